@@ -1,77 +1,166 @@
-from app.domain.shared.value_object.id import Id
+from datetime import datetime
+from typing import Iterator
+
+from app.domain.shared.value_object.id import Id, restore_id
 from app.domain.shared.value_object.time import Time
 from app.domain.chat.value_object.title import Title
-from app.domain.chat.value_object.question import Question
+from app.domain.chat.value_object.question import Question, restore_question
 from app.domain.chat.value_object.answer import Answer
 
 class Step:
+    __slots__ = ("_id", "_chat_id", "_question", "_answer", "_created_at")
+
     def __init__(self, id: Id, chat_id: Id, question: Question, answer: Answer, created_at: Time):
         self._id = id
         self._chat_id = chat_id
         self._question = question
         self._answer = answer
         self._created_at = created_at
-        
+
     def get_id(self) -> Id:
         return self._id
-    
+
     def get_chat_id(self) -> Id:
         return self._chat_id
-    
+
     def get_question(self) -> Question:
         return self._question
-    
+
     def get_answer(self) -> Answer:
         return self._answer
-    
+
     def get_created_at(self) -> Time:
         return self._created_at
-    
+
     def equals(self, other: 'Step') -> bool:
         return self._id.equals(other._id)
-    
+
 def create_step(id: Id, chat_id: Id, question: Question, answer: Answer, created_at: Time) -> Step:
     return Step(id, chat_id, question, answer, created_at)
-        
+
 
 class Chat:
+    """チャットエンティティ。
+
+    長い会話を大量に保持してもメモリを消費しすぎないよう、ステップは Step オブジェクトではなく
+    項目ごとのリスト（ID・質問・回答・作成日時）に分けて値のまま保持し、
+    get_steps などで取り出すときに Step を組み立てる。
+
+    長い会話では、先頭からのステップを要約した文章（会話の要約）と、それが何件目までのステップを
+    まとめたものかを保持する。要約は LLM に渡す履歴を短くするためのもので、ステップ自体は削除しない。
+    """
+
+    __slots__ = ("_id", "_title", "_created_at", "_updated_at", "_step_ids", "_questions", "_answers", "_step_created_at", "_summary", "_summarized_step_count")
+
     def __init__(self, id: Id, title: Title, steps: list[Step], created_at: Time, updated_at: Time):
         self._id = id
         self._title = title
-        self._steps = steps
         self._created_at = created_at
         self._updated_at = updated_at
+        self._step_ids: list[str] = []
+        self._questions: list[str] = []
+        self._answers: list[str] = []
+        self._step_created_at: list[datetime] = []
+        self._summary = ""
+        self._summarized_step_count = 0
+        for step in steps:
+            self.add_step(step)
 
     def get_id(self) -> Id:
         return self._id
-    
+
     def get_title(self) -> Title:
         return self._title
-    
+
     def get_steps(self) -> list[Step]:
-        return self._steps
-    
+        """全ステップを返す。呼び出しのたびに Step を組み立てるため、差分だけが必要な場合は get_steps_since を使う。"""
+        return self.get_steps_since(0)
+
+    def get_steps_since(self, start: int) -> list[Step]:
+        """start 番目以降のステップを返す。"""
+        return [self._step_at(index) for index in range(start, len(self._step_ids))]
+
+    def step_count(self) -> int:
+        return len(self._step_ids)
+
+    def step_values(self) -> Iterator[tuple[str, str, str, datetime]]:
+        """ステップを (ID, 質問, 回答, 作成日時) の値のまま返す。保存や書き出しなど、Step を組み立てる必要の無い処理に使う。"""
+        return zip(self._step_ids, self._questions, self._answers, self._step_created_at)
+
+    def get_summary(self) -> str:
+        """先頭から summarized_step_count 件のステップの要約を返す（要約していない場合は空文字列）。"""
+        return self._summary
+
+    def summarized_step_count(self) -> int:
+        return self._summarized_step_count
+
     def get_created_at(self) -> Time:
         return self._created_at
-    
+
     def get_updated_at(self) -> Time:
         return self._updated_at
-    
+
     def add_step(self, step: Step):
-        self._steps.append(step)
+        # チャット ID はチャット自身のものを使うため、ステップごとには保持しない
+        self._step_ids.append(step.get_id().value())
+        self._questions.append(step.get_question().value())
+        self._answers.append(step.get_answer().value())
+        self._step_created_at.append(step.get_created_at().value())
 
-    def get_chat_history(self) -> str:
-        return "\n".join([f"{index + 1}: {step.get_question().value()} -> {step.get_answer().value()}" for index, step in enumerate(self._steps)])
-    
     def remove_step(self, step: Step):
-        self._steps.remove(step)
+        index = self._step_ids.index(step.get_id().value())
+        del self._step_ids[index]
+        del self._questions[index]
+        del self._answers[index]
+        del self._step_created_at[index]
+        # 要約済みのステップを削除した場合、要約は内容と合わなくなるため捨てる
+        if index < self._summarized_step_count:
+            self.clear_summary()
 
     def update_updated_at(self, updated_at: Time):
         self._updated_at = updated_at
 
+    def update_title(self, title: Title):
+        self._title = title
+
+    def update_summary(self, summary: str, step_count: int):
+        """先頭から step_count 件のステップの要約を設定する。"""
+        if not 0 < step_count <= len(self._step_ids):
+            raise ValueError("Summary must cover between 1 and all steps")
+        self._summary = summary
+        self._summarized_step_count = step_count
+
+    def clear_summary(self):
+        self._summary = ""
+        self._summarized_step_count = 0
+
     def equals(self, other: 'Chat') -> bool:
         return self._id.equals(other._id)
-    
+
+    def _step_at(self, index: int) -> Step:
+        # 追加時に検証済みのため、値オブジェクトは検証せずに作る
+        return Step(
+            restore_id(self._step_ids[index]),
+            self._id,
+            restore_question(self._questions[index]),
+            Answer(self._answers[index]),
+            Time(self._step_created_at[index]),
+        )
+
 def create_chat(id: Id, title: Title, steps: list[Step], created_at: Time, updated_at: Time) -> Chat:
     return Chat(id, title, steps, created_at, updated_at)
-    
\ No newline at end of file
+
+def restore_chat(id: Id, title: Title, created_at: Time, updated_at: Time, step_ids: list[str], questions: list[str], answers: list[str], step_created_at: list[datetime], summary: str = "", summarized_step_count: int = 0) -> Chat:
+    """保存済みのデータからチャットを復元する。ステップの値は検証済みとして扱い、そのまま保持する。"""
+    if not len(step_ids) == len(questions) == len(answers) == len(step_created_at):
+        raise ValueError("Step columns must have the same length")
+    if not 0 <= summarized_step_count <= len(step_ids):
+        raise ValueError("Summary must not cover more steps than the chat has")
+    chat = Chat(id, title, [], created_at, updated_at)
+    chat._step_ids = step_ids
+    chat._questions = questions
+    chat._answers = answers
+    chat._step_created_at = step_created_at
+    chat._summary = summary
+    chat._summarized_step_count = summarized_step_count
+    return chat
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Iterator, Optional
 from app.domain.shared.value_object.id import Id
 from app.domain.chat.entity.chat import Chat
 
@@ -16,9 +17,27 @@ class ChatRepository(ABC):
         pass
 
     @abstractmethod
-    def find_by_id(self, id: Id) -> Chat:
+    def find_by_id(self, id: Id) -> Optional[Chat]:
         pass
     
     @abstractmethod
     def find_all(self) -> list[Chat]:
         pass
+
+    def exists(self, id: Id) -> bool:
+        """チャットが保存されているかを返す。find_by_id と違い、LRU の順序や有効期限を更新しない。"""
+        return self.peek(id) is not None
+
+    def peek(self, id: Id) -> Optional[Chat]:
+        """チャットを返す。find_by_id と違い、LRU の順序や有効期限を更新せず、読み込み済みのチャットにも加えない
+        実装にする（一覧・検索などで、会話中のチャットの扱いに影響しないようにする）。"""
+        return self.find_by_id(id)
+
+    def iter_all(self) -> Iterator[Chat]:
+        """全チャットを 1 件ずつ返す。find_all と違い、全件をまとめてメモリに載せない実装にできる。"""
+        return iter(self.find_all())
+
+    def create_many(self, chats: list[Chat]) -> None:
+        """チャットをまとめて保存する。同じ ID のチャットが保存済みの場合は置き換える。"""
+        for chat in chats:
+            self.create(chat)
@@ -1,4 +1,6 @@
 class Answer:
+    __slots__ = ("_value",)
+
     def __init__(self, value: str):
         self._value = value
 
@@ -7,6 +9,15 @@ class Answer:
     
     def value(self) -> str:
         return self._value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Answer) and self._value == other._value
+
+    def __hash__(self) -> int:
+        return hash(self._value)
+
+    def __repr__(self) -> str:
+        return f"Answer({self._value!r})"
     
 def create_answer(value: str) -> Answer:
-    return Answer(value)
\ No newline at end of file
+    return Answer(value)
@@ -1,6 +1,8 @@
 MAX_QUESTION_LENGTH = 255
 
 class Question:
+    __slots__ = ("_value",)
+
     def __init__(self, value: str):
         if len(value) > MAX_QUESTION_LENGTH:
             raise ValueError(f"Question must be less than {MAX_QUESTION_LENGTH} characters long")
@@ -11,6 +13,21 @@ class Question:
     
     def value(self) -> str:
         return self._value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Question) and self._value == other._value
+
+    def __hash__(self) -> int:
+        return hash(self._value)
+
+    def __repr__(self) -> str:
+        return f"Question({self._value!r})"
     
 def create_question(value: str) -> Question:
-    return Question(value)
\ No newline at end of file
+    return Question(value)
+
+def restore_question(value: str) -> Question:
+    """検証済みの値（保存済みのデータなど）から Question を作る。長さの検証は行わない。"""
+    question = Question.__new__(Question)
+    question._value = value
+    return question
@@ -3,6 +3,8 @@ MIN_TITLE_LENGTH = 3
 
 
 class Title:
+    __slots__ = ("_value",)
+
     def __init__(self, value: str):
         if len(value) < MIN_TITLE_LENGTH:
             raise ValueError(f"Title must be at least {MIN_TITLE_LENGTH} characters long")
@@ -15,6 +17,21 @@ class Title:
     
     def value(self) -> str:
         return self._value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Title) and self._value == other._value
+
+    def __hash__(self) -> int:
+        return hash(self._value)
+
+    def __repr__(self) -> str:
+        return f"Title({self._value!r})"
     
 def create_title(value: str) -> Title:
-    return Title(value)
\ No newline at end of file
+    return Title(value)
+
+def restore_title(value: str) -> Title:
+    """検証済みの値（保存済みのデータなど）から Title を作る。長さの検証は行わない。"""
+    title = Title.__new__(Title)
+    title._value = value
+    return title
@@ -1,6 +1,8 @@
 import uuid
 
 class Id:
+    __slots__ = ("_value",)
+
     def __init__(self, value: str):
         if not uuid.UUID(value):
             raise ValueError("Id must be a valid UUID")
@@ -11,6 +13,26 @@ class Id:
     
     def value(self) -> str:
         return self._value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Id) and self._value == other._value
+
+    def __hash__(self) -> int:
+        # str のハッシュ値はインスタンスにキャッシュされるため、毎回計算し直すことはない
+        return hash(self._value)
+
+    def __repr__(self) -> str:
+        return f"Id({self._value!r})"
     
 def create_id(value: str) -> Id:
-    return Id(value)
\ No newline at end of file
+    return Id(value)
+
+def restore_id(value: str) -> Id:
+    """検証済みの値（採番済みの ID や保存済みのデータ）から Id を作る。UUID としての検証は行わない。"""
+    id = Id.__new__(Id)
+    id._value = value
+    return id
+
+def generate_id() -> Id:
+    """新しい ID を採番する。"""
+    return restore_id(str(uuid.uuid4()))
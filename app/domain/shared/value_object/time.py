@@ -1,6 +1,8 @@
 from datetime import datetime
 
 class Time:
+    __slots__ = ("_value",)
+
     def __init__(self, value: datetime):
         self._value = value
 
@@ -9,6 +11,16 @@ class Time:
     
     def value(self) -> datetime:
         return self._value
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, Time) and self._value == other._value
+
+    def __hash__(self) -> int:
+        # datetime のハッシュ値はインスタンスにキャッシュされる
+        return hash(self._value)
+
+    def __repr__(self) -> str:
+        return f"Time({self._value!r})"
     
 def create_time(value: datetime) -> Time:
-    return Time(value)
\ No newline at end of file
+    return Time(value)
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+from app.usecase.ports.output.llm.client import AsyncLLMClient, ChatMessage
+
+_WHITESPACE = re.compile(r"\s+")
+
+@dataclass
+class LLMCacheStats:
+    hits: int
+    misses: int
+    # 同じリクエストが実行中だったため、上流を呼ばずに相乗りした回数
+    coalesced: int
+    size: int
+
+class _Flight:
+    """上流で実行中のリクエスト。同じキーの呼び出しは、この結果を共有する。"""
+
+    def __init__(self):
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.task: Optional[asyncio.Task[None]] = None
+        # チャンクの追加・完了のたびに set し、新しいイベントに差し替える
+        self.changed = asyncio.Event()
+
+    def push(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def cancelled(self) -> bool:
+        """上流のリクエストが取り消された（取り消し中を含む）か。"""
+        return self.task is not None and (self.task.cancelled() or self.task.cancelling() > 0)
+
+    def _notify(self):
+        changed = self.changed
+        self.changed = asyncio.Event()
+        changed.set()
+
+class CachedLLMClient(AsyncLLMClient):
+    """LLM クライアントの前段に置くレスポンスキャッシュ。
+
+    キーは「プロンプトの種類（タイトル生成 / 回答生成）・正規化した質問・履歴のハッシュ」。
+    LRU と TTL で破棄し、同じキーのリクエストが実行中の場合は上流を呼ばずにその結果を共有する
+    （ストリーミングの場合は、実行中のストリームのチャンクをそのまま受け取る）。
+    """
+
+    def __init__(self, client: AsyncLLMClient, max_entries: int, ttl_seconds: float):
+        self._client = client
+        self._max_entries = max_entries
+        self._ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple[str, str, str], tuple[str, float]] = OrderedDict()
+        self._inflight: dict[tuple[str, str, str], _Flight] = {}
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        return "".join([chunk async for chunk in self._cached(question, prompt, chat_history, task, streaming=False)])
+
+    def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        return self._cached(question, prompt, chat_history, task, streaming=True)
+
+    def stats(self) -> LLMCacheStats:
+        return LLMCacheStats(self._hits, self._misses, self._coalesced, len(self._entries))
+
+    async def _cached(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str, streaming: bool) -> AsyncIterator[str]:
+        key = _cache_key(question, prompt, chat_history)
+        cached = self._lookup(key)
+        if cached is not None:
+            self._hits += 1
+            yield cached
+            return
+
+        flight = self._inflight.get(key)
+        # 取り消し中のリクエストには相乗りせず（CancelledError を受け取ることになる）、新しく呼び出す
+        if flight is None or flight.cancelled():
+            self._misses += 1
+            flight = self._inflight[key] = _Flight()
+            flight.task = asyncio.create_task(self._fly(key, flight, question, prompt, chat_history, task, streaming))
+        else:
+            self._coalesced += 1
+
+        async for chunk in self._follow(key, flight):
+            yield chunk
+
+    async def _fly(self, key: tuple[str, str, str], flight: _Flight, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str, streaming: bool):
+        try:
+            if streaming:
+                async for chunk in self._client.stream_response(question, prompt, chat_history, task):
+                    flight.push(chunk)
+            else:
+                flight.push(await self._client.generate_response(question, prompt, chat_history, task))
+        except asyncio.CancelledError as e:
+            self._land(key, flight, e)
+            raise
+        except Exception as e:
+            # 例外は待っている呼び出し側それぞれに伝える
+            self._land(key, flight, e)
+            return
+
+        answer = "".join(flight.chunks)
+        if answer:
+            self._store(key, answer)
+        self._land(key, flight, None)
+
+    def _land(self, key: tuple[str, str, str], flight: _Flight, error: Optional[BaseException]):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        flight.finish(error)
+
+    async def _follow(self, key: tuple[str, str, str], flight: _Flight) -> AsyncIterator[str]:
+        index = 0
+        flight.waiters += 1
+        try:
+            while True:
+                changed = flight.changed
+                while index < len(flight.chunks):
+                    yield flight.chunks[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await changed.wait()
+        finally:
+            flight.waiters -= 1
+            # 待っている呼び出し側がいなくなった場合は上流のリクエストも取り消し、以降の呼び出しが相乗りしないよう外す
+            if flight.waiters == 0 and not flight.done and flight.task is not None:
+                if self._inflight.get(key) is flight:
+                    del self._inflight[key]
+                flight.task.cancel()
+
+    def _lookup(self, key: tuple[str, str, str]) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if self._ttl_seconds > 0 and expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: tuple[str, str, str], value: str):
+        self._entries[key] = (value, time.monotonic() + self._ttl_seconds)
+        self._entries.move_to_end(key)
+        while self._max_entries > 0 and len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+def _normalize(question: str) -> str:
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", question)).strip().casefold()
+
+def _cache_key(question: str, prompt: str, chat_history: Optional[list[ChatMessage]]) -> tuple[str, str, str]:
+    # プロンプトはタイトル生成 / 回答生成ごとの定数なので、そのまま種類として使う
+    return prompt, _normalize(question), _history_hash(chat_history)
+
+def _history_hash(chat_history: Optional[list[ChatMessage]]) -> str:
+    if not chat_history:
+        return ""
+    digest = hashlib.sha256()
+    for message in chat_history:
+        digest.update(message.role.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(message.content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def create_cached_llm_client(client: AsyncLLMClient, max_entries: int = 10000, ttl_seconds: float = 600) -> CachedLLMClient:
+    return CachedLLMClient(client, max_entries, ttl_seconds)
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+from typing import Any
+
+import httpx
+
+from app.domain.chat.entity.chat import Chat
+from app.domain.chat.repository.chat import ChatRepository
+from app.domain.shared.value_object.id import create_id
+from app.infrastructure.serialization.chat import decode_chat
+
+# ワーカー間の問い合わせのタイムアウト（同じノード上の Unix ソケットのため短くてよい）
+PEER_TIMEOUT_SECONDS = 2.0
+# ワーカー間の API の呼び出しに付ける、クラスターの共有の秘密のヘッダー
+CLUSTER_SECRET_HEADER = "X-Cluster-Secret"
+# serve.py がワーカーの追加・削除（チャットの担当の移動）の間だけ、ソケットディレクトリに置くファイル
+REBALANCE_MARKER_FILE = "rebalancing"
+
+logger = logging.getLogger(__name__)
+
+class PeerChatFetcher:
+    """同じノード上の他のワーカーからチャットを引き継ぐ。
+
+    serve.py で複数ワーカーを起動した場合、各チャットは chat_id のコンシステントハッシュで決まる
+    ワーカーが担当する。ワーカーの追加・削除で担当が変わったチャットは serve.py がまとめて移すが、
+    移し終えるまでの間に新しい担当ワーカーで参照されたチャットは、ソケットディレクトリ内の他のワーカーから移してくる。
+    移動元はチャットを返すだけで削除せず、手元に保存してから release で削除してよいことを伝える
+    （途中で失敗しても、どちらかには必ず残る）。移動元は release でそのチャットの接続を閉じ、
+    渡した後に更新されていた場合は最新の内容を返すため、手元のものを置き換えてからもう一度 release する。
+    """
+
+    def __init__(self, repository: ChatRepository, socket_dir: str, own_socket: str, secret: str):
+        self._repository = repository
+        self._socket_dir = socket_dir
+        self._own_socket = os.path.abspath(own_socket)
+        self._headers = {CLUSTER_SECRET_HEADER: secret}
+        self._marker = os.path.join(socket_dir, REBALANCE_MARKER_FILE)
+
+    async def fetch(self, chat_id: str):
+        """ワーカーの追加・削除中に、chat_id のチャットが手元に無ければ、他のワーカーから移してくる。
+
+        担当が変わるのはワーカーの追加・削除のときだけのため、それ以外のとき（新しいチャットを含む）は
+        マーカーのファイルの有無を確かめるだけで、他のワーカーには問い合わせない。
+        """
+        if not os.path.exists(self._marker):
+            return
+        try:
+            id = create_id(chat_id)
+        except ValueError:
+            return
+        if self._repository.exists(id):
+            return
+        for socket in self._peer_sockets():
+            if await self._take_from(socket, chat_id):
+                return
+
+    async def _take_from(self, socket: str, chat_id: str) -> bool:
+        async with httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=socket), timeout=PEER_TIMEOUT_SECONDS, headers=self._headers) as client:
+            try:
+                response = await client.post(f"http://worker/internal/chats/{chat_id}/handoff")
+            except httpx.HTTPError:
+                logger.warning("Failed to reach peer worker %s", socket)
+                return False
+            if response.status_code != 200:
+                return False
+            record = response.json()
+            chat = decode_chat(record)
+            if not self._repository.exists(chat.get_id()):
+                self._repository.create(chat)
+            try:
+                response = await client.post("http://worker/internal/chats/release", content=json.dumps(release_record(record)))
+                response.raise_for_status()
+                for kept in response.json()["kept"]:
+                    # 渡した後に移動元で更新されていた。手元でまだ更新していなければ置き換える
+                    current = self._repository.peek(chat.get_id())
+                    if current is not None and chat_version(current) != release_record(record)["version"]:
+                        logger.warning("Chat %s was updated on both workers while it was moved; keeping the copy on %s", chat_id, socket)
+                        continue
+                    self._repository.update(decode_chat(kept))
+                    response = await client.post("http://worker/internal/chats/release", content=json.dumps(release_record(kept)))
+                    response.raise_for_status()
+            except httpx.HTTPError:
+                # 移動元にも残るが、担当はこのワーカーのため以降は参照されない
+                logger.warning("Failed to release chat %s on %s", chat_id, socket)
+        logger.info("Took over chat %s from %s", chat_id, socket)
+        return True
+
+    def _peer_sockets(self) -> list[str]:
+        try:
+            names = sorted(os.listdir(self._socket_dir))
+        except OSError:
+            return []
+        sockets = [os.path.abspath(os.path.join(self._socket_dir, name)) for name in names if name.endswith(".sock")]
+        return [socket for socket in sockets if socket != self._own_socket]
+
+def chat_version(chat: Chat) -> list[Any]:
+    """移動元が、チャットを渡した後に更新していないことを確かめるための値。"""
+    return [chat.get_updated_at().value().isoformat(), chat.step_count(), chat.summarized_step_count()]
+
+def release_record(record: dict[str, Any]) -> dict[str, Any]:
+    """encode_chat で変換したチャットを移し終えたときに、移動元の release に送る辞書。"""
+    summary = record.get("summary")
+    return {"id": record["id"], "version": [record["updated_at"], len(record["steps"]), summary[1] if summary else 0]}
+
+def create_peer_chat_fetcher(repository: ChatRepository, socket_dir: str, own_socket: str, secret: str) -> PeerChatFetcher:
+    return PeerChatFetcher(repository, socket_dir, own_socket, secret)
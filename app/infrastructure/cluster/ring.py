@@ -0,0 +1,56 @@
+import bisect
+import hashlib
+from typing import Optional
+
+class HashRing:
+    """コンシステントハッシュのリング。
+
+    ノードごとに virtual_nodes 個の点をリング上に置き、キーのハッシュ値から時計回りに最初の点のノードを
+    担当とする。ノードを追加・削除しても、担当が変わるキーはおおよそ 1 / ノード数 に留まる。
+    """
+
+    def __init__(self, virtual_nodes: int):
+        self._virtual_nodes = virtual_nodes
+        self._points: list[int] = []
+        self._owners: list[str] = []
+        self._nodes: set[str] = set()
+
+    def add(self, node: str):
+        if node in self._nodes:
+            return
+        self._nodes.add(node)
+        for replica in range(self._virtual_nodes):
+            point = _hash(f"{node}#{replica}")
+            index = bisect.bisect_left(self._points, point)
+            self._points.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self._nodes:
+            return
+        self._nodes.discard(node)
+        kept = [(point, owner) for point, owner in zip(self._points, self._owners) if owner != node]
+        self._points = [point for point, _ in kept]
+        self._owners = [owner for _, owner in kept]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._points:
+            return None
+        index = bisect.bisect_right(self._points, _hash(key)) % len(self._points)
+        return self._owners[index]
+
+    def nodes(self) -> list[str]:
+        return sorted(self._nodes)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+def _hash(key: str) -> int:
+    # プロセスごとに値が変わる組み込みの hash() は使えないため、安定したハッシュ関数を使う
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+def create_hash_ring(virtual_nodes: int = 128) -> HashRing:
+    return HashRing(virtual_nodes)
@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+import logging
+import uuid
+from typing import Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from app.infrastructure.cluster.ring import HashRing
+
+# リクエストヘッダーの上限
+MAX_HEAD_BYTES = 64 * 1024
+# 転送時の読み込み単位
+CHUNK_BYTES = 64 * 1024
+
+logger = logging.getLogger(__name__)
+
+class ChatRouter:
+    """TCP で受けた接続を、chat_id を担当するワーカーの Unix ソケットへ中継する。
+
+    最初のリクエストのリクエストラインだけを読み、クエリの chat_id からコンシステントハッシュで
+    ワーカーを選んで、以降は接続が閉じるまでバイト列をそのまま中継する（WebSocket もそのまま通る）。
+    chat_id の無い /chat/stream には新しい chat_id を振り、それ以外のリクエストはラウンドロビンで振り分ける。
+    keep-alive の接続では 2 つ目以降のリクエストも同じワーカーに届く。
+    """
+
+    def __init__(self, ring: HashRing):
+        self.ring = ring
+        self._round_robin = itertools.count()
+
+    async def serve(self, host: str, port: int) -> asyncio.Server:
+        return await asyncio.start_server(self._handle, host, port, limit=MAX_HEAD_BYTES)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        request_line, _, rest = head.partition(b"\r\n")
+        parts = request_line.decode("latin-1").split(" ")
+        if len(parts) != 3:
+            await _reply(writer, 400, "Bad Request")
+            return
+        method, target, version = parts
+        url = urlsplit(target)
+        # ワーカー間の API は外部に公開しない。ここでは最初のリクエストを早めに拒否するだけで
+        # （keep-alive の 2 つ目以降のリクエストは見ない）、ワーカー側で共有の秘密のヘッダーを確かめる
+        if unquote(url.path).startswith("/internal"):
+            await _reply(writer, 404, "Not Found")
+            return
+
+        chat_id = parse_qs(url.query).get("chat_id", [None])[0]
+        if chat_id is None and url.path == "/chat/stream":
+            chat_id = str(uuid.uuid4())
+            query = f"{url.query}&chat_id={chat_id}" if url.query else f"chat_id={chat_id}"
+            target = url._replace(query=query).geturl()
+            head = f"{method} {target} {version}".encode("latin-1") + b"\r\n" + rest
+
+        socket = self._select(chat_id)
+        if socket is None:
+            await _reply(writer, 503, "Service Unavailable")
+            return
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_unix_connection(socket)
+        except OSError:
+            logger.warning("Failed to connect to worker %s", socket)
+            await _reply(writer, 502, "Bad Gateway")
+            return
+        upstream_writer.write(head)
+        try:
+            await asyncio.gather(
+                _pipe(reader, upstream_writer),
+                _pipe(upstream_reader, writer),
+            )
+        finally:
+            upstream_writer.close()
+            writer.close()
+
+    def _select(self, chat_id: Optional[str]) -> Optional[str]:
+        if chat_id is not None:
+            return self.ring.owner(chat_id)
+        nodes = self.ring.nodes()
+        if not nodes:
+            return None
+        return nodes[next(self._round_robin) % len(nodes)]
+
+async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            data = await reader.read(CHUNK_BYTES)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+        # 片方向が終わっても、もう片方向は読み切れるよう送信側だけを閉じる
+        if writer.can_write_eof():
+            writer.write_eof()
+    except (ConnectionError, OSError):
+        writer.close()
+
+async def _reply(writer: asyncio.StreamWriter, status: int, reason: str):
+    body = reason.encode("ascii")
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("ascii") + body
+    )
+    try:
+        await writer.drain()
+    except ConnectionError:
+        pass
+    writer.close()
+
+def create_chat_router(ring: HashRing) -> ChatRouter:
+    return ChatRouter(ring)
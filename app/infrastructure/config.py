@@ -2,9 +2,143 @@ from pydantic_settings import BaseSettings
 
 class Config(BaseSettings):
     openai_api_key: str = ""
+    # 互換 API のサーバー（擬似 LLM サーバーなど）に向ける場合に指定する
+    openai_base_url: str = ""
+
+    # LLM の処理（タイトル生成 / 回答生成 / 会話の要約）ごとのモデル・出力トークン数の上限（0 の場合は指定しない）・
+    # temperature（負の場合は指定しない）。fake の場合も出力トークン数の上限で回答を打ち切る
+    llm_title_model: str = "gpt-4o-mini"
+    llm_title_max_tokens: int = 32
+    llm_title_temperature: float = 0.3
+    llm_step_model: str = "gpt-4o-mini"
+    llm_step_max_tokens: int = 0
+    llm_step_temperature: float = -1
+    llm_summary_model: str = "gpt-4o-mini"
+    llm_summary_max_tokens: int = 512
+    llm_summary_temperature: float = 0.3
+    # 既定のモデルが遅い場合・チャットの使用量が多い場合に切り替えるモデル（空の場合は切り替えない）
+    llm_fallback_model: str = ""
+    # 最初のトークンまでの時間の平均がこれを超えた処理は、llm_fallback_cooldown_seconds の間切り替える（0 の場合は切り替えない）
+    llm_fallback_latency_seconds: float = 0
+    llm_fallback_cooldown_seconds: float = 60
+    # トークン使用量（プロンプト + 出力）がこれを超えたチャットは、以降切り替える（0 の場合は切り替えない）
+    llm_chat_token_budget: int = 0
+    # チャットごとのトークン使用量（/chats/usage・llm_chat_token_budget の判定）を保持するチャット数
+    llm_token_ledger_max_chats: int = 10000
+
+    # OpenAI API との HTTP 接続（ワーカー内で共有する接続プール）。HTTP/2 は h2 がインストールされている場合のみ使う
+    llm_http_max_connections: int = 100
+    llm_http_max_keepalive_connections: int = 20
+    llm_http_keepalive_seconds: float = 30
+    llm_http2: bool = True
+    # 接続・応答ヘッダーとストリームの各チャンクの待ち時間・送信・接続プールの空きを待つ時間の上限
+    llm_http_connect_timeout_seconds: float = 5
+    llm_http_read_timeout_seconds: float = 60
+    llm_http_write_timeout_seconds: float = 10
+    llm_http_pool_timeout_seconds: float = 10
+    # 429・5xx・接続エラー・タイムアウトのリトライ（ジッター付きの指数バックオフ）
+    llm_http_max_retries: int = 2
+    llm_http_retry_backoff_seconds: float = 0.5
+    llm_http_retry_backoff_max_seconds: float = 8
+    # リトライ・ヘッジは直近 10 秒のリクエスト数のこの割合（に加えて毎秒この回数）まで
+    llm_http_retry_budget_ratio: float = 0.2
+    llm_http_retry_budget_min_per_second: float = 1
+    # 応答ヘッダーまでの時間が直近の分位点（と最小値）を超えたら、同じリクエストをもう 1 つ送って先に応答した方を使う
+    llm_http_hedge_enabled: bool = False
+    llm_http_hedge_quantile: float = 0.95
+    llm_http_hedge_min_delay_seconds: float = 1
+    # 起動時に上流へ張っておく接続の数（0 の場合は最初のリクエストで接続する）
+    llm_prewarm_connections: int = 2
+
+    # LLM の実装（openai / fake）。fake の場合は OpenAI を呼ばずに擬似的な回答を返す
+    llm_backend: str = "openai"
+    fake_llm_latency_seconds: float = 0.5
+    fake_llm_tokens_per_second: float = 50
+    fake_llm_answer_tokens: int = 64
+    fake_llm_error_rate: float = 0
+
+    # チャットリポジトリの実装（memory / file）
+    chat_repository: str = "memory"
+
+    # インメモリのチャットリポジトリ（0 の場合は無制限）
+    chat_repository_max_chats: int = 10000
+    chat_repository_max_bytes: int = 256 * 1024 * 1024
+    chat_repository_ttl_seconds: float = 0
+
+    # ファイル（ジャーナル）のチャットリポジトリ
+    chat_repository_path: str = "data/chats"
+    chat_repository_snapshot_interval: int = 10000
+    chat_repository_fsync: bool = False
+    # メモリに保持する読み込み済みのチャット数（スナップショットに未反映のチャットは超えても保持する。0 の場合は無制限）
+    chat_repository_max_loaded_chats: int = 10000
+
+    # チャットの一覧（/chats）・全文検索（/chats/search）用の索引。serve.py のワーカーでは、
+    # リクエストごとに別のワーカーの担当分だけを返す（カーソルも別のワーカーの索引に使われる）ため無効になる
+    chat_index_enabled: bool = True
+
+    # チャットの一括書き出し（/chats/export）・取り込み（/chats/import）。serve.py のワーカーでは、
+    # 各ワーカーが担当のチャットしか持たず、取り込んだチャットが担当のワーカーに届かないため無効になる
+    chat_archive_enabled: bool = True
+
+    # 会話中のチャット集約を保持するセッションキャッシュの上限
+    chat_session_cache_size: int = 1000
+
+    # LLM に渡す過去の会話のトークン数の上限
+    context_max_tokens: int = 4000
+
+    # 長い会話の要約: 直近の chat_summary_keep_recent_steps 件より前に要約されていないステップが
+    # chat_summary_batch_steps 件たまったら、バックグラウンドで要約に取り込む（0 の場合は要約しない）
+    chat_summary_batch_steps: int = 20
+    chat_summary_keep_recent_steps: int = 10
+    # 要約を行うワーカー数と、要約を待つチャット数の上限
+    chat_summary_workers: int = 2
+    chat_summary_max_queue: int = 1000
+
+    # 1 ターン（質問の受信から回答の完了まで）の制限時間（0 の場合は無制限）
+    chat_turn_timeout_seconds: float = 120
+    # /chat/stream の v2 プロトコルで、切断後に再開を待つ時間と、再送用に保持するフレームの上限（件数・バイト数）
+    chat_stream_resume_seconds: float = 30
+    chat_stream_resume_buffer_frames: int = 2048
+    chat_stream_resume_buffer_bytes: int = 1024 * 1024
+    # 全セッションの再送用のフレームの合計の上限（超えた場合は切断中のセッションを古い順に破棄する。0 の場合は無制限）
+    chat_stream_resume_buffer_total_bytes: int = 256 * 1024 * 1024
+    # /chat/stream の接続数・1 接続のターン数・受信するメッセージの大きさの上限（0 の場合は無制限）
+    chat_stream_max_connections: int = 10000
+    chat_stream_max_turns_per_connection: int = 1000
+    chat_stream_max_message_bytes: int = 64 * 1024
+    # v2 の接続に ping を送る間隔と、応答を待つ時間・質問の無い接続を閉じるまでの時間（0 の場合は無効）
+    chat_stream_heartbeat_seconds: float = 20
+    chat_stream_heartbeat_timeout_seconds: float = 20
+    chat_stream_idle_seconds: float = 900
+    # SIGTERM を受け取ってから、実行中のターンが終わるのを待つ時間の上限（0 の場合はすぐに停止する）
+    drain_timeout_seconds: float = 30
+
+    # LLM のレスポンスキャッシュ
+    llm_cache_enabled: bool = True
+    llm_cache_max_entries: int = 10000
+    llm_cache_ttl_seconds: float = 600
+
+    # LLM 呼び出しの流量制御（ワーカー全体の同時実行数と 1 分あたりのトークン数。0 の場合は無制限）
+    llm_max_concurrency: int = 16
+    llm_tokens_per_minute: int = 0
+    # 上限に達している間に待たせるリクエスト数（全体 / 接続ごと）と、待ち時間の上限
+    llm_max_queue: int = 256
+    llm_max_queue_per_connection: int = 4
+    llm_max_queue_wait_seconds: float = 30
+    # トークン数の見積もりに使う、1 回の応答の想定トークン数
+    llm_completion_token_estimate: int = 512
+
+    # 計測値の記録と /metrics の公開
+    metrics_enabled: bool = True
+
+    # serve.py で複数ワーカーを起動した場合に設定される（ワーカーの Unix ソケットのディレクトリと自身のソケット）
+    cluster_socket_dir: str = ""
+    cluster_worker_socket: str = ""
+    # ワーカー間の API（/internal）の呼び出しに付ける共有の秘密（serve.py が起動ごとに生成する）
+    cluster_secret: str = ""
 
     class Config:
         env_file = ".env"
 
 def provide_config() -> Config:
-    return Config()
\ No newline at end of file
+    return Config()
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import random
+import time
+from typing import AsyncIterator, Iterator, Optional
+
+from app.usecase.ports.output.llm.client import LLMClient, AsyncLLMClient, ChatMessage
+
+# 回答の組み立てに使う語彙（1 語 = 1 トークンとして扱う）
+_VOCABULARY = [
+    "ドメイン", "モデル", "は", "を", "に", "の", "として", "表現", "します", "。",
+    "ユースケース", "リポジトリ", "エンティティ", "値オブジェクト", "依存", "内側", "外側", "層", "境界", "ポート",
+    "アダプター", "設計", "です", "、", "つまり", "例えば", "責務", "分離", "変更", "テスト",
+]
+
+class FakeLLMError(Exception):
+    """擬似的に発生させた LLM のエラー。"""
+    pass
+
+class FakeLLM:
+    """OpenAI の代わりに使う、決定的な回答を返す擬似 LLM。
+
+    同じプロンプト・質問・履歴には常に同じ回答を返す。
+    latency_seconds は最初のトークンまでの時間、tokens_per_second は以降の生成速度（0 の場合は一度に返す）、
+    error_rate はリクエストが失敗する確率（seed を固定すれば失敗の順序も再現できる）。
+    """
+
+    def __init__(self, latency_seconds: float, tokens_per_second: float, answer_tokens: int, error_rate: float, seed: int):
+        self.latency_seconds = latency_seconds
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.error_rate = error_rate
+        self._errors = random.Random(seed)
+
+    def derive(self, latency_seconds: float, answer_tokens: int) -> "FakeLLM":
+        """最初のトークンまでの時間と回答の長さだけを変えた擬似 LLM を返す（失敗の順序は共有する）。"""
+        llm = FakeLLM(latency_seconds, self.tokens_per_second, answer_tokens, self.error_rate, 0)
+        llm._errors = self._errors
+        return llm
+
+    def tokens(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]]) -> list[str]:
+        """回答をトークン単位で返す。失敗させる場合は FakeLLMError を送出する。"""
+        if self.error_rate > 0 and self._errors.random() < self.error_rate:
+            raise FakeLLMError("Fake LLM error")
+        digest = hashlib.sha256()
+        for message in chat_history or []:
+            digest.update(message.content.encode("utf-8"))
+        digest.update(prompt.encode("utf-8"))
+        digest.update(question.encode("utf-8"))
+        words = random.Random(digest.digest())
+        return [words.choice(_VOCABULARY) for _ in range(self.answer_tokens)]
+
+    def delay(self, index: int) -> float:
+        """リクエスト開始から index 番目のトークンを返すまでの時間。"""
+        if self.tokens_per_second <= 0:
+            return self.latency_seconds
+        return self.latency_seconds + index / self.tokens_per_second
+
+class FakeLLMClient(LLMClient):
+    """max_tokens は処理（タイトル生成 / 回答生成）ごとの出力トークン数の上限（0 または未指定の場合は無制限）。"""
+
+    def __init__(self, llm: FakeLLM, max_tokens: dict[str, int]):
+        self.llm = llm
+        self.max_tokens = max_tokens
+
+    def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        tokens = _limit(self.llm.tokens(question, prompt, chat_history), self.max_tokens.get(task, 0))
+        time.sleep(self.llm.delay(len(tokens) - 1))
+        return "".join(tokens)
+
+class AsyncFakeLLMClient(AsyncLLMClient):
+    """max_tokens は処理（タイトル生成 / 回答生成）ごとの出力トークン数の上限（0 または未指定の場合は無制限）。"""
+
+    def __init__(self, llm: FakeLLM, max_tokens: dict[str, int]):
+        self.llm = llm
+        self.max_tokens = max_tokens
+
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        tokens = _limit(self.llm.tokens(question, prompt, chat_history), self.max_tokens.get(task, 0))
+        await asyncio.sleep(self.llm.delay(len(tokens) - 1))
+        return "".join(tokens)
+
+    async def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        started = time.monotonic()
+        tokens = _limit(self.llm.tokens(question, prompt, chat_history), self.max_tokens.get(task, 0))
+        for chunk in _paced(self.llm, tokens, started):
+            # 生成速度が速い場合はスリープの回数を減らすため、時刻の到来したトークンをまとめて返す
+            delay = started + self.llm.delay(chunk[0]) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield chunk[1]
+
+def _limit(tokens: list[str], max_tokens: int) -> list[str]:
+    return tokens[:max_tokens] if max_tokens > 0 else tokens
+
+def _paced(llm: FakeLLM, tokens: list[str], started: float) -> Iterator[tuple[int, str]]:
+    """(最初のトークンの番号, まとめたテキスト) を順に返す。"""
+    index = 0
+    while index < len(tokens):
+        elapsed = time.monotonic() - started
+        end = index + 1
+        while end < len(tokens) and llm.delay(end) <= elapsed:
+            end += 1
+        yield index, "".join(tokens[index:end])
+        index = end
+
+def create_fake_llm(latency_seconds: float = 0.5, tokens_per_second: float = 50, answer_tokens: int = 64, error_rate: float = 0, seed: int = 0) -> FakeLLM:
+    return FakeLLM(latency_seconds, tokens_per_second, answer_tokens, error_rate, seed)
+
+def create_fake_llm_client(llm: FakeLLM, max_tokens: Optional[dict[str, int]] = None) -> FakeLLMClient:
+    return FakeLLMClient(llm, max_tokens or {})
+
+def create_async_fake_llm_client(llm: FakeLLM, max_tokens: Optional[dict[str, int]] = None) -> AsyncFakeLLMClient:
+    return AsyncFakeLLMClient(llm, max_tokens or {})
@@ -0,0 +1,179 @@
+"""OpenAI の Chat Completions API（/v1/chat/completions）を模した擬似 LLM サーバー。
+
+OPENAI_BASE_URL に指定すると、OpenAI クライアントを含む実際の経路のまま負荷試験ができる。
+max_completion_tokens（max_tokens）を指定した場合は回答をその長さで打ち切り、
+--model-latency でモデルごとに最初のトークンまでの時間を変えられる（モデルの切り替えの確認用）。
+--stall-rate・--server-error-rate で、応答ヘッダーを返さずに止まるリクエストと 503 を返すリクエストを混ぜられる
+（タイムアウト・リトライ・ヘッジの確認用）。テストでは faults で、リクエストごとの障害を順に指定できる。
+
+    uv run python -m app.infrastructure.fake.server --port 8001 --latency 0.5 --tps 50 --error-rate 0.01
+    uv run python -m app.infrastructure.fake.server --port 8001 --model-latency gpt-4o=2.0 --model-latency gpt-4o-mini=0.2
+    uv run python -m app.infrastructure.fake.server --port 8001 --stall-rate 0.05 --stall-seconds 30 --server-error-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from app.infrastructure.fake.client import FakeLLM, FakeLLMError, create_async_fake_llm_client, create_fake_llm
+from app.infrastructure.openai.tokenizer import create_tokenizer
+from app.usecase.ports.output.llm.client import ChatMessage
+
+# faults で指定する、リクエストごとの障害（FAULT_NONE は障害を起こさない）
+FAULT_NONE = "none"
+FAULT_STALL = "stall"
+FAULT_RATE_LIMIT = "429"
+FAULT_SERVER_ERROR = "503"
+
+class FakeChatCompletionsServer:
+    def __init__(self, llm: FakeLLM, model_latency: dict[str, float], stall_rate: float, stall_seconds: float, server_error_rate: float, seed: int, faults: list[str]):
+        self._llm = llm
+        self._client = create_async_fake_llm_client(llm)
+        self._model_latency = model_latency
+        self._stall_rate = stall_rate
+        self._stall_seconds = stall_seconds
+        self._server_error_rate = server_error_rate
+        self._faults = random.Random(seed)
+        # 先頭のリクエストから順に使い、使い切った後は stall_rate・server_error_rate に従う
+        self._scripted_faults = deque(faults)
+        self._tokenizer = create_tokenizer()
+        # 受け付けた /v1/chat/completions の数（リトライ・ヘッジを含む）
+        self.requests = 0
+
+    def application(self) -> FastAPI:
+        application = FastAPI()
+        application.add_api_route("/v1/chat/completions", self.chat_completions, methods=["POST"])
+        application.add_api_route("/v1/models", self.models, methods=["GET"])
+        return application
+
+    async def models(self, request: Request) -> Response:
+        """モデルの一覧（接続の事前確立の確認用）。--model-latency で指定したモデルを返す。"""
+        return JSONResponse({"object": "list", "data": [{"id": model, "object": "model", "created": 0, "owned_by": "fake"} for model in self._model_latency]})
+
+    async def chat_completions(self, request: Request) -> Response:
+        body = await request.json()
+        self.requests += 1
+        fault = self._scripted_faults.popleft() if self._scripted_faults else None
+        if fault == FAULT_STALL or (fault is None and self._stall_rate > 0 and self._faults.random() < self._stall_rate):
+            # 応答ヘッダーを返さずに止まる上流（クライアントが接続を閉じるまで）
+            await asyncio.sleep(self._stall_seconds)
+        if fault == FAULT_SERVER_ERROR or (fault is None and self._server_error_rate > 0 and self._faults.random() < self._server_error_rate):
+            return JSONResponse({"error": {"message": "Fake server error", "type": "server_error", "code": None}}, status_code=503)
+        if fault == FAULT_RATE_LIMIT:
+            return _error(FakeLLMError("Fake rate limit exceeded"))
+        model = body.get("model", "fake")
+        messages = [ChatMessage(message["role"], message.get("content") or "") for message in body["messages"] if message["role"] != "system"]
+        # 最後の user メッセージを質問、それより前を履歴として扱う
+        question = messages[-1].content if messages else ""
+        history = messages[:-1]
+        prompt_tokens = sum(self._tokenizer.count(message["content"] or "") for message in body["messages"])
+        client = self._client
+        max_tokens: Optional[int] = body.get("max_completion_tokens") or body.get("max_tokens")
+        truncated = max_tokens is not None and max_tokens < self._llm.answer_tokens
+        if truncated or model in self._model_latency:
+            answer_tokens = min(max_tokens or self._llm.answer_tokens, self._llm.answer_tokens)
+            client = create_async_fake_llm_client(self._llm.derive(self._model_latency.get(model, self._llm.latency_seconds), answer_tokens))
+        finish_reason = "length" if truncated else "stop"
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        if body.get("stream"):
+            include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+            stream = client.stream_response(question, "", history, "")
+            try:
+                # 最初のチャンクまで進めて、失敗する場合はステータスコードで返す
+                first = await anext(stream)
+            except FakeLLMError as e:
+                return _error(e)
+            return StreamingResponse(
+                self._events(stream, first, completion_id, created, model, prompt_tokens, include_usage, finish_reason),
+                media_type="text/event-stream",
+            )
+
+        try:
+            content = await client.generate_response(question, "", history, "")
+        except FakeLLMError as e:
+            return _error(e)
+        return JSONResponse({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": _usage(prompt_tokens, self._tokenizer.count(content)),
+        })
+
+    async def _events(self, stream: AsyncIterator[str], first: str, completion_id: str, created: int, model: str, prompt_tokens: int, include_usage: bool, finish_reason: str) -> AsyncIterator[str]:
+        def chunk(delta: dict[str, Any], finish_reason: Any = None) -> str:
+            return _event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        completion = [first]
+        yield chunk({"role": "assistant", "content": first})
+        async for content in stream:
+            completion.append(content)
+            yield chunk({"content": content})
+        yield chunk({}, finish_reason)
+        if include_usage:
+            yield _event({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [],
+                "usage": _usage(prompt_tokens, self._tokenizer.count("".join(completion))),
+            })
+        yield "data: [DONE]\n\n"
+
+def _event(data: dict[str, Any]) -> str:
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict[str, int]:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+def _error(e: FakeLLMError) -> JSONResponse:
+    # OpenAI のレート制限と同じ形式で返す
+    return JSONResponse({"error": {"message": str(e), "type": "rate_limit_exceeded", "code": "rate_limit_exceeded"}}, status_code=429)
+
+def create_fake_chat_completions_server(llm: FakeLLM, model_latency: Optional[dict[str, float]] = None, stall_rate: float = 0, stall_seconds: float = 30, server_error_rate: float = 0, seed: int = 0, faults: Optional[list[str]] = None) -> FakeChatCompletionsServer:
+    return FakeChatCompletionsServer(llm, model_latency or {}, stall_rate, stall_seconds, server_error_rate, seed, faults or [])
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.5, help="最初のトークンまでの時間（秒）")
+    parser.add_argument("--tps", type=float, default=50, help="1 秒あたりの生成トークン数（0 の場合は一度に返す）")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stall-rate", type=float, default=0, help="応答ヘッダーを返さずに止まるリクエストの割合")
+    parser.add_argument("--stall-seconds", type=float, default=30, help="止まる時間（秒）")
+    parser.add_argument("--server-error-rate", type=float, default=0, help="503 を返すリクエストの割合")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS", help="モデルごとの最初のトークンまでの時間（複数指定可）")
+    args = parser.parse_args()
+    model_latency = {}
+    for item in args.model_latency:
+        model, _, seconds = item.partition("=")
+        model_latency[model] = float(seconds)
+
+    llm = create_fake_llm(args.latency, args.tps, args.answer_tokens, args.error_rate, args.seed)
+    uvicorn.run(create_fake_chat_completions_server(llm, model_latency, args.stall_rate, args.stall_seconds, args.server_error_rate, args.seed).application(), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
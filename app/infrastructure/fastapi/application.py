@@ -1,17 +1,104 @@
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
 
+from fastapi import Depends, FastAPI
+
+from app.domain.chat.repository.chat import ChatRepository
+from app.infrastructure.config import Config
 from app.infrastructure.fastapi.handler.stream.chat_stream import ChatStreamHandler
 from app.infrastructure.fastapi.handler.ui.ui import UIHandler
+from app.infrastructure.fastapi.handler.metrics.metrics import MetricsHandler
+from app.infrastructure.fastapi.handler.internal.chats import InternalChatHandler
+from app.infrastructure.fastapi.handler.chat.query import ChatQueryHandler
+from app.infrastructure.fastapi.handler.chat.archive import ChatArchiveHandler
+from app.infrastructure.fastapi.handler.chat.usage import ChatUsageHandler
+from app.infrastructure.fastapi.handler.health.health import HealthHandler
+from app.infrastructure.fastapi.lifecycle import ApplicationLifecycle, create_application_lifecycle
+from app.infrastructure.fastapi.handler.stream.chat_stream import create_chat_stream_handler
+from app.infrastructure.fastapi.handler.stream.connections import StreamConnectionSettings, create_connection_manager
+from app.infrastructure.fastapi.handler.ui.ui import create_ui_handler
+from app.infrastructure.fastapi.handler.metrics.metrics import create_metrics_handler
+from app.infrastructure.fastapi.handler.internal.chats import create_internal_chat_handler
+from app.infrastructure.fastapi.handler.chat.query import create_chat_query_handler
+from app.infrastructure.fastapi.handler.chat.archive import create_chat_archive_handler
+from app.infrastructure.fastapi.handler.chat.usage import create_chat_usage_handler
+from app.infrastructure.fastapi.handler.health.health import create_health_handler
+from app.usecase.stream.chat_session import create_async_chat_session_usecase
+from app.usecase.stream.session_cache import ChatSessionCache, create_chat_session_cache
+from app.usecase.stream.context import create_chat_context_builder
+from app.usecase.stream.summary import create_chat_summarizer
+from app.usecase.chat.query import create_list_chats_usecase, create_search_chats_usecase
+from app.usecase.ports.output.llm.client import AsyncLLMClient, LLM_TASK_TITLE, LLM_TASK_STEP, LLM_TASK_SUMMARY
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+from app.infrastructure.memory.repository.chat import create_chat_repository
+from app.infrastructure.file.repository.chat import create_file_chat_repository
+from app.infrastructure.openai.client import create_async_openai_client
+from app.infrastructure.fake.client import create_async_fake_llm_client, create_fake_llm
+from app.infrastructure.openai.tokenizer import create_tokenizer
+from app.infrastructure.openai.transport import LLMHTTPSettings, create_llm_http_client
+from app.infrastructure.openai.routing import LLMTaskPolicy, LLMTokenLedger, create_llm_router, create_llm_token_ledger
+from app.infrastructure.cache.client import CachedLLMClient, create_cached_llm_client
+from app.infrastructure.scheduler.llm import LLMScheduler, chat_llm_request_scope, create_llm_scheduler, create_scheduled_llm_client
+from app.infrastructure.metrics.prometheus import PrometheusMetrics, create_prometheus_metrics
+from app.infrastructure.metrics.llm import create_instrumented_llm_client
+from app.infrastructure.metrics.repository import create_instrumented_chat_repository
+from app.infrastructure.cluster.peer import create_peer_chat_fetcher
+from app.infrastructure.index.chat import IndexedChatRepository, create_indexed_chat_repository
 
 class FastAPIApplication:
-    def __init__(self, stream_handler: ChatStreamHandler, ui_handler: UIHandler):
-        self.app = FastAPI()
+    def __init__(
+        self,
+        stream_handler: ChatStreamHandler,
+        ui_handler: UIHandler,
+        metrics_handler: Optional[MetricsHandler] = None,
+        internal_handler: Optional[InternalChatHandler] = None,
+        query_handler: Optional[ChatQueryHandler] = None,
+        archive_handler: Optional[ChatArchiveHandler] = None,
+        usage_handler: Optional[ChatUsageHandler] = None,
+        health_handler: Optional[HealthHandler] = None,
+        lifecycle: Optional[ApplicationLifecycle] = None,
+    ):
+        # 起動後の準備と終了時の後始末は lifespan で行う
+        self.app = FastAPI(lifespan=lifecycle.lifespan if lifecycle is not None else None)
         self.stream_handler = stream_handler
         self.ui_handler = ui_handler
+        self.metrics_handler = metrics_handler
+        self.internal_handler = internal_handler
+        self.query_handler = query_handler
+        self.archive_handler = archive_handler
+        self.usage_handler = usage_handler
+        self.health_handler = health_handler
 
         # ルーティングを登録
         self.app.add_websocket_route("/chat/stream", self.stream_handler.handle)
         self.app.add_api_route("/", self.ui_handler.handle, methods=["GET"], name="ui")
+        self.app.add_api_route("/static/{name}", self.ui_handler.asset, methods=["GET"], name="ui_asset")
+        if self.health_handler is not None:
+            self.app.add_api_route("/healthz", self.health_handler.healthz, methods=["GET"], name="healthz")
+            self.app.add_api_route("/readyz", self.health_handler.readyz, methods=["GET"], name="readyz")
+        # 計測が無効な場合は登録しない
+        if self.metrics_handler is not None:
+            self.app.add_api_route("/metrics", self.metrics_handler.handle, methods=["GET"], name="metrics")
+        # 索引が無効な場合は登録しない
+        if self.query_handler is not None:
+            self.app.add_api_route("/chats", self.query_handler.list_chats, methods=["GET"], name="list_chats")
+            self.app.add_api_route("/chats/search", self.query_handler.search_chats, methods=["GET"], name="search_chats")
+        # 一括書き出し・取り込みが無効な場合は登録しない
+        if self.archive_handler is not None:
+            self.app.add_api_route("/chats/export", self.archive_handler.export, methods=["GET"], name="export_chats")
+            self.app.add_api_route("/chats/import", self.archive_handler.import_chats, methods=["POST"], name="import_chats")
+        # LLM の使用量を記録していない（擬似 LLM の）場合は登録しない
+        if self.usage_handler is not None:
+            self.app.add_api_route("/chats/usage", self.usage_handler.usage, methods=["GET"], name="chat_usage")
+        # serve.py のワーカーとして起動した場合のみ、ワーカー間の API を登録する
+        if self.internal_handler is not None:
+            internal = [Depends(self.internal_handler.authorize)]
+            self.app.add_api_route("/internal/chats/{chat_id}/handoff", self.internal_handler.handoff, methods=["POST"], name="internal_handoff", dependencies=internal)
+            self.app.add_api_route("/internal/chats/release", self.internal_handler.release, methods=["POST"], name="internal_release", dependencies=internal)
+            self.app.add_api_route("/internal/chats/replace", self.internal_handler.replace, methods=["POST"], name="internal_replace", dependencies=internal)
+            self.app.add_api_route("/internal/chats", self.internal_handler.export, methods=["GET"], name="internal_export", dependencies=internal)
+            self.app.add_api_route("/internal/chats", self.internal_handler.import_chats, methods=["POST"], name="internal_import", dependencies=internal)
 
     def application(self) -> FastAPI:
         """アプリケーションを起動する。
@@ -22,5 +109,209 @@ class FastAPIApplication:
 
         return self.app
     
-def create_fastapi_application(stream_handler: ChatStreamHandler, ui_handler: UIHandler) -> FastAPIApplication:
-    return FastAPIApplication(stream_handler, ui_handler)
\ No newline at end of file
+def create_fastapi_application(
+    stream_handler: ChatStreamHandler,
+    ui_handler: UIHandler,
+    metrics_handler: Optional[MetricsHandler] = None,
+    internal_handler: Optional[InternalChatHandler] = None,
+    query_handler: Optional[ChatQueryHandler] = None,
+    archive_handler: Optional[ChatArchiveHandler] = None,
+    usage_handler: Optional[ChatUsageHandler] = None,
+    health_handler: Optional[HealthHandler] = None,
+    lifecycle: Optional[ApplicationLifecycle] = None,
+) -> FastAPIApplication:
+    return FastAPIApplication(stream_handler, ui_handler, metrics_handler, internal_handler, query_handler, archive_handler, usage_handler, health_handler, lifecycle)
+
+def create_application(config: Config, started_at: float) -> FastAPIApplication:
+    """設定から各コンポーネントを組み立て、アプリケーションを作る。started_at は起動時間の計測の起点。"""
+    prometheus_metrics = create_prometheus_metrics() if config.metrics_enabled else None
+    metrics: Metrics = prometheus_metrics or NULL_METRICS
+    lifecycle = create_application_lifecycle(started_at, config.drain_timeout_seconds, metrics)
+    tokenizer = create_tokenizer()
+    # エンコーディングの読み込みは重いため、起動後に別スレッドで済ませておく
+    lifecycle.on_warmup("tokenizer", lambda: asyncio.to_thread(tokenizer.load))
+    llm_scheduler = create_llm_scheduler(
+        max_concurrency=config.llm_max_concurrency,
+        tokens_per_minute=config.llm_tokens_per_minute,
+        max_queue=config.llm_max_queue,
+        max_queue_per_connection=config.llm_max_queue_per_connection,
+        max_wait_seconds=config.llm_max_queue_wait_seconds,
+        metrics=metrics,
+    )
+    # チャットごとの LLM の使用量は OpenAI API の応答から記録する（擬似 LLM の場合は記録しない）
+    token_ledger = create_llm_token_ledger(config.llm_token_ledger_max_chats) if config.llm_backend != "fake" else None
+    llm_client, llm_cache = _create_llm_client(config, lifecycle, tokenizer, llm_scheduler, token_ledger, prometheus_metrics, metrics)
+    chat_repository, chat_index = _create_chat_repository(config, lifecycle, prometheus_metrics, metrics)
+    session_cache = create_chat_session_cache(config.chat_session_cache_size)
+    context_builder = create_chat_context_builder(tokenizer, config.context_max_tokens, config.chat_session_cache_size)
+    chat_summarizer = create_chat_summarizer(
+        llm_client,
+        chat_repository,
+        keep_recent_steps=config.chat_summary_keep_recent_steps,
+        batch_steps=config.chat_summary_batch_steps,
+        workers=config.chat_summary_workers,
+        max_queue=config.chat_summary_max_queue,
+        metrics=metrics,
+        llm_scope=chat_llm_request_scope,
+    )
+    lifecycle.on_shutdown("summarizer", chat_summarizer.aclose)
+    chat_session_usecase = create_async_chat_session_usecase(llm_client, chat_repository, session_cache, context_builder, metrics, chat_summarizer)
+
+    def release_chat(chat_id: str):
+        """他のワーカーへ移した・取り込みで置き換えたチャットを、キャッシュから取り除く。"""
+        session_cache.discard(chat_id)
+        context_builder.discard(chat_id)
+
+    # serve.py から起動された場合は、担当の変わったチャットを他のワーカーとやり取りする
+    chat_fetcher = None
+    if config.cluster_socket_dir:
+        chat_fetcher = create_peer_chat_fetcher(chat_repository, config.cluster_socket_dir, config.cluster_worker_socket, config.cluster_secret)
+    connection_manager = create_connection_manager(StreamConnectionSettings(
+        max_connections=config.chat_stream_max_connections,
+        heartbeat_seconds=config.chat_stream_heartbeat_seconds,
+        heartbeat_timeout_seconds=config.chat_stream_heartbeat_timeout_seconds,
+        idle_seconds=config.chat_stream_idle_seconds,
+        max_turns_per_connection=config.chat_stream_max_turns_per_connection,
+        max_message_bytes=config.chat_stream_max_message_bytes,
+    ), metrics)
+    # 停止の前に、実行中のターンを終えてから接続を閉じる
+    lifecycle.on_drain("websocket", connection_manager.drain)
+    lifecycle.on_shutdown("websocket", connection_manager.aclose)
+    stream_handler = create_chat_stream_handler(chat_session_usecase, metrics, chat_fetcher, config.chat_turn_timeout_seconds, config.chat_stream_resume_seconds, config.chat_stream_resume_buffer_frames, config.chat_stream_resume_buffer_bytes, connection_manager, config.chat_stream_resume_buffer_total_bytes)
+    internal_handler = None
+    if config.cluster_socket_dir:
+        internal_handler = create_internal_chat_handler(chat_repository, release_chat, stream_handler.close_chat, config.cluster_secret)
+    ui_handler = create_ui_handler()
+    query_handler = None
+    if chat_index is not None:
+        query_handler = create_chat_query_handler(create_list_chats_usecase(chat_index), create_search_chats_usecase(chat_index))
+    archive_handler = None
+    if config.chat_archive_enabled and not config.cluster_socket_dir:
+        archive_handler = create_chat_archive_handler(chat_repository, release_chat)
+    usage_handler = create_chat_usage_handler(token_ledger) if token_ledger is not None else None
+
+    metrics_handler = None
+    if prometheus_metrics is not None:
+        _register_collectors(prometheus_metrics, llm_scheduler, llm_cache, session_cache)
+        metrics_handler = create_metrics_handler(prometheus_metrics)
+    health_handler = create_health_handler(lifecycle)
+    return create_fastapi_application(stream_handler, ui_handler, metrics_handler, internal_handler, query_handler, archive_handler, usage_handler, health_handler, lifecycle)
+
+def _create_llm_client(config: Config, lifecycle: ApplicationLifecycle, tokenizer: Tokenizer, llm_scheduler: LLMScheduler, token_ledger: Optional[LLMTokenLedger], prometheus_metrics: Optional[PrometheusMetrics], metrics: Metrics) -> tuple[AsyncLLMClient, Optional[CachedLLMClient]]:
+    """LLM クライアントを組み立てる。応答のキャッシュが有効な場合は、キャッシュもあわせて返す。"""
+    llm_policies = {
+        LLM_TASK_TITLE: LLMTaskPolicy(
+            config.llm_title_model,
+            config.llm_title_max_tokens if config.llm_title_max_tokens > 0 else None,
+            config.llm_title_temperature if config.llm_title_temperature >= 0 else None,
+        ),
+        LLM_TASK_STEP: LLMTaskPolicy(
+            config.llm_step_model,
+            config.llm_step_max_tokens if config.llm_step_max_tokens > 0 else None,
+            config.llm_step_temperature if config.llm_step_temperature >= 0 else None,
+        ),
+        LLM_TASK_SUMMARY: LLMTaskPolicy(
+            config.llm_summary_model,
+            config.llm_summary_max_tokens if config.llm_summary_max_tokens > 0 else None,
+            config.llm_summary_temperature if config.llm_summary_temperature >= 0 else None,
+        ),
+    }
+    llm_client: AsyncLLMClient
+    if config.llm_backend == "fake":
+        llm_client = create_async_fake_llm_client(create_fake_llm(
+            latency_seconds=config.fake_llm_latency_seconds,
+            tokens_per_second=config.fake_llm_tokens_per_second,
+            answer_tokens=config.fake_llm_answer_tokens,
+            error_rate=config.fake_llm_error_rate,
+        ), {task: policy.max_tokens or 0 for task, policy in llm_policies.items()})
+    else:
+        llm_router = create_llm_router(
+            llm_policies,
+            fallback_model=config.llm_fallback_model,
+            latency_threshold_seconds=config.llm_fallback_latency_seconds,
+            cooldown_seconds=config.llm_fallback_cooldown_seconds,
+            chat_token_budget=config.llm_chat_token_budget,
+            ledger=token_ledger,
+            metrics=metrics,
+        )
+        llm_http_client = create_llm_http_client(LLMHTTPSettings(
+            max_connections=config.llm_http_max_connections,
+            max_keepalive_connections=config.llm_http_max_keepalive_connections,
+            keepalive_seconds=config.llm_http_keepalive_seconds,
+            http2=config.llm_http2,
+            connect_timeout_seconds=config.llm_http_connect_timeout_seconds,
+            read_timeout_seconds=config.llm_http_read_timeout_seconds,
+            write_timeout_seconds=config.llm_http_write_timeout_seconds,
+            pool_timeout_seconds=config.llm_http_pool_timeout_seconds,
+            max_retries=config.llm_http_max_retries,
+            retry_backoff_seconds=config.llm_http_retry_backoff_seconds,
+            retry_backoff_max_seconds=config.llm_http_retry_backoff_max_seconds,
+            retry_budget_ratio=config.llm_http_retry_budget_ratio,
+            retry_budget_min_per_second=config.llm_http_retry_budget_min_per_second,
+            hedge=config.llm_http_hedge_enabled,
+            hedge_quantile=config.llm_http_hedge_quantile,
+            hedge_min_delay_seconds=config.llm_http_hedge_min_delay_seconds,
+        ), metrics)
+        openai_client = create_async_openai_client(llm_router, llm_http_client, config.openai_api_key, config.openai_base_url or None, metrics)
+        if config.llm_prewarm_connections > 0:
+            lifecycle.on_warmup("openai", lambda: openai_client.prewarm(config.llm_prewarm_connections))
+        lifecycle.on_shutdown("openai", openai_client.aclose)
+        llm_client = openai_client
+    if prometheus_metrics is not None:
+        llm_client = create_instrumented_llm_client(llm_client, prometheus_metrics, tokenizer)
+    # キャッシュにヒットしたリクエストは流量制御の対象にしない
+    llm_client = create_scheduled_llm_client(llm_client, llm_scheduler, tokenizer, config.llm_completion_token_estimate)
+    llm_cache = None
+    if config.llm_cache_enabled:
+        llm_client = llm_cache = create_cached_llm_client(llm_client, config.llm_cache_max_entries, config.llm_cache_ttl_seconds)
+    return llm_client, llm_cache
+
+def _create_chat_repository(config: Config, lifecycle: ApplicationLifecycle, prometheus_metrics: Optional[PrometheusMetrics], metrics: Metrics) -> tuple[ChatRepository, Optional[IndexedChatRepository]]:
+    """チャットのリポジトリを組み立てる。索引が有効な場合は、索引もあわせて返す。"""
+    chat_repository: ChatRepository
+    if config.chat_repository == "file":
+        chat_repository = file_repository = create_file_chat_repository(
+            config.chat_repository_path,
+            snapshot_interval=config.chat_repository_snapshot_interval,
+            fsync=config.chat_repository_fsync,
+            max_loaded_chats=config.chat_repository_max_loaded_chats,
+        )
+        # 終了時にジャーナルを詰めて閉じる（次の起動で読み直す量を減らす）
+        lifecycle.on_shutdown("chat_repository", lambda: asyncio.to_thread(file_repository.close))
+    else:
+        chat_repository = create_chat_repository(
+            max_chats=config.chat_repository_max_chats,
+            max_bytes=config.chat_repository_max_bytes,
+            ttl_seconds=config.chat_repository_ttl_seconds,
+        )
+    chat_index = None
+    if config.chat_index_enabled and not config.cluster_socket_dir:
+        index = create_indexed_chat_repository(chat_repository, metrics)
+        # 保存済みのチャットの索引は、待ち受けを始めた後に別スレッドで作る（作り終えるまで ready にしない）
+        lifecycle.on_warmup("chat_index", lambda: asyncio.to_thread(index.build))
+        chat_repository = chat_index = index
+    if prometheus_metrics is not None:
+        chat_repository = create_instrumented_chat_repository(chat_repository, prometheus_metrics)
+    return chat_repository, chat_index
+
+def _register_collectors(prometheus_metrics: PrometheusMetrics, llm_scheduler: LLMScheduler, llm_cache: Optional[CachedLLMClient], session_cache: ChatSessionCache):
+    """他のコンポーネントが保持している状態を、/metrics の出力時にゲージへ反映する。"""
+    scheduler_active = prometheus_metrics.gauge("llm_scheduler_active", "LLM requests currently holding a scheduler slot.")
+    scheduler_queued = prometheus_metrics.gauge("llm_scheduler_queued", "LLM requests waiting for a scheduler slot.")
+    cache_events = prometheus_metrics.gauge("llm_cache_events", "LLM response cache lookups by result since startup.", ["result"])
+    cache_size = prometheus_metrics.gauge("llm_cache_entries", "Entries in the LLM response cache.")
+    sessions = prometheus_metrics.gauge("chat_session_cache_entries", "Chats held in the session cache.")
+
+    def collect():
+        scheduler_stats = llm_scheduler.stats()
+        scheduler_active.set(scheduler_stats.active)
+        scheduler_queued.set(scheduler_stats.queued)
+        if llm_cache is not None:
+            cache_stats = llm_cache.stats()
+            cache_events.labels("hit").set(cache_stats.hits)
+            cache_events.labels("miss").set(cache_stats.misses)
+            cache_events.labels("coalesced").set(cache_stats.coalesced)
+            cache_size.set(cache_stats.size)
+        sessions.set(len(session_cache))
+
+    prometheus_metrics.add_collector(collect)
@@ -0,0 +1,71 @@
+import asyncio
+from typing import Callable, Iterator
+
+from fastapi import HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from app.domain.chat.repository.chat import ChatRepository
+from app.domain.chat.entity.chat import Chat
+from app.infrastructure.serialization.archive import ChatArchiveError, create_chat_archive_decoder, encode_chat_archive
+
+# path: /chats/export  (GET)  全チャットを 1 行 1 チャットの NDJSON で返す
+# query:
+# format: str  ndjson（既定）/ gzip
+# output: {"id", "title", "created_at", "updated_at", "steps": [[id, question, answer, created_at]]} の行
+#
+# path: /chats/import  (POST)  /chats/export の出力（gzip 可）を取り込む。同じ ID のチャットは置き換える
+# output: {"imported": int}
+# 400: {"detail": {"error": str, "line": int, "imported": int}}（imported 件はエラーの前に取り込み済み）
+
+class ChatArchiveHandler:
+    """チャットの一括書き出し・取り込み。どちらも全件をメモリに載せず、少しずつ処理する。"""
+
+    def __init__(self, chat_repository: ChatRepository, on_import: Callable[[str], None]):
+        self.chat_repository = chat_repository
+        # 取り込んだチャットを、セッションキャッシュなどに残っている古い内容から取り除くために呼ぶ
+        self.on_import = on_import
+
+    async def export(self, format: str = "ndjson"):
+        if format not in ("ndjson", "gzip"):
+            raise HTTPException(status_code=400, detail="format must be ndjson or gzip")
+        compress = format == "gzip"
+        filename = "chats.ndjson.gz" if compress else "chats.ndjson"
+        # 同期のイテレーターはスレッドプールで回されるため、書き出し中もイベントループを止めない
+        return StreamingResponse(
+            encode_chat_archive(self.chat_repository.iter_all(), compress),
+            media_type="application/gzip" if compress else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+    async def import_chats(self, request: Request):
+        decoder = create_chat_archive_decoder()
+        imported = 0
+        # 保存済みで、キャッシュからまだ取り除いていないチャットの ID
+        saved: list[str] = []
+        try:
+            async for chunk in request.stream():
+                # JSON の解析・検証と保存はスレッドで行う
+                await asyncio.to_thread(self._save, decoder.feed(chunk), saved)
+                imported += self._release(saved)
+            await asyncio.to_thread(self._save, decoder.close(), saved)
+        except ChatArchiveError as e:
+            imported += self._release(saved)
+            raise HTTPException(status_code=400, detail={"error": str(e), "line": e.line, "imported": imported})
+        imported += self._release(saved)
+        return {"imported": imported}
+
+    def _save(self, batches: Iterator[list[Chat]], saved: list[str]):
+        for batch in batches:
+            self.chat_repository.create_many(batch)
+            saved.extend(chat.get_id().value() for chat in batch)
+
+    def _release(self, saved: list[str]) -> int:
+        # キャッシュはイベントループ側で操作する
+        for chat_id in saved:
+            self.on_import(chat_id)
+        count = len(saved)
+        saved.clear()
+        return count
+
+def create_chat_archive_handler(chat_repository: ChatRepository, on_import: Callable[[str], None]) -> ChatArchiveHandler:
+    return ChatArchiveHandler(chat_repository, on_import)
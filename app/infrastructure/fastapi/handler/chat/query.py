@@ -0,0 +1,65 @@
+from typing import Any, Optional
+
+from fastapi import HTTPException
+
+from app.usecase.ports.input.chat.query import ListChatsInputPort, SearchChatsInputPort, ListChatsInput, SearchChatsInput
+from app.usecase.ports.output.chat.index import ChatIndexNotReadyError, ChatSummary, InvalidCursorError, InvalidQueryError
+
+# path: /chats  (GET)  チャットを更新日時の新しい順に返す
+# query:
+# limit: int  1 ページの件数（既定 20、最大 100）
+# cursor: str  前のページの next_cursor
+# output: {"items": [{"id", "title", "updated_at", "step_count"}], "next_cursor": str | null}
+#
+# path: /chats/search  (GET)  タイトル・質問・回答に、空白で区切った語をすべて含むチャットを新しい順に返す
+# （文字・数字を含まない検索語は 400）
+# query:
+# q: str
+# limit: int
+# cursor: str
+# output: {"hits": [{"chat": {...}, "field": "title" | "question" | "answer", "snippet": str, "step_id": str | null}], "next_cursor": str | null}
+#
+# 起動直後、保存済みのチャットの索引を作り終えるまでは、どちらも 503 を返す
+#
+# 索引の参照と本文の確認（リポジトリの読み込み）はイベントループを止めないよう、
+# 同期関数として FastAPI のスレッドプールで実行する
+
+class ChatQueryHandler:
+    def __init__(self, list_chats_usecase: ListChatsInputPort, search_chats_usecase: SearchChatsInputPort):
+        self.list_chats_usecase = list_chats_usecase
+        self.search_chats_usecase = search_chats_usecase
+
+    def list_chats(self, limit: int = 20, cursor: Optional[str] = None):
+        try:
+            page = self.list_chats_usecase.execute(ListChatsInput(limit, cursor))
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ChatIndexNotReadyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return {"items": [_summary(item) for item in page.items], "next_cursor": page.next_cursor}
+
+    def search_chats(self, q: str = "", limit: int = 20, cursor: Optional[str] = None):
+        try:
+            page = self.search_chats_usecase.execute(SearchChatsInput(q, limit, cursor))
+        except (InvalidCursorError, InvalidQueryError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except ChatIndexNotReadyError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return {
+            "hits": [
+                {"chat": _summary(hit.chat), "field": hit.field, "snippet": hit.snippet, "step_id": hit.step_id}
+                for hit in page.hits
+            ],
+            "next_cursor": page.next_cursor,
+        }
+
+def _summary(summary: ChatSummary) -> dict[str, Any]:
+    return {
+        "id": summary.id,
+        "title": summary.title,
+        "updated_at": summary.updated_at.isoformat(),
+        "step_count": summary.step_count,
+    }
+
+def create_chat_query_handler(list_chats_usecase: ListChatsInputPort, search_chats_usecase: SearchChatsInputPort) -> ChatQueryHandler:
+    return ChatQueryHandler(list_chats_usecase, search_chats_usecase)
@@ -0,0 +1,30 @@
+from fastapi.responses import JSONResponse
+
+from app.infrastructure.openai.routing import LLMTokenLedger
+
+# path: /chats/usage  (GET)  チャットの LLM のトークン使用量を、処理（title / step / summary）ごとに返す
+# query:
+# chat_id: str
+# output: {"chat_id": str, "total_tokens": int, "tasks": {task: {"requests", "prompt_tokens", "completion_tokens", "cached_prompt_tokens"}}}
+#
+# 使用量はワーカーのメモリ上にあり、最近使われた LLM_TOKEN_LEDGER_MAX_CHATS 件のチャットだけを保持する
+# （記録の無いチャットは tasks が空）。serve.py のルーターが担当のワーカーへ中継できるよう、chat_id はクエリで受け取る
+
+class ChatUsageHandler:
+    def __init__(self, ledger: LLMTokenLedger):
+        self.ledger = ledger
+
+    async def usage(self, chat_id: str):
+        tasks = {
+            task: {
+                "requests": usage.requests,
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "cached_prompt_tokens": usage.cached_prompt_tokens,
+            }
+            for task, usage in self.ledger.usage(chat_id).items()
+        }
+        return JSONResponse({"chat_id": chat_id, "total_tokens": self.ledger.total_tokens(chat_id), "tasks": tasks})
+
+def create_chat_usage_handler(ledger: LLMTokenLedger) -> ChatUsageHandler:
+    return ChatUsageHandler(ledger)
@@ -0,0 +1,20 @@
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from app.infrastructure.fastapi.lifecycle import ApplicationLifecycle
+
+class HealthHandler:
+    def __init__(self, lifecycle: ApplicationLifecycle):
+        self.lifecycle = lifecycle
+
+    async def healthz(self, request: Request):
+        """プロセスが応答できるか（liveness）。準備中・終了中でも 200 を返す。"""
+        return JSONResponse({"status": "ok"})
+
+    async def readyz(self, request: Request):
+        """リクエストを受け付けられるか（readiness）。ウォームアップが終わるまでと終了中は 503 を返す。"""
+        status_code = 200 if self.lifecycle.is_ready() else 503
+        return JSONResponse({"status": self.lifecycle.state}, status_code=status_code)
+
+def create_health_handler(lifecycle: ApplicationLifecycle) -> HealthHandler:
+    return HealthHandler(lifecycle)
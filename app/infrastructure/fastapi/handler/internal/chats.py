@@ -0,0 +1,120 @@
+import hmac
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable
+
+from fastapi import Header, HTTPException, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+from app.domain.chat.repository.chat import ChatRepository
+from app.domain.shared.value_object.id import create_id
+from app.infrastructure.cluster.peer import CLUSTER_SECRET_HEADER, chat_version, release_record
+from app.infrastructure.serialization.archive import encode_chat_archive
+from app.infrastructure.serialization.chat import decode_chat, encode_chat
+
+# path: /internal/chats/{chat_id}/handoff  (POST)  他のワーカーへ移すチャットを返す（削除は release で行う）
+# path: /internal/chats/release  (POST)  移し終えたチャットを NDJSON で受け取り、接続を閉じてから、渡した後に更新されていなければ削除する
+#   output: {"released": int, "kept": [チャット]}  kept は渡した後に更新されていたため残したチャット（移動先へ replace で送り直す）
+# path: /internal/chats  (GET)  全チャットを NDJSON で返す
+# path: /internal/chats  (POST)  NDJSON で受け取ったチャットのうち、手元に無いものを取り込む
+# path: /internal/chats/replace  (POST)  NDJSON（{"chat": チャット, "version": 移したときの版}）で受け取ったチャットで、
+#   手元のチャットが移したときのまま（または無い）ものを置き換える
+#   output: {"replaced": [release に送る辞書]}
+# serve.py のワーカー間（Unix ソケット）でのみ使う。ワーカーのソケットにはルーターが外部からの接続を中継するため、
+# X-Cluster-Secret ヘッダーが serve.py の生成した共有の秘密と一致しないリクエストは 404 にする
+
+logger = logging.getLogger(__name__)
+
+class InternalChatHandler:
+    """ワーカー間でチャットを移すための内部 API。"""
+
+    def __init__(self, chat_repository: ChatRepository, on_release: Callable[[str], None], close_chat: Callable[[str], Awaitable[None]], secret: str):
+        self.chat_repository = chat_repository
+        # このワーカーがチャットを手放したときに、キャッシュなどから取り除くために呼ぶ
+        self.on_release = on_release
+        # チャットを手放す前に、そのチャットの接続を閉じて実行中のターンを止めるために呼ぶ
+        self.close_chat = close_chat
+        self._secret = secret.encode("utf-8")
+
+    def authorize(self, x_cluster_secret: str = Header(default="", alias=CLUSTER_SECRET_HEADER)):
+        """ルートの依存関係として、共有の秘密を確かめる（秘密が未設定の場合はすべて拒否する）。"""
+        if not self._secret or not hmac.compare_digest(x_cluster_secret.encode("utf-8"), self._secret):
+            raise HTTPException(status_code=404)
+
+    async def handoff(self, chat_id: str):
+        try:
+            id = create_id(chat_id)
+        except ValueError:
+            return Response(status_code=404)
+        chat = self.chat_repository.peek(id)
+        if chat is None:
+            return Response(status_code=404)
+        return JSONResponse(encode_chat(chat))
+
+    async def release(self, request: Request):
+        released = 0
+        kept = []
+        async for line in _lines(request):
+            record = json.loads(line)
+            id = create_id(record["id"])
+            # 以降はこのワーカーで更新されないよう、先に接続を閉じる（クライアントは担当のワーカーへ再接続する）
+            await self.close_chat(record["id"])
+            chat = self.chat_repository.peek(id)
+            if chat is None:
+                continue
+            # 渡した後に更新された（移動の前に始まっていたターンなど）チャットは残し、最新の内容を返して送り直してもらう
+            if chat_version(chat) != record["version"]:
+                logger.info("Kept chat %s: updated after it was handed off", record["id"])
+                kept.append(encode_chat(chat))
+                continue
+            self.chat_repository.delete(id)
+            self.on_release(record["id"])
+            released += 1
+        return JSONResponse({"released": released, "kept": kept})
+
+    async def export(self, request: Request):
+        return StreamingResponse(encode_chat_archive(self.chat_repository.iter_all()), media_type="application/x-ndjson")
+
+    async def import_chats(self, request: Request):
+        # 手元にあるチャットは、移し終える前に参照されて先に移してきたもの（移動元と同じか新しい）のため上書きしない
+        imported = 0
+        async for line in _lines(request):
+            chat = decode_chat(json.loads(line))
+            if self.chat_repository.exists(chat.get_id()):
+                continue
+            self.chat_repository.create(chat)
+            self.on_release(chat.get_id().value())
+            imported += 1
+        return JSONResponse({"imported": imported})
+
+    async def replace(self, request: Request):
+        replaced = []
+        async for line in _lines(request):
+            entry = json.loads(line)
+            chat = decode_chat(entry["chat"])
+            current = self.chat_repository.peek(chat.get_id())
+            if current is None:
+                self.chat_repository.create(chat)
+            elif chat_version(current) == entry["version"]:
+                self.chat_repository.update(chat)
+            else:
+                # 移してきた後に、移動元とこのワーカーの両方で更新された。どちらの更新も失わないよう、移動元にも残す
+                logger.warning("Chat %s was updated on both workers while it was moved; keeping the copy on the previous worker", entry["chat"]["id"])
+                continue
+            self.on_release(chat.get_id().value())
+            replaced.append(release_record(entry["chat"]))
+        return JSONResponse({"replaced": replaced})
+
+async def _lines(request: Request) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line.decode("utf-8")
+    if buffer.strip():
+        yield buffer.decode("utf-8")
+
+def create_internal_chat_handler(chat_repository: ChatRepository, on_release: Callable[[str], None], close_chat: Callable[[str], Awaitable[None]], secret: str) -> InternalChatHandler:
+    return InternalChatHandler(chat_repository, on_release, close_chat, secret)
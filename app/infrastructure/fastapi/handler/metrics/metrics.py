@@ -0,0 +1,15 @@
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.infrastructure.metrics.prometheus import CONTENT_TYPE, PrometheusMetrics
+
+class MetricsHandler:
+    def __init__(self, metrics: PrometheusMetrics):
+        self.metrics = metrics
+
+    async def handle(self, request: Request):
+        """計測値を Prometheus のテキスト形式で返す。"""
+        return Response(content=self.metrics.render(), media_type=CONTENT_TYPE)
+
+def create_metrics_handler(metrics: PrometheusMetrics) -> MetricsHandler:
+    return MetricsHandler(metrics)
@@ -1,13 +1,139 @@
-from fastapi import WebSocket
-from app.usecase.ports.input.stream.chat_session import ChatSessionInputPort, ChatSessionInput, StepInput
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import aclosing
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+from app.usecase.ports.input.stream.chat_session import AsyncChatSessionInputPort, ChatSessionInput, ChatSessionDelta, ChatSessionTitle, ChatSessionOutput
+from app.usecase.ports.output.llm.client import LLMBusyError
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+from app.infrastructure.scheduler.llm import LLMRequestScope, set_llm_request_scope, reset_llm_request_scope
+from app.infrastructure.cluster.peer import PeerChatFetcher
+from app.infrastructure.fastapi.handler.stream.connections import CLOSE_GOING_AWAY, CLOSE_MESSAGE_TOO_BIG, CLOSE_TRY_AGAIN_LATER, ConnectionManager, StreamConnection, close_websocket, create_connection_manager
 
 # path: /chat/stream
+# query:
+# chat_id: str  省略可。メッセージで chat_id を省略した場合に使う（serve.py のルーターはこの値で振り分ける）
+# last_seq: int  v2 で再接続する場合に、受信済みの最後の seq を指定する
 # params:
 # json:
-# chat_id: str
+# chat_id: str  省略した場合はサーバーで採番する（end フレームで返す）
 # current_question: str
-# output:
-# answer: str
+# output (json frames):
+# {"type": "start"}
+# {"type": "queued", "position": int}  LLM の順番待ちの間、待ち順が変わるたびに送る
+# {"type": "delta", "content": str}  回答の差分（複数回）
+# {"type": "end", "chat_id": str, "step_id": str, "title": str}
+# {"type": "title", "title": str}  新規チャットのタイトル確定時（end の後になることもある）
+# {"type": "error", "code": "busy", "message": str}  混雑のため受け付けられなかった（end は送らない）
+# {"type": "error", "code": "timeout", "message": str}  回答が制限時間内に完了しなかった（ステップは保存しない）
+# {"type": "error", "code": "cancelled", "message": str}  回答中に次の質問が届いたため中断した（ステップは保存しない）
+# {"type": "error", "code": "closing", "message": str}  接続を閉じ始めている（停止・ターン数の上限）ため受け付けなかった。再接続して送り直す
+# {"type": "error", "code": "invalid", "message": str}  メッセージを読めない（JSON でない・current_question が無いなど）ため受け付けなかった（接続は閉じない）
+# {"type": "error", "code": "internal", "message": str}  その他のエラー
+# 回答中に次の質問を送ると、回答中の質問は中断して次の質問に答える。切断した場合も生成を中断する
+# サーバーは以下のコードで接続を閉じることがある（ConnectionManager）
+# 1001 停止するため・チャットの担当のワーカーが変わったため（再接続する） / 1009 メッセージが大きすぎる / 1013 接続数の上限・停止中（待ってから再接続する）
+# 4001 アイドル（次の質問を送るときに再接続する） / 4002 ping に応答が無い / 4003 ターン数の上限（再接続して続ける）
+#
+# v2 プロトコル: 接続時にサブプロトコル（Sec-WebSocket-Protocol）で以下のいずれかを指定する
+# chat.v2.msgpack  フレームを msgpack のバイナリで送受信する（サーバーに msgpack がインストールされている場合のみ）
+# chat.v2.json  フレームを JSON のテキストで送受信する
+# - 接続直後に {"type": "hello", "chat_id": str, "seq": int, "resumed": bool} を送る（seq は送信済みの最後の番号）
+# - hello 以外の送信フレームに "seq": int（chat_id ごとの連番）を付ける
+# - 切断しても回答の生成は続け、一定時間、送信したフレームを保持する
+# - 同じ chat_id と last_seq で再接続すると、hello の後に last_seq より後のフレームを送り直し、そのまま続ける
+#   保持期間を過ぎた・保持している範囲より前が欠けている場合は、hello の後に
+#   {"type": "error", "code": "resume_failed", "message": str} を送り、新しい接続として扱う（生成中の回答は中断する）
+# - 同じ chat_id の v2 の接続は 1 つだけ。新しい接続が来た場合、古い接続は 4000 で閉じる
+# - 受信の無い間、サーバーは {"type": "ping"}（seq なし・再送しない）を送る。クライアントは {"type": "pong"} を返す
+# permessage-deflate による圧縮は、クライアントが要求すれば uvicorn（WebSocket の拡張）が有効にする
+
+logger = logging.getLogger(__name__)
+
+SUBPROTOCOL_MSGPACK = "chat.v2.msgpack"
+SUBPROTOCOL_JSON = "chat.v2.json"
+# 別の接続で再開された場合に、古い接続を閉じるコード
+CLOSE_SUPERSEDED = 4000
+
+class _InvalidMessage(Exception):
+    """受信したメッセージの形式が正しくない。"""
+
+class _Codec:
+    """v2 のフレームの符号化方式。"""
+
+    def __init__(self, subprotocol: str, binary: bool, encode: Callable[[dict[str, Any]], Any], decode: Callable[[Any], Any]):
+        self.subprotocol = subprotocol
+        self.binary = binary
+        self.encode = encode
+        self.decode = decode
+
+def _load_codecs() -> dict[str, _Codec]:
+    codecs = {
+        SUBPROTOCOL_JSON: _Codec(
+            SUBPROTOCOL_JSON,
+            False,
+            lambda frame: json.dumps(frame, ensure_ascii=False, separators=(",", ":")),
+            json.loads,
+        ),
+    }
+    try:
+        import msgpack  # type: ignore
+        codecs[SUBPROTOCOL_MSGPACK] = _Codec(SUBPROTOCOL_MSGPACK, True, msgpack.packb, msgpack.unpackb)
+    except ImportError:
+        # msgpack は任意の依存関係のため、インストールされていない場合は chat.v2.json だけに対応する
+        pass
+    return codecs
+
+class _StreamSession:
+    """1 つの chat_id の送信の状態と、実行中のターン。
+
+    v1 では接続と同時に破棄する。v2 では切断後も一定時間保持し、再接続した接続に引き継ぐ。
+    """
+
+    def __init__(self, chat_id: Optional[str], codec: Optional[_Codec], buffer_frames: int, buffer_bytes: int):
+        self.chat_id = chat_id
+        self.codec = codec
+        # LLM の流量制御で、接続ごとの待ち数の上限に使う（再接続しても同じ値を使う）
+        self.connection_id = str(uuid.uuid4())
+        self.websocket: Optional[WebSocket] = None
+        # タイトル生成などのバックグラウンドのタスクからも送信するため、送信を直列化する
+        self.send_lock = asyncio.Lock()
+        # 送信済みの最後の seq と、再送用に保持しているフレーム（seq, フレーム, 符号化後の大きさ）
+        self.seq = 0
+        self.frames: deque[tuple[int, dict[str, Any], int]] = deque()
+        self.frame_bytes = 0
+        self.buffer_frames = buffer_frames
+        self.buffer_bytes = buffer_bytes
+        # 回答の生成は別タスクで行い、その間も次のメッセージ（や切断）を受け取れるようにする
+        self.turn: Optional[asyncio.Task[None]] = None
+        # end を送ったターン（タイトルの確定を待っているだけのもの）は、次の質問が届いても中断しない
+        self.answered = asyncio.Event()
+        # タイトルの確定を待っているターン
+        self.finishing: set[asyncio.Task[None]] = set()
+        # 切断中のセッションを破棄するタスク
+        self.expiry: Optional[asyncio.Task[None]] = None
+        # このセッションでターンを実行した（v1 はクエリで指定された）chat_id
+        self.chat_ids: set[str] = set()
+
+    def remember(self, seq: int, frame: dict[str, Any], size: int):
+        self.frames.append((seq, frame, size))
+        self.frame_bytes += size
+        while self.frames and (len(self.frames) > self.buffer_frames or self.frame_bytes > self.buffer_bytes):
+            self.frame_bytes -= self.frames.popleft()[2]
+
+    def can_replay(self, last_seq: int) -> bool:
+        """last_seq より後のフレームをすべて保持しているかどうか。"""
+        first_seq = self.frames[0][0] if self.frames else self.seq + 1
+        return first_seq - 1 <= last_seq <= self.seq
+
+    def tasks(self) -> list[asyncio.Task[None]]:
+        return [task for task in [*self.finishing, self.turn] if task is not None and not task.done()]
 
 class ChatStreamHandler:
     """WebSocket ストリーム用ハンドラ。
@@ -16,44 +142,407 @@ class ChatStreamHandler:
     UseCase などの依存はコンストラクタで注入する。
     """
 
-    def __init__(self, chat_session_usecase: ChatSessionInputPort):
+    def __init__(self, chat_session_usecase: AsyncChatSessionInputPort, metrics: Metrics, chat_fetcher: Optional[PeerChatFetcher], turn_timeout_seconds: float, resume_seconds: float, resume_buffer_frames: int, resume_buffer_bytes: int, connections: ConnectionManager, resume_buffer_total_bytes: int):
         self.chat_session_usecase = chat_session_usecase
+        # 接続の一覧・上限・ハートビート・ドレイン
+        self.connections = connections
+        # 1 ターン（質問の受信から end まで）の制限時間（0 の場合は無制限）
+        self.turn_timeout_seconds = turn_timeout_seconds
+        # 複数ワーカーで起動した場合に、担当の変わったチャットを他のワーカーから移してくる
+        self.chat_fetcher = chat_fetcher
+        # v2 で切断後にセッションを保持する時間と、再送用に保持するフレームの上限（件数・符号化後のバイト数）
+        self.resume_seconds = resume_seconds
+        self.resume_buffer_frames = resume_buffer_frames
+        self.resume_buffer_bytes = resume_buffer_bytes
+        # 全セッションの再送用のフレームの合計の上限（0 の場合は無制限）。超えた場合は切断中のセッションを古い順に破棄する
+        self.resume_buffer_total_bytes = resume_buffer_total_bytes
+        self._codecs = _load_codecs()
+        # v2 のセッション（chat_id → セッション）と、そのうち切断中のもの（切断した順）
+        self._sessions: dict[str, _StreamSession] = {}
+        self._detached: OrderedDict[str, _StreamSession] = OrderedDict()
+        # chat_id → そのチャットを扱っているセッション（担当の移ったチャットの接続を閉じるために使う）
+        self._chat_sessions: dict[str, set[_StreamSession]] = {}
+        self._buffer_bytes = 0
+        self._buffer_gauge = metrics.gauge("websocket_resume_buffer_bytes", "Bytes of frames kept for resuming v2 streams.")
+        self._evictions = metrics.counter("websocket_sessions_evicted_total", "Detached v2 sessions dropped to stay within the total resume buffer.")
+        self._send_seconds = metrics.histogram("websocket_send_seconds", "Time to serialize and send one WebSocket frame.")
+        turns = metrics.counter("websocket_turns_total", "Chat turns handled over WebSocket by result.", ["result"])
+        self._turns_ok = turns.labels("ok")
+        self._turns_busy = turns.labels("busy")
+        self._turns_timeout = turns.labels("timeout")
+        self._turns_superseded = turns.labels("superseded")
+        self._turns_disconnected = turns.labels("disconnected")
+        self._turns_error = turns.labels("error")
+        resumes = metrics.counter("websocket_resumes_total", "Reconnections that asked to resume a v2 stream by result.", ["result"])
+        self._resumes_ok = resumes.labels("ok")
+        self._resumes_failed = resumes.labels("failed")
+        self._frames_replayed = metrics.counter("websocket_frames_replayed_total", "Frames sent again after a v2 stream was resumed.")
 
     async def handle(self, websocket: WebSocket):
-        await websocket.accept()
-        is_first = True
-        title = None
-        steps = []
-        created_at = None
-        updated_at = None
-
-        while True:
-            data = await websocket.receive_json()
-            chat_id = data["chat_id"]
-            current_question = data["current_question"]
-
-            input = ChatSessionInput(
-                chat_id=chat_id,
-                is_first=is_first,
-                title=title,
-                current_question=current_question,
-                steps=steps,
-                created_at=created_at,
-                updated_at=updated_at,
-            )
-
-            output = self.chat_session_usecase.execute(input)
-
-            await websocket.send_text(output.answer)
-
-            steps = [
-                StepInput(step.id, step.question, step.answer, step.created_at)
-                for step in output.steps
-            ]
-            is_first = False
-            title = output.title
-            created_at = output.created_at
-            updated_at = output.updated_at
-
-def create_chat_stream_handler(chat_session_usecase: ChatSessionInputPort) -> ChatStreamHandler:
-    return ChatStreamHandler(chat_session_usecase)
\ No newline at end of file
+        codec = next((self._codecs[name] for name in websocket.scope.get("subprotocols", []) if name in self._codecs), None)
+        await websocket.accept(codec.subprotocol if codec is not None else None)
+        connection = self.connections.register(websocket)
+        if connection is None:
+            await close_websocket(websocket, CLOSE_TRY_AGAIN_LATER)
+            return
+        try:
+            await self._serve(websocket, codec, connection)
+        finally:
+            self.connections.unregister(connection)
+
+    async def _serve(self, websocket: WebSocket, codec: Optional[_Codec], connection: StreamConnection):
+        default_chat_id = websocket.query_params.get("chat_id")
+        if codec is None:
+            session = _StreamSession(default_chat_id, None, 0, 0)
+            session.websocket = websocket
+            if default_chat_id:
+                self._bind(session, default_chat_id)
+        else:
+            session = await self._attach(websocket, codec, default_chat_id or str(uuid.uuid4()), websocket.query_params.get("last_seq"))
+            # 再開したセッションで実行中のターンも、この接続のターンとして扱う（ドレインで終わるのを待つ）
+            for task in session.tasks():
+                self.connections.track(connection, task)
+
+            async def ping():
+                await self._ping(session, websocket)
+
+            connection.ping = ping
+
+        async def send(frame: dict[str, Any]):
+            await self._send(session, frame)
+
+        async def on_queued(position: int):
+            # 通知に失敗しても LLM の呼び出しは続ける（切断は受信側のループで検知する）
+            try:
+                await send({"type": "queued", "position": position})
+            except WebSocketDisconnect:
+                pass
+
+        try:
+            while True:
+                try:
+                    data = await self._receive(websocket, codec, connection)
+                except _InvalidMessage as e:
+                    self.connections.received(connection)
+                    await send({"type": "error", "code": "invalid", "message": str(e)})
+                    continue
+                if data is None:
+                    continue
+                self.connections.received(connection)
+                if data.get("type") == "pong":
+                    continue
+                question = data.get("current_question")
+                chat_id = data.get("chat_id")
+                if not isinstance(question, str) or not (chat_id is None or isinstance(chat_id, str)):
+                    await send({"type": "error", "code": "invalid", "message": "current_question must be a string (and chat_id a string if given)"})
+                    continue
+                if not self.connections.admits_turn(connection):
+                    # 停止中・ターン数の上限に達した接続は、実行中のターンを終えてから閉じる
+                    await send({"type": "error", "code": "closing", "message": "This connection is closing; reconnect and send the question again"})
+                    continue
+                turn = session.turn
+                if turn is not None and not turn.done():
+                    if session.answered.is_set():
+                        session.finishing.add(turn)
+                        turn.add_done_callback(session.finishing.discard)
+                    else:
+                        # 回答中に次の質問が届いた場合は、回答中の質問を中断する
+                        await _cancel(turn)
+                        self._turns_superseded.inc()
+                        await send({"type": "error", "code": "cancelled", "message": "Cancelled by a new question"})
+                # 会話の状態はサーバー側（UseCase のセッションキャッシュ）が保持するため、
+                # クライアントからは chat_id と質問だけを受け取る
+                input = ChatSessionInput(
+                    chat_id=chat_id or session.chat_id,
+                    current_question=question,
+                )
+                if input.chat_id is not None:
+                    self._bind(session, input.chat_id)
+                session.answered = asyncio.Event()
+                scope = LLMRequestScope(session.connection_id, input.chat_id or "", on_queued)
+                session.turn = asyncio.create_task(self._turn(input, scope, send, session.answered))
+                self.connections.turn_started(connection, session.turn)
+        except WebSocketDisconnect:
+            if codec is not None:
+                # v2 は生成を続け、再接続を待つ
+                self._detach(session, websocket)
+                return
+            if session.turn is not None and not session.turn.done() and not session.answered.is_set():
+                self._turns_disconnected.inc()
+        finally:
+            # v1 の切断・エラーで抜ける場合は、上流の LLM 呼び出しも含めて取り消す
+            if codec is None or session.websocket is websocket:
+                if codec is not None:
+                    self._forget(session)
+                else:
+                    self._unbind(session)
+                for task in session.tasks():
+                    await _cancel(task)
+
+    async def _attach(self, websocket: WebSocket, codec: _Codec, chat_id: str, last_seq: Optional[str]) -> _StreamSession:
+        """v2 の接続を chat_id のセッションに結び付け、hello と再送するフレームを送る。"""
+        session = self._sessions.get(chat_id)
+        resumed = False
+        error: Optional[str] = None
+        if last_seq is not None:
+            if session is None:
+                error = "No stream to resume (expired or unknown chat_id)"
+            elif not last_seq.isdigit() or not session.can_replay(int(last_seq)):
+                error = "Frames after last_seq are no longer available"
+            else:
+                resumed = True
+            (self._resumes_ok if resumed else self._resumes_failed).inc()
+
+        if session is not None and not resumed:
+            # 再開できない場合は新しい接続として扱い、前のセッションの生成は中断する
+            await self._close(session)
+            session = None
+        if session is None:
+            session = _StreamSession(chat_id, codec, self.resume_buffer_frames, self.resume_buffer_bytes)
+            self._sessions[chat_id] = session
+            self._bind(session, chat_id)
+        else:
+            if self._detached.get(chat_id) is session:
+                del self._detached[chat_id]
+            if session.expiry is not None:
+                session.expiry.cancel()
+                session.expiry = None
+
+        previous = session.websocket
+        async with session.send_lock:
+            session.codec = codec
+            session.websocket = websocket
+            await self._write(session, {"type": "hello", "chat_id": chat_id, "seq": session.seq, "resumed": resumed})
+            if error is not None:
+                await self._write(session, {"type": "error", "code": "resume_failed", "message": error})
+            if resumed:
+                after = int(last_seq or 0)
+                for seq, frame, _ in session.frames:
+                    if seq > after:
+                        await self._write(session, frame)
+                        self._frames_replayed.inc()
+        if previous is not None and previous is not websocket:
+            await close_websocket(previous, CLOSE_SUPERSEDED)
+        return session
+
+    def _detach(self, session: _StreamSession, websocket: WebSocket):
+        if session.websocket is not websocket:
+            # 別の接続で再開済み
+            return
+        session.websocket = None
+        self._detached[session.chat_id or ""] = session
+        session.expiry = asyncio.create_task(self._expire(session))
+
+    async def _expire(self, session: _StreamSession):
+        await asyncio.sleep(self.resume_seconds)
+        if session.websocket is not None or self._sessions.get(session.chat_id or "") is not session:
+            return
+        session.expiry = None
+        await self._close(session)
+
+    def _forget(self, session: _StreamSession):
+        """セッションを一覧から外し、再送用のフレームを捨てる。"""
+        chat_id = session.chat_id or ""
+        if self._sessions.get(chat_id) is session:
+            del self._sessions[chat_id]
+        if self._detached.get(chat_id) is session:
+            del self._detached[chat_id]
+        self._unbind(session)
+        self._account(-session.frame_bytes)
+        session.frames.clear()
+        session.frame_bytes = 0
+
+    def _bind(self, session: _StreamSession, chat_id: str):
+        if chat_id not in session.chat_ids:
+            session.chat_ids.add(chat_id)
+            self._chat_sessions.setdefault(chat_id, set()).add(session)
+
+    def _unbind(self, session: _StreamSession):
+        for chat_id in session.chat_ids:
+            sessions = self._chat_sessions.get(chat_id)
+            if sessions is not None:
+                sessions.discard(session)
+                if not sessions:
+                    del self._chat_sessions[chat_id]
+        session.chat_ids.clear()
+
+    async def close_chat(self, chat_id: str):
+        """chat_id のチャットを扱っている接続を CLOSE_GOING_AWAY で閉じ、実行中のターンを中断する。
+
+        チャットを他のワーカーへ移した後に、このワーカーで更新されないようにする（クライアントは再接続して担当のワーカーで続ける）。
+        """
+        for session in list(self._chat_sessions.get(chat_id, ())):
+            if session.codec is not None:
+                await self._close(session, CLOSE_GOING_AWAY)
+                continue
+            self._unbind(session)
+            if session.turn is not None and not session.turn.done() and not session.answered.is_set():
+                self._turns_disconnected.inc()
+            if session.websocket is not None:
+                await close_websocket(session.websocket, CLOSE_GOING_AWAY)
+            for task in session.tasks():
+                await _cancel(task)
+
+    def _account(self, delta: int):
+        self._buffer_bytes += delta
+        self._buffer_gauge.set(self._buffer_bytes)
+
+    def _shrink_buffers(self, current: _StreamSession):
+        """再送用のフレームの合計を上限内に収める。切断中のセッションを古い順に破棄し、それでも超える場合は current の古いフレームを捨てる。"""
+        while self._buffer_bytes > self.resume_buffer_total_bytes and self._detached:
+            _, evicted = next(iter(self._detached.items()))
+            self._forget(evicted)
+            self._evictions.inc()
+            # 生成中のターンも中断する（再開しようとすると resume_failed になる）
+            asyncio.create_task(self._close(evicted))
+        while self._buffer_bytes > self.resume_buffer_total_bytes and current.frames:
+            size = current.frames.popleft()[2]
+            current.frame_bytes -= size
+            self._account(-size)
+
+    async def _ping(self, session: _StreamSession, websocket: WebSocket):
+        async with session.send_lock:
+            if session.websocket is websocket:
+                await self._write(session, {"type": "ping"})
+
+    async def _close(self, session: _StreamSession, code: int = CLOSE_SUPERSEDED):
+        """セッションを破棄し、実行中のターンを中断する。"""
+        self._forget(session)
+        if session.expiry is not None and session.expiry is not asyncio.current_task():
+            session.expiry.cancel()
+        session.expiry = None
+        if session.turn is not None and not session.turn.done() and not session.answered.is_set():
+            self._turns_disconnected.inc()
+        if session.websocket is not None:
+            await close_websocket(session.websocket, code)
+            session.websocket = None
+        for task in session.tasks():
+            await _cancel(task)
+
+    async def _send(self, session: _StreamSession, frame: dict[str, Any]):
+        async with session.send_lock:
+            if session.codec is None:
+                # 切断後の送信は、送信中に切断された場合と同じく WebSocketDisconnect にする
+                if session.websocket is None or session.websocket.application_state != WebSocketState.CONNECTED:
+                    raise WebSocketDisconnect(1006)
+                started = time.perf_counter()
+                await session.websocket.send_json(frame)
+                self._send_seconds.observe(time.perf_counter() - started)
+                return
+
+            # v2 は切断中も seq を進めてフレームを保持し、再接続時に送り直す
+            session.seq += 1
+            frame["seq"] = session.seq
+            size = await self._write(session, frame)
+            before = session.frame_bytes
+            session.remember(session.seq, frame, size)
+            self._account(session.frame_bytes - before)
+            if 0 < self.resume_buffer_total_bytes < self._buffer_bytes:
+                self._shrink_buffers(session)
+
+    async def _write(self, session: _StreamSession, frame: dict[str, Any]) -> int:
+        """v2 のフレームを符号化して送り、符号化後の大きさを返す。切断されている場合は送らない。"""
+        assert session.codec is not None
+        started = time.perf_counter()
+        data = session.codec.encode(frame)
+        websocket = session.websocket
+        if websocket is not None and websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                if session.codec.binary:
+                    await websocket.send_bytes(data)
+                else:
+                    await websocket.send_text(data)
+            except WebSocketDisconnect:
+                # 受信側のループで切断を検知し、再接続を待つ
+                pass
+            self._send_seconds.observe(time.perf_counter() - started)
+        return len(data)
+
+    async def _receive(self, websocket: WebSocket, codec: Optional[_Codec], connection: StreamConnection) -> Optional[dict[str, Any]]:
+        """次のメッセージを返す。大きすぎるメッセージは読まずに接続を閉じ始め、None を返す。
+
+        読めない（JSON・msgpack でない、オブジェクトでない）メッセージは _InvalidMessage にする。
+        """
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("bytes")
+        if data is None:
+            data = message["text"]
+        max_bytes = self.connections.settings.max_message_bytes
+        # 文字列の長さは UTF-8 のバイト数以下のため、大きい場合だけエンコードして確かめる
+        if max_bytes > 0 and len(data) * (1 if isinstance(data, bytes) else 4) > max_bytes:
+            size = len(data) if isinstance(data, bytes) else len(data.encode("utf-8"))
+            if size > max_bytes:
+                self.connections.close(connection, CLOSE_MESSAGE_TOO_BIG)
+                return None
+        try:
+            decoded = codec.decode(data) if codec is not None and isinstance(data, bytes) else json.loads(data)
+        except ValueError:
+            # json.JSONDecodeError・UnicodeDecodeError・msgpack の展開のエラーはいずれも ValueError
+            raise _InvalidMessage("The message could not be decoded")
+        if not isinstance(decoded, dict):
+            raise _InvalidMessage("The message must be an object")
+        return decoded
+
+    async def _turn(self, input: ChatSessionInput, scope: LLMRequestScope, send: Callable[[dict[str, Any]], Awaitable[None]], answered: asyncio.Event):
+        token = set_llm_request_scope(scope)
+        try:
+            async with asyncio.timeout(self.turn_timeout_seconds if self.turn_timeout_seconds > 0 else None) as deadline:
+                if self.chat_fetcher is not None and input.chat_id is not None:
+                    await self.chat_fetcher.fetch(input.chat_id)
+
+                await send({"type": "start"})
+                # 送信に失敗した・中断された場合も UseCase のストリームを閉じ、上流の LLM のストリームと実行枠をすぐに返させる
+                async with aclosing(self.chat_session_usecase.stream(input)) as events:
+                    async for event in events:
+                        if isinstance(event, ChatSessionDelta):
+                            await send({"type": "delta", "content": event.content})
+                        elif isinstance(event, ChatSessionOutput):
+                            await send({
+                                "type": "end",
+                                "chat_id": event.chat_id,
+                                "step_id": event.step.id,
+                                "title": event.title,
+                            })
+                            answered.set()
+                            # 制限時間は回答までとし、タイトルの確定は待つ
+                            deadline.reschedule(None)
+                        elif isinstance(event, ChatSessionTitle):
+                            await send({"type": "title", "title": event.title})
+            self._turns_ok.inc()
+        except WebSocketDisconnect:
+            # 送信中に切断された場合（受信側のループでも検知して終了する）
+            return
+        except LLMBusyError as e:
+            self._turns_busy.inc()
+            await _send_error(send, "busy", str(e))
+        except TimeoutError:
+            self._turns_timeout.inc()
+            await _send_error(send, "timeout", f"The answer did not complete within {self.turn_timeout_seconds} seconds")
+        except Exception as e:
+            logger.exception("Failed to handle a chat turn")
+            self._turns_error.inc()
+            await _send_error(send, "internal", str(e))
+        finally:
+            reset_llm_request_scope(token)
+
+async def _send_error(send: Callable[[dict[str, Any]], Awaitable[None]], code: str, message: str):
+    try:
+        await send({"type": "error", "code": code, "message": message})
+    except WebSocketDisconnect:
+        pass
+
+async def _cancel(task: asyncio.Task[None]):
+    """タスクを取り消し、後始末（上流のリクエストの中断など）が終わるまで待つ。"""
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        # 呼び出し元自身が取り消された場合はそのまま伝える
+        current = asyncio.current_task()
+        if current is not None and current.cancelling():
+            raise
+
+def create_chat_stream_handler(chat_session_usecase: AsyncChatSessionInputPort, metrics: Metrics = NULL_METRICS, chat_fetcher: Optional[PeerChatFetcher] = None, turn_timeout_seconds: float = 120, resume_seconds: float = 30, resume_buffer_frames: int = 2048, resume_buffer_bytes: int = 1024 * 1024, connections: Optional[ConnectionManager] = None, resume_buffer_total_bytes: int = 256 * 1024 * 1024) -> ChatStreamHandler:
+    return ChatStreamHandler(chat_session_usecase, metrics, chat_fetcher, turn_timeout_seconds, resume_seconds, resume_buffer_frames, resume_buffer_bytes, connections if connections is not None else create_connection_manager(metrics=metrics), resume_buffer_total_bytes)
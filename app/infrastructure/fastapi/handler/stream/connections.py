@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
+
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+# 接続を閉じるコード
+# 停止（ドレイン）のため。クライアントは再接続して他のサーバーへ移る
+CLOSE_GOING_AWAY = 1001
+# 受信したメッセージが大きすぎる
+CLOSE_MESSAGE_TOO_BIG = 1009
+# 接続数の上限に達している・停止中のため受け付けられない。クライアントは待ってから再接続する
+CLOSE_TRY_AGAIN_LATER = 1013
+# 質問も回答も無いまま idle_seconds が経った。クライアントは次の質問を送るときに再接続する
+CLOSE_IDLE = 4001
+# ping に応答が無い（v2）
+CLOSE_HEARTBEAT_TIMEOUT = 4002
+# 1 つの接続で受け付けるターン数の上限に達した。クライアントは再接続して続ける
+CLOSE_TURN_LIMIT = 4003
+
+_CLOSE_REASONS = {
+    CLOSE_GOING_AWAY: "drain",
+    CLOSE_MESSAGE_TOO_BIG: "message_too_big",
+    CLOSE_TRY_AGAIN_LATER: "capacity",
+    CLOSE_IDLE: "idle",
+    CLOSE_HEARTBEAT_TIMEOUT: "heartbeat",
+    CLOSE_TURN_LIMIT: "turn_limit",
+}
+
+@dataclass
+class StreamConnectionSettings:
+    """/chat/stream の接続の上限とハートビート（0 の場合は無制限・無効）。"""
+
+    max_connections: int = 10000
+    # v2 の接続で、この間受信が無ければ {"type": "ping"} を送る
+    heartbeat_seconds: float = 20
+    # ping を送ってからこの間にも受信が無ければ、切れた接続として閉じる
+    heartbeat_timeout_seconds: float = 20
+    # 質問も実行中のターンも無いまま、この時間が経った接続を閉じる
+    idle_seconds: float = 900
+    max_turns_per_connection: int = 1000
+    max_message_bytes: int = 64 * 1024
+
+class StreamConnection:
+    """登録中の接続 1 つの状態。"""
+
+    def __init__(self, websocket: WebSocket, now: float):
+        self.id = str(uuid.uuid4())
+        self.websocket = websocket
+        self.opened_at = now
+        # 最後に何かを受信した時刻（ハートビート）と、最後の質問・ターンの終了の時刻（アイドル）
+        self.last_received = now
+        self.last_active = now
+        self.last_ping = 0.0
+        # v2 の接続で ping を送る関数（v1 はアプリケーションの ping を送らない）
+        self.ping: Optional[Callable[[], Awaitable[None]]] = None
+        self.turns = 0
+        self.active: set[asyncio.Task[None]] = set()
+        # 閉じ始めた場合のコード
+        self.closing: Optional[int] = None
+
+class ConnectionManager:
+    """/chat/stream の接続の一覧を持ち、上限・ハートビート・アイドル切断・ドレインを扱う。
+
+    - 接続数が max_connections に達している場合・停止中は、新しい接続を CLOSE_TRY_AGAIN_LATER で閉じる
+    - v2 の接続には受信の無い間 heartbeat_seconds ごとに ping を送り、heartbeat_timeout_seconds の間も
+      受信が無ければ（クライアントは pong を返す）CLOSE_HEARTBEAT_TIMEOUT で閉じる。v1 の接続は
+      アプリケーションの ping に対応していないため、uvicorn の WebSocket の ping（--ws-ping-interval）に任せる
+    - 実行中のターンの無いまま idle_seconds が経った接続を CLOSE_IDLE で閉じる
+    - max_turns_per_connection 回のターンを終えた接続は、最後のターンが終わってから CLOSE_TURN_LIMIT で閉じる
+    - drain では新しい接続とターンを受け付けず、実行中のターンが終わった接続から CLOSE_GOING_AWAY で閉じる
+    """
+
+    def __init__(self, settings: StreamConnectionSettings, metrics: Metrics):
+        self.settings = settings
+        self._connections: dict[str, StreamConnection] = {}
+        self._draining = False
+        self._drained = asyncio.Event()
+        self._sweeper: Optional[asyncio.Task[None]] = None
+        # ping・接続を閉じるタスク（参照を保持しておく）
+        self._background: set[asyncio.Task[None]] = set()
+        self._open = metrics.gauge("websocket_connections", "Open /chat/stream WebSocket connections.")
+        closes = metrics.counter("websocket_closes_total", "WebSocket connections closed by the server by reason.", ["reason"])
+        self._closes = {code: closes.labels(reason) for code, reason in _CLOSE_REASONS.items()}
+        self._pings = metrics.counter("websocket_pings_total", "Heartbeat pings sent to v2 WebSocket connections.")
+
+    def register(self, websocket: WebSocket) -> Optional[StreamConnection]:
+        """接続を登録する。上限に達している・停止中の場合は None を返す（呼び出し元が閉じる）。"""
+        if self._draining or (self.settings.max_connections > 0 and len(self._connections) >= self.settings.max_connections):
+            self._closes[CLOSE_TRY_AGAIN_LATER].inc()
+            return None
+        connection = StreamConnection(websocket, time.monotonic())
+        self._connections[connection.id] = connection
+        self._open.inc()
+        if self._sweeper is None and (self.settings.heartbeat_seconds > 0 or self.settings.idle_seconds > 0):
+            self._sweeper = asyncio.create_task(self._sweep())
+        return connection
+
+    def unregister(self, connection: StreamConnection):
+        if self._connections.pop(connection.id, None) is None:
+            return
+        self._open.dec()
+        if self._draining and not self._connections:
+            self._drained.set()
+
+    def received(self, connection: StreamConnection):
+        """メッセージ（pong を含む）を受信したことを記録する。"""
+        connection.last_received = time.monotonic()
+
+    def admits_turn(self, connection: StreamConnection) -> bool:
+        """新しいターンを受け付けられるか（停止中・ターン数の上限・閉じ始めた接続は受け付けない）。"""
+        if self._draining or connection.closing is not None:
+            return False
+        return self.settings.max_turns_per_connection <= 0 or connection.turns < self.settings.max_turns_per_connection
+
+    def turn_started(self, connection: StreamConnection, task: "asyncio.Task[None]"):
+        connection.turns += 1
+        self.track(connection, task)
+
+    def track(self, connection: StreamConnection, task: "asyncio.Task[None]"):
+        """実行中のターンとして扱う（終わるまではアイドルにせず、ドレインでは終わるのを待つ）。"""
+        connection.last_active = time.monotonic()
+        connection.active.add(task)
+        task.add_done_callback(lambda task: self._turn_finished(connection, task))
+
+    def _turn_finished(self, connection: StreamConnection, task: "asyncio.Task[None]"):
+        connection.active.discard(task)
+        connection.last_active = time.monotonic()
+        # 切断済みの接続（v2 で再開した場合は新しい接続が引き継ぐ）
+        if connection.active or connection.id not in self._connections:
+            return
+        if self._draining:
+            self.close(connection, CLOSE_GOING_AWAY)
+        elif 0 < self.settings.max_turns_per_connection <= connection.turns:
+            self.close(connection, CLOSE_TURN_LIMIT)
+
+    def close(self, connection: StreamConnection, code: int):
+        """接続を閉じる（受信側のループが切断を検知して後始末をする）。"""
+        if connection.closing is not None:
+            return
+        connection.closing = code
+        if code in self._closes:
+            self._closes[code].inc()
+        self._spawn(close_websocket(connection.websocket, code))
+
+    async def drain(self):
+        """新しい接続とターンを止め、実行中のターンが終わった接続から閉じる。すべて閉じるまで待つ。"""
+        self._draining = True
+        for connection in list(self._connections.values()):
+            if not connection.active:
+                self.close(connection, CLOSE_GOING_AWAY)
+        if self._connections:
+            logger.info("Draining %d WebSocket connections", len(self._connections))
+            await self._drained.wait()
+
+    async def aclose(self):
+        for task in [self._sweeper, *self._background]:
+            if task is not None:
+                task.cancel()
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+    def _tick_seconds(self) -> float:
+        intervals = [seconds for seconds in (self.settings.heartbeat_seconds, self.settings.heartbeat_timeout_seconds, self.settings.idle_seconds) if seconds > 0]
+        return min(max(min(intervals) / 4, 0.05), 5.0)
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(self._tick_seconds())
+            now = time.monotonic()
+            for connection in list(self._connections.values()):
+                if connection.closing is None:
+                    self._check(connection, now)
+
+    def _check(self, connection: StreamConnection, now: float):
+        settings = self.settings
+        if settings.heartbeat_seconds > 0 and connection.ping is not None:
+            silent = now - connection.last_received
+            if settings.heartbeat_timeout_seconds > 0 and silent >= settings.heartbeat_seconds + settings.heartbeat_timeout_seconds:
+                self.close(connection, CLOSE_HEARTBEAT_TIMEOUT)
+                return
+            if silent >= settings.heartbeat_seconds and now - connection.last_ping >= settings.heartbeat_seconds:
+                connection.last_ping = now
+                self._pings.inc()
+                self._spawn(connection.ping())
+        if settings.idle_seconds > 0 and not connection.active and now - connection.last_active >= settings.idle_seconds:
+            self.close(connection, CLOSE_IDLE)
+
+    def _spawn(self, coroutine: Awaitable[None]):
+        async def run():
+            try:
+                await coroutine
+            except WebSocketDisconnect:
+                pass
+
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+async def close_websocket(websocket: WebSocket, code: int):
+    if websocket.application_state != WebSocketState.CONNECTED:
+        return
+    try:
+        await websocket.close(code)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+def create_connection_manager(settings: Optional[StreamConnectionSettings] = None, metrics: Metrics = NULL_METRICS) -> ConnectionManager:
+    return ConnectionManager(settings or StreamConnectionSettings(), metrics)
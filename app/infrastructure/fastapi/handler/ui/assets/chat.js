@@ -0,0 +1,217 @@
+(function () {
+  // プロトコルに応じて ws / wss を切り替え
+  const wsScheme = window.location.protocol === 'https:' ? 'wss' : 'ws';
+
+  // UUID を生成（古いブラウザ向けに fallback も用意）
+  const chatId = (crypto.randomUUID ? crypto.randomUUID() : [...Array(36)].map((_, i) => {
+    if ([8, 13, 18, 23].includes(i)) return '-';
+    const r = (crypto.getRandomValues ? crypto.getRandomValues(new Uint8Array(1))[0] : Math.random() * 16) & 15;
+    return (i === 14 ? 4 : (i === 19 ? (r & 0x3) | 0x8 : r)).toString(16);
+  }).join(''));
+
+  // 複数ワーカーで起動している場合は、chat_id でチャットを担当するワーカーに振り分けられる
+  const wsUrl = `${wsScheme}://${window.location.host}/chat/stream?chat_id=${chatId}`;
+  // v2 プロトコル（seq 付きのフレーム）で接続し、切断時は受信済みの seq から再開する
+  let socket = null;
+  // 受信済みの最後の seq（再開時に送り直されたフレームと重複したものは捨てる）
+  let lastSeq = null;
+  // 再接続までの待ち時間（失敗するたびに延ばす）
+  let retryDelay = 500;
+  // 切断中に送ろうとした質問
+  const pending = [];
+  // 最後に送った質問（サーバーが接続を閉じ始めていて受け付けなかった場合に、再接続してから送り直す）
+  let lastSent = null;
+  // アイドルのためサーバーが閉じた（次の質問を送るときに再接続する）
+  let idle = false;
+
+  const titleEl = document.querySelector('header h2');
+  const messagesEl = document.getElementById('messages');
+  const questionInput = document.getElementById('question-input');
+  const sendBtn = document.getElementById('send-btn');
+
+  // 回答の差分と自動スクロールは、フレームごと（requestAnimationFrame）にまとめて DOM へ反映する。
+  // 差分ごとに書き込んで scrollHeight を読むと、そのたびにレイアウトの計算が走るため
+  let pendingText = '';
+  let pendingTarget = null;
+  let scrollPending = false;
+  let framePending = false;
+
+  function scheduleRender() {
+    if (framePending) return;
+    framePending = true;
+    requestAnimationFrame(render);
+  }
+
+  function render() {
+    framePending = false;
+    flushText();
+    if (scrollPending) {
+      scrollPending = false;
+      messagesEl.scrollTop = messagesEl.scrollHeight; // 自動スクロール
+    }
+  }
+
+  // 反映待ちの差分を書き込む（回答の要素を直接書き換える前にも呼ぶ）
+  function flushText() {
+    if (!pendingText) return;
+    pendingTarget.insertAdjacentText('beforeend', pendingText);
+    pendingText = '';
+  }
+
+  function appendText(el, text) {
+    if (pendingTarget !== el) {
+      flushText();
+      pendingTarget = el;
+    }
+    pendingText += text;
+    scrollPending = true;
+    scheduleRender();
+  }
+
+  function appendMessage(text, className) {
+    const p = document.createElement('p');
+    p.className = className;
+    p.textContent = text;
+    messagesEl.appendChild(p);
+    scrollPending = true;
+    scheduleRender();
+    return p;
+  }
+
+  sendBtn.addEventListener('click', sendQuestion);
+  questionInput.addEventListener('keypress', function (e) {
+    if (e.key === 'Enter') {
+      sendQuestion();
+    }
+  });
+
+  function sendQuestion() {
+    const question = questionInput.value.trim();
+    if (!question) return;
+    const message = JSON.stringify({ chat_id: chatId, current_question: question });
+    if (socket && socket.readyState === WebSocket.OPEN) {
+      socket.send(message);
+      lastSent = message;
+    } else {
+      pending.push(message);
+      if (idle) {
+        idle = false;
+        connect();
+      }
+    }
+    appendMessage(question, 'question');
+    questionInput.value = '';
+  }
+
+  // ストリーミング中の回答要素（start で作成し、delta を追記する）
+  let currentAnswer = null;
+  // 順番待ちの表示中かどうか（最初の delta で消す）
+  let queued = false;
+
+  function handleFrame(frame) {
+    // delta 以外のフレームは回答の要素を直接書き換えるため、先に反映待ちの差分を書き込んでおく
+    if (frame.type !== 'delta') flushText();
+    if (frame.type === 'hello') {
+      if (!frame.resumed) lastSeq = frame.seq;
+      return;
+    }
+    if (frame.type === 'ping') {
+      socket.send(JSON.stringify({ type: 'pong' }));
+      return;
+    }
+    if (frame.seq !== undefined) {
+      if (lastSeq !== null && frame.seq <= lastSeq) return;
+      lastSeq = frame.seq;
+    }
+    switch (frame.type) {
+      case 'start':
+        currentAnswer = appendMessage('', 'answer');
+        queued = false;
+        break;
+      case 'queued':
+        if (!currentAnswer) currentAnswer = appendMessage('', 'answer');
+        currentAnswer.textContent = `混雑しています（${frame.position} 番目に待機中）...`;
+        queued = true;
+        break;
+      case 'delta':
+        if (!currentAnswer) currentAnswer = appendMessage('', 'answer');
+        if (queued) {
+          currentAnswer.textContent = '';
+          queued = false;
+        }
+        appendText(currentAnswer, frame.content);
+        break;
+      case 'end':
+        currentAnswer = null;
+        break;
+      case 'error':
+        if (frame.code === 'closing') {
+          // サーバーが接続を閉じ始めている（回答中の質問はそのまま続く）。閉じた後に再接続して送り直す
+          if (lastSent) pending.push(lastSent);
+          lastSent = null;
+          break;
+        }
+        if (frame.code === 'resume_failed') {
+          // 再開できなかった（回答中だった場合は、途中までの回答を残して中断扱いにする）
+          if (currentAnswer) currentAnswer.textContent += '（接続が切れたため中断しました）';
+          currentAnswer = null;
+          queued = false;
+          break;
+        }
+        if (!currentAnswer) currentAnswer = appendMessage('', 'answer');
+        if (frame.code === 'cancelled') {
+          // 次の質問を送ったため中断した（途中までの回答は残す）
+          currentAnswer.textContent += '（中断しました）';
+        } else if (frame.code === 'busy') {
+          currentAnswer.textContent = '混雑しているため回答できませんでした。しばらくしてから再度お試しください。';
+        } else if (frame.code === 'timeout') {
+          currentAnswer.textContent = '時間内に回答できませんでした。もう一度お試しください。';
+        } else {
+          currentAnswer.textContent = frame.message;
+        }
+        currentAnswer = null;
+        queued = false;
+        break;
+      case 'title':
+        titleEl.textContent = frame.title;
+        document.title = frame.title;
+        break;
+    }
+  }
+
+  function connect() {
+    const url = lastSeq === null ? wsUrl : `${wsUrl}&last_seq=${lastSeq}`;
+    socket = new WebSocket(url, ['chat.v2.json']);
+    socket.onopen = function () {
+      retryDelay = 500;
+      while (pending.length) {
+        lastSent = pending.shift();
+        socket.send(lastSent);
+      }
+    };
+    socket.onmessage = function (event) {
+      handleFrame(JSON.parse(event.data));
+    };
+    socket.onclose = function (event) {
+      // 同じチャットを別の接続（別のタブなど）で開いた場合は再接続しない
+      if (event.code === 4000) return;
+      // アイドルのため閉じた場合は、次の質問を送るときに再接続する
+      if (event.code === 4001) {
+        if (pending.length) {
+          connect();
+        } else {
+          idle = true;
+        }
+        return;
+      }
+      // 停止（1001）・ping の応答切れ（4002）・ターン数の上限（4003）・混雑（1013）などは再接続する
+      setTimeout(connect, retryDelay);
+      retryDelay = Math.min(retryDelay * 2, 10000);
+    };
+    socket.onerror = function (event) {
+      console.error('WebSocket error:', event);
+    };
+  }
+
+  connect();
+})();
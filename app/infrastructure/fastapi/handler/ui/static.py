@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+logger = logging.getLogger(__name__)
+
+# ファイル名（ハッシュ付き）の変わらないアセットは 1 年間キャッシュさせる
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# index.html はアセットの URL が変わるため、毎回 ETag で確かめさせる
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# 同じ q 値の場合に優先する符号化方式
+_ENCODING_PREFERENCE = ("br", "gzip", "identity")
+_MEDIA_TYPES = {
+    ".html": "text/html; charset=utf-8",
+    ".css": "text/css; charset=utf-8",
+    ".js": "text/javascript; charset=utf-8",
+}
+# index.html の {{chat.js}} などを、ハッシュ付きの URL に置き換える
+_PLACEHOLDER = re.compile(r"\{\{([\w.-]+)\}\}")
+
+@dataclass
+class StaticAsset:
+    """起動時に圧縮しておいたアセット。符号化方式（identity / gzip / br）ごとに本文と ETag を持つ。"""
+
+    media_type: str
+    cache_control: str
+    bodies: dict[str, bytes]
+    etags: dict[str, str]
+
+    def respond(self, request: Request) -> Response:
+        """Accept-Encoding で符号化方式を選び、If-None-Match が一致する場合は 304 を返す。"""
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""), self.bodies)
+        headers = {"ETag": self.etags[encoding], "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if etag_matches(request.headers.get("if-none-match"), self.etags[encoding]):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.bodies[encoding], media_type=self.media_type, headers=headers)
+
+def _load_brotli() -> Optional[Callable[[bytes], bytes]]:
+    try:
+        import brotli  # type: ignore
+    except ImportError:
+        # brotli は任意の依存関係のため、インストールされていない場合は gzip だけにする
+        logger.info("brotli is not installed; serving the UI with gzip only")
+        return None
+    return lambda data: brotli.compress(data, quality=11)
+
+def _gzip(data: bytes) -> bytes:
+    # mtime を固定し、同じ内容からは同じバイト列を作る
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def _compress(data: bytes, brotli: Optional[Callable[[bytes], bytes]]) -> dict[str, bytes]:
+    bodies = {"identity": data}
+    compressors: dict[str, Callable[[bytes], bytes]] = {"gzip": _gzip}
+    if brotli is not None:
+        compressors["br"] = brotli
+    for encoding, compress in compressors.items():
+        compressed = compress(data)
+        # 小さくならない場合は圧縮しない
+        if len(compressed) < len(data):
+            bodies[encoding] = compressed
+    return bodies
+
+def build_asset(data: bytes, media_type: str, cache_control: str, brotli: Optional[Callable[[bytes], bytes]] = None) -> StaticAsset:
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    bodies = _compress(data, brotli)
+    # 強い ETag は表現（符号化方式）ごとに変える
+    etags = {encoding: f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"' for encoding in bodies}
+    return StaticAsset(media_type, cache_control, bodies, etags)
+
+def build_static_assets(directory: str, index: str = "index.html", prefix: str = "/static/") -> tuple[StaticAsset, dict[str, StaticAsset]]:
+    """directory のアセットを読み込んで圧縮し、index と、ハッシュ付きのファイル名ごとのアセットを返す。
+
+    index 以外のアセットは内容のハッシュをファイル名に含めて長期間キャッシュさせ、
+    index の {{ファイル名}} をその URL に置き換える。
+    """
+    brotli = _load_brotli()
+    assets: dict[str, StaticAsset] = {}
+    urls: dict[str, str] = {}
+    for name in sorted(os.listdir(directory)):
+        if name == index:
+            continue
+        stem, extension = os.path.splitext(name)
+        with open(os.path.join(directory, name), "rb") as f:
+            data = f.read()
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+        assets[hashed] = build_asset(data, _MEDIA_TYPES.get(extension, "application/octet-stream"), IMMUTABLE_CACHE_CONTROL, brotli)
+        urls[name] = prefix + hashed
+    with open(os.path.join(directory, index), encoding="utf-8") as f:
+        html = _PLACEHOLDER.sub(lambda match: urls[match.group(1)], f.read())
+    return build_asset(html.encode("utf-8"), _MEDIA_TYPES[".html"], REVALIDATE_CACHE_CONTROL, brotli), assets
+
+def negotiate_encoding(accept_encoding: str, available: dict[str, bytes]) -> str:
+    """Accept-Encoding の q 値に従い、available のうち最も優先する符号化方式を返す（無い場合は identity）。"""
+    qualities: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    wildcard = qualities.get("*")
+
+    def accepted(encoding: str) -> float:
+        if encoding in qualities:
+            return qualities[encoding]
+        if wildcard is not None:
+            return wildcard
+        # 指定の無い identity は常に受け付けられる
+        return 1.0 if encoding == "identity" else 0.0
+
+    best = "identity"
+    best_quality = 0.0
+    for encoding in _ENCODING_PREFERENCE:
+        if encoding in available and accepted(encoding) > best_quality:
+            best, best_quality = encoding, accepted(encoding)
+    return best
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match の一覧に etag が含まれるか（弱い比較）。"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
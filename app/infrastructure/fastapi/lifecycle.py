@@ -0,0 +1,160 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+from fastapi import FastAPI
+
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+Hook = Callable[[], Awaitable[None]]
+
+# 状態（/readyz の応答）
+STATE_STARTING = "starting"
+STATE_READY = "ready"
+STATE_DRAINING = "draining"
+STATE_STOPPING = "stopping"
+
+class ApplicationLifecycle:
+    """FastAPI の lifespan で、起動後の準備（ウォームアップ）と終了時の後始末を行う。
+
+    - ウォームアップ（SDK の読み込み・上流への接続など）は、待ち受けを始めた後にバックグラウンドで
+      登録順に行い、すべて終わったら ready にする。失敗しても、最初のリクエストで同じ処理が行われる
+      だけのため、ログに残して ready にする
+    - SIGTERM を受け取ったら draining にし、ドレイン（実行中のターンを終えてから接続を閉じるなど）を
+      drain_timeout_seconds まで待ってから、uvicorn の SIGTERM の処理（停止）に渡す。uvicorn は停止時に
+      WebSocket をすぐに閉じるため、その前に行う。2 回目の SIGTERM はすぐに渡す。SIGINT（Ctrl+C）はドレインしない
+    - 終了時は stopping にしてから、後始末を登録と逆の順に行う
+    """
+
+    def __init__(self, started_at: float, drain_timeout_seconds: float, metrics: Metrics):
+        # main の読み込みを始めた時刻（time.perf_counter）
+        self._started_at = started_at
+        # 0 の場合はドレインしない
+        self._drain_timeout_seconds = drain_timeout_seconds
+        self._warmups: list[tuple[str, Hook]] = []
+        self._drains: list[tuple[str, Hook]] = []
+        self._shutdowns: list[tuple[str, Hook]] = []
+        self._previous_sigterm: Any = None
+        self._drain_requested = False
+        self._draining: Optional[asyncio.Task[None]] = None
+        self._task: Optional[asyncio.Task[None]] = None
+        self.state = STATE_STARTING
+        startup = metrics.gauge("app_startup_seconds", "Seconds spent in each startup phase.", ["phase"])
+        self._import_seconds = startup.labels("import")
+        self._warmup_seconds = startup.labels("warmup")
+        self._ready = metrics.gauge("app_ready", "Whether the application is ready to serve requests.")
+
+    def on_warmup(self, name: str, hook: Hook):
+        self._warmups.append((name, hook))
+
+    def on_drain(self, name: str, hook: Hook):
+        self._drains.append((name, hook))
+
+    def on_shutdown(self, name: str, hook: Hook):
+        self._shutdowns.append((name, hook))
+
+    def is_ready(self) -> bool:
+        return self.state == STATE_READY
+
+    @asynccontextmanager
+    async def lifespan(self, app: FastAPI) -> AsyncIterator[None]:
+        self._import_seconds.set(time.perf_counter() - self._started_at)
+        self._task = asyncio.create_task(self._warm_up())
+        self._install_sigterm()
+        try:
+            yield
+        finally:
+            self._restore_sigterm()
+            self.state = STATE_STOPPING
+            self._ready.set(0)
+            if not self._task.done():
+                self._task.cancel()
+                try:
+                    await self._task
+                except asyncio.CancelledError:
+                    pass
+            for name, hook in reversed(self._shutdowns):
+                try:
+                    await hook()
+                except Exception:
+                    logger.exception("Shutdown hook %s failed", name)
+
+    async def _warm_up(self):
+        started = time.perf_counter()
+        for name, hook in self._warmups:
+            hook_started = time.perf_counter()
+            try:
+                await hook()
+            except Exception as e:
+                logger.warning("Warmup %s failed: %s", name, e)
+            else:
+                logger.info("Warmup %s finished in %.3fs", name, time.perf_counter() - hook_started)
+        self._warmup_seconds.set(time.perf_counter() - started)
+        if self.state == STATE_STARTING:
+            self.state = STATE_READY
+            self._ready.set(1)
+
+    def _install_sigterm(self):
+        if self._drain_timeout_seconds <= 0 or not self._drains:
+            return
+        loop = asyncio.get_running_loop()
+
+        def handle(signum: int, frame: Any):
+            if self._drain_requested:
+                self._forward_sigterm(signum, frame)
+                return
+            self._drain_requested = True
+            loop.call_soon_threadsafe(self._start_drain, signum, frame)
+
+        try:
+            self._previous_sigterm = signal.getsignal(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, handle)
+        except ValueError:
+            # メインスレッド以外で起動された場合はドレインしない
+            self._previous_sigterm = None
+
+    def _restore_sigterm(self):
+        if self._previous_sigterm is not None:
+            signal.signal(signal.SIGTERM, self._previous_sigterm)
+            self._previous_sigterm = None
+
+    def _start_drain(self, signum: int, frame: Any):
+        self._draining = asyncio.create_task(self._drain(signum, frame))
+
+    async def _drain(self, signum: int, frame: Any):
+        self.state = STATE_DRAINING
+        self._ready.set(0)
+        started = time.perf_counter()
+        logger.info("Draining before shutdown (up to %.0fs)", self._drain_timeout_seconds)
+
+        async def run(name: str, hook: Hook):
+            try:
+                await hook()
+            except Exception:
+                logger.exception("Drain hook %s failed", name)
+
+        try:
+            async with asyncio.timeout(self._drain_timeout_seconds):
+                await asyncio.gather(*(run(name, hook) for name, hook in self._drains))
+        except TimeoutError:
+            logger.warning("Drain did not finish within %.0fs", self._drain_timeout_seconds)
+        logger.info("Drained in %.3fs", time.perf_counter() - started)
+        self._forward_sigterm(signum, frame)
+
+    def _forward_sigterm(self, signum: int, frame: Any):
+        """SIGTERM をドレイン前の処理（uvicorn の停止）に渡す。"""
+        previous = self._previous_sigterm
+        self._restore_sigterm()
+        if callable(previous):
+            previous(signum, frame)
+        elif previous == signal.SIG_DFL:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+def create_application_lifecycle(started_at: float, drain_timeout_seconds: float = 30, metrics: Metrics = NULL_METRICS) -> ApplicationLifecycle:
+    return ApplicationLifecycle(started_at, drain_timeout_seconds, metrics)
@@ -0,0 +1,664 @@
+import json
+import logging
+import mmap
+import os
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import IO, Any, Callable, Iterator, Optional, Union
+
+from app.domain.chat.repository.chat import ChatRepository
+from app.domain.chat.entity.chat import Chat, create_chat, create_step, restore_chat
+from app.domain.chat.value_object.answer import create_answer
+from app.domain.chat.value_object.question import restore_question
+from app.domain.chat.value_object.title import restore_title
+from app.domain.shared.value_object.id import Id, restore_id
+from app.domain.shared.value_object.time import create_time
+
+# ファイルの先頭行。世代番号でスナップショットとジャーナルの対応を判定する
+SNAPSHOT_HEADER = "# chat-snapshot v1 gen="
+JOURNAL_HEADER = "# chat-journal v1 gen="
+
+SNAPSHOT_FILE = "snapshot.dat"
+JOURNAL_FILE = "journal.log"
+# コンパクション中の、スナップショットに反映する前のジャーナル
+ROTATED_JOURNAL_FILE = "journal.old"
+
+# スナップショットの各行は「チャット ID + タブ + JSON」
+
+# コンパクションに失敗した場合に、やり直すまでの待ち時間（失敗するたびに倍にし、上限で止める）
+COMPACTION_RETRY_SECONDS = 1.0
+COMPACTION_RETRY_MAX_SECONDS = 60.0
+
+logger = logging.getLogger(__name__)
+
+class _PersistedState:
+    """ジャーナルに書き込み済みの内容。update 時に差分だけを追記するために使う。"""
+
+    __slots__ = ("step_count", "title", "updated_at", "summarized_step_count")
+
+    def __init__(self, step_count: int, title: str, updated_at: datetime, summarized_step_count: int):
+        self.step_count = step_count
+        self.title = title
+        self.updated_at = updated_at
+        self.summarized_step_count = summarized_step_count
+
+class _Rotation:
+    """書き込みキュー上の、ジャーナルを切り替えてコンパクションを始める位置。"""
+
+    __slots__ = ("generation",)
+
+    def __init__(self, generation: int):
+        self.generation = generation
+
+# 書き込みキューの要素（追記する行・ジャーナルの切り替え・flush の待ち合わせ・停止）
+_WriteItem = Union[str, _Rotation, threading.Event, None]
+
+class ChatRepositoryFileImpl(ChatRepository):
+    """追記型ジャーナルとスナップショットでチャットを永続化するリポジトリ。
+
+    - 新しいステップは 1 件につきジャーナルへの 1 回の追記で保存する（チャット全体は書き直さない）。
+      追記は書き込みスレッドが行い、update は差分の行を書き込みキューに入れるだけで戻る。
+      書き込みスレッドはキューにたまった行をまとめて 1 回の write（と fsync）で書く
+    - ジャーナルが一定件数に達したら、ジャーナルを journal.old に切り替え、別スレッドで旧スナップショットと
+      journal.old から新しいスナップショットを書き出す（コンパクション）。その間の追記は新しいジャーナルに書く
+    - 起動時はスナップショットを mmap し、各行の先頭にある ID だけを読んで索引を作る。
+      チャット本体は初めて参照されたときに読み込む
+    - 読み込み済みのチャットは max_loaded_chats 件を上限に、最終アクセス順（LRU）で破棄し、
+      次に参照されたときにスナップショットから読み直す。ジャーナルにだけ記録のあるチャットは
+      スナップショットに反映されるまで破棄しない
+    - create_many（一括取り込み）は、ジャーナルに記録の無いチャットをスナップショットの末尾に直接追記する。
+      取り込んだチャットはメモリに載せず、他のチャットと同じく参照されたときに読み込む
+    """
+
+    def __init__(self, path: str, snapshot_interval: int = 10000, fsync: bool = False, max_loaded_chats: int = 10000):
+        self._path = path
+        self._snapshot_interval = snapshot_interval
+        self._fsync = fsync
+        # 0 の場合は無制限
+        self._max_loaded_chats = max_loaded_chats
+        self._lock = threading.Lock()
+        # スナップショットのファイルを書き換える処理（コンパクション・create_many）を 1 つずつ行う。
+        # _lock より先に取る
+        self._snapshot_lock = threading.Lock()
+
+        # 読み込み済みのチャットと、その永続化済みの状態
+        self._chats: dict[str, Chat] = {}
+        self._persisted: dict[str, _PersistedState] = {}
+        # 読み込み済みのうち、スナップショットと内容が同じ（破棄して読み直せる）チャット。最終アクセス順
+        self._clean: OrderedDict[str, None] = OrderedDict()
+        # スナップショット上のチャットの位置（開始, 終了）
+        self._snapshot_index: dict[str, tuple[int, int]] = {}
+        self._snapshot: Optional[mmap.mmap] = None
+        self._generation = 0
+        # 現在のジャーナル（書き込みキューを含む）の件数と、記録のあるチャット
+        # （起動時はジャーナルの後からスナップショットを読むことはないため、これらのチャットは
+        # スナップショットへ直接追記せず、ジャーナルに書く）
+        self._journal_records = 0
+        self._journal_keys: set[str] = set()
+        # コンパクション中の journal.old に記録のあるチャット
+        self._compacting = False
+        self._compacting_keys: set[str] = set()
+        self._compaction: Optional[threading.Thread] = None
+        self._queue: queue.SimpleQueue[_WriteItem] = queue.SimpleQueue()
+        self._closing = False
+        # close で、失敗したコンパクションのやり直しを待つのをやめさせる
+        self._closed = threading.Event()
+
+        os.makedirs(path, exist_ok=True)
+        self._open_snapshot()
+        self._recover_rotated_journal()
+        self._replay_journal()
+        self._journal: IO[str] = open(self._journal_path(), "a", encoding="utf-8")
+        if self._journal.tell() == 0:
+            self._write_journal([f"{JOURNAL_HEADER}{self._generation}\n"])
+        self._writer = threading.Thread(target=self._run_writer, name="chat-journal-writer", daemon=True)
+        self._writer.start()
+
+    def create(self, chat: Chat) -> Chat:
+        return self.update(chat)
+
+    def update(self, chat: Chat) -> Chat:
+        with self._lock:
+            self._check_open()
+            self._write(chat)
+            self._rotate_if_needed()
+        return chat
+
+    def delete(self, id: Id) -> None:
+        key = id.value()
+        with self._lock:
+            self._check_open()
+            if key not in self._chats and key not in self._snapshot_index:
+                return
+            self._enqueue([_dumps({"op": "delete", "id": key})])
+            self._journal_keys.add(key)
+            self._forget(key)
+            self._rotate_if_needed()
+
+    def find_by_id(self, id: Id) -> Optional[Chat]:
+        key = id.value()
+        with self._lock:
+            return self._load(key)
+
+    def exists(self, id: Id) -> bool:
+        key = id.value()
+        with self._lock:
+            return key in self._chats or key in self._snapshot_index
+
+    def peek(self, id: Id) -> Optional[Chat]:
+        # 未読み込みのチャットはスナップショットから復元するが、読み込み済みにはしない
+        key = id.value()
+        with self._lock:
+            chat = self._chats.get(key)
+            return chat if chat is not None else self._read_snapshot(key)
+
+    def find_all(self) -> list[Chat]:
+        return list(self.iter_all())
+
+    def iter_all(self) -> Iterator[Chat]:
+        # 未読み込みのチャットはスナップショットから 1 件ずつ復元し、読み込み済みにはしない
+        # （全件を書き出しても、保持するのは ID の一覧とチャット 1 件分だけ）
+        with self._lock:
+            keys = list(self._chats) + [key for key in self._snapshot_index if key not in self._chats]
+        for key in keys:
+            with self._lock:
+                chat = self._chats.get(key)
+                if chat is None:
+                    chat = self._read_snapshot(key)
+            if chat is not None:
+                yield chat
+
+    def create_many(self, chats: list[Chat]) -> None:
+        # _lock はチャット 1 件ごとと、追記した行を公開するときだけ取り、取り込み中もターンの保存を止めない
+        with self._snapshot_lock:
+            appended: list[Chat] = []
+            for chat in chats:
+                with self._lock:
+                    self._check_open()
+                    if self._journaled(chat.get_id().value()):
+                        self._rewrite(chat)
+                    else:
+                        appended.append(chat)
+            if appended:
+                self._append_snapshot(appended)
+
+    def flush(self):
+        """書き込みキューに入っている行が、ジャーナルに書き込まれるまで待つ。"""
+        with self._lock:
+            self._check_open()
+        written = threading.Event()
+        self._queue.put(written)
+        written.wait()
+
+    def close(self, compact: bool = True):
+        """書き込みキューを書き終え、ジャーナルをスナップショットに反映してファイルを閉じる。
+
+        compact が False の場合は反映せずに閉じる（次の起動時にジャーナルを再生する）。
+        """
+        with self._lock:
+            self._closing = True
+        self._closed.set()
+        self._queue.put(None)
+        self._writer.join()
+        if self._compaction is not None:
+            self._compaction.join()
+        if compact and self._journal_records > 0 and not self._compacting:
+            generation = self._generation + 1
+            self._rotate_journal(generation)
+            self._merge_rotated_journal(generation)
+        self._journal.close()
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+
+    # --- 読み込み ---
+
+    def _snapshot_path(self) -> str:
+        return os.path.join(self._path, SNAPSHOT_FILE)
+
+    def _journal_path(self) -> str:
+        return os.path.join(self._path, JOURNAL_FILE)
+
+    def _rotated_journal_path(self) -> str:
+        return os.path.join(self._path, ROTATED_JOURNAL_FILE)
+
+    def _open_snapshot(self):
+        path = self._snapshot_path()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        with open(path, "rb") as f:
+            snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_end = snapshot.find(b"\n")
+        self._generation = _parse_generation(snapshot[:header_end].decode("utf-8"), SNAPSHOT_HEADER)
+        self._snapshot = snapshot
+        self._snapshot_index = _index_snapshot(snapshot, header_end + 1)
+
+    def _recover_rotated_journal(self):
+        """コンパクションの途中で停止した場合は、残った journal.old をスナップショットに反映する。"""
+        path = self._rotated_journal_path()
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            header = f.readline()
+        # スナップショットへの反映後、journal.old を消す前に停止した場合は捨てる
+        if not header or _parse_generation(header.decode("utf-8"), JOURNAL_HEADER) < self._generation:
+            os.remove(path)
+            return
+        self._merge_rotated_journal(self._generation + 1)
+
+    def _replay_journal(self):
+        path = self._journal_path()
+        if not os.path.exists(path):
+            return
+        replayed: dict[str, Optional[Chat]] = {}
+        with open(path, "r+b") as f:
+            header = f.readline()
+            if not header:
+                return
+            # コンパクション後、ジャーナルを空にする前に停止した場合は反映済みなので捨てる
+            if _parse_generation(header.decode("utf-8"), JOURNAL_HEADER) < self._generation:
+                f.truncate(0)
+                return
+            position = f.tell()
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete journal record")
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で停止した末尾の行は切り詰め、以降の追記と混ざらないようにする
+                    f.truncate(position)
+                    break
+                _apply_record(replayed, record, self._read_snapshot)
+                self._journal_records += 1
+                position += len(line)
+
+        # ジャーナルに記録のあるチャットは、スナップショットに反映されるまで読み込み済みにしておく
+        for key, chat in replayed.items():
+            self._journal_keys.add(key)
+            if chat is None:
+                self._forget(key)
+            else:
+                self._chats[key] = chat
+                self._persisted[key] = _persisted_state(chat)
+
+    def _load(self, key: str) -> Optional[Chat]:
+        chat = self._chats.get(key)
+        if chat is not None:
+            if key in self._clean:
+                self._clean.move_to_end(key)
+            return chat
+        chat = self._read_snapshot(key)
+        if chat is None:
+            return None
+        self._chats[key] = chat
+        self._persisted[key] = _persisted_state(chat)
+        self._clean[key] = None
+        self._evict()
+        return chat
+
+    def _read_snapshot(self, key: str) -> Optional[Chat]:
+        return _read_snapshot_chat(self._snapshot, self._snapshot_index, key)
+
+    def _forget(self, key: str):
+        self._chats.pop(key, None)
+        self._persisted.pop(key, None)
+        self._clean.pop(key, None)
+        self._snapshot_index.pop(key, None)
+
+    def _evict(self):
+        """読み込み済みのチャットが上限を超えたら、スナップショットから読み直せるものを古い順に破棄する。"""
+        if self._max_loaded_chats <= 0:
+            return
+        while len(self._chats) > self._max_loaded_chats and self._clean:
+            key, _ = self._clean.popitem(last=False)
+            self._chats.pop(key)
+            self._persisted.pop(key)
+
+    # --- 書き込み ---
+
+    def _check_open(self):
+        # 停止した書き込みスレッドのキューに入れると、書き込まれずに失われる（flush は戻らなくなる）
+        if self._closing:
+            raise RuntimeError("The chat repository is closed")
+
+    def _write(self, chat: Chat):
+        key = chat.get_id().value()
+        state = self._persisted.get(key)
+        if state is None and key in self._snapshot_index:
+            # 破棄したチャットを、破棄前に取得した呼び出し元が更新した場合は、スナップショットの内容との差分を書く
+            persisted = self._read_snapshot(key)
+            if persisted is not None:
+                state = _persisted_state(persisted)
+        lines: list[str] = []
+        title = chat.get_title().value()
+        updated_at = chat.get_updated_at().value()
+        if state is None or state.title != title or state.updated_at != updated_at:
+            lines.append(_dumps({
+                "op": "chat",
+                "id": key,
+                "title": title,
+                "created_at": chat.get_created_at().value().isoformat(),
+                "updated_at": updated_at.isoformat(),
+            }))
+
+        # 永続化済みの件数より後ろのステップだけを追記する
+        start = state.step_count if state is not None else 0
+        for step in chat.get_steps_since(start):
+            lines.append(_dumps({
+                "op": "step",
+                "chat_id": key,
+                "id": step.get_id().value(),
+                "question": step.get_question().value(),
+                "answer": step.get_answer().value(),
+                "created_at": step.get_created_at().value().isoformat(),
+            }))
+
+        # 会話の要約は更新されたときだけ書く（要約はステップより短く、更新も数ステップに 1 回）
+        summarized_step_count = chat.summarized_step_count()
+        if summarized_step_count > 0 and (state is None or state.summarized_step_count != summarized_step_count):
+            lines.append(_dumps({"op": "summary", "id": key, "summary": chat.get_summary(), "steps": summarized_step_count}))
+
+        if lines:
+            self._enqueue(lines)
+            self._journal_keys.add(key)
+            self._clean.pop(key, None)
+        elif key not in self._chats and key not in self._journal_keys and key not in self._compacting_keys:
+            self._clean[key] = None
+        self._chats[key] = chat
+        self._persisted[key] = _PersistedState(chat.step_count(), title, updated_at, summarized_step_count)
+        self._evict()
+
+    def _journaled(self, key: str) -> bool:
+        """ジャーナル（journal.old を含む）に記録のあるチャットか。"""
+        return key in self._journal_keys or key in self._compacting_keys
+
+    def _rewrite(self, chat: Chat):
+        """ジャーナル上の記録より後に適用されるよう、削除してからジャーナルに書き直す。"""
+        key = chat.get_id().value()
+        self._enqueue([_dumps({"op": "delete", "id": key})])
+        self._forget(key)
+        self._write(chat)
+        self._rotate_if_needed()
+
+    def _enqueue(self, lines: list[str]):
+        # 1 ターン分の書き込みは 1 つの要素にまとめる
+        self._queue.put("\n".join(lines) + "\n")
+        self._journal_records += len(lines)
+
+    def _rotate_if_needed(self):
+        if self._snapshot_interval <= 0 or self._journal_records < self._snapshot_interval or self._compacting or self._closing:
+            return
+        # 書き込みキュー上のこの位置でジャーナルを切り替える。ここまでに記録したチャットは journal.old に入る
+        self._queue.put(_Rotation(self._generation + 1))
+        self._compacting = True
+        self._compacting_keys = self._journal_keys
+        self._journal_keys = set()
+        self._journal_records = 0
+
+    def _run_writer(self):
+        while True:
+            items = [self._queue.get()]
+            while not self._queue.empty():
+                items.append(self._queue.get())
+            chunks: list[str] = []
+            for item in items:
+                if isinstance(item, str):
+                    chunks.append(item)
+                    continue
+                self._write_journal(chunks)
+                chunks = []
+                if item is None:
+                    return
+                if isinstance(item, threading.Event):
+                    item.set()
+                else:
+                    self._rotate_journal(item.generation)
+                    self._compaction = threading.Thread(target=self._compact, args=(item.generation,), name="chat-compaction", daemon=True)
+                    self._compaction.start()
+            self._write_journal(chunks)
+
+    def _write_journal(self, chunks: list[str]):
+        if not chunks:
+            return
+        try:
+            self._journal.write("".join(chunks))
+            self._journal.flush()
+            if self._fsync:
+                os.fsync(self._journal.fileno())
+        except OSError:
+            logger.exception("Failed to append to the chat journal")
+
+    def _rotate_journal(self, generation: int):
+        """ジャーナルを journal.old に切り替え、新しい世代のジャーナルを作る。"""
+        self._journal.close()
+        os.replace(self._journal_path(), self._rotated_journal_path())
+        self._journal = open(self._journal_path(), "w", encoding="utf-8")
+        self._write_journal([f"{JOURNAL_HEADER}{generation}\n"])
+
+    def _compact(self, generation: int):
+        delay = COMPACTION_RETRY_SECONDS
+        while True:
+            try:
+                self._merge_rotated_journal(generation)
+                return
+            except Exception:
+                # journal.old は残るため、待ってから反映し直す（それまでジャーナルは切り替えず、
+                # journal.old に記録のあるチャットも破棄しない）。停止する場合は次の起動時に反映する
+                logger.exception("Failed to compact the chat journal; retrying in %g seconds", delay)
+            if self._closed.wait(delay):
+                return
+            delay = min(delay * 2, COMPACTION_RETRY_MAX_SECONDS)
+
+    def _merge_rotated_journal(self, generation: int):
+        """旧スナップショットに journal.old を反映した、新しい世代のスナップショットを書き出して切り替える。"""
+        with self._snapshot_lock:
+            with self._lock:
+                old_snapshot = self._snapshot
+                old_index = dict(self._snapshot_index)
+
+            # journal.old に記録のあるチャットだけを復元して記録を適用し、それ以外は旧スナップショットの行をそのまま複製する
+            touched: dict[str, Optional[Chat]] = {}
+            for record in _read_journal(self._rotated_journal_path()):
+                _apply_record(touched, record, lambda key: _read_snapshot_chat(old_snapshot, old_index, key))
+
+            tmp_path = self._snapshot_path() + ".tmp"
+            index: dict[str, tuple[int, int]] = {}
+            with open(tmp_path, "wb") as f:
+                f.write(f"{SNAPSHOT_HEADER}{generation}\n".encode("utf-8"))
+                if old_snapshot is not None:
+                    for key, (start, end) in old_index.items():
+                        if key in touched:
+                            continue
+                        offset = f.tell()
+                        f.write(old_snapshot[start:end + 1])
+                        index[key] = (offset, offset + end - start)
+                for key, chat in touched.items():
+                    if chat is None:
+                        continue
+                    line = key.encode("utf-8") + b"\t" + _dumps(_chat_to_record(chat)).encode("utf-8")
+                    offset = f.tell()
+                    f.write(line + b"\n")
+                    index[key] = (offset, offset + len(line))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._snapshot_path())
+            # 次の切り替えで journal.old を作り直す前に消す
+            os.remove(self._rotated_journal_path())
+            with open(self._snapshot_path(), "rb") as f:
+                snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            with self._lock:
+                self._snapshot = snapshot
+                self._generation = generation
+                # 切り替え後に削除したチャットは索引に戻さない
+                self._snapshot_index = {key: position for key, position in index.items() if key in self._chats or key not in self._journal_keys}
+                for key in self._compacting_keys:
+                    if key in self._chats and key not in self._journal_keys:
+                        self._clean[key] = None
+                self._compacting = False
+                self._compacting_keys = set()
+                self._evict()
+                self._rotate_if_needed()
+            if old_snapshot is not None:
+                old_snapshot.close()
+
+    def _append_snapshot(self, chats: list[Chat]):
+        """スナップショットの末尾にチャットの行を追記する。同じ ID の行があった場合は、後の行が有効になる。
+
+        ファイルへの書き込みは _lock を取らずに行い（読み込みは追記前の mmap の範囲だけを参照する）、
+        書き終えてから _lock を取って mmap と索引を切り替える。
+        """
+        path = self._snapshot_path()
+        with open(path, "ab") as f:
+            if self._snapshot is None:
+                f.truncate(0)
+                f.write(f"{SNAPSHOT_HEADER}{self._generation}\n".encode("utf-8"))
+            else:
+                # 追記の途中で停止して残った不完全な行は切り詰める
+                f.truncate(self._snapshot.rfind(b"\n") + 1)
+            offset = f.seek(0, os.SEEK_END)
+            positions: dict[str, tuple[int, int]] = {}
+            lines: list[bytes] = []
+            for chat in chats:
+                key = chat.get_id().value()
+                line = key.encode("utf-8") + b"\t" + _dumps(_chat_to_record(chat)).encode("utf-8")
+                positions[key] = (offset, offset + len(line))
+                lines.append(line)
+                offset += len(line) + 1
+            f.write(b"\n".join(lines) + b"\n")
+            f.flush()
+            if self._fsync:
+                os.fsync(f.fileno())
+
+        with open(path, "rb") as f:
+            snapshot = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with self._lock:
+            old_snapshot = self._snapshot
+            self._snapshot = snapshot
+            for chat in chats:
+                key = chat.get_id().value()
+                if self._journaled(key):
+                    # 書き込み中にジャーナルへ記録された場合は、追記した行より後に適用されるジャーナルに書き直す
+                    self._rewrite(chat)
+                    continue
+                # 読み込み済みだった場合は、置き換えたチャットを次に参照されたときに読み込み直す
+                self._chats.pop(key, None)
+                self._persisted.pop(key, None)
+                self._clean.pop(key, None)
+                self._snapshot_index[key] = positions[key]
+        if old_snapshot is not None:
+            old_snapshot.close()
+
+def _index_snapshot(snapshot: mmap.mmap, position: int) -> dict[str, tuple[int, int]]:
+    """各行の先頭の ID だけを読み、JSON を解析せずに索引を作る。"""
+    index: dict[str, tuple[int, int]] = {}
+    size = len(snapshot)
+    while position < size:
+        end = snapshot.find(b"\n", position)
+        if end == -1:
+            break
+        separator = snapshot.find(b"\t", position, end)
+        index[snapshot[position:separator].decode("ascii")] = (position, end)
+        position = end + 1
+    return index
+
+def _read_snapshot_chat(snapshot: Optional[mmap.mmap], index: dict[str, tuple[int, int]], key: str) -> Optional[Chat]:
+    position = index.get(key)
+    if position is None or snapshot is None:
+        return None
+    start, end = position
+    return _chat_from_record(key, json.loads(snapshot[start + len(key) + 1:end]))
+
+def _read_journal(path: str) -> Iterator[dict[str, Any]]:
+    """ジャーナルの記録を順に返す。書き込み途中で停止した末尾の行は読み飛ばす。"""
+    with open(path, "rb") as f:
+        f.readline()
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                record = json.loads(line)
+            except ValueError:
+                return
+            yield record
+
+def _apply_record(chats: dict[str, Optional[Chat]], record: dict[str, Any], read: Callable[[str], Optional[Chat]]):
+    """ジャーナルの記録を chats（チャット ID → チャット。削除した場合は None）に適用する。
+
+    chats に無いチャットは read でスナップショットから読み込む。
+    """
+    op = record["op"]
+    key = record["chat_id"] if op == "step" else record["id"]
+    if op == "delete":
+        chats[key] = None
+        return
+    chat = chats[key] if key in chats else read(key)
+    chats[key] = chat
+    if op == "chat":
+        title = restore_title(record["title"])
+        updated_at = create_time(datetime.fromisoformat(record["updated_at"]))
+        if chat is None:
+            chats[key] = create_chat(restore_id(key), title, [], create_time(datetime.fromisoformat(record["created_at"])), updated_at)
+        else:
+            chat.update_title(title)
+            chat.update_updated_at(updated_at)
+    elif chat is None:
+        return
+    elif op == "step":
+        chat.add_step(_step_from_record(chat.get_id(), record))
+    elif op == "summary":
+        chat.update_summary(record["summary"], record["steps"])
+
+def _persisted_state(chat: Chat) -> _PersistedState:
+    return _PersistedState(chat.step_count(), chat.get_title().value(), chat.get_updated_at().value(), chat.summarized_step_count())
+
+def _parse_generation(header: str, prefix: str) -> int:
+    if not header.startswith(prefix):
+        raise ValueError(f"Unexpected chat file header: {header!r}")
+    return int(header[len(prefix):].strip())
+
+def _dumps(record: dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+
+def _chat_to_record(chat: Chat) -> dict[str, Any]:
+    record: dict[str, Any] = {
+        "title": chat.get_title().value(),
+        "created_at": chat.get_created_at().value().isoformat(),
+        "updated_at": chat.get_updated_at().value().isoformat(),
+        "steps": [[id, question, answer, created_at.isoformat()] for id, question, answer, created_at in chat.step_values()],
+    }
+    if chat.summarized_step_count() > 0:
+        record["summary"] = [chat.get_summary(), chat.summarized_step_count()]
+    return record
+
+def _chat_from_record(key: str, record: dict[str, Any]) -> Chat:
+    # 保存時に検証済みのため、値オブジェクトを作らずに列のまま復元する
+    steps = record["steps"]
+    summary, summarized_step_count = record.get("summary") or ("", 0)
+    return restore_chat(
+        restore_id(key),
+        restore_title(record["title"]),
+        create_time(datetime.fromisoformat(record["created_at"])),
+        create_time(datetime.fromisoformat(record["updated_at"])),
+        [step[0] for step in steps],
+        [step[1] for step in steps],
+        [step[2] for step in steps],
+        [datetime.fromisoformat(step[3]) for step in steps],
+        summary,
+        summarized_step_count,
+    )
+
+def _step_from_record(chat_id: Id, record: dict[str, Any]):
+    return create_step(
+        restore_id(record["id"]),
+        chat_id,
+        restore_question(record["question"]),
+        create_answer(record["answer"]),
+        create_time(datetime.fromisoformat(record["created_at"])),
+    )
+
+def create_file_chat_repository(path: str, snapshot_interval: int = 10000, fsync: bool = False, max_loaded_chats: int = 10000) -> ChatRepositoryFileImpl:
+    return ChatRepositoryFileImpl(path, snapshot_interval, fsync, max_loaded_chats)
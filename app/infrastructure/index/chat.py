@@ -0,0 +1,397 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from datetime import datetime
+from typing import Iterator, Optional
+
+from app.domain.chat.entity.chat import Chat
+from app.domain.chat.repository.chat import ChatRepository
+from app.domain.shared.value_object.id import Id, restore_id
+from app.usecase.ports.output.chat.index import ChatIndex, ChatIndexNotReadyError, ChatSummary, ChatSummaryPage, ChatSearchHit, ChatSearchPage, InvalidCursorError, InvalidQueryError
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+
+# 検索結果の抜粋に含める、一致箇所の前後の文字数
+SNIPPET_CHARS = 30
+
+# 候補が全体のこの割合を超える場合は、候補を並べ替えずに更新日時順の索引を先頭から走査する
+_SCAN_RATIO = 0.125
+
+_RUN = re.compile(r"\w+")
+
+# 更新日時順の索引のキー（更新日時のマイクロ秒, チャット ID）
+_OrderKey = tuple[int, str]
+
+class _Doc:
+    """索引に登録したチャットの一覧表示用の情報と、索引済みの範囲。"""
+
+    __slots__ = ("chat_id", "title", "updated_at", "step_count", "key", "indexed_steps", "indexed_title")
+
+    def __init__(self, chat_id: str, key: _OrderKey):
+        self.chat_id = chat_id
+        self.key = key
+        self.title = ""
+        self.updated_at = datetime.min
+        self.step_count = 0
+        self.indexed_steps = 0
+        self.indexed_title = ""
+
+class _Postings:
+    """語を含むチャットの番号の列。追加時は重複を許して末尾に足し、一定量ごとに重複と削除済みを取り除く。"""
+
+    __slots__ = ("ordinals", "compacted")
+
+    def __init__(self):
+        self.ordinals = array("I")
+        self.compacted = 0
+
+class IndexedChatRepository(ChatRepository, ChatIndex):
+    """チャットリポジトリの前段に置き、保存のたびに一覧用・検索用の索引を更新する。
+
+    - 一覧: (更新日時, チャット ID) の昇順に並べたリストを二分探索で更新し、カーソルの位置から新しい順に返す
+    - 検索: タイトル・質問・回答を正規化（NFKC・casefold）し、文字の 1-gram と 2-gram からチャットへの転置索引を作る。
+      保存のたびに、前回の索引以降に追加されたステップとタイトルの変更だけを索引に加える。
+      検索語の 2-gram（1 文字だけの語は 1-gram）をすべて含むチャットを候補とし、新しい順に本文を確認して
+      一致したものを返す。文字・数字を含まない検索語は索引を使えないため受け付けない（InvalidQueryError）
+
+    リポジトリ側で破棄されたチャット（インメモリの LRU・TTL など）は、一覧・検索で見つかった時点で索引から取り除く。
+    確認には peek・exists を使い、リポジトリの LRU の順序や有効期限、読み込み済みのチャットに影響しないようにする。
+
+    保存済みのチャットの索引は、起動後のウォームアップで build を呼んで作る。作り終えるまでの一覧・検索は
+    ChatIndexNotReadyError を送出する（その間に保存されたチャットは保存時に索引に加える）。
+    """
+
+    def __init__(self, repository: ChatRepository, metrics: Metrics):
+        self._repository = repository
+        self._lock = threading.Lock()
+        self._order: list[_OrderKey] = []
+        # チャットの番号 → 索引の情報（削除済みの場合は None）
+        self._docs: list[Optional[_Doc]] = []
+        self._ordinals: dict[str, int] = {}
+        self._postings: dict[str, _Postings] = {}
+        seconds = metrics.histogram("chat_index_query_seconds", "Duration of chat listing and search queries.", ["operation"])
+        self._list_seconds = seconds.labels("list")
+        self._search_seconds = seconds.labels("search")
+        self._build_seconds = metrics.gauge("chat_index_build_seconds", "Seconds spent indexing the stored chats at startup.")
+        self._ready = False
+
+    def build(self):
+        """保存済みのチャットをすべて索引に加える。時間がかかるため、起動後に別スレッドで呼ぶ。"""
+        started = time.perf_counter()
+        for chat in self._repository.iter_all():
+            # 索引の作成中に保存されたチャットは、読み出した内容より新しいため上書きしない
+            self._index(chat, if_absent=True)
+        self._ready = True
+        self._build_seconds.set(time.perf_counter() - started)
+
+    def is_ready(self) -> bool:
+        return self._ready
+
+    # --- ChatRepository ---
+
+    def create(self, chat: Chat) -> Chat:
+        result = self._repository.create(chat)
+        self._index(chat)
+        return result
+
+    def update(self, chat: Chat) -> Chat:
+        result = self._repository.update(chat)
+        self._index(chat)
+        return result
+
+    def delete(self, id: Id) -> None:
+        self._repository.delete(id)
+        with self._lock:
+            self._unindex(id.value())
+
+    def find_by_id(self, id: Id) -> Optional[Chat]:
+        return self._repository.find_by_id(id)
+
+    def exists(self, id: Id) -> bool:
+        return self._repository.exists(id)
+
+    def peek(self, id: Id) -> Optional[Chat]:
+        return self._repository.peek(id)
+
+    def find_all(self) -> list[Chat]:
+        return self._repository.find_all()
+
+    def iter_all(self) -> Iterator[Chat]:
+        return self._repository.iter_all()
+
+    def create_many(self, chats: list[Chat]) -> None:
+        self._repository.create_many(chats)
+        for chat in chats:
+            # 取り込んだ内容は既存のものと異なりうるため、差分ではなく索引し直す
+            with self._lock:
+                self._unindex(chat.get_id().value())
+            self._index(chat)
+
+    # --- ChatIndex ---
+
+    def list_recent(self, limit: int, cursor: Optional[str]) -> ChatSummaryPage:
+        self._check_ready()
+        started = time.perf_counter()
+        before = _parse_cursor(cursor)
+        items: list[ChatSummary] = []
+        last: Optional[_OrderKey] = None
+        for key, doc in self._newest_first(before):
+            if self._evicted(doc):
+                continue
+            items.append(_summary(doc))
+            last = key
+            if len(items) == limit:
+                break
+        self._list_seconds.observe(time.perf_counter() - started)
+        return ChatSummaryPage(items, self._next_cursor(last, len(items) == limit))
+
+    def search(self, query: str, limit: int, cursor: Optional[str]) -> ChatSearchPage:
+        self._check_ready()
+        started = time.perf_counter()
+        before = _parse_cursor(cursor)
+        words = [_normalize(word) for word in query.split()]
+        terms: set[str] = set()
+        for word in words:
+            terms |= _query_terms(word)
+        if not terms:
+            raise InvalidQueryError("Query must contain a letter or a digit")
+
+        hits: list[ChatSearchHit] = []
+        last: Optional[_OrderKey] = None
+        for key, doc in self._candidates(terms, before):
+            chat = self._repository.peek(restore_id(doc.chat_id))
+            if chat is None:
+                with self._lock:
+                    self._unindex(doc.chat_id)
+                continue
+            # 2-gram の候補には語が連続していないものや古いタイトルで一致したものも含まれるため、本文で確認する
+            hit = _match(chat, words, _summary(doc))
+            if hit is None:
+                continue
+            hits.append(hit)
+            last = key
+            if len(hits) == limit:
+                break
+        self._search_seconds.observe(time.perf_counter() - started)
+        return ChatSearchPage(hits, self._next_cursor(last, len(hits) == limit))
+
+    def _check_ready(self):
+        if not self._ready:
+            raise ChatIndexNotReadyError("Chat index is still being built")
+
+    # --- 索引の更新 ---
+
+    def _index(self, chat: Chat, if_absent: bool = False):
+        chat_id = chat.get_id().value()
+        title = chat.get_title().value()
+        updated_at = chat.get_updated_at().value()
+        key = (_micros(updated_at), chat_id)
+        step_count = chat.step_count()
+
+        with self._lock:
+            ordinal = self._ordinals.get(chat_id)
+            doc = self._docs[ordinal] if ordinal is not None else None
+            if doc is not None and if_absent:
+                return
+            if doc is not None and step_count < doc.indexed_steps:
+                # ステップの減った別の内容で置き換えられた場合は索引し直す
+                self._unindex(chat_id)
+                doc = None
+            if doc is None:
+                ordinal = len(self._docs)
+                doc = _Doc(chat_id, key)
+                self._docs.append(doc)
+                self._ordinals[chat_id] = ordinal
+                bisect.insort(self._order, key)
+            elif doc.key != key:
+                self._order.pop(bisect.bisect_left(self._order, doc.key))
+                bisect.insort(self._order, key)
+                doc.key = key
+            start = doc.indexed_steps
+            title_changed = title != doc.indexed_title
+            doc.title = title
+            doc.updated_at = updated_at
+            doc.step_count = step_count
+            doc.indexed_steps = step_count
+            doc.indexed_title = title
+        assert ordinal is not None
+
+        # 語の抽出はロックの外で行う
+        texts = [title] if title_changed else []
+        for step in chat.get_steps_since(start):
+            texts.append(step.get_question().value())
+            texts.append(step.get_answer().value())
+        if not texts:
+            return
+        terms = _terms(_normalize("\n".join(texts)))
+
+        with self._lock:
+            if self._ordinals.get(chat_id) != ordinal:
+                return
+            for term in terms:
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = _Postings()
+                postings.ordinals.append(ordinal)
+                if len(postings.ordinals) > 2 * postings.compacted + 64:
+                    self._compact(term, postings)
+
+    def _unindex(self, chat_id: str):
+        # 転置索引からは取り除かず、番号を削除済みにしておく（次のコンパクションで取り除かれる）
+        ordinal = self._ordinals.pop(chat_id, None)
+        if ordinal is None:
+            return
+        doc = self._docs[ordinal]
+        self._docs[ordinal] = None
+        if doc is not None:
+            self._order.pop(bisect.bisect_left(self._order, doc.key))
+
+    def _compact(self, term: str, postings: _Postings):
+        docs = self._docs
+        live = sorted({ordinal for ordinal in postings.ordinals if docs[ordinal] is not None})
+        if not live:
+            del self._postings[term]
+            return
+        postings.ordinals = array("I", live)
+        postings.compacted = len(live)
+
+    # --- 索引の参照 ---
+
+    def _newest_first(self, before: Optional[_OrderKey]) -> Iterator[tuple[_OrderKey, _Doc]]:
+        """before より古いチャットを新しい順に返す。ロックを長く持たないよう、少しずつ取り出す。"""
+        batch_size = 64
+        while True:
+            with self._lock:
+                end = bisect.bisect_left(self._order, before) if before is not None else len(self._order)
+                keys = self._order[max(0, end - batch_size):end]
+                docs = [self._docs[self._ordinals[chat_id]] for _, chat_id in keys]
+            if not keys:
+                return
+            for key, doc in zip(reversed(keys), reversed(docs)):
+                if doc is not None:
+                    yield key, doc
+            before = keys[0]
+            batch_size = min(batch_size * 4, 4096)
+
+    def _candidates(self, terms: set[str], before: Optional[_OrderKey]) -> Iterator[tuple[_OrderKey, _Doc]]:
+        """検索語の語をすべて含むチャットを、新しい順に返す。"""
+        with self._lock:
+            ordinals = self._intersect(terms)
+            sorted_candidates: Optional[list[tuple[_OrderKey, _Doc]]] = None
+            if len(ordinals) <= len(self._order) * _SCAN_RATIO:
+                docs = [doc for doc in (self._docs[ordinal] for ordinal in ordinals) if doc is not None and (before is None or doc.key < before)]
+                docs.sort(key=lambda doc: doc.key, reverse=True)
+                sorted_candidates = [(doc.key, doc) for doc in docs]
+        if sorted_candidates is not None:
+            yield from sorted_candidates
+            return
+        for key, doc in self._newest_first(before):
+            if self._ordinals.get(doc.chat_id) in ordinals:
+                yield key, doc
+
+    def _intersect(self, terms: set[str]) -> set[int]:
+        lists: list[array[int]] = []
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                return set()
+            lists.append(postings.ordinals)
+        lists.sort(key=len)
+        ordinals = set(lists[0])
+        for other in lists[1:]:
+            ordinals.intersection_update(other)
+            if not ordinals:
+                break
+        return ordinals
+
+    def _evicted(self, doc: _Doc) -> bool:
+        if self._repository.exists(restore_id(doc.chat_id)):
+            return False
+        with self._lock:
+            self._unindex(doc.chat_id)
+        return True
+
+    def _next_cursor(self, last: Optional[_OrderKey], full: bool) -> Optional[str]:
+        if last is None or not full:
+            return None
+        with self._lock:
+            if bisect.bisect_left(self._order, last) == 0:
+                return None
+        return _format_cursor(last)
+
+def _normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold()
+
+def _terms(normalized: str) -> set[str]:
+    """正規化したテキストの 1-gram と 2-gram を返す。"""
+    terms: set[str] = set()
+    for run in _RUN.findall(normalized):
+        terms.update(run)
+        terms.update([run[i:i + 2] for i in range(len(run) - 1)])
+    return terms
+
+def _query_terms(word: str) -> set[str]:
+    # 1 文字だけの部分は 1-gram で、それ以外は（候補を絞り込める）2-gram で引く
+    terms: set[str] = set()
+    for run in _RUN.findall(word):
+        if len(run) == 1:
+            terms.add(run)
+        else:
+            terms.update([run[i:i + 2] for i in range(len(run) - 1)])
+    return terms
+
+def _match(chat: Chat, words: list[str], summary: ChatSummary) -> Optional[ChatSearchHit]:
+    """すべての語がチャットのどこかに含まれていれば、最初に見つかった箇所を返す。"""
+    remaining = set(words)
+    hit: Optional[ChatSearchHit] = None
+    for field, step_id, text in _fields(chat):
+        normalized = _normalize(text)
+        found = [word for word in remaining if word in normalized]
+        if not found:
+            continue
+        if hit is None:
+            hit = ChatSearchHit(summary, field, _snippet(text, normalized, found[0]), step_id)
+        remaining.difference_update(found)
+        if not remaining:
+            return hit
+    return None
+
+def _fields(chat: Chat) -> Iterator[tuple[str, Optional[str], str]]:
+    yield "title", None, chat.get_title().value()
+    for step in chat.get_steps():
+        step_id = step.get_id().value()
+        yield "question", step_id, step.get_question().value()
+        yield "answer", step_id, step.get_answer().value()
+
+def _snippet(text: str, normalized: str, word: str) -> str:
+    # 正規化で長さが変わらない場合は元のテキストから、変わる場合は正規化後のテキストから切り出す
+    source = text if len(text) == len(normalized) else normalized
+    position = normalized.find(word)
+    start = max(0, position - SNIPPET_CHARS)
+    end = min(len(source), position + len(word) + SNIPPET_CHARS)
+    return ("…" if start > 0 else "") + source[start:end] + ("…" if end < len(source) else "")
+
+def _summary(doc: _Doc) -> ChatSummary:
+    return ChatSummary(doc.chat_id, doc.title, doc.updated_at, doc.step_count)
+
+def _micros(value: datetime) -> int:
+    return round(value.timestamp() * 1_000_000)
+
+def _format_cursor(key: _OrderKey) -> str:
+    return f"{key[0]}_{key[1]}"
+
+def _parse_cursor(cursor: Optional[str]) -> Optional[_OrderKey]:
+    if not cursor:
+        return None
+    micros, separator, chat_id = cursor.partition("_")
+    if not separator or not chat_id:
+        raise InvalidCursorError("Invalid cursor")
+    try:
+        return int(micros), chat_id
+    except ValueError:
+        raise InvalidCursorError("Invalid cursor")
+
+def create_indexed_chat_repository(repository: ChatRepository, metrics: Metrics = NULL_METRICS) -> IndexedChatRepository:
+    return IndexedChatRepository(repository, metrics)
@@ -1,31 +1,184 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
 from app.domain.chat.repository.chat import ChatRepository
 from app.domain.chat.entity.chat import Chat
 from app.domain.shared.value_object.id import Id
 
-class ChatRepositoryMemoryImpl(ChatRepository):
+# ステップ 1 件が質問・回答の文字列以外に占めるおおよそのバイト数
+# （Chat の各列の要素・ステップ ID の文字列・作成日時。benchmark/domain_objects.py で計測）
+_STEP_OVERHEAD_BYTES = 160
+
+class _Entry:
+    """格納中のチャットと、エビクション判定用の付随情報。"""
+
+    __slots__ = ("chat", "accessed_at", "step_count", "size")
+
+    def __init__(self, chat: Chat, accessed_at: float):
+        self.chat = chat
+        self.accessed_at = accessed_at
+        # size の計上済みステップ数（更新時は増えた分だけ計上する）
+        self.step_count = 0
+        self.size = 0
+
+class _ChatLock:
+    """チャットごとのロックと、それを使っている（待っている）呼び出しの数。"""
+
+    __slots__ = ("lock", "users")
+
     def __init__(self):
-        self._chats: list[Chat] = []
+        self.lock = threading.Lock()
+        self.users = 0
+
+class ChatRepositoryMemoryImpl(ChatRepository):
+    """チャット ID をキーにした辞書で保持するインメモリリポジトリ。
+
+    - 検索・更新・削除は O(1)
+    - 最終アクセス順（LRU）で並べ、件数・推定メモリ量の上限を超えたら古いものから破棄する
+    - TTL を指定した場合は、一定時間アクセスの無いチャットを破棄する
+
+    辞書の操作はリポジトリ全体のロックで、チャット単位の処理（サイズの計上など）は
+    チャットごとのロックで保護するため、複数の接続から同時に呼び出しても安全。
+    """
+
+    def __init__(self, max_chats: int = 0, max_bytes: int = 0, ttl_seconds: float = 0):
+        self._chats: OrderedDict[str, _Entry] = OrderedDict()
+        # 使っている呼び出しのあるチャットのロックだけを保持する（最後の呼び出しが外す）
+        self._chat_locks: dict[str, _ChatLock] = {}
+        self._lock = threading.Lock()
+        self._max_chats = max_chats
+        self._max_bytes = max_bytes
+        self._ttl_seconds = ttl_seconds
+        self._total_bytes = 0
 
     def create(self, chat: Chat) -> Chat:
-        self._chats.append(chat)
-        return chat
-    
+        return self._put(chat)
+
     def update(self, chat: Chat) -> Chat:
-        self._chats = [chat for chat in self._chats if chat.get_id() != chat.get_id()]
-        self._chats.append(chat)
-        return chat
-    
+        return self._put(chat)
+
     def delete(self, id: Id) -> None:
-        self._chats = [chat for chat in self._chats if chat.get_id() != id]
-    
-    def find_by_id(self, id: Id) -> Chat:
-        chat = next((chat for chat in self._chats if chat.get_id() == id), None)
-        if chat is None:
-            raise ValueError(f"Chat with id {id} not found")
-        return chat
-    
+        key = id.value()
+        with self._lock:
+            self._remove(key)
+
+    def find_by_id(self, id: Id) -> Optional[Chat]:
+        key = id.value()
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._chats.get(key)
+            if entry is None:
+                return None
+            entry.accessed_at = now
+            self._chats.move_to_end(key)
+            return entry.chat
+
+    def peek(self, id: Id) -> Optional[Chat]:
+        with self._lock:
+            # 期限切れのものは取り除くが、参照したチャットの最終アクセスは更新しない
+            self._expire(time.monotonic())
+            entry = self._chats.get(id.value())
+            return entry.chat if entry is not None else None
+
     def find_all(self) -> list[Chat]:
-        return self._chats
-    
-def create_chat_repository() -> ChatRepository:
-    return ChatRepositoryMemoryImpl()
\ No newline at end of file
+        # 内部の辞書を公開しないよう、呼び出し時点のスナップショットを返す
+        with self._lock:
+            self._expire(time.monotonic())
+            return [entry.chat for entry in self._chats.values()]
+
+    def iter_all(self) -> Iterator[Chat]:
+        # 書き出しなどで全件をたどっても LRU の順序は変えない
+        with self._lock:
+            self._expire(time.monotonic())
+            keys = list(self._chats)
+        for key in keys:
+            with self._lock:
+                entry = self._chats.get(key)
+            if entry is not None:
+                yield entry.chat
+
+    def _put(self, chat: Chat) -> Chat:
+        key = chat.get_id().value()
+        with self._chat_lock(key):
+            now = time.monotonic()
+            with self._lock:
+                entry = self._chats.get(key)
+                if entry is None or entry.chat is not chat:
+                    # 別インスタンスで置き換える場合はサイズを計上し直す
+                    if entry is not None:
+                        self._total_bytes -= entry.size
+                    entry = _Entry(chat, now)
+                    self._chats[key] = entry
+                else:
+                    entry.accessed_at = now
+                self._chats.move_to_end(key)
+
+            # 追加されたステップ分だけサイズを計上する（辞書全体のロックは持たない）
+            added = _estimate_size(chat, entry.step_count)
+            entry.step_count = chat.step_count()
+
+            with self._lock:
+                entry.size += added
+                if self._chats.get(key) is entry:
+                    self._total_bytes += added
+                self._expire(now)
+                self._evict()
+        return chat
+
+    @contextmanager
+    def _chat_lock(self, key: str) -> Iterator[None]:
+        with self._lock:
+            chat_lock = self._chat_locks.get(key)
+            if chat_lock is None:
+                chat_lock = self._chat_locks[key] = _ChatLock()
+            chat_lock.users += 1
+        try:
+            with chat_lock.lock:
+                yield
+        finally:
+            # 削除・破棄されたチャットでも、他のスレッドが使っている間はロックを外さない
+            with self._lock:
+                chat_lock.users -= 1
+                if chat_lock.users == 0:
+                    del self._chat_locks[key]
+
+    def _remove(self, key: str) -> Optional[_Entry]:
+        entry = self._chats.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry.size
+        return entry
+
+    def _expire(self, now: float):
+        if self._ttl_seconds <= 0:
+            return
+        # LRU 順に並んでいるため、先頭から期限切れのものだけを取り除けばよい
+        while self._chats:
+            key, entry = next(iter(self._chats.items()))
+            if now - entry.accessed_at < self._ttl_seconds:
+                break
+            self._remove(key)
+
+    def _evict(self):
+        while self._chats and (
+            (self._max_chats > 0 and len(self._chats) > self._max_chats)
+            or (self._max_bytes > 0 and self._total_bytes > self._max_bytes)
+        ):
+            # 最後に追加・更新したチャットは残す
+            if len(self._chats) == 1:
+                break
+            self._remove(next(iter(self._chats)))
+
+def _estimate_size(chat: Chat, start: int) -> int:
+    """start 番目以降のステップが占める、おおよそのバイト数を返す。"""
+    size = sys.getsizeof(chat.get_title().value()) if start == 0 else 0
+    for step in chat.get_steps_since(start):
+        size += _STEP_OVERHEAD_BYTES + sys.getsizeof(step.get_question().value()) + sys.getsizeof(step.get_answer().value())
+    return size
+
+def create_chat_repository(max_chats: int = 0, max_bytes: int = 0, ttl_seconds: float = 0) -> ChatRepository:
+    return ChatRepositoryMemoryImpl(max_chats, max_bytes, ttl_seconds)
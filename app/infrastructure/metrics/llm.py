@@ -0,0 +1,82 @@
+import time
+from typing import AsyncIterator, Optional
+
+from app.usecase.ports.output.llm.client import AsyncLLMClient, ChatMessage
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+from app.usecase.ports.output.metrics.metrics import Metrics
+
+class InstrumentedLLMClient(AsyncLLMClient):
+    """上流の LLM 呼び出しの所要時間・最初のチャンクまでの時間・結果を記録する。
+
+    ストリームが途中で取り消された場合は、最後まで生成されたストリームの平均の長さとの差を
+    生成せずに済んだトークン数として記録する。
+    """
+
+    def __init__(self, client: AsyncLLMClient, metrics: Metrics, tokenizer: Tokenizer):
+        self._client = client
+        self._tokenizer = tokenizer
+        # 最後まで生成されたストリームの出力トークン数の合計と件数
+        self._completed_tokens = 0
+        self._completed_streams = 0
+        seconds = metrics.histogram("llm_request_seconds", "Duration of upstream LLM requests.", ["method"])
+        self._generate_seconds = seconds.labels("generate")
+        self._stream_seconds = seconds.labels("stream")
+        self._ttft_seconds = metrics.histogram("llm_ttft_seconds", "Time from an upstream streaming request to its first chunk.")
+        requests = metrics.counter("llm_requests_total", "Upstream LLM requests by method and result.", ["method", "result"])
+        self._requests = {
+            (method, result): requests.labels(method, result)
+            for method in ("generate", "stream")
+            for result in ("ok", "error", "cancelled")
+        }
+        self._tokens_saved = metrics.counter("llm_tokens_saved_total", "Estimated completion tokens not generated because a stream was cancelled.")
+
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        started = time.perf_counter()
+        result = "error"
+        try:
+            response = await self._client.generate_response(question, prompt, chat_history, task)
+            result = "ok"
+            return response
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                result = "cancelled"
+            raise
+        finally:
+            self._generate_seconds.observe(time.perf_counter() - started)
+            self._requests["generate", result].inc()
+
+    async def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        first = True
+        result = "error"
+        chunks: list[str] = []
+        try:
+            async for chunk in self._client.stream_response(question, prompt, chat_history, task):
+                if first:
+                    self._ttft_seconds.observe(time.perf_counter() - started)
+                    first = False
+                chunks.append(chunk)
+                yield chunk
+            result = "ok"
+            self._completed_tokens += self._tokenizer.count("".join(chunks))
+            self._completed_streams += 1
+        except BaseException as e:
+            # 呼び出し側が途中で読むのをやめた場合（GeneratorExit）も取り消しとして扱う
+            if not isinstance(e, Exception):
+                result = "cancelled"
+                self._record_saved(chunks)
+            raise
+        finally:
+            self._stream_seconds.observe(time.perf_counter() - started)
+            self._requests["stream", result].inc()
+
+    def _record_saved(self, chunks: list[str]):
+        if self._completed_streams == 0:
+            return
+        expected = self._completed_tokens / self._completed_streams
+        saved = expected - self._tokenizer.count("".join(chunks))
+        if saved > 0:
+            self._tokens_saved.inc(saved)
+
+def create_instrumented_llm_client(client: AsyncLLMClient, metrics: Metrics, tokenizer: Tokenizer) -> InstrumentedLLMClient:
+    return InstrumentedLLMClient(client, metrics, tokenizer)
@@ -0,0 +1,230 @@
+import bisect
+import math
+import threading
+from typing import Callable, Optional, Sequence, TypeVar
+
+from app.usecase.ports.output.metrics.metrics import Counter, Gauge, Histogram, Metrics, LATENCY_BUCKETS
+
+# Prometheus のテキスト形式の Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+T = TypeVar("T")
+
+class _Value:
+    """カウンター・ゲージの値（ラベルの組み合わせごと）。"""
+
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, amount: float):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+class _Buckets:
+    """ヒストグラムの値（ラベルの組み合わせごと）。バケットごとの件数は累積せずに持つ。"""
+
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class _Family:
+    def __init__(self, name: str, description: str, type: str, label_names: tuple[str, ...]):
+        self.name = name
+        self.description = description
+        self.type = type
+        self.label_names = label_names
+        self._lock = threading.Lock()
+
+    def _child(self, children: dict[tuple[str, ...], T], values: tuple[str, ...], factory: Callable[[], T]) -> T:
+        child = children.get(values)
+        if child is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values}")
+            with self._lock:
+                child = children.setdefault(values, factory())
+        return child
+
+class _CounterFamily(_Family, Counter):
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...]):
+        super().__init__(name, description, "counter", label_names)
+        self.children: dict[tuple[str, ...], _Value] = {}
+
+    def labels(self, *values: str) -> "_CounterChild":
+        return _CounterChild(self._child(self.children, values, _Value))
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._child(self.children, (), _Value).add(amount)
+
+class _CounterChild(Counter):
+    __slots__ = ("_value",)
+
+    def __init__(self, value: _Value):
+        self._value = value
+
+    def labels(self, *values: str) -> Counter:
+        raise ValueError("labels are already bound")
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._value.add(amount)
+
+class _GaugeFamily(_Family, Gauge):
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...]):
+        super().__init__(name, description, "gauge", label_names)
+        self.children: dict[tuple[str, ...], _Value] = {}
+
+    def labels(self, *values: str) -> "_GaugeChild":
+        return _GaugeChild(self._child(self.children, values, _Value))
+
+    def set(self, value: float) -> None:
+        self._child(self.children, (), _Value).set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._child(self.children, (), _Value).add(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._child(self.children, (), _Value).add(-amount)
+
+class _GaugeChild(Gauge):
+    __slots__ = ("_value",)
+
+    def __init__(self, value: _Value):
+        self._value = value
+
+    def labels(self, *values: str) -> Gauge:
+        raise ValueError("labels are already bound")
+
+    def set(self, value: float) -> None:
+        self._value.set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._value.add(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._value.add(-amount)
+
+class _HistogramFamily(_Family, Histogram):
+    def __init__(self, name: str, description: str, label_names: tuple[str, ...], buckets: tuple[float, ...]):
+        super().__init__(name, description, "histogram", label_names)
+        self.buckets = buckets
+        self.children: dict[tuple[str, ...], _Buckets] = {}
+
+    def labels(self, *values: str) -> "_HistogramChild":
+        return _HistogramChild(self._child(self.children, values, self._new_buckets))
+
+    def observe(self, value: float) -> None:
+        self._child(self.children, (), self._new_buckets).observe(value)
+
+    def _new_buckets(self) -> _Buckets:
+        return _Buckets(self.buckets)
+
+class _HistogramChild(Histogram):
+    __slots__ = ("_buckets",)
+
+    def __init__(self, buckets: _Buckets):
+        self._buckets = buckets
+
+    def labels(self, *values: str) -> Histogram:
+        raise ValueError("labels are already bound")
+
+    def observe(self, value: float) -> None:
+        self._buckets.observe(value)
+
+F = TypeVar("F", bound=_Family)
+
+class PrometheusMetrics(Metrics):
+    """計測値をメモリ上に集計し、Prometheus のテキスト形式で出力する。
+
+    ワーカープロセスごとの値を返すため、複数ワーカーの場合は Prometheus 側で集約する。
+    """
+
+    def __init__(self):
+        self._families: dict[str, _Family] = {}
+        self._collectors: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(name, lambda: _CounterFamily(name, description, tuple(label_names)), _CounterFamily)
+
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(name, lambda: _GaugeFamily(name, description, tuple(label_names)), _GaugeFamily)
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Histogram:
+        bounds = tuple(sorted(buckets if buckets is not None else LATENCY_BUCKETS))
+        return self._register(name, lambda: _HistogramFamily(name, description, tuple(label_names), bounds), _HistogramFamily)
+
+    def add_collector(self, collector: Callable[[], None]):
+        """出力の直前に呼ばれる関数を登録する。他のコンポーネントの状態をゲージに反映するのに使う。"""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines: list[str] = []
+        for family in list(self._families.values()):
+            lines.append(f"# HELP {family.name} {_escape_help(family.description)}")
+            lines.append(f"# TYPE {family.name} {family.type}")
+            if isinstance(family, (_CounterFamily, _GaugeFamily)):
+                for values, value in list(family.children.items()):
+                    lines.append(f"{family.name}{_labels(family.label_names, values)} {_number(value.value)}")
+            elif isinstance(family, _HistogramFamily):
+                for values, buckets in list(family.children.items()):
+                    cumulative = 0
+                    for bound, count in zip((*buckets.bounds, math.inf), buckets.counts):
+                        cumulative += count
+                        le = _labels((*family.label_names, "le"), (*values, _number(bound)))
+                        lines.append(f"{family.name}_bucket{le} {cumulative}")
+                    label_text = _labels(family.label_names, values)
+                    lines.append(f"{family.name}_sum{label_text} {_number(buckets.sum)}")
+                    lines.append(f"{family.name}_count{label_text} {buckets.count}")
+        lines.append("")
+        return "\n".join(lines)
+
+    def _register(self, name: str, factory: Callable[[], F], type: type[F]) -> F:
+        family = self._families.get(name)
+        if family is None:
+            with self._lock:
+                family = self._families.get(name)
+                if family is None:
+                    family = self._families[name] = factory()
+        if not isinstance(family, type):
+            raise ValueError(f"metric {name} is already registered as a {family.type}")
+        return family
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)) + "}"
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+def create_prometheus_metrics() -> PrometheusMetrics:
+    return PrometheusMetrics()
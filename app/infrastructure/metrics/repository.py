@@ -0,0 +1,74 @@
+import time
+from typing import Iterator, Optional
+
+from app.domain.chat.entity.chat import Chat
+from app.domain.chat.repository.chat import ChatRepository
+from app.domain.shared.value_object.id import Id
+from app.usecase.ports.output.metrics.metrics import Metrics
+
+class InstrumentedChatRepository(ChatRepository):
+    """チャットリポジトリの操作ごとの所要時間を記録する。"""
+
+    def __init__(self, repository: ChatRepository, metrics: Metrics):
+        self._repository = repository
+        seconds = metrics.histogram("chat_repository_operation_seconds", "Duration of chat repository operations.", ["operation"])
+        self._create_seconds = seconds.labels("create")
+        self._update_seconds = seconds.labels("update")
+        self._delete_seconds = seconds.labels("delete")
+        self._find_by_id_seconds = seconds.labels("find_by_id")
+        self._find_all_seconds = seconds.labels("find_all")
+        self._create_many_seconds = seconds.labels("create_many")
+
+    def create(self, chat: Chat) -> Chat:
+        started = time.perf_counter()
+        try:
+            return self._repository.create(chat)
+        finally:
+            self._create_seconds.observe(time.perf_counter() - started)
+
+    def update(self, chat: Chat) -> Chat:
+        started = time.perf_counter()
+        try:
+            return self._repository.update(chat)
+        finally:
+            self._update_seconds.observe(time.perf_counter() - started)
+
+    def delete(self, id: Id) -> None:
+        started = time.perf_counter()
+        try:
+            self._repository.delete(id)
+        finally:
+            self._delete_seconds.observe(time.perf_counter() - started)
+
+    def find_by_id(self, id: Id) -> Optional[Chat]:
+        started = time.perf_counter()
+        try:
+            return self._repository.find_by_id(id)
+        finally:
+            self._find_by_id_seconds.observe(time.perf_counter() - started)
+
+    def exists(self, id: Id) -> bool:
+        return self._repository.exists(id)
+
+    def peek(self, id: Id) -> Optional[Chat]:
+        return self._repository.peek(id)
+
+    def find_all(self) -> list[Chat]:
+        started = time.perf_counter()
+        try:
+            return self._repository.find_all()
+        finally:
+            self._find_all_seconds.observe(time.perf_counter() - started)
+
+    def iter_all(self) -> Iterator[Chat]:
+        return self._repository.iter_all()
+
+    def create_many(self, chats: list[Chat]) -> None:
+        started = time.perf_counter()
+        try:
+            self._repository.create_many(chats)
+        finally:
+            self._create_many_seconds.observe(time.perf_counter() - started)
+
+def create_instrumented_chat_repository(repository: ChatRepository, metrics: Metrics) -> InstrumentedChatRepository:
+    return InstrumentedChatRepository(repository, metrics)
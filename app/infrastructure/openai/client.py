@@ -1,40 +1,207 @@
-from app.usecase.ports.output.llm.client import LLMClient
-from openai import OpenAI
-from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
-from app.infrastructure.config import provide_config
-from typing import Optional
+import asyncio
+import importlib
+import logging
+import time
+import httpx
+from app.usecase.ports.output.llm.client import LLMClient, AsyncLLMClient, ChatMessage
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+from app.infrastructure.openai.routing import LLMRoute, LLMRouter
+from app.infrastructure.openai.transport import LLMHTTPSettings, create_sync_llm_http_client
+from app.infrastructure.scheduler.llm import current_llm_request_scope
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
+
+# openai の SDK は読み込みに時間がかかる（型の定義が多い）ため、最初に使うとき（または prewarm）まで読み込まない
+if TYPE_CHECKING:
+    from openai import OpenAI, AsyncOpenAI
+    from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
+    from openai.types.completion_usage import CompletionUsage
+
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = """
 あなたは、ユーザーの質問に対して、適切な回答を生成するアシスタントです。
 """
 
+def _build_messages(question: str, prompt: str, chat_history: Optional[list[ChatMessage]]) -> "list[ChatCompletionMessageParam]":
+    # システムプロンプトと過去の会話を先頭に固定し、プロンプトキャッシュが効くようにする
+    messages: "list[ChatCompletionMessageParam]" = [{"role": "system", "content": SYSTEM_PROMPT}]
+
+    # チャット履歴がある場合は、user / assistant のメッセージとして追加
+    if chat_history:
+        for message in chat_history:
+            messages.append({"role": message.role, "content": message.content})  # type: ignore
+
+    messages.append({"role": "user", "content": prompt + question})
+    return messages
+
+def _route(router: LLMRouter, task: str) -> tuple[LLMRoute, Optional[str], dict[str, Any]]:
+    """処理に応じたモデル・パラメーターと、使用量を記録するチャットを返す。"""
+    # チャットは LLM 呼び出しの発生元（WebSocket のターン）から取る
+    scope = current_llm_request_scope()
+    chat_id = scope.chat_id if scope is not None else None
+    route = router.route(task, chat_id)
+    # 指定しないパラメーターは渡さない（API の既定値）
+    params: dict[str, Any] = {"model": route.model}
+    if route.max_tokens is not None:
+        params["max_completion_tokens"] = route.max_tokens
+    if route.temperature is not None:
+        params["temperature"] = route.temperature
+    return route, chat_id, params
+
+# トークン数のヒストグラムのバケット
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536, 131072)
+
+class _UsageRecorder:
+    """レスポンスの usage（プロンプト・出力・キャッシュされたプロンプトのトークン数）を記録する。
+
+    処理・モデルごとの集計とチャットごとの使用量は LLMRouter に渡す。
+    """
+
+    def __init__(self, metrics: Metrics, router: LLMRouter):
+        self._router = router
+        tokens_total = metrics.counter("llm_tokens_total", "Tokens reported by the OpenAI API.", ["type"])
+        tokens = metrics.histogram("llm_tokens", "Tokens per OpenAI request.", ["type"], TOKEN_BUCKETS)
+        self._prompt_total = tokens_total.labels("prompt")
+        self._completion_total = tokens_total.labels("completion")
+        self._cached_total = tokens_total.labels("cached_prompt")
+        self._prompt = tokens.labels("prompt")
+        self._completion = tokens.labels("completion")
+
+    def record(self, usage: "Optional[CompletionUsage]", route: LLMRoute, chat_id: Optional[str]):
+        if usage is None:
+            return
+        self._prompt_total.inc(usage.prompt_tokens)
+        self._completion_total.inc(usage.completion_tokens)
+        self._prompt.observe(usage.prompt_tokens)
+        self._completion.observe(usage.completion_tokens)
+        details = usage.prompt_tokens_details
+        cached_tokens = (details.cached_tokens or 0) if details is not None else 0
+        if cached_tokens:
+            self._cached_total.inc(cached_tokens)
+        self._router.record_usage(route, chat_id, usage.prompt_tokens, usage.completion_tokens, cached_tokens)
+
 class OpenAIClient(LLMClient):
-    def __init__(self):
-        config = provide_config()
-        self.client = OpenAI(api_key=config.openai_api_key)
-
-    def generate_response(self, question: str, prompt: str, chat_history: Optional[str]) -> str:
-        messages: list[ChatCompletionMessageParam] = [{"role": "system", "content": SYSTEM_PROMPT}]
-        
-        # チャット履歴がある場合は、適切な形式でメッセージに追加
-        if chat_history:
-            messages.append({"role": "user", "content": self._parse_chat_history(chat_history)})
-            
-        messages.append({"role": "user", "content": prompt + question})
-        
-        response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=messages  # type: ignore
+    def __init__(self, metrics: Metrics, router: LLMRouter, settings: LLMHTTPSettings, api_key: str, base_url: Optional[str]):
+        self.client: "Optional[OpenAI]" = None
+        self.router = router
+        self.usage = _UsageRecorder(metrics, router)
+        self._settings = settings
+        self._api_key = api_key
+        self._base_url = base_url
+
+    def _sdk(self) -> "OpenAI":
+        if self.client is None:
+            from openai import OpenAI
+            self.client = OpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=create_sync_llm_http_client(self._settings),
+                max_retries=self._settings.max_retries,
+            )
+        return self.client
+
+    def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        route, chat_id, params = _route(self.router, task)
+        started = time.perf_counter()
+        response = self._sdk().chat.completions.create(
+            messages=_build_messages(question, prompt, chat_history),  # type: ignore
+            **params,
         )
+        self.router.record_latency(route, time.perf_counter() - started)
+        self.usage.record(response.usage, route, chat_id)
         return response.choices[0].message.content or ""
-    
-    def _parse_chat_history(self, chat_history: str) -> str:
-        print(chat_history)
-        prompt = f"""
-        過去の会話
-        {chat_history}
+
+class AsyncOpenAIClient(AsyncLLMClient):
+    """AsyncOpenAI を用いた非同期版のクライアント。
+
+    http_client はワーカー内で共有する接続プール（create_llm_http_client）。
+    リトライ・ヘッジは http_client のトランスポートで行うため、SDK のリトライは無効にする。
+    SDK は最初の呼び出しまで読み込まない。起動時に prewarm を呼ぶと、SDK の読み込みと
+    上流への接続（DNS・TLS）を済ませておき、最初のリクエストがその時間を待たずに済む。
+    """
+
+    def __init__(self, metrics: Metrics, router: LLMRouter, http_client: httpx.AsyncClient, api_key: str, base_url: Optional[str]):
+        self.client: "Optional[AsyncOpenAI]" = None
+        self.router = router
+        self.usage = _UsageRecorder(metrics, router)
+        self._http_client = http_client
+        self._api_key = api_key
+        self._base_url = base_url
+
+    def _sdk(self) -> "AsyncOpenAI":
+        if self.client is None:
+            from openai import AsyncOpenAI
+            self.client = AsyncOpenAI(
+                api_key=self._api_key,
+                base_url=self._base_url,
+                http_client=self._http_client,
+                timeout=self._http_client.timeout,
+                max_retries=0,
+            )
+        return self.client
+
+    async def prewarm(self, connections: int):
+        """SDK を読み込み、上流へ connections 本の接続を張って接続プールに残しておく。
+
+        接続の確立だけが目的のため、応答（認証エラーなど）は確かめない。
         """
-        return prompt
+        # 読み込みはイベントループを止めないよう別スレッドで行う
+        await asyncio.to_thread(importlib.import_module, "openai")
+        client = self._sdk()
+        url = f"{str(client.base_url).rstrip('/')}/models"
+        headers = {"Authorization": f"Bearer {self._api_key}"}
+
+        async def connect():
+            try:
+                response = await self._http_client.get(url, headers=headers)
+                await response.aclose()
+            except httpx.HTTPError as e:
+                logger.warning("Failed to prewarm a connection to %s: %s", url, e)
+
+        # 同時に送り、それぞれ別の接続を張る
+        await asyncio.gather(*(connect() for _ in range(connections)))
+
+    async def aclose(self):
+        """共有の接続プールを閉じる。"""
+        await self._http_client.aclose()
+
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        route, chat_id, params = _route(self.router, task)
+        started = time.perf_counter()
+        response = await self._sdk().chat.completions.create(
+            messages=_build_messages(question, prompt, chat_history),  # type: ignore
+            **params,
+        )
+        self.router.record_latency(route, time.perf_counter() - started)
+        self.usage.record(response.usage, route, chat_id)
+        return response.choices[0].message.content or ""
+
+    async def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        route, chat_id, params = _route(self.router, task)
+        started = time.perf_counter()
+        stream = await self._sdk().chat.completions.create(
+            messages=_build_messages(question, prompt, chat_history),  # type: ignore
+            stream=True,
+            # 最後のチャンクで usage を受け取る
+            stream_options={"include_usage": True},
+            **params,
+        )
+        first = True
+        # 途中で取り消された場合も、レスポンスを閉じて上流の生成を止める
+        async with stream:
+            async for chunk in stream:
+                self.usage.record(chunk.usage, route, chat_id)
+                if not chunk.choices:
+                    continue
+                content = chunk.choices[0].delta.content
+                if content:
+                    if first:
+                        self.router.record_latency(route, time.perf_counter() - started)
+                        first = False
+                    yield content
+
+def create_openai_client(router: LLMRouter, api_key: str, base_url: Optional[str] = None, settings: Optional[LLMHTTPSettings] = None, metrics: Metrics = NULL_METRICS) -> OpenAIClient:
+    return OpenAIClient(metrics, router, settings or LLMHTTPSettings(), api_key, base_url)
 
-def create_openai_client() -> OpenAIClient:
-    return OpenAIClient()
\ No newline at end of file
+def create_async_openai_client(router: LLMRouter, http_client: httpx.AsyncClient, api_key: str, base_url: Optional[str] = None, metrics: Metrics = NULL_METRICS) -> AsyncOpenAIClient:
+    return AsyncOpenAIClient(metrics, router, http_client, api_key, base_url)
@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from typing import Optional
+
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+
+# 遅延による切り替えを判断するまでに必要な、既定のモデルの計測回数
+_LATENCY_MIN_SAMPLES = 3
+# 遅延の指数移動平均の重み
+_LATENCY_ALPHA = 0.2
+
+@dataclass
+class LLMTaskPolicy:
+    """処理（タイトル生成 / 回答生成）ごとの呼び出し方。"""
+
+    model: str
+    # 出力トークン数の上限（None の場合は指定しない）
+    max_tokens: Optional[int]
+    # None の場合は指定しない（API の既定値）
+    temperature: Optional[float]
+
+@dataclass
+class LLMRoute:
+    """1 回の呼び出しに使う設定。"""
+
+    task: str
+    model: str
+    max_tokens: Optional[int]
+    temperature: Optional[float]
+    # 既定のモデルから切り替えた理由（latency / budget）。切り替えていない場合は None
+    downgraded: Optional[str]
+
+@dataclass
+class LLMTaskUsage:
+    requests: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_prompt_tokens: int = 0
+
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+class LLMTokenLedger:
+    """チャットごと・処理ごとのトークン使用量を記録する（/chats/usage で返し、chat_token_budget の判定に使う）。
+
+    チャットは最近使われた max_chats 件（0 の場合は無制限）だけ保持し、古いものから忘れる。
+    """
+
+    def __init__(self, max_chats: int):
+        self._max_chats = max_chats
+        self._chats: OrderedDict[str, dict[str, LLMTaskUsage]] = OrderedDict()
+        self._totals: dict[str, int] = {}
+
+    def record(self, chat_id: str, task: str, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int):
+        tasks = self._chats.get(chat_id)
+        if tasks is None:
+            tasks = self._chats[chat_id] = {}
+            if self._max_chats > 0 and len(self._chats) > self._max_chats:
+                forgotten, _ = self._chats.popitem(last=False)
+                self._totals.pop(forgotten, None)
+        else:
+            self._chats.move_to_end(chat_id)
+        usage = tasks.get(task)
+        if usage is None:
+            usage = tasks[task] = LLMTaskUsage()
+        usage.requests += 1
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+        usage.cached_prompt_tokens += cached_prompt_tokens
+        self._totals[chat_id] = self._totals.get(chat_id, 0) + prompt_tokens + completion_tokens
+
+    def usage(self, chat_id: str) -> dict[str, LLMTaskUsage]:
+        """処理ごとの使用量を返す（記録の無いチャットは空）。LRU の順序は変えない。"""
+        return {task: replace(usage) for task, usage in self._chats.get(chat_id, {}).items()}
+
+    def total_tokens(self, chat_id: str) -> int:
+        return self._totals.get(chat_id, 0)
+
+    def __len__(self) -> int:
+        return len(self._chats)
+
+class _Latency:
+    """既定のモデルの、最初のトークンまでの時間の指数移動平均と、切り替え中の期限。"""
+
+    def __init__(self):
+        self.average = 0.0
+        self.samples = 0
+        self.downgraded_until = 0.0
+
+class LLMRouter:
+    """処理ごとに使うモデル・最大出力トークン数・temperature を決め、使用量を記録する。
+
+    fallback_model を指定した場合は、以下のときにそのモデル（より速い・安いモデル）へ切り替える。
+    - 既定のモデルの最初のトークンまでの時間（ストリームでない場合は応答までの時間）の平均が
+      latency_threshold_seconds を超えた処理: cooldown_seconds の間切り替え、その後は既定のモデルで測り直す
+    - トークン使用量が chat_token_budget を超えたチャット: 以降のすべての処理
+    """
+
+    def __init__(self, policies: dict[str, LLMTaskPolicy], fallback_model: str, latency_threshold_seconds: float, cooldown_seconds: float, chat_token_budget: int, ledger: LLMTokenLedger, metrics: Metrics):
+        self._policies = policies
+        self._fallback_model = fallback_model
+        self._latency_threshold_seconds = latency_threshold_seconds
+        self._cooldown_seconds = cooldown_seconds
+        self._chat_token_budget = chat_token_budget
+        self.ledger = ledger
+        self._latency = {task: _Latency() for task in policies}
+        self._tokens = metrics.counter("llm_task_tokens_total", "Tokens reported by the OpenAI API by task, model and type.", ["task", "model", "type"])
+        self._downgrades = metrics.counter("llm_downgrades_total", "Requests routed to the fallback model by task and reason.", ["task", "reason"])
+
+    def route(self, task: str, chat_id: Optional[str]) -> LLMRoute:
+        policy = self._policies[task]
+        reason = None
+        if self._fallback_model and self._fallback_model != policy.model:
+            if self._chat_token_budget > 0 and chat_id and self.ledger.total_tokens(chat_id) >= self._chat_token_budget:
+                reason = "budget"
+            elif self._latency_downgraded(task):
+                reason = "latency"
+        if reason is None:
+            return LLMRoute(task, policy.model, policy.max_tokens, policy.temperature, None)
+        self._downgrades.labels(task, reason).inc()
+        return LLMRoute(task, self._fallback_model, policy.max_tokens, policy.temperature, reason)
+
+    def record_latency(self, route: LLMRoute, seconds: float):
+        """最初のトークンまでの時間を記録する。既定のモデルの平均が閾値を超えた場合は切り替える。"""
+        if route.downgraded is not None or self._latency_threshold_seconds <= 0:
+            return
+        latency = self._latency[route.task]
+        latency.average = seconds if latency.samples == 0 else latency.average + _LATENCY_ALPHA * (seconds - latency.average)
+        latency.samples += 1
+        if latency.samples >= _LATENCY_MIN_SAMPLES and latency.average > self._latency_threshold_seconds:
+            latency.downgraded_until = time.monotonic() + self._cooldown_seconds
+
+    def record_usage(self, route: LLMRoute, chat_id: Optional[str], prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int):
+        self._tokens.labels(route.task, route.model, "prompt").inc(prompt_tokens)
+        self._tokens.labels(route.task, route.model, "completion").inc(completion_tokens)
+        if chat_id:
+            self.ledger.record(chat_id, route.task, prompt_tokens, completion_tokens, cached_prompt_tokens)
+
+    def _latency_downgraded(self, task: str) -> bool:
+        latency = self._latency[task]
+        if latency.downgraded_until == 0:
+            return False
+        if time.monotonic() < latency.downgraded_until:
+            return True
+        # 期限が過ぎたら、既定のモデルで測り直す
+        self._latency[task] = _Latency()
+        return False
+
+def create_llm_token_ledger(max_chats: int = 10000) -> LLMTokenLedger:
+    return LLMTokenLedger(max_chats)
+
+def create_llm_router(policies: dict[str, LLMTaskPolicy], fallback_model: str = "", latency_threshold_seconds: float = 0, cooldown_seconds: float = 60, chat_token_budget: int = 0, ledger: Optional[LLMTokenLedger] = None, metrics: Metrics = NULL_METRICS) -> LLMRouter:
+    return LLMRouter(policies, fallback_model, latency_threshold_seconds, cooldown_seconds, chat_token_budget, ledger if ledger is not None else create_llm_token_ledger(), metrics)
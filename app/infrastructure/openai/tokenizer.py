@@ -0,0 +1,62 @@
+import logging
+import threading
+from typing import Any, Optional
+
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+
+# gpt-4o 系のモデルが使うエンコーディング
+ENCODING = "o200k_base"
+
+logger = logging.getLogger(__name__)
+
+class TiktokenTokenizer(Tokenizer):
+    """tiktoken でトークン数を数えるトークナイザ。
+
+    tiktoken は任意の依存関係のため、インストールされていない場合や
+    エンコーディングを読み込めない場合（オフライン環境など）は概算にフォールバックする。
+    エンコーディングの読み込みは重いため、最初に数えるとき（または load を呼んだとき）に行う。
+    """
+
+    def __init__(self, encoding: str = ENCODING):
+        self._name = encoding
+        self._encoding: Optional[Any] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def load(self):
+        """エンコーディングを読み込む。起動時に別スレッドで呼んでおくと、最初のリクエストで待たずに済む。"""
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._encoding = _load_encoding(self._name)
+                self._loaded = True
+
+    def count(self, text: str) -> int:
+        if not self._loaded:
+            self.load()
+        if self._encoding is None:
+            return approximate_token_count(text)
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+def _load_encoding(name: str) -> Optional[Any]:
+    # 読み込みはトークナイザごとに 1 回だけのため、フォールバックの警告も 1 回だけ出る
+    try:
+        import tiktoken  # type: ignore
+    except ImportError:
+        logger.warning("tiktoken is not installed; falling back to approximate token counts (install the 'tokenizer' extra for exact counts)")
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        logger.warning("Failed to load the tiktoken encoding %s (%s); falling back to approximate token counts", name, e)
+        return None
+
+def approximate_token_count(text: str) -> int:
+    """トークナイズせずに、文字の種類と数からトークン数を概算する。"""
+    # ASCII はおおよそ 4 文字で 1 トークン、日本語などの非 ASCII 文字は 1 文字で 1 トークンとみなす
+    ascii_count = len(text.encode("ascii", "ignore"))
+    return (ascii_count + 3) // 4 + (len(text) - ascii_count)
+
+def create_tokenizer() -> TiktokenTokenizer:
+    return TiktokenTokenizer()
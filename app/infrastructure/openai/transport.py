@@ -0,0 +1,280 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+
+logger = logging.getLogger(__name__)
+
+# リトライする応答のステータスコード（レート制限・一時的なサーバーエラー）
+RETRY_STATUS_CODES = frozenset({408, 409, 429, 500, 502, 503, 504})
+# リトライする送信時の例外（応答ヘッダーを受け取る前に失敗したもの）
+_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout, httpx.RemoteProtocolError, httpx.ReadError, httpx.WriteError)
+# ヘッジの待ち時間を決めるのに使う、応答ヘッダーまでの時間の件数（直近の件数と、判断に必要な最小の件数）
+_LATENCY_SAMPLES = 200
+_LATENCY_MIN_SAMPLES = 20
+# リトライの予算を数える期間と、そのうちヘッジに使ってよい割合
+_BUDGET_WINDOW_SECONDS = 10.0
+_HEDGE_BUDGET_SHARE = 0.5
+
+@dataclass
+class LLMHTTPSettings:
+    """OpenAI API との HTTP 接続の設定。"""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_seconds: float = 30
+    # h2 がインストールされている場合のみ有効になる
+    http2: bool = True
+    connect_timeout_seconds: float = 5
+    # 応答ヘッダー・ストリームの各チャンクを待つ時間の上限
+    read_timeout_seconds: float = 60
+    write_timeout_seconds: float = 10
+    pool_timeout_seconds: float = 10
+    max_retries: int = 2
+    retry_backoff_seconds: float = 0.5
+    retry_backoff_max_seconds: float = 8
+    # リトライ・ヘッジは、直近のリクエスト数のこの割合（に加えて毎秒 min_per_second 回）まで
+    retry_budget_ratio: float = 0.2
+    retry_budget_min_per_second: float = 1
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_delay_seconds: float = 1
+
+class RetryBudget:
+    """リトライ（とヘッジ）の回数を、直近のリクエスト数に比例する範囲に抑える。
+
+    上流が障害で全リクエストが失敗する場合に、リトライで負荷を何倍にも増やさないようにする。
+    """
+
+    def __init__(self, ratio: float, min_per_second: float, window_seconds: float = _BUDGET_WINDOW_SECONDS):
+        self._ratio = ratio
+        self._reserve = min_per_second * window_seconds
+        self._window_seconds = window_seconds
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+
+    def deposit(self):
+        """新しいリクエスト（リトライを除く）を記録する。"""
+        now = time.monotonic()
+        self._expire(now)
+        self._requests.append(now)
+
+    def try_spend(self, share: float = 1.0) -> bool:
+        """予算が残っていれば 1 回分を使って True を返す。share は予算のうち使ってよい割合。"""
+        now = time.monotonic()
+        self._expire(now)
+        if len(self._retries) >= share * (self._reserve + self._ratio * len(self._requests)):
+            return False
+        self._retries.append(now)
+        return True
+
+    def _expire(self, now: float):
+        horizon = now - self._window_seconds
+        for events in (self._requests, self._retries):
+            while events and events[0] < horizon:
+                events.popleft()
+
+class _LatencyWindow:
+    """直近の応答ヘッダーまでの時間から、分位点を求める。"""
+
+    def __init__(self, size: int):
+        self._samples: deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self._samples) < _LATENCY_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """リトライとヘッジを行う httpx のトランスポート。
+
+    - 接続エラー・応答ヘッダーまでのタイムアウト・RETRY_STATUS_CODES の応答は、ジッター付きの指数バックオフで
+      max_retries 回までリトライする（Retry-After があればそれに従う）。ストリームの途中で失敗した場合は
+      受け取った分を送り直せないため、リトライしない
+    - hedge の場合は、応答ヘッダーまでの時間が直近の hedge_quantile の分位点を超えたら同じリクエストを
+      もう 1 つ送り、先に応答した方を使う（もう一方は接続を閉じて生成を止める）
+    - リトライとヘッジは RetryBudget の範囲でだけ行う
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, settings: LLMHTTPSettings, metrics: Metrics):
+        self._transport = transport
+        self._settings = settings
+        self._budget = RetryBudget(settings.retry_budget_ratio, settings.retry_budget_min_per_second)
+        # ストリームは最初のチャンク、そうでない場合は生成の完了で応答ヘッダーが届くため、別々に集計する
+        self._latency = {streaming: _LatencyWindow(_LATENCY_SAMPLES) for streaming in (False, True)}
+        retries = metrics.counter("llm_http_retries_total", "Retried OpenAI API requests by reason.", ["reason"])
+        self._retries = {reason: retries.labels(reason) for reason in ("status", "error")}
+        self._budget_exhausted = metrics.counter("llm_http_retry_budget_exhausted_total", "Retries or hedges skipped because the retry budget was exhausted.")
+        hedges = metrics.counter("llm_http_hedges_total", "Hedged OpenAI API requests by which attempt answered first.", ["winner"])
+        self._hedge_primary = hedges.labels("primary")
+        self._hedge_hedge = hedges.labels("hedge")
+        self._header_seconds = metrics.histogram("llm_http_header_seconds", "Time from sending an OpenAI API request to its response headers.")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._budget.deposit()
+        attempt = 0
+        while True:
+            try:
+                response = await self._send(request)
+            except _RETRY_ERRORS as e:
+                if not self._may_retry(attempt, "error"):
+                    raise
+                logger.warning("Retrying %s %s after %s", request.method, request.url.path, type(e).__name__)
+                await asyncio.sleep(self._backoff(attempt, None))
+            else:
+                if response.status_code not in RETRY_STATUS_CODES or not self._may_retry(attempt, "status"):
+                    return response
+                retry_after = _retry_after(response)
+                await response.aclose()
+                logger.warning("Retrying %s %s after status %d", request.method, request.url.path, response.status_code)
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+            attempt += 1
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+    def _may_retry(self, attempt: int, reason: str) -> bool:
+        if attempt >= self._settings.max_retries:
+            return False
+        if not self._budget.try_spend():
+            self._budget_exhausted.inc()
+            return False
+        self._retries[reason].inc()
+        return True
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        if retry_after is not None:
+            return min(retry_after, self._settings.retry_backoff_max_seconds)
+        # full jitter: 0 から上限までの一様乱数
+        ceiling = min(self._settings.retry_backoff_seconds * 2 ** attempt, self._settings.retry_backoff_max_seconds)
+        return random.uniform(0, ceiling)
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        streaming = _is_streaming(request)
+        delay = self._hedge_delay(streaming)
+        if delay is None:
+            return await self._timed(request, streaming)
+
+        primary = asyncio.create_task(self._timed(request, streaming))
+        hedge: Optional[asyncio.Task[httpx.Response]] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            # 失敗したリクエストのリトライを優先し、ヘッジには予算の半分までしか使わない
+            if done or not self._budget.try_spend(_HEDGE_BUDGET_SHARE):
+                if not done:
+                    self._budget_exhausted.inc()
+                return await primary
+            hedge = asyncio.create_task(self._timed(request, streaming))
+            pending = {primary, hedge}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if _usable(task)), None)
+                # 失敗した・リトライ対象の応答を返した方は、もう一方がまだ実行中ならそちらを待つ
+                if winner is None and pending:
+                    for task in done:
+                        await _discard(task)
+                    continue
+                winner = winner or next(iter(done))
+                for task in done:
+                    if task is not winner:
+                        await _discard(task)
+                (self._hedge_primary if winner is primary else self._hedge_hedge).inc()
+                return winner.result()
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+                    await _discard(task)
+
+    async def _timed(self, request: httpx.Request, streaming: bool) -> httpx.Response:
+        started = time.perf_counter()
+        response = await self._transport.handle_async_request(request)
+        seconds = time.perf_counter() - started
+        self._header_seconds.observe(seconds)
+        if response.status_code < 400:
+            self._latency[streaming].add(seconds)
+        return response
+
+    def _hedge_delay(self, streaming: bool) -> Optional[float]:
+        if not self._settings.hedge:
+            return None
+        quantile = self._latency[streaming].quantile(self._settings.hedge_quantile)
+        if quantile is None:
+            return None
+        return max(quantile, self._settings.hedge_min_delay_seconds)
+
+def _is_streaming(request: httpx.Request) -> bool:
+    # SDK はリクエストの本文を JSON（バイト列）で組み立てる
+    content = request.content
+    return b'"stream": true' in content or b'"stream":true' in content
+
+def _usable(task: "asyncio.Task[httpx.Response]") -> bool:
+    return not task.cancelled() and task.exception() is None and task.result().status_code not in RETRY_STATUS_CODES
+
+async def _discard(task: "asyncio.Task[httpx.Response]"):
+    """使わない方の応答を閉じる（例外・取り消しは無視する）。"""
+    try:
+        response = await task
+    except BaseException:
+        return
+    await response.aclose()
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+def _http2_available(enabled: bool) -> bool:
+    if not enabled:
+        return False
+    try:
+        import h2  # type: ignore  # noqa: F401
+        return True
+    except ImportError:
+        # h2 は任意の依存関係のため、インストールされていない場合は HTTP/1.1 で接続する
+        logger.info("h2 is not installed; using HTTP/1.1 for the OpenAI API")
+        return False
+
+def _timeout(settings: LLMHTTPSettings) -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=settings.connect_timeout_seconds,
+        read=settings.read_timeout_seconds,
+        write=settings.write_timeout_seconds,
+        pool=settings.pool_timeout_seconds,
+    )
+
+def _limits(settings: LLMHTTPSettings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.max_connections,
+        max_keepalive_connections=settings.max_keepalive_connections,
+        keepalive_expiry=settings.keepalive_seconds,
+    )
+
+def create_llm_http_client(settings: LLMHTTPSettings, metrics: Metrics = NULL_METRICS) -> httpx.AsyncClient:
+    """ワーカー内で共有する、OpenAI API 用の HTTP クライアントを作る（リトライは SDK ではなくここで行う）。"""
+    transport = httpx.AsyncHTTPTransport(limits=_limits(settings), http2=_http2_available(settings.http2))
+    return httpx.AsyncClient(transport=ResilientTransport(transport, settings, metrics), timeout=_timeout(settings))
+
+def create_sync_llm_http_client(settings: LLMHTTPSettings) -> httpx.Client:
+    """同期版の OpenAI クライアント用。接続プールとタイムアウトだけを設定する（リトライは SDK に任せる）。"""
+    return httpx.Client(limits=_limits(settings), http2=_http2_available(settings.http2), timeout=_timeout(settings))
@@ -0,0 +1,321 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Awaitable, Callable, Iterator, Optional
+
+from app.usecase.ports.output.llm.client import AsyncLLMClient, ChatMessage, LLMBusyError
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+from app.infrastructure.openai.tokenizer import approximate_token_count
+
+@dataclass
+class LLMRequestScope:
+    """LLM 呼び出しの発生元。公平なスケジューリングと順番待ちの通知に使う。"""
+
+    connection_id: str
+    chat_id: str
+    # 順番待ちになった・順番が変わったときに、待ち順（1 始まり）を受け取る
+    on_queued: Optional[Callable[[int], Awaitable[None]]] = None
+
+_request_scope: contextvars.ContextVar[Optional[LLMRequestScope]] = contextvars.ContextVar("llm_request_scope", default=None)
+
+def set_llm_request_scope(scope: LLMRequestScope) -> contextvars.Token[Optional[LLMRequestScope]]:
+    """以降の LLM 呼び出し（この中で作られるタスクを含む）の発生元を設定する。"""
+    return _request_scope.set(scope)
+
+def reset_llm_request_scope(token: contextvars.Token[Optional[LLMRequestScope]]):
+    _request_scope.reset(token)
+
+def current_llm_request_scope() -> Optional[LLMRequestScope]:
+    return _request_scope.get()
+
+@contextmanager
+def chat_llm_request_scope(chat_id: str) -> Iterator[None]:
+    """接続に属さない（バックグラウンドの）LLM 呼び出しの発生元を、チャットだけにして設定する。
+
+    使用量はチャットに記録されるが、順番待ちの通知はせず、スケジューリングでは接続の無い呼び出しとしてまとめて扱う。
+    """
+    token = _request_scope.set(LLMRequestScope("", chat_id))
+    try:
+        yield
+    finally:
+        _request_scope.reset(token)
+
+@dataclass
+class LLMSchedulerStats:
+    active: int
+    queued: int
+    # 許可されたリクエストの待ち時間の合計・件数・最大値
+    wait_seconds_total: float
+    wait_count: int
+    max_wait_seconds: float
+    rejected: int
+
+class _Waiter:
+    __slots__ = ("connection_id", "chat_id", "cost", "enqueued_at", "position", "granted", "event")
+
+    def __init__(self, connection_id: str, chat_id: str, cost: int):
+        self.connection_id = connection_id
+        self.chat_id = chat_id
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+        self.position = 0
+        self.granted = False
+        self.event = asyncio.Event()
+
+class LLMScheduler:
+    """ワーカー全体で LLM への同時リクエスト数と 1 分あたりのトークン数を制限する。
+
+    上限に達している間のリクエストは、接続ごと・チャットごとのキューに入れ、
+    接続 → チャットの順にラウンドロビンで取り出す。これにより 1 つの接続が大量に
+    リクエストしても、他の接続が待たされ続けることはない。
+    キューが一杯の場合や待ち時間が上限を超えた場合は LLMBusyError で拒否する。
+    """
+
+    def __init__(self, max_concurrency: int, tokens_per_minute: int, max_queue: int, max_queue_per_connection: int, max_wait_seconds: float, metrics: Metrics):
+        self._max_concurrency = max_concurrency
+        self._tokens_per_minute = tokens_per_minute
+        self._max_queue = max_queue
+        self._max_queue_per_connection = max_queue_per_connection
+        self._max_wait_seconds = max_wait_seconds
+
+        self._active = 0
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+
+        # 接続 ID → チャット ID → 待ち行列
+        self._queues: OrderedDict[str, OrderedDict[str, deque[_Waiter]]] = OrderedDict()
+        self._queued = 0
+        self._queued_by_connection: dict[str, int] = {}
+
+        self._wait_seconds_total = 0.0
+        self._wait_count = 0
+        self._max_wait_seconds_seen = 0.0
+        self._rejected = 0
+        self._queue_wait_seconds = metrics.histogram("llm_queue_wait_seconds", "Time LLM requests waited for a scheduler slot.")
+        rejected = metrics.counter("llm_scheduler_rejected_total", "LLM requests rejected by the scheduler.", ["reason"])
+        self._rejected_full = rejected.labels("queue_full")
+        self._rejected_timeout = rejected.labels("timeout")
+
+    async def acquire(self, cost: int):
+        """実行枠を 1 つ確保する。確保できるまで待ち、待ち順が変わるたびに通知する。"""
+        scope = _request_scope.get()
+        connection_id = scope.connection_id if scope is not None else ""
+        chat_id = scope.chat_id if scope is not None else ""
+        if self._tokens_per_minute > 0:
+            cost = min(cost, self._tokens_per_minute)
+
+        # 待っているリクエストが無く、枠も空いていればそのまま実行する
+        if self._queued == 0 and self._has_slot() and self._take_tokens(cost):
+            self._active += 1
+            self._record_wait(0.0)
+            return
+
+        if self._queued >= self._max_queue or self._queued_by_connection.get(connection_id, 0) >= self._max_queue_per_connection:
+            self._rejected += 1
+            self._rejected_full.inc()
+            raise LLMBusyError("Too many pending requests")
+
+        waiter = _Waiter(connection_id, chat_id, cost)
+        self._enqueue(waiter)
+        self._dispatch()
+
+        try:
+            async with asyncio.timeout(self._max_wait_seconds if self._max_wait_seconds > 0 else None):
+                reported = 0
+                while not waiter.granted:
+                    if scope is not None and scope.on_queued is not None and waiter.position != reported:
+                        reported = waiter.position
+                        await scope.on_queued(reported)
+                        continue
+                    waiter.event.clear()
+                    await waiter.event.wait()
+        except BaseException as e:
+            if waiter.granted:
+                # 枠を確保した直後に取り消された場合は、トークンも含めて返却する
+                self.release(waiter.cost)
+            else:
+                self._remove(waiter)
+                self._dispatch()
+            if isinstance(e, TimeoutError):
+                self._rejected += 1
+                self._rejected_timeout.inc()
+                raise LLMBusyError("Timed out waiting for an LLM slot") from e
+            raise
+
+    def release(self, unused_tokens: int = 0):
+        """実行枠を返却する。途中で取り消されたリクエストは、使わなかった見積もりのトークンを戻す。"""
+        self._active -= 1
+        if unused_tokens > 0 and self._tokens_per_minute > 0:
+            self._tokens = min(float(self._tokens_per_minute), self._tokens + unused_tokens)
+        self._dispatch()
+
+    def stats(self) -> LLMSchedulerStats:
+        return LLMSchedulerStats(self._active, self._queued, self._wait_seconds_total, self._wait_count, self._max_wait_seconds_seen, self._rejected)
+
+    def _has_slot(self) -> bool:
+        return self._max_concurrency <= 0 or self._active < self._max_concurrency
+
+    def _take_tokens(self, cost: int) -> bool:
+        if self._tokens_per_minute <= 0:
+            return True
+        now = time.monotonic()
+        self._tokens = min(float(self._tokens_per_minute), self._tokens + (now - self._refilled_at) * self._tokens_per_minute / 60)
+        self._refilled_at = now
+        if self._tokens < cost:
+            return False
+        self._tokens -= cost
+        return True
+
+    def _dispatch(self):
+        while self._queued > 0 and self._has_slot():
+            waiter = self._peek()
+            if not self._take_tokens(waiter.cost):
+                # トークンが貯まる頃に再度試す
+                self._schedule_wakeup((waiter.cost - self._tokens) * 60 / self._tokens_per_minute)
+                break
+            self._pop()
+            self._active += 1
+            waiter.granted = True
+            self._record_wait(time.monotonic() - waiter.enqueued_at)
+            waiter.event.set()
+        self._update_positions()
+
+    def _schedule_wakeup(self, delay: float):
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._on_wakeup)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    def _record_wait(self, seconds: float):
+        self._queue_wait_seconds.observe(seconds)
+        self._wait_seconds_total += seconds
+        self._wait_count += 1
+        self._max_wait_seconds_seen = max(self._max_wait_seconds_seen, seconds)
+
+    # --- キュー操作 ---
+
+    def _enqueue(self, waiter: _Waiter):
+        chats = self._queues.get(waiter.connection_id)
+        if chats is None:
+            chats = self._queues[waiter.connection_id] = OrderedDict()
+        waiters = chats.get(waiter.chat_id)
+        if waiters is None:
+            waiters = chats[waiter.chat_id] = deque()
+        waiters.append(waiter)
+        self._queued += 1
+        self._queued_by_connection[waiter.connection_id] = self._queued_by_connection.get(waiter.connection_id, 0) + 1
+
+    def _peek(self) -> _Waiter:
+        chats = next(iter(self._queues.values()))
+        return next(iter(chats.values()))[0]
+
+    def _pop(self) -> _Waiter:
+        # 先頭の接続の先頭のチャットから取り出し、どちらも末尾に回す（ラウンドロビン）
+        connection_id, chats = next(iter(self._queues.items()))
+        chat_id, waiters = next(iter(chats.items()))
+        waiter = waiters.popleft()
+        if waiters:
+            chats.move_to_end(chat_id)
+        else:
+            del chats[chat_id]
+        if chats:
+            self._queues.move_to_end(connection_id)
+        else:
+            del self._queues[connection_id]
+        self._forget(waiter)
+        return waiter
+
+    def _remove(self, waiter: _Waiter):
+        chats = self._queues.get(waiter.connection_id)
+        if chats is None or waiter.chat_id not in chats:
+            return
+        waiters = chats[waiter.chat_id]
+        try:
+            waiters.remove(waiter)
+        except ValueError:
+            return
+        if not waiters:
+            del chats[waiter.chat_id]
+        if not chats:
+            del self._queues[waiter.connection_id]
+        self._forget(waiter)
+
+    def _forget(self, waiter: _Waiter):
+        self._queued -= 1
+        remaining = self._queued_by_connection[waiter.connection_id] - 1
+        if remaining:
+            self._queued_by_connection[waiter.connection_id] = remaining
+        else:
+            del self._queued_by_connection[waiter.connection_id]
+
+    def _update_positions(self):
+        """実際に取り出される順（ラウンドロビン）で、各リクエストの待ち順を更新する。"""
+        connections = deque(deque(deque(waiters) for waiters in chats.values()) for chats in self._queues.values())
+        position = 0
+        while connections:
+            chats = connections.popleft()
+            waiters = chats.popleft()
+            waiter = waiters.popleft()
+            position += 1
+            if waiter.position != position:
+                waiter.position = position
+                waiter.event.set()
+            if waiters:
+                chats.append(waiters)
+            if chats:
+                connections.append(chats)
+
+class ScheduledLLMClient(AsyncLLMClient):
+    """LLMScheduler で実行枠を確保してから上流の LLM クライアントを呼び出す。"""
+
+    def __init__(self, client: AsyncLLMClient, scheduler: LLMScheduler, tokenizer: Tokenizer, completion_tokens: int):
+        self._client = client
+        self._scheduler = scheduler
+        self._tokenizer = tokenizer
+        self._completion_tokens = completion_tokens
+
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        await self._scheduler.acquire(self._estimate(question, prompt, chat_history))
+        unused_tokens = self._completion_tokens
+        try:
+            response = await self._client.generate_response(question, prompt, chat_history, task)
+            unused_tokens = 0
+            return response
+        finally:
+            self._scheduler.release(unused_tokens)
+
+    async def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        await self._scheduler.acquire(self._estimate(question, prompt, chat_history))
+        chunks: list[str] = []
+        completed = False
+        try:
+            async for chunk in self._client.stream_response(question, prompt, chat_history, task):
+                chunks.append(chunk)
+                yield chunk
+            completed = True
+        finally:
+            # 取り消された場合は、生成されなかった分の出力トークンを戻す
+            unused_tokens = 0 if completed else max(self._completion_tokens - self._tokenizer.count("".join(chunks)), 0)
+            self._scheduler.release(unused_tokens)
+
+    def _estimate(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]]) -> int:
+        # 実際の使用量は応答後まで分からないため、プロンプトと想定される出力の長さから見積もる。
+        # 呼び出しごとに履歴全体をトークナイズするとイベントループを塞ぐため、文字数から概算する
+        tokens = approximate_token_count(prompt) + approximate_token_count(question) + self._completion_tokens
+        for message in chat_history or []:
+            tokens += approximate_token_count(message.content)
+        return tokens
+
+def create_llm_scheduler(max_concurrency: int = 16, tokens_per_minute: int = 0, max_queue: int = 256, max_queue_per_connection: int = 4, max_wait_seconds: float = 30, metrics: Metrics = NULL_METRICS) -> LLMScheduler:
+    return LLMScheduler(max_concurrency, tokens_per_minute, max_queue, max_queue_per_connection, max_wait_seconds, metrics)
+
+def create_scheduled_llm_client(client: AsyncLLMClient, scheduler: LLMScheduler, tokenizer: Tokenizer, completion_tokens: int = 512) -> ScheduledLLMClient:
+    return ScheduledLLMClient(client, scheduler, tokenizer, completion_tokens)
@@ -0,0 +1,169 @@
+import json
+import zlib
+from typing import Any, Iterable, Iterator, Optional
+
+from app.domain.chat.entity.chat import Chat
+from app.infrastructure.serialization.chat import InvalidChatRecordError, decode_chats, encode_chat
+
+# チャットの一括書き出し・取り込みの形式: 1 行に 1 チャット（encode_chat の JSON）を並べた NDJSON。
+# gzip で圧縮してもよい（取り込み時は先頭のマジックナンバーで判定する）
+
+# 書き出し時に、この大きさまで行をまとめてから返す（圧縮する場合は圧縮前の大きさ）
+EXPORT_CHUNK_BYTES = 256 * 1024
+# 取り込み時に、この件数（または行の合計の大きさ）ごとに検証してリポジトリへ保存する
+IMPORT_BATCH_SIZE = 500
+IMPORT_BATCH_BYTES = 8 * 1024 * 1024
+# 1 行（1 チャット）の大きさの上限。改行の無い巨大な入力でメモリを使い切らないようにする
+MAX_LINE_BYTES = 64 * 1024 * 1024
+# gzip の展開時に一度に取り出す大きさ。圧縮率の極端に高い入力でもこの単位で処理する
+_INFLATE_CHUNK_BYTES = 1024 * 1024
+_GZIP_MAGIC = b"\x1f\x8b"
+
+class ChatArchiveError(ValueError):
+    """取り込むデータが正しくない場合に送出する。line は展開後の行番号（1 始まり）。"""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+
+def encode_chat_archive(chats: Iterable[Chat], compress: bool = False, compress_level: int = 1) -> Iterator[bytes]:
+    """チャットを 1 件ずつ NDJSON の行にし、EXPORT_CHUNK_BYTES ごとにまとめて返す。
+
+    chats を順にたどるだけで、全件をメモリに載せない。compress の場合は gzip で圧縮する
+    （書き出しの速度を優先し、既定の圧縮レベルは 1）。
+    """
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+    lines: list[bytes] = []
+    size = 0
+    for chat in chats:
+        line = json.dumps(encode_chat(chat), ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        lines.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            data = b"".join(lines)
+            lines.clear()
+            size = 0
+            if compressor is not None:
+                data = compressor.compress(data)
+            if data:
+                yield data
+    data = b"".join(lines)
+    if compressor is not None:
+        data = compressor.compress(data) + compressor.flush()
+    if data:
+        yield data
+
+class ChatArchiveDecoder:
+    """NDJSON（gzip 可）を任意の大きさの断片で受け取り、batch_size 件（または batch_bytes）ごとに検証済みのチャットを返す。
+
+    保持するのは未完の行と、検証待ちの 1 バッチ分だけ。値の検証はバッチ単位でまとめて行う（decode_chats）。
+    """
+
+    def __init__(self, batch_size: int = IMPORT_BATCH_SIZE, batch_bytes: int = IMPORT_BATCH_BYTES):
+        self._batch_size = batch_size
+        self._batch_bytes = batch_bytes
+        self._head = b""
+        self._compressed: Optional[bool] = None
+        self._inflater: Any = None
+        # 改行を受け取っていない行の断片
+        self._partial: list[bytes] = []
+        self._partial_size = 0
+        self._line = 0
+        # 検証待ちの辞書と、それぞれの行番号
+        self._records: list[Any] = []
+        self._record_lines: list[int] = []
+        self._record_bytes = 0
+
+    def feed(self, data: bytes) -> Iterator[list[Chat]]:
+        """受け取った断片から、揃ったバッチを返す。バッチは保存してから次を取り出すこと（1 バッチずつ復元する）。"""
+        if self._compressed is None:
+            # 圧縮の有無は先頭 2 バイトで判定する
+            self._head += data
+            if len(self._head) < len(_GZIP_MAGIC):
+                return
+            data, self._head = self._head, b""
+            self._compressed = data.startswith(_GZIP_MAGIC)
+            if self._compressed:
+                self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if not self._compressed:
+            yield from self._split(data)
+            return
+        for text in self._inflate(data):
+            yield from self._split(text)
+
+    def close(self) -> Iterator[list[Chat]]:
+        """入力の終わりに呼び、残りのチャットを返す。"""
+        if self._compressed is None and self._head:
+            self._compressed = False
+            yield from self._split(self._head)
+        if self._compressed:
+            yield from self._split(self._inflater.flush())
+            if not self._inflater.eof:
+                raise ChatArchiveError(self._line + 1, "truncated gzip stream")
+        if self._partial:
+            line = b"".join(self._partial)
+            self._partial = []
+            if self._add(line):
+                yield self._decode()
+        if self._records:
+            yield self._decode()
+
+    def _inflate(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            try:
+                text = self._inflater.decompress(data, _INFLATE_CHUNK_BYTES)
+            except zlib.error as e:
+                raise ChatArchiveError(self._line + 1, f"invalid gzip stream: {e}") from e
+            yield text
+            if self._inflater.eof:
+                # 連結された gzip（cat a.gz b.gz）の次のメンバー
+                data = self._inflater.unused_data
+                if data:
+                    self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                data = self._inflater.unconsumed_tail
+
+    def _split(self, data: bytes) -> Iterator[list[Chat]]:
+        lines = data.split(b"\n")
+        # 最後の要素は改行で終わっていない（続きの断片を待つ）
+        rest = lines.pop()
+        for line in lines:
+            if self._partial:
+                self._partial.append(line)
+                line = b"".join(self._partial)
+                self._partial = []
+                self._partial_size = 0
+            if self._add(line):
+                yield self._decode()
+        if rest:
+            self._partial.append(rest)
+            self._partial_size += len(rest)
+            if self._partial_size > MAX_LINE_BYTES:
+                raise ChatArchiveError(self._line + 1, f"line exceeds {MAX_LINE_BYTES} bytes")
+
+    def _add(self, line: bytes) -> bool:
+        """行を検証待ちに加え、バッチが揃ったかどうかを返す。"""
+        self._line += 1
+        if not line.strip():
+            return False
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ChatArchiveError(self._line, f"invalid JSON: {e}") from e
+        self._records.append(record)
+        self._record_lines.append(self._line)
+        self._record_bytes += len(line)
+        return len(self._records) >= self._batch_size or self._record_bytes >= self._batch_bytes
+
+    def _decode(self) -> list[Chat]:
+        try:
+            chats = decode_chats(self._records)
+        except InvalidChatRecordError as e:
+            raise ChatArchiveError(self._record_lines[e.index], str(e)) from e
+        self._records = []
+        self._record_lines = []
+        self._record_bytes = 0
+        return chats
+
+def create_chat_archive_decoder(batch_size: int = IMPORT_BATCH_SIZE, batch_bytes: int = IMPORT_BATCH_BYTES) -> ChatArchiveDecoder:
+    return ChatArchiveDecoder(batch_size, batch_bytes)
@@ -0,0 +1,162 @@
+import re
+from datetime import datetime
+from typing import Any
+
+from app.domain.chat.entity.chat import Chat, restore_chat
+from app.domain.chat.value_object.question import MAX_QUESTION_LENGTH, create_question
+from app.domain.chat.value_object.title import MAX_TITLE_LENGTH, MIN_TITLE_LENGTH, create_title, restore_title
+from app.domain.shared.value_object.id import create_id, restore_id
+from app.domain.shared.value_object.time import create_time
+
+def encode_chat(chat: Chat) -> dict[str, Any]:
+    """チャットを JSON に変換できる辞書にする。ステップは [id, question, answer, created_at] の配列で表す。
+
+    会話の要約がある場合は、[要約, 要約したステップ数] を summary に入れる（無い場合は項目ごと省く）。
+    """
+    record: dict[str, Any] = {
+        "id": chat.get_id().value(),
+        "title": chat.get_title().value(),
+        "created_at": chat.get_created_at().value().isoformat(),
+        "updated_at": chat.get_updated_at().value().isoformat(),
+        "steps": [[id, question, answer, created_at.isoformat()] for id, question, answer, created_at in chat.step_values()],
+    }
+    if chat.summarized_step_count() > 0:
+        record["summary"] = [chat.get_summary(), chat.summarized_step_count()]
+    return record
+
+def decode_chat(record: dict[str, Any]) -> Chat:
+    """encode_chat で変換した辞書からチャットを復元する。自分たちが書き出したデータを前提とし、値は検証しない。"""
+    steps = record["steps"]
+    summary, summarized_step_count = record.get("summary") or ("", 0)
+    return restore_chat(
+        restore_id(record["id"]),
+        restore_title(record["title"]),
+        create_time(datetime.fromisoformat(record["created_at"])),
+        create_time(datetime.fromisoformat(record["updated_at"])),
+        [step[0] for step in steps],
+        [step[1] for step in steps],
+        [step[2] for step in steps],
+        [datetime.fromisoformat(step[3]) for step in steps],
+        summary,
+        summarized_step_count,
+    )
+
+# ハイフンの有無・大文字小文字を問わない UUID（create_id が受け付ける形式の大半）を改行区切りで並べたもの
+_UUID_LINES = re.compile(r"[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12}(?:\n[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12})*")
+
+class InvalidChatRecordError(ValueError):
+    """外部から受け取ったチャットの辞書が正しくない場合に送出する。index はバッチ内の位置。"""
+
+    def __init__(self, index: int, message: str):
+        super().__init__(message)
+        self.index = index
+
+def decode_chats(records: list[Any]) -> list[Chat]:
+    """外部から受け取った（検証されていない）辞書のリストをチャットにする。
+
+    値オブジェクトを 1 件ずつ作って検証する代わりに、バッチ全体の ID・タイトル・質問を項目ごとの列にまとめ、
+    列単位で検証してから検証なしで復元する。検証に失敗した場合のみ 1 件ずつ確認し、原因のチャットを特定する。
+    """
+    try:
+        return _decode_columns(records)
+    except (ValueError, TypeError, KeyError, IndexError):
+        pass
+    for index, record in enumerate(records):
+        try:
+            _decode_columns([record])
+        except (ValueError, TypeError, KeyError, IndexError) as e:
+            raise InvalidChatRecordError(index, _describe(e)) from e
+    raise InvalidChatRecordError(0, "invalid chat records")
+
+def _decode_columns(records: list[Any]) -> list[Chat]:
+    chat_ids: list[str] = []
+    titles: list[str] = []
+    times: list[str] = []
+    step_counts: list[int] = []
+    step_ids: list[str] = []
+    questions: list[str] = []
+    answers: list[str] = []
+    step_times: list[str] = []
+    summaries: list[tuple[str, int]] = []
+    for record in records:
+        if type(record) is not dict:
+            raise TypeError("chat must be an object")
+        steps = record["steps"]
+        if type(steps) is not list:
+            raise TypeError("steps must be an array")
+        chat_ids.append(record["id"])
+        titles.append(record["title"])
+        times.append(record["created_at"])
+        times.append(record["updated_at"])
+        step_counts.append(len(steps))
+        summaries.append(_decode_summary(record.get("summary"), len(steps)))
+        if steps:
+            if set(map(type, steps)) != {list} or set(map(len, steps)) != {4}:
+                raise TypeError("each step must be [id, question, answer, created_at]")
+            ids, step_questions, step_answers, created = zip(*steps)
+            step_ids.extend(ids)
+            questions.extend(step_questions)
+            answers.extend(step_answers)
+            step_times.extend(created)
+
+    for column in (chat_ids, titles, times, step_ids, questions, answers, step_times):
+        if not set(map(type, column)) <= {str}:
+            raise TypeError("values must be strings")
+    _validate_ids(chat_ids)
+    _validate_ids(step_ids)
+    if titles and (min(map(len, titles)) < MIN_TITLE_LENGTH or max(map(len, titles)) > MAX_TITLE_LENGTH):
+        for title in titles:
+            create_title(title)
+    if questions and max(map(len, questions)) > MAX_QUESTION_LENGTH:
+        for question in questions:
+            create_question(question)
+    parsed_times = _parse_times(times)
+    parsed_step_times = _parse_times(step_times)
+
+    chats: list[Chat] = []
+    start = 0
+    for index, count in enumerate(step_counts):
+        end = start + count
+        chats.append(restore_chat(
+            restore_id(chat_ids[index]),
+            restore_title(titles[index]),
+            create_time(parsed_times[2 * index]),
+            create_time(parsed_times[2 * index + 1]),
+            step_ids[start:end],
+            questions[start:end],
+            answers[start:end],
+            parsed_step_times[start:end],
+            *summaries[index],
+        ))
+        start = end
+    return chats
+
+def _decode_summary(summary: Any, step_count: int) -> tuple[str, int]:
+    if summary is None:
+        return "", 0
+    if type(summary) is not list or len(summary) != 2 or type(summary[0]) is not str or type(summary[1]) is not int:
+        raise TypeError("summary must be [text, step_count]")
+    if not 0 <= summary[1] <= step_count:
+        raise ValueError("summary must not cover more steps than the chat has")
+    return summary[0], summary[1]
+
+def _validate_ids(ids: list[str]):
+    joined = "\n".join(ids)
+    # 値の中に改行があると、まとめた文字列では区切りと見分けられないため件数も確かめる
+    if not ids or (joined.count("\n") == len(ids) - 1 and _UUID_LINES.fullmatch(joined)):
+        return
+    # 波括弧や urn: 付きなど、まとめた検証で扱わない形式も create_id と同じく受け付ける
+    for id in ids:
+        create_id(id)
+
+def _parse_times(values: list[str]) -> list[datetime]:
+    parsed = list(map(datetime.fromisoformat, values))
+    if any(value.tzinfo is not None for value in parsed):
+        # アプリケーション内の日時はタイムゾーンなし（ローカル時刻）で扱う
+        parsed = [value.astimezone().replace(tzinfo=None) if value.tzinfo is not None else value for value in parsed]
+    return parsed
+
+def _describe(e: Exception) -> str:
+    if isinstance(e, KeyError):
+        return f"missing field: {e.args[0]}"
+    return str(e)
@@ -0,0 +1,4 @@
+# 起動時間（読み込み）の計測のため、main.py で他のモジュールより先に読み込み、時刻を取る
+import time
+
+STARTED_AT = time.perf_counter()
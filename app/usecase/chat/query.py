@@ -0,0 +1,35 @@
+from app.usecase.ports.input.chat.query import ListChatsInputPort, SearchChatsInputPort, ListChatsInput, SearchChatsInput
+from app.usecase.ports.output.chat.index import ChatIndex, ChatSummaryPage, ChatSearchPage
+
+# 1 ページあたりの件数の上限
+MAX_PAGE_SIZE = 100
+
+def _page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+class ListChatsInteractor(ListChatsInputPort):
+    """チャットを更新日時の新しい順に一覧する。"""
+
+    def __init__(self, chat_index: ChatIndex):
+        self.chat_index = chat_index
+
+    def execute(self, input: ListChatsInput) -> ChatSummaryPage:
+        return self.chat_index.list_recent(_page_size(input.limit), input.cursor)
+
+class SearchChatsInteractor(SearchChatsInputPort):
+    """タイトル・質問・回答に語を含むチャットを、更新日時の新しい順に返す。"""
+
+    def __init__(self, chat_index: ChatIndex):
+        self.chat_index = chat_index
+
+    def execute(self, input: SearchChatsInput) -> ChatSearchPage:
+        query = input.query.strip()
+        if not query:
+            return ChatSearchPage([], None)
+        return self.chat_index.search(query, _page_size(input.limit), input.cursor)
+
+def create_list_chats_usecase(chat_index: ChatIndex) -> ListChatsInputPort:
+    return ListChatsInteractor(chat_index)
+
+def create_search_chats_usecase(chat_index: ChatIndex) -> SearchChatsInputPort:
+    return SearchChatsInteractor(chat_index)
@@ -0,0 +1,27 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+from app.usecase.ports.output.chat.index import ChatSummaryPage, ChatSearchPage
+
+@dataclass
+class ListChatsInput:
+    limit: int
+    # 前のページの next_cursor（最初のページの場合は None）
+    cursor: Optional[str]
+
+@dataclass
+class SearchChatsInput:
+    query: str
+    limit: int
+    cursor: Optional[str]
+
+class ListChatsInputPort(ABC):
+    @abstractmethod
+    def execute(self, input: ListChatsInput) -> ChatSummaryPage:
+        pass
+
+class SearchChatsInputPort(ABC):
+    @abstractmethod
+    def execute(self, input: SearchChatsInput) -> ChatSearchPage:
+        pass
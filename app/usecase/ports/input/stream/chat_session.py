@@ -1,24 +1,13 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import Optional
+from typing import AsyncGenerator, Optional
 from datetime import datetime
 
-@dataclass
-class StepInput:
-    id: str
-    question: str
-    answer: str
-    created_at: datetime
-
 @dataclass
 class ChatSessionInput:
-    chat_id: str
-    is_first: bool
-    title: Optional[str]
+    # None の場合は新しい ID でチャットを作成する
+    chat_id: Optional[str]
     current_question: str
-    steps: list[StepInput]
-    created_at: Optional[datetime]
-    updated_at: Optional[datetime]
 
 @dataclass
 class StepOutput:
@@ -32,11 +21,38 @@ class ChatSessionOutput:
     chat_id: str
     answer: str
     title: str
-    steps: list[StepOutput]
+    # このターンで追加されたステップのみ（履歴全体は返さない）
+    step: StepOutput
     created_at: datetime
     updated_at: datetime
 
+@dataclass
+class ChatSessionDelta:
+    content: str
+
+@dataclass
+class ChatSessionTitle:
+    title: str
+
+ChatSessionEvent = ChatSessionDelta | ChatSessionTitle | ChatSessionOutput
+
 class ChatSessionInputPort(ABC):
     @abstractmethod
     def execute(self, input: ChatSessionInput) -> ChatSessionOutput:
-        pass
\ No newline at end of file
+        pass
+
+class AsyncChatSessionInputPort(ABC):
+    @abstractmethod
+    async def execute(self, input: ChatSessionInput) -> ChatSessionOutput:
+        pass
+
+    @abstractmethod
+    def stream(self, input: ChatSessionInput) -> AsyncGenerator[ChatSessionEvent, None]:
+        """回答のデルタを順に返し、最後にステップを保存した結果を返す。
+
+        途中でやめる場合は aclose を呼び、生成中の LLM の呼び出しなどの後始末をさせる。
+
+        新規チャットのタイトルは回答と並行して生成され、
+        確定した時点で ChatSessionTitle として返される（回答の完了後になることもある）。
+        """
+        pass
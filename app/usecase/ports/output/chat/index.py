@@ -0,0 +1,63 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+@dataclass
+class ChatSummary:
+    id: str
+    title: str
+    updated_at: datetime
+    step_count: int
+
+@dataclass
+class ChatSummaryPage:
+    # 更新日時の新しい順
+    items: list[ChatSummary]
+    # 続きを取得するためのカーソル（最後のページの場合は None）
+    next_cursor: Optional[str]
+
+@dataclass
+class ChatSearchHit:
+    chat: ChatSummary
+    # 一致した箇所（title / question / answer）と、その前後の抜粋
+    field: str
+    snippet: str
+    # 質問・回答で一致した場合のステップ ID（タイトルの場合は None）
+    step_id: Optional[str]
+
+@dataclass
+class ChatSearchPage:
+    # 更新日時の新しい順
+    hits: list[ChatSearchHit]
+    next_cursor: Optional[str]
+
+class InvalidCursorError(ValueError):
+    """カーソルの形式が正しくない場合に送出する。"""
+    pass
+
+class InvalidQueryError(ValueError):
+    """検索語が索引で引けない（文字・数字を含まない）場合に送出する。"""
+    pass
+
+class ChatIndexNotReadyError(RuntimeError):
+    """保存済みのチャットの索引を作り終えていない場合に送出する。"""
+    pass
+
+class ChatIndex(ABC):
+    """保存済みのチャットを更新日時順に一覧し、タイトル・質問・回答を全文検索するためのポート。
+
+    カーソルは前のページの next_cursor をそのまま渡す（中身に依存しないこと）。
+    """
+
+    @abstractmethod
+    def list_recent(self, limit: int, cursor: Optional[str]) -> ChatSummaryPage:
+        pass
+
+    @abstractmethod
+    def search(self, query: str, limit: int, cursor: Optional[str]) -> ChatSearchPage:
+        """空白で区切った語をすべて含むチャットを返す（大文字・小文字や全角・半角は区別しない）。
+
+        文字・数字を含まない検索語の場合は InvalidQueryError を送出する。
+        """
+        pass
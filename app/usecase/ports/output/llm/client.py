@@ -1,7 +1,33 @@
 from abc import ABC, abstractmethod
-from typing import Optional
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+
+@dataclass
+class ChatMessage:
+    # "user"・"assistant"、または会話の要約を渡す "system"
+    role: str
+    content: str
+
+# LLM に依頼する処理の種類。処理ごとにモデル・最大出力トークン数などを切り替え、使用量を集計する
+LLM_TASK_TITLE = "title"
+LLM_TASK_STEP = "step"
+LLM_TASK_SUMMARY = "summary"
+
+class LLMBusyError(Exception):
+    """混雑しているため LLM へのリクエストを受け付けられない場合に送出する。"""
+    pass
 
 class LLMClient(ABC):
     @abstractmethod
-    def generate_response(self, question: str, prompt: str, chat_history: Optional[str]) -> str:
-        pass 
\ No newline at end of file
+    def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        pass
+
+class AsyncLLMClient(ABC):
+    @abstractmethod
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        pass
+
+    @abstractmethod
+    def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        """回答を生成しながら、差分（デルタ）を順に返す。"""
+        pass
@@ -0,0 +1,7 @@
+from abc import ABC, abstractmethod
+
+class Tokenizer(ABC):
+    @abstractmethod
+    def count(self, text: str) -> int:
+        """text のトークン数を返す。"""
+        pass
@@ -0,0 +1,93 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Sequence
+
+# 処理時間（秒）のヒストグラムの既定のバケット
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Counter(ABC):
+    @abstractmethod
+    def labels(self, *values: str) -> "Counter":
+        """ラベルの値を指定した子を返す。ホットパスでは事前に取得しておくこと。"""
+        pass
+
+    @abstractmethod
+    def inc(self, amount: float = 1.0) -> None:
+        pass
+
+class Gauge(ABC):
+    @abstractmethod
+    def labels(self, *values: str) -> "Gauge":
+        pass
+
+    @abstractmethod
+    def set(self, value: float) -> None:
+        pass
+
+    @abstractmethod
+    def inc(self, amount: float = 1.0) -> None:
+        pass
+
+    @abstractmethod
+    def dec(self, amount: float = 1.0) -> None:
+        pass
+
+class Histogram(ABC):
+    @abstractmethod
+    def labels(self, *values: str) -> "Histogram":
+        pass
+
+    @abstractmethod
+    def observe(self, value: float) -> None:
+        pass
+
+class Metrics(ABC):
+    """処理時間やトークン数などの計測値を記録するポート。
+
+    計測値は名前とラベル名を指定して作成し、作成した計測値に記録する。
+    同じ名前で作成した場合は同じ計測値を返す。
+    """
+
+    @abstractmethod
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        pass
+
+    @abstractmethod
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        pass
+
+    @abstractmethod
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Histogram:
+        """buckets を省略した場合は LATENCY_BUCKETS を使う。"""
+        pass
+
+class _NullInstrument(Counter, Gauge, Histogram):
+    def labels(self, *values: str) -> "_NullInstrument":
+        return self
+
+    def inc(self, amount: float = 1.0) -> None:
+        pass
+
+    def dec(self, amount: float = 1.0) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+_NULL_INSTRUMENT = _NullInstrument()
+
+class NullMetrics(Metrics):
+    """何も記録しない実装。計測を無効にした場合に使う。"""
+
+    def counter(self, name: str, description: str, label_names: Sequence[str] = ()) -> Counter:
+        return _NULL_INSTRUMENT
+
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        return _NULL_INSTRUMENT
+
+    def histogram(self, name: str, description: str, label_names: Sequence[str] = (), buckets: Optional[Sequence[float]] = None) -> Histogram:
+        return _NULL_INSTRUMENT
+
+NULL_METRICS = NullMetrics()
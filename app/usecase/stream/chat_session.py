@@ -1,14 +1,21 @@
-import uuid
+import asyncio
+import logging
+import time
 from datetime import datetime
+from typing import AsyncGenerator, Awaitable, Optional
 
-from app.usecase.ports.input.stream.chat_session import ChatSessionInputPort, ChatSessionInput, ChatSessionOutput, StepOutput
-from app.usecase.ports.output.llm.client import LLMClient
+from app.usecase.ports.input.stream.chat_session import ChatSessionInputPort, AsyncChatSessionInputPort, ChatSessionInput, ChatSessionOutput, ChatSessionDelta, ChatSessionTitle, ChatSessionEvent, StepOutput
+from app.usecase.stream.session_cache import ChatSessionCache
+from app.usecase.stream.context import ChatContext, ChatContextBuilder
+from app.usecase.stream.summary import ChatSummarizer
+from app.usecase.ports.output.llm.client import LLMClient, AsyncLLMClient, LLMBusyError, LLM_TASK_TITLE, LLM_TASK_STEP
+from app.usecase.ports.output.metrics.metrics import Histogram, Metrics, NULL_METRICS
 from app.domain.chat.repository.chat import ChatRepository
-from app.domain.chat.entity.chat import create_chat, create_step
-from app.domain.shared.value_object.id import create_id
+from app.domain.chat.entity.chat import Chat, create_chat, create_step
+from app.domain.shared.value_object.id import create_id, generate_id
 from app.domain.shared.value_object.time import create_time
-from app.domain.chat.value_object.title import create_title
-from app.domain.chat.value_object.question import create_question
+from app.domain.chat.value_object.title import Title, create_title
+from app.domain.chat.value_object.question import Question, create_question
 from app.domain.chat.value_object.answer import create_answer
 
 GENERATE_TITLE_PROMPT = """
@@ -19,84 +26,268 @@ GENERATE_STEP_PROMPT = """
 以下の質問に対して、適切な回答を生成してください。
 """
 
-class ChatSessionInteractor(ChatSessionInputPort):
-    def __init__(self, llm_client: LLMClient, chat_repository: ChatRepository):
-        self.llm_client = llm_client
+# タイトル生成が完了するまで新規チャットに付ける仮タイトル
+PLACEHOLDER_TITLE = "新しいチャット"
+
+logger = logging.getLogger(__name__)
+
+class _ChatSessionBase:
+    """同期版・非同期版のインタラクタで共有する処理。
+
+    LLM 呼び出し以外（チャットの取得・作成・保存・出力変換）はここにまとめ、
+    各インタラクタは LLM の呼び出し方だけを実装する。
+    会話中のチャット集約はセッションキャッシュに保持し、ターンごとには新しいステップを追加するだけにする。
+    """
+
+    def __init__(self, chat_repository: ChatRepository, session_cache: ChatSessionCache, context_builder: ChatContextBuilder, metrics: Metrics):
         self.chat_repository = chat_repository
+        self.session_cache = session_cache
+        self.context_builder = context_builder
+
+        # ターンの段階ごとの所要時間
+        stage_seconds = metrics.histogram("chat_stage_seconds", "Duration of each stage of a chat turn.", ["stage"])
+        self._find_chat_seconds = stage_seconds.labels("find_chat")
+        self._create_chat_seconds = stage_seconds.labels("create_chat")
+        self._title_seconds = stage_seconds.labels("title")
+        self._context_seconds = stage_seconds.labels("context")
+        self._answer_seconds = stage_seconds.labels("answer")
+        self._save_seconds = stage_seconds.labels("save")
+        self._ttft_seconds = metrics.histogram("chat_answer_ttft_seconds", "Time from the start of a streamed turn to its first answer delta.")
+        self._turn_seconds = metrics.histogram("chat_turn_seconds", "Duration of a whole chat turn.", ["mode"])
+
+    def _find_chat(self, input: ChatSessionInput) -> Optional[Chat]:
+        if input.chat_id is None:
+            return None
+        started = time.perf_counter()
+        try:
+            return self._find_cached_chat(input.chat_id)
+        finally:
+            self._find_chat_seconds.observe(time.perf_counter() - started)
+
+    def _find_cached_chat(self, chat_id: str) -> Optional[Chat]:
+        # 会話中のチャットはキャッシュから取得する
+        chat = self.session_cache.get(chat_id)
+        if chat is not None:
+            return chat
+        # キャッシュに無い場合（再開時など）はリポジトリから取得する
+        chat = self.chat_repository.find_by_id(create_id(chat_id))
+        if chat is not None:
+            self.session_cache.put(chat)
+        return chat
+
+    def _create_new_chat(self, input: ChatSessionInput, title_raw: str) -> Chat:
+        started = time.perf_counter()
+        # チャット値オブジェクトを作成（ID の指定が無い場合は新しく採番する）
+        chat_id = create_id(input.chat_id) if input.chat_id is not None else generate_id()
+        title = create_title(title_raw)
+        steps = []
+        created_at = create_time(datetime.now())
+        updated_at = create_time(datetime.now())
+        # チャットエンティティを作成
+        chat = create_chat(chat_id, title, steps, created_at, updated_at)
+        # チャットを保存
+        self.chat_repository.create(chat)
+        self.session_cache.put(chat)
+        self._create_chat_seconds.observe(time.perf_counter() - started)
+        return chat
+
+    def _build_context(self, chat: Chat, question: str) -> ChatContext:
+        context = self.context_builder.build(chat, GENERATE_STEP_PROMPT + question)
+        self._context_seconds.observe(context.build_seconds)
+        return context
+
+    def _complete_step(self, chat: Chat, question: Question, answer_raw: str) -> ChatSessionOutput:
+        started = time.perf_counter()
+        # ステップを作成
+        id = generate_id()
+        answer = create_answer(answer_raw)
+        created_at = create_time(datetime.now())
+
+        # 新しいステップを追加
+        step = create_step(id, chat.get_id(), question, answer, created_at)
+        chat.add_step(step)
+        chat.update_updated_at(created_at)
+        # チャットを更新
+        self.chat_repository.update(chat)
+
+        # 出力は今回追加したステップのみ
+        output_step = StepOutput(id.value(), question.value(), answer_raw, created_at.value())
+        self._save_seconds.observe(time.perf_counter() - started)
+        return ChatSessionOutput(chat.get_id().value(), answer_raw, chat.get_title().value(), output_step, chat.get_created_at().value(), chat.get_updated_at().value())
+
+class ChatSessionInteractor(_ChatSessionBase, ChatSessionInputPort):
+    def __init__(self, llm_client: LLMClient, chat_repository: ChatRepository, session_cache: ChatSessionCache, context_builder: ChatContextBuilder, metrics: Metrics):
+        super().__init__(chat_repository, session_cache, context_builder, metrics)
+        self.llm_client = llm_client
+        self._execute_seconds = self._turn_seconds.labels("execute")
 
     def execute(self, input: ChatSessionInput) -> ChatSessionOutput:
+        started = time.perf_counter()
         try:
-            chat = None
-            chat_id = None
-            
-            # 新規初回ループの場合
-            if input.is_first and input.title is None and input.created_at is None and input.updated_at is None:
-                # タイトルを生成
-                title = self.llm_client.generate_response(input.current_question, GENERATE_TITLE_PROMPT, None)
-                # チャット値オブジェクトを作成
-                chat_id = create_id(str(uuid.uuid4()))
-                title = create_title(title)
-                steps = []
-                created_at = create_time(datetime.now())
-                updated_at = create_time(datetime.now())
-                # チャットエンティティを作成
-                chat = create_chat(chat_id, title, steps, created_at, updated_at)
-                # チャットを保存
-                self.chat_repository.create(chat)
-
-            # 再開初回ループの場合
-            elif input.is_first and input.title is not None and input.created_at is not None and input.updated_at is not None:
-                # チャットIDを作成
-                chat_id = create_id(input.chat_id)
-                # チャットを取得
-                chat = self.chat_repository.find_by_id(chat_id)
-                # チャットが存在しない場合はエラー
-                if chat is None:
-                    raise Exception(f"Chat with id {input.chat_id} not found")
-
-            # ループの途中の場合
-            elif not input.is_first and input.title is not None and input.created_at is not None and input.updated_at is not None:
-                # チャットを再構成
-                chat_id = create_id(input.chat_id)
-                title = create_title(input.title)
-                steps = []
-                created_at = create_time(input.created_at)
-                updated_at = create_time(input.updated_at)
-                chat = create_chat(chat_id, title, steps, created_at, updated_at)
-                # ステップを作成
-                for step in input.steps:
-                    id = create_id(step.id)
-                    question = create_question(step.question)
-                    answer = create_answer(step.answer)
-                    created_at = create_time(step.created_at)
-                    step = create_step(id, chat_id, question, answer, created_at)
-                    chat.add_step(step)
-            else:
-                # 想定外の条件の場合
-                raise Exception("Invalid input conditions")
+            question = create_question(input.current_question)
+            chat = self._find_chat(input)
+            # 新規チャットの場合
+            if chat is None:
+                # タイトルを生成（失敗した場合は仮タイトルのまま回答する）
+                title_started = time.perf_counter()
+                try:
+                    title = create_title(self.llm_client.generate_response(input.current_question, GENERATE_TITLE_PROMPT, None, LLM_TASK_TITLE)).value()
+                except Exception:
+                    logger.exception("Failed to generate title for a new chat")
+                    title = PLACEHOLDER_TITLE
+                self._title_seconds.observe(time.perf_counter() - title_started)
+                chat = self._create_new_chat(input, title)
 
             # 回答を生成
-            answer_raw = self.llm_client.generate_response(input.current_question, GENERATE_STEP_PROMPT, chat.get_chat_history())
-            # ステップを作成
-            id = create_id(str(uuid.uuid4()))
+            context = self._build_context(chat, input.current_question)
+            answer_started = time.perf_counter()
+            answer_raw = self.llm_client.generate_response(input.current_question, GENERATE_STEP_PROMPT, context.messages, LLM_TASK_STEP)
+            self._answer_seconds.observe(time.perf_counter() - answer_started)
+            return self._complete_step(chat, question, answer_raw)
+
+        except LLMBusyError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error generating response: {e}")
+        finally:
+            self._execute_seconds.observe(time.perf_counter() - started)
+
+class AsyncChatSessionInteractor(_ChatSessionBase, AsyncChatSessionInputPort):
+    """イベントループをブロックしない非同期版のインタラクタ。
+
+    LLM 呼び出しを await するため、ある WebSocket の回答生成中も
+    同じワーカー上の他の接続は処理を続けられる。
+    summarizer を指定した場合は、ステップの保存後に古いステップの要約をバックグラウンドで依頼する。
+    """
+
+    def __init__(self, llm_client: AsyncLLMClient, chat_repository: ChatRepository, session_cache: ChatSessionCache, context_builder: ChatContextBuilder, metrics: Metrics, summarizer: Optional[ChatSummarizer]):
+        super().__init__(chat_repository, session_cache, context_builder, metrics)
+        self.llm_client = llm_client
+        self.summarizer = summarizer
+        self._execute_seconds = self._turn_seconds.labels("execute")
+        self._stream_seconds = self._turn_seconds.labels("stream")
+        # 実行中のタイトル生成タスク（GC で回収されないよう参照を保持する）
+        self._title_tasks: set[asyncio.Task[Optional[str]]] = set()
+
+    async def execute(self, input: ChatSessionInput) -> ChatSessionOutput:
+        started = time.perf_counter()
+        try:
+            question = create_question(input.current_question)
+            chat = self._find_chat(input)
+            # 新規チャットの場合
+            if chat is None:
+                # 新規チャットには履歴が無いため、タイトルと回答を並行して生成する
+                # （タイトルの生成に失敗した場合は、stream と同じく仮タイトルのまま回答する）
+                title, answer_raw = await asyncio.gather(
+                    self._try_generate_title(input.chat_id or "(new)", input.current_question),
+                    self._timed(self.llm_client.generate_response(input.current_question, GENERATE_STEP_PROMPT, None, LLM_TASK_STEP), self._answer_seconds),
+                )
+                chat = self._create_new_chat(input, title.value() if title is not None else PLACEHOLDER_TITLE)
+                return self._complete_step(chat, question, answer_raw)
+
+            # 回答を生成
+            context = self._build_context(chat, input.current_question)
+            answer_raw = await self._timed(self.llm_client.generate_response(input.current_question, GENERATE_STEP_PROMPT, context.messages, LLM_TASK_STEP), self._answer_seconds)
+            output = self._complete_step(chat, question, answer_raw)
+            self._request_summary(chat)
+            return output
+
+        except LLMBusyError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error generating response: {e}")
+        finally:
+            self._execute_seconds.observe(time.perf_counter() - started)
+
+    async def stream(self, input: ChatSessionInput) -> AsyncGenerator[ChatSessionEvent, None]:
+        started = time.perf_counter()
+        try:
             question = create_question(input.current_question)
-            answer = create_answer(answer_raw)
-            created_at = create_time(datetime.now())
+            title_task: Optional[asyncio.Task[Optional[str]]] = None
 
-            # 新しいステップを作成
-            step = create_step(id, chat_id, question, answer, created_at)
-            chat.add_step(step)
-            # チャットを更新
-            self.chat_repository.update(chat)
+            chat = self._find_chat(input)
+            # 新規チャットの場合
+            if chat is None:
+                # 仮タイトルでチャットを作成し、タイトル生成はバックグラウンドで行う
+                chat = self._create_new_chat(input, PLACEHOLDER_TITLE)
+                title_task = self._start_title_generation(chat, input.current_question)
 
-            output_steps: list[StepOutput] = []
-            for step in chat.get_steps():
-                output_steps.append(StepOutput(step.get_id().value(), step.get_question().value(), step.get_answer().value(), step.get_created_at().value()))
+            # 回答をデルタ単位で返しつつ組み立てる（タイトルの完了は待たない）
+            context = self._build_context(chat, input.current_question)
+            chunks: list[str] = []
+            answer_started = time.perf_counter()
+            async for delta in self.llm_client.stream_response(input.current_question, GENERATE_STEP_PROMPT, context.messages, LLM_TASK_STEP):
+                if not chunks:
+                    self._ttft_seconds.observe(time.perf_counter() - started)
+                chunks.append(delta)
+                yield ChatSessionDelta(delta)
+                # 回答の途中でタイトルが確定していれば先に返す
+                if title_task is not None and title_task.done():
+                    title = title_task.result()
+                    title_task = None
+                    if title is not None:
+                        yield ChatSessionTitle(title)
 
-            return ChatSessionOutput(chat_id.value(), answer_raw, chat.get_title().value(), output_steps, chat.get_created_at().value(), chat.get_updated_at().value())
+            self._answer_seconds.observe(time.perf_counter() - answer_started)
 
+            # ストリームが最後まで完了した場合のみステップを保存する
+            output = self._complete_step(chat, question, "".join(chunks))
+            # 出力を受け取った側がストリームを閉じても依頼されるよう、返す前に依頼する
+            self._request_summary(chat)
+            yield output
+
+            # 回答の完了後にタイトルが確定した場合は、別フレームとして返す
+            if title_task is not None:
+                title = await title_task
+                if title is not None:
+                    yield ChatSessionTitle(title)
+
+        except LLMBusyError:
+            raise
         except Exception as e:
             raise Exception(f"Error generating response: {e}")
-        
-def create_chat_session_usecase(llm_client: LLMClient, chat_repository: ChatRepository) -> ChatSessionInputPort:
-    return ChatSessionInteractor(llm_client, chat_repository)
\ No newline at end of file
+        finally:
+            self._stream_seconds.observe(time.perf_counter() - started)
+
+    async def _timed(self, awaitable: Awaitable[str], histogram: Histogram) -> str:
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            histogram.observe(time.perf_counter() - started)
+
+    def _request_summary(self, chat: Chat):
+        if self.summarizer is not None:
+            self.summarizer.request(chat)
+
+    def _start_title_generation(self, chat: Chat, question: str) -> asyncio.Task[Optional[str]]:
+        task = asyncio.create_task(self._generate_title(chat, question))
+        self._title_tasks.add(task)
+        task.add_done_callback(self._title_tasks.discard)
+        return task
+
+    async def _generate_title(self, chat: Chat, question: str) -> Optional[str]:
+        """タイトルを生成してチャットに反映する。失敗した場合は仮タイトルのまま None を返す。"""
+        title = await self._try_generate_title(chat.get_id().value(), question)
+        if title is None:
+            return None
+        chat.update_title(title)
+        self.chat_repository.update(chat)
+        return title.value()
+
+    async def _try_generate_title(self, chat_id: str, question: str) -> Optional[Title]:
+        """タイトルを生成する。失敗した（LLM の混雑・タイトルとして短すぎるなど）場合は None を返す。"""
+        try:
+            return create_title(await self._timed(self.llm_client.generate_response(question, GENERATE_TITLE_PROMPT, None, LLM_TASK_TITLE), self._title_seconds))
+        except LLMBusyError:
+            logger.warning("Skipped title generation for chat %s: LLM is busy", chat_id)
+            return None
+        except Exception:
+            logger.exception("Failed to generate title for chat %s", chat_id)
+            return None
+
+def create_chat_session_usecase(llm_client: LLMClient, chat_repository: ChatRepository, session_cache: ChatSessionCache, context_builder: ChatContextBuilder, metrics: Metrics = NULL_METRICS) -> ChatSessionInputPort:
+    return ChatSessionInteractor(llm_client, chat_repository, session_cache, context_builder, metrics)
+
+def create_async_chat_session_usecase(llm_client: AsyncLLMClient, chat_repository: ChatRepository, session_cache: ChatSessionCache, context_builder: ChatContextBuilder, metrics: Metrics = NULL_METRICS, summarizer: Optional[ChatSummarizer] = None) -> AsyncChatSessionInputPort:
+    return AsyncChatSessionInteractor(llm_client, chat_repository, session_cache, context_builder, metrics, summarizer)
@@ -0,0 +1,136 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from app.domain.chat.entity.chat import Chat
+from app.usecase.ports.output.llm.client import ChatMessage
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+
+# メッセージ 1 件ごとに付く書式分のトークン数（おおよそ）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 予算を超えた場合はこの割合まで減らす。1 ステップずつずらすと毎ターン先頭が変わり、
+# プロバイダーのプロンプトキャッシュが効かなくなるため、まとめて切り捨てる
+TRUNCATE_RATIO = 0.75
+
+# 会話の要約を渡すメッセージの書き出し
+SUMMARY_MESSAGE_PREFIX = "これまでの会話の要約:\n"
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class ChatContext:
+    # 会話の要約（ある場合のみ、system）と、それ以降の user / assistant が交互に並ぶ過去の会話
+    messages: list[ChatMessage]
+    history_tokens: int
+    # 過去の会話 + 今回の質問のトークン数
+    prompt_tokens: int
+    build_seconds: float
+
+class _ChatHistory:
+    """チャットごとに組み立て済みの履歴。"""
+
+    __slots__ = ("messages", "step_tokens", "step_count", "total_tokens", "summary", "summarized_step_count")
+
+    def __init__(self):
+        self.messages: list[ChatMessage] = []
+        # messages に含まれるステップごとのトークン数
+        self.step_tokens: list[int] = []
+        # 取り込み済みのステップ数（切り捨てたもの・要約に含まれるものも含む）
+        self.step_count = 0
+        # 要約とステップのトークン数の合計
+        self.total_tokens = 0
+        self.summary: Optional[ChatMessage] = None
+        self.summarized_step_count = 0
+
+class ChatContextBuilder:
+    """LLM に渡す会話履歴を、ステップの追加に合わせて差分で組み立てる。
+
+    - 新しく追加されたステップだけをトークナイズしてメッセージに追加する
+    - チャットに会話の要約がある場合は、要約と、要約に含まれないステップだけを渡す。
+      要約が更新されたら、新しく要約に含まれたステップを先頭から取り除く
+    - 履歴のトークン数が予算を超えた場合は、古いステップからまとめて切り捨てる
+    """
+
+    def __init__(self, tokenizer: Tokenizer, max_history_tokens: int, max_chats: int):
+        self._tokenizer = tokenizer
+        self._max_history_tokens = max_history_tokens
+        self._max_chats = max_chats
+        self._histories: OrderedDict[str, _ChatHistory] = OrderedDict()
+
+    def build(self, chat: Chat, question: str) -> ChatContext:
+        started = time.perf_counter()
+        history = self._history(chat)
+        if chat.summarized_step_count() != history.summarized_step_count:
+            self._apply_summary(history, chat)
+
+        # 前回から追加されたステップだけを取り込む
+        for step in chat.get_steps_since(history.step_count):
+            question_text = step.get_question().value()
+            answer_text = step.get_answer().value()
+            history.messages.append(ChatMessage("user", question_text))
+            history.messages.append(ChatMessage("assistant", answer_text))
+            tokens = self._tokenizer.count(question_text) + self._tokenizer.count(answer_text) + MESSAGE_OVERHEAD_TOKENS * 2
+            history.step_tokens.append(tokens)
+            history.total_tokens += tokens
+        history.step_count = chat.step_count()
+
+        if self._max_history_tokens > 0 and history.total_tokens > self._max_history_tokens:
+            self._truncate(history)
+
+        history_tokens = history.total_tokens
+        prompt_tokens = history_tokens + self._tokenizer.count(question) + MESSAGE_OVERHEAD_TOKENS
+        messages = [history.summary, *history.messages] if history.summary is not None else list(history.messages)
+        context = ChatContext(messages, history_tokens, prompt_tokens, time.perf_counter() - started)
+        logger.debug(
+            "chat context built: chat_id=%s messages=%d prompt_tokens=%d build_ms=%.3f",
+            chat.get_id().value(), len(context.messages), context.prompt_tokens, context.build_seconds * 1000,
+        )
+        return context
+
+    def discard(self, chat_id: str):
+        self._histories.pop(chat_id, None)
+
+    def _history(self, chat: Chat) -> _ChatHistory:
+        chat_id = chat.get_id().value()
+        history = self._histories.get(chat_id)
+        # ステップが削除されていた・要約が取り消された場合は組み立て直す
+        if history is None or history.step_count > chat.step_count() or history.summarized_step_count > chat.summarized_step_count():
+            history = _ChatHistory()
+            self._histories[chat_id] = history
+        self._histories.move_to_end(chat_id)
+        while self._max_chats > 0 and len(self._histories) > self._max_chats:
+            self._histories.popitem(last=False)
+        return history
+
+    def _apply_summary(self, history: _ChatHistory, chat: Chat):
+        """要約を差し替え、要約に含まれたステップをメッセージから取り除く。"""
+        summarized = chat.summarized_step_count()
+        if history.summary is not None:
+            history.total_tokens -= self._tokenizer.count(history.summary.content) + MESSAGE_OVERHEAD_TOKENS
+        history.summary = ChatMessage("system", SUMMARY_MESSAGE_PREFIX + chat.get_summary())
+        history.total_tokens += self._tokenizer.count(history.summary.content) + MESSAGE_OVERHEAD_TOKENS
+        history.summarized_step_count = summarized
+
+        # messages の先頭のステップが何件目か（切り捨て済みのステップの後）
+        first = history.step_count - len(history.step_tokens)
+        drop = min(max(summarized - first, 0), len(history.step_tokens))
+        history.total_tokens -= sum(history.step_tokens[:drop])
+        del history.step_tokens[:drop]
+        del history.messages[:drop * 2]
+        # 要約に含まれるステップは取り込まない
+        history.step_count = max(history.step_count, summarized)
+
+    def _truncate(self, history: _ChatHistory):
+        target = self._max_history_tokens * TRUNCATE_RATIO
+        drop = 0
+        while drop < len(history.step_tokens) and history.total_tokens > target:
+            history.total_tokens -= history.step_tokens[drop]
+            drop += 1
+        del history.step_tokens[:drop]
+        del history.messages[:drop * 2]
+
+def create_chat_context_builder(tokenizer: Tokenizer, max_history_tokens: int = 4000, max_chats: int = 1000) -> ChatContextBuilder:
+    return ChatContextBuilder(tokenizer, max_history_tokens, max_chats)
@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from typing import Optional
+
+from app.domain.chat.entity.chat import Chat
+
+class ChatSessionCache:
+    """会話中のチャット集約を chat_id ごとに保持するキャッシュ。
+
+    ターンごとにリポジトリから読み直したり、クライアントから受け取った履歴で
+    チャットを組み立て直したりせず、保持している集約にステップを追加するだけで済むようにする。
+    上限を超えた場合は最も長く使われていないものから破棄する（破棄後はリポジトリから読み直す）。
+    """
+
+    def __init__(self, max_sessions: int):
+        self._sessions: OrderedDict[str, Chat] = OrderedDict()
+        self._max_sessions = max_sessions
+
+    def get(self, chat_id: str) -> Optional[Chat]:
+        chat = self._sessions.get(chat_id)
+        if chat is not None:
+            self._sessions.move_to_end(chat_id)
+        return chat
+
+    def put(self, chat: Chat):
+        chat_id = chat.get_id().value()
+        self._sessions[chat_id] = chat
+        self._sessions.move_to_end(chat_id)
+        while self._max_sessions > 0 and len(self._sessions) > self._max_sessions:
+            self._sessions.popitem(last=False)
+
+    def discard(self, chat_id: str):
+        self._sessions.pop(chat_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+def create_chat_session_cache(max_sessions: int = 1000) -> ChatSessionCache:
+    return ChatSessionCache(max_sessions)
@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import AbstractContextManager, nullcontext
+from typing import Callable
+from app.domain.chat.entity.chat import Chat, Step
+from app.domain.chat.repository.chat import ChatRepository
+from app.usecase.ports.output.llm.client import AsyncLLMClient, LLMBusyError, LLM_TASK_SUMMARY
+from app.usecase.ports.output.metrics.metrics import Metrics, NULL_METRICS
+
+GENERATE_SUMMARY_PROMPT = """
+以下は、ユーザーとアシスタントの会話の要約と、その続きの会話です。
+続きの会話の内容を要約に取り込み、以降の会話で参照できるよう、事実・決定事項・ユーザーの意図を漏らさずに簡潔にまとめてください。
+要約だけを出力してください。
+"""
+
+logger = logging.getLogger(__name__)
+
+class ChatSummarizer:
+    """長い会話の古いステップを、バックグラウンドで会話の要約（Chat の summary）にまとめる。
+
+    - ターンが完了したら request を呼ぶ。直近の keep_recent_steps 件より前に、要約されていないステップが
+      batch_steps 件以上たまったチャットをキューに入れ、その batch_steps 件を前回の要約とあわせて
+      1 回の LLM 呼び出しで新しい要約にする。要約の更新（= 履歴の先頭が変わる）を batch_steps ターンに
+      1 回にまとめ、その間はプロバイダーのプロンプトキャッシュが効くようにする
+    - 要約は workers 個のワーカーで、ターンとは別に行う（ターンは要約の完了を待たない）。
+      キューが一杯の場合は入れずに捨てる（次のターンで再び依頼される）。同じチャットは同時に 1 つだけ扱う
+    - ワーカーは接続（ターン）の LLM の発生元を引き継がず、順番待ちの通知もしない。LLM の呼び出しは
+      llm_scope(チャット ID) の中で行い、使用量（予算による切り替えを含む）を要約したチャットのものとして扱わせる
+    """
+
+    def __init__(self, llm_client: AsyncLLMClient, chat_repository: ChatRepository, keep_recent_steps: int, batch_steps: int, workers: int, max_queue: int, metrics: Metrics, llm_scope: Callable[[str], AbstractContextManager[None]]):
+        self.llm_client = llm_client
+        self.chat_repository = chat_repository
+        self._llm_scope = llm_scope
+        self._keep_recent_steps = keep_recent_steps
+        # 0 の場合は要約しない
+        self._batch_steps = batch_steps
+        self._workers_count = workers
+        # 要約するチャットと、キューに入れた時刻
+        self._queue: asyncio.Queue[tuple[Chat, float]] = asyncio.Queue(max_queue)
+        # キューに入っている・要約中のチャット ID
+        self._pending: set[str] = set()
+        self._workers: list[asyncio.Task[None]] = []
+
+        summaries = metrics.counter("chat_summaries_total", "Background chat summarizations by result.", ["result"])
+        self._summaries_ok = summaries.labels("ok")
+        self._summaries_busy = summaries.labels("busy")
+        self._summaries_error = summaries.labels("error")
+        self._summaries_stale = summaries.labels("stale")
+        self._summaries_dropped = summaries.labels("dropped")
+        self._summary_seconds = metrics.histogram("chat_summary_seconds", "Duration of a background chat summarization.")
+        self._summary_lag = metrics.histogram("chat_summary_queue_seconds", "Time a chat waited for a summarization worker.")
+
+    def request(self, chat: Chat):
+        """要約が必要なチャットをキューに入れる（要約の完了は待たない）。"""
+        if not self._needs_summary(chat):
+            return
+        chat_id = chat.get_id().value()
+        if chat_id in self._pending:
+            return
+        try:
+            self._queue.put_nowait((chat, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._summaries_dropped.inc()
+            return
+        self._pending.add(chat_id)
+        if not self._workers:
+            self._start_workers()
+
+    def pending(self) -> int:
+        """キューに入っている・要約中のチャット数。"""
+        return len(self._pending)
+
+    async def join(self):
+        """キューに入っているチャットの要約がすべて終わるまで待つ。"""
+        await self._queue.join()
+
+    async def aclose(self):
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+
+    def _needs_summary(self, chat: Chat) -> bool:
+        if self._batch_steps <= 0:
+            return False
+        return chat.step_count() - self._keep_recent_steps - chat.summarized_step_count() >= self._batch_steps
+
+    def _start_workers(self):
+        for _ in range(self._workers_count):
+            # 依頼したターンのコンテキスト（LLM の発生元など）を引き継がないよう、空のコンテキストで動かす
+            self._workers.append(asyncio.create_task(self._work(), context=contextvars.Context()))
+
+    async def _work(self):
+        while True:
+            chat, enqueued_at = await self._queue.get()
+            started = time.perf_counter()
+            self._summary_lag.observe(started - enqueued_at)
+            summarized = False
+            try:
+                summarized = await self._summarize(chat)
+            except LLMBusyError:
+                self._summaries_busy.inc()
+                logger.warning("Skipped summarization for chat %s: LLM is busy", chat.get_id().value())
+            except Exception:
+                self._summaries_error.inc()
+                logger.exception("Failed to summarize chat %s", chat.get_id().value())
+            finally:
+                self._summary_seconds.observe(time.perf_counter() - started)
+                self._pending.discard(chat.get_id().value())
+                self._queue.task_done()
+            # まだ要約されていないステップが残っていれば続ける（取り込んだ長いチャットなど）。
+            # 失敗した場合は次のターンの依頼を待つ
+            if summarized:
+                self.request(chat)
+
+    async def _summarize(self, chat: Chat) -> bool:
+        start = chat.summarized_step_count()
+        end = start + self._batch_steps
+        if not self._needs_summary(chat):
+            return False
+        transcript = _transcript(chat.get_summary(), chat.get_steps_since(start)[:self._batch_steps])
+        with self._llm_scope(chat.get_id().value()):
+            summary = await self.llm_client.generate_response(transcript, GENERATE_SUMMARY_PROMPT, None, LLM_TASK_SUMMARY)
+
+        # 要約中にステップが削除された・他の要約で更新された・チャットが置き換えられた（他のワーカーへの移動・取り込み）
+        # 場合は、要約が内容と合わないため捨てる。置き換えの確認はリポジトリの読み込みを伴いうるため、
+        # LRU に影響しない peek でイベントループの外で行う
+        current = await asyncio.to_thread(self.chat_repository.peek, chat.get_id())
+        if chat.summarized_step_count() != start or chat.step_count() < end or current is not chat:
+            self._summaries_stale.inc()
+            return False
+        chat.update_summary(summary, end)
+        # 保存はターンと同じく update で行う（ファイルのリポジトリでは書き込みスレッドのキューに入れるだけで、
+        # ディスクへの書き込みはイベントループの外で行われる）
+        self.chat_repository.update(chat)
+        self._summaries_ok.inc()
+        return True
+
+def _transcript(summary: str, steps: list[Step]) -> str:
+    lines = [f"これまでの要約:\n{summary or '（なし）'}", "", "続きの会話:"]
+    for step in steps:
+        lines.append(f"ユーザー: {step.get_question().value()}")
+        lines.append(f"アシスタント: {step.get_answer().value()}")
+    return "\n".join(lines)
+
+def _no_llm_scope(chat_id: str) -> AbstractContextManager[None]:
+    return nullcontext()
+
+def create_chat_summarizer(llm_client: AsyncLLMClient, chat_repository: ChatRepository, keep_recent_steps: int = 10, batch_steps: int = 20, workers: int = 2, max_queue: int = 1000, metrics: Metrics = NULL_METRICS, llm_scope: Callable[[str], AbstractContextManager[None]] = _no_llm_scope) -> ChatSummarizer:
+    return ChatSummarizer(llm_client, chat_repository, keep_recent_steps, batch_steps, workers, max_queue, metrics, llm_scope)
@@ -0,0 +1,215 @@
+"""チャットの一括書き出し・取り込み（NDJSON / gzip）のスループットとメモリ使用量を計測する。
+
+指定した大きさの NDJSON のダンプを生成し、以下をそれぞれ別のプロセスで実行して、所要時間とメモリ使用量の最大値を出力する。
+- 取り込み: ダンプを少しずつ読み、バッチごとに検証してファイルのリポジトリへ保存する（chat_archive.py import と同じ処理）
+- 書き出し: ファイルのリポジトリから NDJSON / gzip を書き出す（chat_archive.py export と同じ処理）
+- 検証: ダンプの先頭の一部を、値オブジェクトを 1 件ずつ作る方法とバッチ単位の検証（decode_chats）で復元して比べる
+
+    uv run python -m benchmark.chat_archive --gigabytes 2
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+from app.domain.chat.entity.chat import Chat, create_chat, create_step
+from app.domain.chat.value_object.answer import create_answer
+from app.domain.chat.value_object.question import create_question
+from app.domain.chat.value_object.title import create_title
+from app.domain.shared.value_object.id import create_id
+from app.domain.shared.value_object.time import create_time
+from app.infrastructure.file.repository.chat import ChatRepositoryFileImpl
+from app.infrastructure.serialization.archive import create_chat_archive_decoder, encode_chat_archive
+from app.infrastructure.serialization.chat import decode_chats
+
+READ_CHUNK_BYTES = 1024 * 1024
+WORDS = ["ドメイン", "モデル", "ユースケース", "リポジトリ", "境界", "依存", "設計", "は", "を", "に", "の", "。"]
+
+
+def generate(path: str, size: int, steps: int, seed: int) -> tuple[int, int]:
+    """size バイト以上のダンプを書き、チャット数とステップ数を返す。"""
+    rng = random.Random(seed)
+    answers = ["".join(rng.choice(WORDS) for _ in range(60)) for _ in range(500)]
+    questions = [f"{rng.choice(WORDS)}について、{rng.choice(WORDS)}の観点で教えてください。" for _ in range(100)]
+    started_at = datetime(2025, 1, 1)
+    chats = total_steps = written = 0
+    with open(path, "wb") as f:
+        while written < size:
+            created = started_at + timedelta(minutes=chats)
+            record = {
+                "id": str(uuid.uuid4()),
+                "title": f"相談 {chats}",
+                "created_at": created.isoformat(),
+                "updated_at": (created + timedelta(seconds=steps)).isoformat(),
+                "steps": [
+                    [str(uuid.uuid4()), rng.choice(questions), rng.choice(answers), (created + timedelta(seconds=i)).isoformat()]
+                    for i in range(steps)
+                ],
+            }
+            line = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+            f.write(line)
+            written += len(line)
+            chats += 1
+            total_steps += steps
+    return chats, total_steps
+
+
+class AnonymousMemory:
+    """ヒープなどの匿名メモリ（RssAnon）の最大値を記録する。
+
+    スナップショットの mmap で読んだページもプロセスの RSS に含まれるが、ページキャッシュで回収できるため除く。
+    """
+
+    def __init__(self):
+        self.peak = 0
+
+    def sample(self):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    self.peak = max(self.peak, int(line.split()[1]) * 1024)
+                    return
+
+    def peak_mib(self) -> float:
+        self.sample()
+        return self.peak / 1024 / 1024
+
+
+def import_dump(dump: str, repository_path: str) -> dict[str, Any]:
+    memory = AnonymousMemory()
+    started = time.perf_counter()
+    repository = ChatRepositoryFileImpl(repository_path, snapshot_interval=0)
+    decoder = create_chat_archive_decoder()
+    chats = steps = 0
+    with open(dump, "rb") as f:
+        while chunk := f.read(READ_CHUNK_BYTES):
+            for batch in decoder.feed(chunk):
+                memory.sample()
+                repository.create_many(batch)
+                chats += len(batch)
+                steps += sum(chat.step_count() for chat in batch)
+    for batch in decoder.close():
+        repository.create_many(batch)
+        chats += len(batch)
+        steps += sum(chat.step_count() for chat in batch)
+    repository.close()
+    return {"seconds": time.perf_counter() - started, "chats": chats, "steps": steps, "rss": memory.peak_mib()}
+
+
+def export_dump(repository_path: str, output: str, compress: bool) -> dict[str, Any]:
+    memory = AnonymousMemory()
+    started = time.perf_counter()
+    repository = ChatRepositoryFileImpl(repository_path, snapshot_interval=0)
+    written = 0
+    with open(output, "wb") as f:
+        for chunk in encode_chat_archive(repository.iter_all(), compress):
+            memory.sample()
+            f.write(chunk)
+            written += len(chunk)
+    repository.close()
+    return {"seconds": time.perf_counter() - started, "bytes": written, "rss": memory.peak_mib()}
+
+
+def decode_per_object(records: list[Any]) -> list[Chat]:
+    """値オブジェクトを 1 件ずつ作って検証する、従来の復元方法。"""
+    chats = []
+    for record in records:
+        chat_id = create_id(record["id"])
+        chat = create_chat(
+            chat_id,
+            create_title(record["title"]),
+            [],
+            create_time(datetime.fromisoformat(record["created_at"])),
+            create_time(datetime.fromisoformat(record["updated_at"])),
+        )
+        for step_id, question, answer, created_at in record["steps"]:
+            chat.add_step(create_step(create_id(step_id), chat_id, create_question(question), create_answer(answer), create_time(datetime.fromisoformat(created_at))))
+        chats.append(chat)
+    return chats
+
+
+def compare_decode(dump: str, sample: int, batch_size: int) -> dict[str, Any]:
+    records = []
+    with open(dump, "rb") as f:
+        read = 0
+        for line in f:
+            records.append(json.loads(line))
+            read += len(line)
+            if read >= sample:
+                break
+    result: dict[str, Any] = {"chats": len(records), "steps": sum(len(record["steps"]) for record in records)}
+    for name, decode in (("per_object", decode_per_object), ("bulk", decode_chats)):
+        started = time.perf_counter()
+        for start in range(0, len(records), batch_size):
+            decode(records[start:start + batch_size])
+        result[name] = time.perf_counter() - started
+    return result
+
+
+def in_child(fn: Callable[..., dict[str, Any]], *args: Any) -> dict[str, Any]:
+    # メモリ使用量を処理ごとに測るため、新しいプロセスで実行する
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--gigabytes", type=float, default=2.0, help="生成するダンプの大きさ")
+    parser.add_argument("--steps", type=int, default=100, help="チャットあたりのステップ数")
+    parser.add_argument("--sample-megabytes", type=float, default=100.0, help="検証方法の比較に使うダンプの先頭の大きさ")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default=None, help="作業用のディレクトリ（既定は一時ディレクトリ）")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        dump = os.path.join(workdir, "dump.ndjson")
+        started = time.perf_counter()
+        chats, steps = generate(dump, int(args.gigabytes * 1024 ** 3), args.steps, args.seed)
+        size = os.path.getsize(dump)
+        print(f"dump: {size / 1024 ** 3:.2f}GiB, {chats:,} chats, {steps:,} steps (generated in {time.perf_counter() - started:.1f}s)")
+
+        # MiB/s は圧縮の有無によらず、展開後（NDJSON）の大きさで計算する
+        def report(name: str, result: dict[str, Any]):
+            print(f"{name:>14}: {result['seconds']:6.1f}s  {size / 1024 ** 2 / result['seconds']:7.1f}MiB/s  "
+                  f"{chats / result['seconds']:8,.0f} chats/s  {steps / result['seconds']:10,.0f} steps/s  "
+                  f"max anon RSS {result['rss']:,.0f}MiB")
+
+        repository_path = os.path.join(workdir, "repository")
+        result = in_child(import_dump, dump, repository_path)
+        assert result["chats"] == chats and result["steps"] == steps
+        report("import ndjson", result)
+
+        exported = os.path.join(workdir, "export.ndjson")
+        result = in_child(export_dump, repository_path, exported, False)
+        report("export ndjson", result)
+        os.remove(exported)
+
+        compressed = os.path.join(workdir, "export.ndjson.gz")
+        result = in_child(export_dump, repository_path, compressed, True)
+        report("export gzip", result)
+        print(f"{'':>14}  gzip: {result['bytes'] / 1024 ** 2:,.0f}MiB ({result['bytes'] / size:.0%} of ndjson)")
+        shutil.rmtree(repository_path)
+
+        result = in_child(import_dump, compressed, repository_path)
+        report("import gzip", result)
+        os.remove(compressed)
+
+        result = in_child(compare_decode, dump, int(args.sample_megabytes * 1024 ** 2), 500)
+        print(f"decode {result['chats']:,} chats / {result['steps']:,} steps:"
+              f" per-object {result['steps'] / result['per_object']:,.0f} steps/s,"
+              f" bulk {result['steps'] / result['bulk']:,.0f} steps/s ({result['per_object'] / result['bulk']:.1f}x)")
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""チャットの一覧（更新日時順）と全文検索を、索引あり・なし（全件走査）で比較する。
+
+インメモリのリポジトリにチャットを作成し、以下を出力する。
+- 索引の構築時間と、索引が使うメモリ（RSS の増分）
+- 既存のチャットに 1 ステップ追加したときの、索引の更新を含む保存時間
+- 一覧（先頭ページ・途中のページ）と検索（まれな語・よく出る語・一致なし・1 文字）の所要時間
+
+索引なしの場合は、一覧は find_all() を更新日時で並べ替え、検索は新しい順に全文を正規化して確認する。
+質問・回答の文字列は共有し、チャットとステップのオブジェクトの分だけメモリを使う。
+
+    uv run python -m benchmark.chat_index --chats 10000 --steps 100
+    uv run python -m benchmark.chat_index --chats 100000 --steps 100 --skip-baseline  # 10M ステップ
+"""
+
+import argparse
+import random
+import statistics
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from app.domain.chat.entity.chat import Chat, create_step, restore_chat
+from app.domain.chat.value_object.answer import create_answer
+from app.domain.chat.value_object.question import create_question
+from app.domain.chat.value_object.title import restore_title
+from app.domain.shared.value_object.id import generate_id
+from app.domain.shared.value_object.time import create_time
+from app.infrastructure.index.chat import create_indexed_chat_repository
+from app.infrastructure.memory.repository.chat import create_chat_repository
+
+WORDS = [
+    "ドメイン", "モデル", "ユースケース", "リポジトリ", "エンティティ", "値オブジェクト", "依存", "境界", "ポート",
+    "アダプター", "設計", "責務", "分離", "変更", "テスト", "は", "を", "に", "の", "として", "します", "。", "、",
+]
+KATAKANA = "アイウエオカキクケコサシスセソタチツテトナニヌネノハヒフヘホマミムメモヤユヨラリルレロワン"
+
+
+def make_topics(count: int, rng: random.Random) -> list[str]:
+    topics: set[str] = set()
+    while len(topics) < count:
+        topics.add("".join(rng.choice(KATAKANA) for _ in range(rng.randint(4, 6))))
+    return sorted(topics)
+
+
+def build_chats(chats: int, steps: int, seed: int) -> tuple[list[Chat], list[str]]:
+    rng = random.Random(seed)
+    topics = make_topics(max(chats // 20, 10), rng)
+    answers = ["".join(rng.choice(WORDS) for _ in range(40)) for _ in range(1000)]
+    questions = {topic: [f"{topic}の{word}について教えてください。" for word in WORDS[:8]] for topic in topics}
+    started_at = datetime(2025, 1, 1)
+    result: list[Chat] = []
+    for index in range(chats):
+        topic = rng.choice(topics)
+        step_ids = [generate_id().value() for _ in range(steps)]
+        created = [started_at + timedelta(seconds=index * 60 + i) for i in range(steps)]
+        updated_at = create_time(created[-1] if steps else started_at)
+        result.append(restore_chat(
+            generate_id(), restore_title(f"{topic}の相談"), create_time(started_at), updated_at,
+            step_ids,
+            [rng.choice(questions[topic]) for _ in range(steps)],
+            [rng.choice(answers) for _ in range(steps)],
+            created,
+        ))
+    return result, topics
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def measure(fn: Callable[[], object], repeat: int) -> float:
+    """repeat 回実行した所要時間の中央値（ミリ秒）を返す。"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize("NFKC", text).casefold()
+
+
+def scan_list(chats: list[Chat], limit: int, before: Optional[datetime]) -> list[Chat]:
+    ordered = sorted(chats, key=lambda chat: chat.get_updated_at().value(), reverse=True)
+    if before is not None:
+        ordered = [chat for chat in ordered if chat.get_updated_at().value() < before]
+    return ordered[:limit]
+
+
+def scan_search(chats: list[Chat], query: str, limit: int) -> list[Chat]:
+    word = normalize(query)
+    hits = []
+    for chat in sorted(chats, key=lambda chat: chat.get_updated_at().value(), reverse=True):
+        texts = [chat.get_title().value()]
+        for step in chat.get_steps():
+            texts.append(step.get_question().value())
+            texts.append(step.get_answer().value())
+        if any(word in normalize(text) for text in texts):
+            hits.append(chat)
+            if len(hits) == limit:
+                break
+    return hits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=10000)
+    parser.add_argument("--steps", type=int, default=100, help="チャットあたりのステップ数")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-baseline", action="store_true", help="索引なし（全件走査）の計測を省く")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    chats, topics = build_chats(args.chats, args.steps, args.seed)
+    repository = create_chat_repository()
+    for chat in chats:
+        repository.create(chat)
+    print(f"chats={args.chats:,} steps={args.chats * args.steps:,} (generated in {time.perf_counter() - started:.1f}s)")
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    index = create_indexed_chat_repository(repository)
+    index.build()
+    build_seconds = time.perf_counter() - started
+    print(f"index build: {build_seconds:.1f}s ({args.chats * args.steps / build_seconds:,.0f} steps/s), rss +{(rss_bytes() - rss_before) / 1024 / 1024:,.0f}MiB")
+
+    # 1 ステップ追加して保存する（会話のターンと同じ更新）
+    rng = random.Random(args.seed)
+    question = create_question("ドメインの境界について教えてください。")
+    answer = create_answer("".join(rng.choice(WORDS) for _ in range(40)))
+    update_samples = []
+    for _ in range(1000):
+        chat = rng.choice(chats)
+        now = create_time(datetime.now())
+        chat.add_step(create_step(generate_id(), chat.get_id(), question, answer, now))
+        chat.update_updated_at(now)
+        started = time.perf_counter()
+        index.update(chat)
+        update_samples.append((time.perf_counter() - started) * 1000)
+    print(f"update with a new step: p50={statistics.median(update_samples):.3f}ms")
+
+    # 途中のページのカーソルと、検索語（まれな語・よく出る語・一致なし）
+    middle = index.list_recent(args.limit, None)
+    for _ in range(10):
+        if middle.next_cursor is None:
+            break
+        middle = index.list_recent(args.limit, middle.next_cursor)
+    middle_cursor = middle.next_cursor
+    middle_before = middle.items[-1].updated_at if middle.items else None
+    rare, common, missing = topics[len(topics) // 2], "境界", "存在しない語"
+
+    print(f"{'':>22} {'indexed (ms)':>13} {'scan (ms)':>10}")
+    cases: list[tuple[str, Callable[[], object], Callable[[], object]]] = [
+        ("list first page", lambda: index.list_recent(args.limit, None), lambda: scan_list(chats, args.limit, None)),
+        ("list page 11", lambda: index.list_recent(args.limit, middle_cursor), lambda: scan_list(chats, args.limit, middle_before)),
+        (f"search rare ({rare})", lambda: index.search(rare, args.limit, None), lambda: scan_search(chats, rare, args.limit)),
+        (f"search common ({common})", lambda: index.search(common, args.limit, None), lambda: scan_search(chats, common, args.limit)),
+        ("search no match", lambda: index.search(missing, args.limit, None), lambda: scan_search(chats, missing, args.limit)),
+        ("search one char (境)", lambda: index.search("境", args.limit, None), lambda: scan_search(chats, "境", args.limit)),
+    ]
+    for name, indexed, scan in cases:
+        indexed_ms = measure(indexed, args.repeat)
+        scan_text = "-" if args.skip_baseline else f"{measure(scan, 1):,.1f}"
+        print(f"{name:>22} {indexed_ms:>13.3f} {scan_text:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""インメモリのチャットリポジトリに対する操作 1 回あたりのコストを計測する。
+
+    uv run python -m benchmark.chat_repository --sizes 10000 100000 1000000
+"""
+
+import argparse
+import random
+import time
+import uuid
+from datetime import datetime
+
+from app.domain.chat.entity.chat import Chat, create_chat, create_step
+from app.domain.chat.value_object.answer import create_answer
+from app.domain.chat.value_object.question import create_question
+from app.domain.chat.value_object.title import create_title
+from app.domain.shared.value_object.id import create_id
+from app.domain.shared.value_object.time import create_time
+from app.infrastructure.memory.repository.chat import create_chat_repository
+
+
+def build_chats(count: int) -> list[Chat]:
+    now = create_time(datetime.now())
+    title = create_title("ベンチマーク")
+    return [create_chat(create_id(str(uuid.uuid4())), title, [], now, now) for _ in range(count)]
+
+
+def per_op(elapsed: float, ops: int) -> str:
+    return f"{elapsed / ops * 1e6:8.2f} µs/op"
+
+
+def run(size: int, samples: int):
+    chats = build_chats(size)
+    repository = create_chat_repository()
+
+    started = time.perf_counter()
+    for chat in chats:
+        repository.create(chat)
+    create_elapsed = time.perf_counter() - started
+
+    picked = random.sample(chats, min(samples, size))
+    ids = [chat.get_id() for chat in picked]
+
+    started = time.perf_counter()
+    for id in ids:
+        repository.find_by_id(id)
+    find_elapsed = time.perf_counter() - started
+
+    # 1 ターン分（ステップを 1 件追加して保存）の更新
+    question = create_question("質問")
+    answer = create_answer("回答")
+    now = create_time(datetime.now())
+    started = time.perf_counter()
+    for chat in picked:
+        chat.add_step(create_step(create_id(str(uuid.uuid4())), chat.get_id(), question, answer, now))
+        repository.update(chat)
+    update_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for id in ids:
+        repository.delete(id)
+    delete_elapsed = time.perf_counter() - started
+
+    print(
+        f"chats={size:>8}  create {per_op(create_elapsed, size)}  find {per_op(find_elapsed, len(ids))}"
+        f"  update {per_op(update_elapsed, len(picked))}  delete {per_op(delete_elapsed, len(ids))}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--samples", type=int, default=10_000, help="find/update/delete を計測する件数")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run(size, args.samples)
+
+
+if __name__ == "__main__":
+    main()
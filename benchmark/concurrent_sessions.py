@@ -0,0 +1,105 @@
+"""N 本の WebSocket を同時に張り、1 ターンの完了までにかかる時間を計測する。
+
+LLM 呼び出しを一定時間後に回答を返す擬似 LLM に差し替え、
+同期版（イベントループをブロックする）と非同期版を比較する。
+
+    uv run python -m benchmark.concurrent_sessions --sockets 32 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import time
+import uuid
+from typing import AsyncGenerator
+
+import uvicorn
+from websockets.asyncio.client import connect
+
+from app.infrastructure.fastapi.application import create_fastapi_application
+from app.infrastructure.fastapi.handler.stream.chat_stream import create_chat_stream_handler
+from app.infrastructure.fastapi.handler.ui.ui import create_ui_handler
+from app.infrastructure.memory.repository.chat import create_chat_repository
+from app.infrastructure.fake.client import create_async_fake_llm_client, create_fake_llm, create_fake_llm_client
+from app.usecase.ports.input.stream.chat_session import AsyncChatSessionInputPort, ChatSessionDelta, ChatSessionInput, ChatSessionInputPort, ChatSessionOutput
+from app.usecase.stream.chat_session import create_async_chat_session_usecase, create_chat_session_usecase
+from app.usecase.stream.session_cache import create_chat_session_cache
+from app.usecase.stream.context import create_chat_context_builder
+from app.infrastructure.openai.tokenizer import create_tokenizer
+
+
+class BlockingUsecaseAdapter(AsyncChatSessionInputPort):
+    """同期版ユースケースをそのまま await 可能に見せる（変更前の挙動の再現）。"""
+
+    def __init__(self, usecase: ChatSessionInputPort):
+        self.usecase = usecase
+
+    async def execute(self, input: ChatSessionInput) -> ChatSessionOutput:
+        return self.usecase.execute(input)
+
+    async def stream(self, input: ChatSessionInput) -> AsyncGenerator[ChatSessionDelta | ChatSessionOutput, None]:
+        output = self.usecase.execute(input)
+        yield ChatSessionDelta(output.answer)
+        yield output
+
+
+def build_usecase(mode: str, latency: float) -> AsyncChatSessionInputPort:
+    context_builder = create_chat_context_builder(create_tokenizer())
+    # 生成速度は考慮せず、latency 秒後に回答全体を返す
+    llm = create_fake_llm(latency_seconds=latency, tokens_per_second=0)
+    if mode == "sync":
+        return BlockingUsecaseAdapter(create_chat_session_usecase(create_fake_llm_client(llm), create_chat_repository(), create_chat_session_cache(), context_builder))
+    return create_async_chat_session_usecase(create_async_fake_llm_client(llm), create_chat_repository(), create_chat_session_cache(), context_builder)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def one_turn(url: str) -> float:
+    async with connect(url) as ws:
+        started = time.perf_counter()
+        await ws.send(json.dumps({"chat_id": str(uuid.uuid4()), "current_question": "こんにちは"}))
+        while json.loads(await ws.recv())["type"] != "end":
+            pass
+        return time.perf_counter() - started
+
+
+async def run(mode: str, sockets: int, latency: float) -> float:
+    usecase = build_usecase(mode, latency)
+    app = create_fastapi_application(create_chat_stream_handler(usecase), create_ui_handler()).application()
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    url = f"ws://127.0.0.1:{port}/chat/stream"
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(one_turn(url) for _ in range(sockets)))
+        return time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        await serve_task
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.5, help="LLM 1 回あたりの擬似レイテンシ（秒）")
+    args = parser.parse_args()
+
+    print(f"sockets={args.sockets} latency={args.latency:.2f}s")
+    for mode in ("sync", "async"):
+        # 1 本だけの場合の所要時間を基準に、N 本同時の場合と比較する
+        single_turn = asyncio.run(run(mode, 1, args.latency))
+        elapsed = asyncio.run(run(mode, args.sockets, args.latency))
+        print(f"{mode:>5}: single={single_turn:.2f}s concurrent={elapsed:.2f}s ({elapsed / single_turn:.1f}x single turn)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""/chat/stream の接続の上限・ハートビート・アイドル切断・停止時のドレインを確かめる。
+
+アプリ（main:app）を擬似 LLM で、ハートビートとアイドルの時間を短くして起動し、以下を出力する。
+1. ping に応答しない v2 の接続（切れたまま残った接続を模したもの）と、pong を返す v2 の接続を開き、
+   応答しない接続だけが 4002 で閉じられること、その後アイドルの接続が 4001 で閉じられ、
+   websocket_connections が 0 に戻ること
+2. 接続数の上限を超えた接続が 1013 で閉じられること
+3. 回答の途中で SIGTERM を送った場合に、ドレインあり（DRAIN_TIMEOUT_SECONDS）では回答を最後まで受け取ってから
+   1001 で閉じられ、ドレイン無し（0）では回答の途中で 1012 で閉じられること
+
+    uv run python -m benchmark.connections --dead 20 --alive 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import signal
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+import httpx
+from websockets.asyncio.client import ClientConnection, connect
+from websockets.exceptions import ConnectionClosed
+from websockets.typing import Subprotocol
+
+from benchmark.loadgen import free_port, wait_for_port
+
+V2_JSON = Subprotocol("chat.v2.json")
+
+def start_app(port: int, env: dict[str, str]) -> subprocess.Popen[bytes]:
+    app_env = dict(os.environ)
+    app_env.update({
+        "LLM_BACKEND": "fake",
+        "CHAT_REPOSITORY": "memory",
+        "METRICS_ENABLED": "true",
+        "LLM_CACHE_ENABLED": "false",
+    })
+    app_env.update(env)
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"], env=app_env)
+
+async def open_connections(port: int) -> Optional[float]:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"http://127.0.0.1:{port}/metrics")
+    match = re.search(r"^websocket_connections (\S+)$", response.text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+async def wait_closed(ws: ClientConnection, pong: bool) -> tuple[Optional[int], float]:
+    """接続が閉じられるまで待ち、閉じたコードと時間を返す。pong が False の場合は何も受信しない（ping に応答しない）。"""
+    started = time.perf_counter()
+    try:
+        if pong:
+            async for message in ws:
+                if json.loads(message).get("type") == "ping":
+                    await ws.send(json.dumps({"type": "pong"}))
+        else:
+            await ws.wait_closed()
+    except ConnectionClosed:
+        pass
+    return (ws.close_code, time.perf_counter() - started)
+
+async def check_heartbeat(args: argparse.Namespace):
+    port = free_port()
+    app = start_app(port, {
+        "CHAT_STREAM_HEARTBEAT_SECONDS": str(args.heartbeat),
+        "CHAT_STREAM_HEARTBEAT_TIMEOUT_SECONDS": str(args.heartbeat),
+        "CHAT_STREAM_IDLE_SECONDS": str(args.idle),
+        "CHAT_STREAM_MAX_CONNECTIONS": str(args.dead + args.alive),
+    })
+    try:
+        await wait_for_port(port, app)
+        url = f"ws://127.0.0.1:{port}/chat/stream"
+        clients = [await connect(f"{url}?chat_id={uuid.uuid4()}", subprotocols=[V2_JSON]) for _ in range(args.dead + args.alive)]
+        print(f"opened {len(clients)} connections: websocket_connections={await open_connections(port)}")
+        # 上限に達しているため、次の接続は受け付けられない
+        async with connect(url) as extra:
+            try:
+                await extra.recv()
+            except ConnectionClosed:
+                pass
+            print(f"over capacity: closed with {extra.close_code}")
+
+        results = await asyncio.gather(*(wait_closed(ws, pong=index >= args.dead) for index, ws in enumerate(clients)))
+        for name, group in (("no pong", results[:args.dead]), ("pong", results[args.dead:])):
+            codes = Counter(code for code, _ in group)
+            seconds = max(elapsed for _, elapsed in group)
+            print(f"{name:>8}: closed {dict(codes)} within {seconds:.1f}s")
+        await asyncio.sleep(0.2)
+        print(f"after close: websocket_connections={await open_connections(port)}")
+    finally:
+        app.terminate()
+        app.wait()
+
+async def drain_once(drain_timeout: float, args: argparse.Namespace) -> tuple[int, bool, Optional[int]]:
+    """回答の途中で SIGTERM を送り、受け取った delta の数・end を受け取ったか・閉じたコードを返す。"""
+    port = free_port()
+    app = start_app(port, {
+        "DRAIN_TIMEOUT_SECONDS": str(drain_timeout),
+        "FAKE_LLM_LATENCY_SECONDS": "0.1",
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.answer_tokens / args.answer_seconds),
+        "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+    })
+    deltas = 0
+    ended = False
+    try:
+        await wait_for_port(port, app)
+        async with connect(f"ws://127.0.0.1:{port}/chat/stream?chat_id={uuid.uuid4()}", subprotocols=[V2_JSON]) as ws:
+            await ws.send(json.dumps({"current_question": "停止中に回答を受け取れますか"}))
+            try:
+                async for message in ws:
+                    frame = json.loads(message)
+                    if frame["type"] == "delta":
+                        deltas += 1
+                        if deltas == 1:
+                            app.send_signal(signal.SIGTERM)
+                    elif frame["type"] == "end":
+                        ended = True
+            except ConnectionClosed:
+                pass
+            return deltas, ended, ws.close_code
+    finally:
+        app.wait(timeout=drain_timeout + 30)
+
+async def main_async(args: argparse.Namespace):
+    print(f"heartbeat {args.heartbeat}s + timeout {args.heartbeat}s, idle {args.idle}s")
+    await check_heartbeat(args)
+    print(f"SIGTERM during a {args.answer_seconds}s answer ({args.answer_tokens} tokens)")
+    for name, drain_timeout in (("drain", args.drain_timeout), ("no drain", 0.0)):
+        deltas, ended, code = await drain_once(drain_timeout, args)
+        print(f"{name:>8}: deltas {deltas:4d}/{args.answer_tokens}  end={ended}  closed with {code}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dead", type=int, default=20, help="ping に応答しない接続の数")
+    parser.add_argument("--alive", type=int, default=10, help="pong を返す接続の数")
+    parser.add_argument("--heartbeat", type=float, default=0.5)
+    parser.add_argument("--idle", type=float, default=3.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--answer-seconds", type=float, default=2.0)
+    parser.add_argument("--drain-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""会話が長くなったときの、ターンごとのプロンプトのトークン数と組み立て時間を計測する。
+
+従来の方式（毎ターン全ステップを 1 つの文字列に連結してトークン数を数える）と、
+ChatContextBuilder（差分で組み立て、予算を超えたら古いステップを切り捨てる）を比較する。
+
+    uv run python -m benchmark.context_builder --turns 500 --max-tokens 4000
+"""
+
+import argparse
+import time
+import uuid
+from datetime import datetime
+
+from app.domain.chat.entity.chat import Chat, create_chat, create_step
+from app.domain.chat.value_object.answer import create_answer
+from app.domain.chat.value_object.question import create_question
+from app.domain.chat.value_object.title import create_title
+from app.domain.shared.value_object.id import create_id
+from app.domain.shared.value_object.time import create_time
+from app.infrastructure.openai.tokenizer import create_tokenizer
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+from app.usecase.stream.context import create_chat_context_builder
+
+QUESTION = "DDD とクリーンアーキテクチャの違いを教えてください。"
+ANSWER = "DDD はドメインの知識をモデルとして表現する設計手法で、クリーンアーキテクチャは依存の向きを内側に揃える構成の指針です。" * 4
+
+
+def joined_history(chat: Chat, tokenizer: Tokenizer) -> tuple[int, float]:
+    started = time.perf_counter()
+    history = "\n".join(f"{index + 1}: {step.get_question().value()} -> {step.get_answer().value()}" for index, step in enumerate(chat.get_steps()))
+    tokens = tokenizer.count(history) + tokenizer.count(QUESTION)
+    return tokens, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--max-tokens", type=int, default=4000)
+    parser.add_argument("--report-every", type=int, default=50)
+    args = parser.parse_args()
+
+    tokenizer = create_tokenizer()
+    builder = create_chat_context_builder(tokenizer, args.max_tokens)
+    now = create_time(datetime.now())
+    chat = create_chat(create_id(str(uuid.uuid4())), create_title("ベンチマーク"), [], now, now)
+
+    print(f"{'turn':>6} {'joined tokens':>14} {'joined ms':>10} {'builder tokens':>15} {'builder ms':>11}")
+    for turn in range(1, args.turns + 1):
+        joined_tokens, joined_elapsed = joined_history(chat, tokenizer)
+        context = builder.build(chat, QUESTION)
+        if turn == 1 or turn % args.report_every == 0:
+            print(f"{turn:>6} {joined_tokens:>14} {joined_elapsed * 1e3:>10.3f} {context.prompt_tokens:>15} {context.build_seconds * 1e3:>11.3f}")
+        chat.add_step(create_step(create_id(str(uuid.uuid4())), chat.get_id(), create_question(QUESTION), create_answer(ANSWER), now))
+
+
+if __name__ == "__main__":
+    main()
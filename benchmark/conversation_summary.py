@@ -0,0 +1,133 @@
+"""会話が数百ステップまで長くなったときの、ターンごとのプロンプトのトークン数とターンの所要時間を計測する。
+
+会話の要約を使わない構成（毎ターン全ステップを履歴として渡す）と、ChatSummarizer で古いステップを
+バックグラウンドで要約し、要約と直近のステップだけを渡す構成とで、同じ会話を chats 個並行して流す。
+擬似 LLM は、プロバイダーのプロンプトの処理時間を模して、プロンプトのトークン数に比例して最初のトークンまでの
+時間が延びるようにする（--prefill-us-per-token）。report_every ターンごとに、回答生成のプロンプトのトークン数と
+ターンの所要時間（chats 個の平均）を出力し、最後に要約に使ったトークン数を含めた合計を出力する。
+
+    uv run python -m benchmark.conversation_summary --turns 300 --chats 4
+"""
+
+import argparse
+import asyncio
+import contextvars
+import statistics
+import time
+from collections import defaultdict
+from typing import AsyncIterator, Optional
+
+from app.infrastructure.fake.client import create_async_fake_llm_client, create_fake_llm
+from app.infrastructure.memory.repository.chat import create_chat_repository
+from app.infrastructure.openai.tokenizer import create_tokenizer
+from app.usecase.ports.input.stream.chat_session import AsyncChatSessionInputPort, ChatSessionInput
+from app.usecase.ports.output.llm.client import AsyncLLMClient, ChatMessage, LLM_TASK_STEP, LLM_TASK_SUMMARY
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+from app.usecase.stream.chat_session import create_async_chat_session_usecase
+from app.usecase.stream.context import create_chat_context_builder
+from app.usecase.stream.session_cache import create_chat_session_cache
+from app.usecase.stream.summary import create_chat_summarizer
+
+QUESTION = "DDD とクリーンアーキテクチャの違いについて、前の回答を踏まえてもう少し詳しく教えてください。"
+
+# 回答生成を依頼した会話の番号（要約のワーカーは会話のコンテキストを引き継がないため None になる）
+_conversation: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("conversation", default=None)
+
+class PrefillLLMClient(AsyncLLMClient):
+    """プロンプトのトークン数に比例した時間だけ待ってから、上流の擬似 LLM を呼び出す。処理ごとのトークン数を記録する。"""
+
+    def __init__(self, client: AsyncLLMClient, tokenizer: Tokenizer, seconds_per_token: float):
+        self._client = client
+        self._tokenizer = tokenizer
+        self._seconds_per_token = seconds_per_token
+        self.prompt_tokens: dict[str, list[int]] = defaultdict(list)
+        # 会話ごとの最後の回答生成のプロンプトのトークン数
+        self.last_step_tokens: dict[int, int] = {}
+
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        await self._prefill(question, prompt, chat_history, task)
+        return await self._client.generate_response(question, prompt, chat_history, task)
+
+    async def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        await self._prefill(question, prompt, chat_history, task)
+        async for chunk in self._client.stream_response(question, prompt, chat_history, task):
+            yield chunk
+
+    async def _prefill(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str):
+        tokens = self._tokenizer.count(prompt + question) + sum(self._tokenizer.count(message.content) for message in chat_history or [])
+        self.prompt_tokens[task].append(tokens)
+        conversation = _conversation.get()
+        if task == LLM_TASK_STEP and conversation is not None:
+            self.last_step_tokens[conversation] = tokens
+        await asyncio.sleep(tokens * self._seconds_per_token)
+
+async def converse(usecase: AsyncChatSessionInputPort, client: PrefillLLMClient, conversation: int, turns: int, think_time: float) -> list[tuple[int, float]]:
+    """1 つの会話を turns ターン続け、ターンごとの (回答生成のプロンプトのトークン数, 所要時間) を返す。"""
+    _conversation.set(conversation)
+    results: list[tuple[int, float]] = []
+    chat_id: Optional[str] = None
+    for _ in range(turns):
+        started = time.perf_counter()
+        output = await usecase.execute(ChatSessionInput(chat_id=chat_id, current_question=QUESTION))
+        elapsed = time.perf_counter() - started
+        chat_id = output.chat_id
+        results.append((client.last_step_tokens[conversation], elapsed))
+        await asyncio.sleep(think_time)
+    return results
+
+async def run(args: argparse.Namespace, summarize: bool) -> tuple[list[list[tuple[int, float]]], PrefillLLMClient]:
+    tokenizer = create_tokenizer()
+    fake = create_async_fake_llm_client(create_fake_llm(latency_seconds=args.latency, tokens_per_second=0, answer_tokens=args.answer_tokens))
+    client = PrefillLLMClient(fake, tokenizer, args.prefill_us_per_token / 1e6)
+    repository = create_chat_repository()
+    summarizer = None
+    if summarize:
+        summarizer = create_chat_summarizer(client, repository, keep_recent_steps=args.keep_recent_steps, batch_steps=args.batch_steps, workers=args.workers)
+    # 要約の効果だけを見るため、トークン数の上限による切り捨ては行わない
+    usecase = create_async_chat_session_usecase(client, repository, create_chat_session_cache(), create_chat_context_builder(tokenizer, 0), summarizer=summarizer)
+    results = await asyncio.gather(*(converse(usecase, client, conversation, args.turns, args.think_time) for conversation in range(args.chats)))
+    if summarizer is not None:
+        await summarizer.aclose()
+    return list(results), client
+
+async def main_async(args: argparse.Namespace):
+    print(f"{args.chats} chats x {args.turns} turns, prefill {args.prefill_us_per_token}us/token, "
+          f"summary every {args.batch_steps} steps keeping {args.keep_recent_steps} recent ({args.workers} workers)")
+    modes: dict[str, tuple[list[list[tuple[int, float]]], PrefillLLMClient]] = {}
+    for name, summarize in (("full", False), ("summary", True)):
+        modes[name] = await run(args, summarize)
+
+    print(f"{'turn':>6} {'full tokens':>12} {'full ms':>9} {'summary tokens':>15} {'summary ms':>11}")
+    for turn in range(args.turns):
+        if turn != 0 and (turn + 1) % args.report_every != 0:
+            continue
+        row = []
+        for name in ("full", "summary"):
+            results = modes[name][0]
+            row.append(statistics.mean(result[turn][0] for result in results))
+            row.append(statistics.mean(result[turn][1] for result in results) * 1000)
+        print(f"{turn + 1:>6} {row[0]:>12,.0f} {row[1]:>9.1f} {row[2]:>15,.0f} {row[3]:>11.1f}")
+
+    for name in ("full", "summary"):
+        client = modes[name][1]
+        step_tokens = sum(client.prompt_tokens[LLM_TASK_STEP])
+        summary_tokens = sum(client.prompt_tokens[LLM_TASK_SUMMARY])
+        print(f"{name:>8}: prompt tokens {step_tokens + summary_tokens:12,d} (answers {step_tokens:,d}, summaries {summary_tokens:,d} in {len(client.prompt_tokens[LLM_TASK_SUMMARY])} calls)")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--chats", type=int, default=4)
+    parser.add_argument("--report-every", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.005, help="プロンプトの処理時間を除いた、最初のトークンまでの時間")
+    parser.add_argument("--prefill-us-per-token", type=float, default=5.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--think-time", type=float, default=0.0)
+    parser.add_argument("--keep-recent-steps", type=int, default=10)
+    parser.add_argument("--batch-steps", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""ドメインオブジェクト（Chat / Step / 値オブジェクト）のメモリ使用量と、ターンあたりの処理速度を計測する。
+
+従来の実装（インスタンスごとに __dict__ を持ち、Chat は Step のリストを保持し、ID は毎回 UUID として
+パースし直す）をこのファイル内に再現し、現在の実装と比較する。
+
+- メモリ: 1,000 ステップあたりの割り当てバイト数（tracemalloc。質問・回答の文字列は両者で共有し、計上しない）
+- 速度: 1 ターン分のドメイン操作（質問の作成・ステップの採番と追加・新しいステップの取り出し）の回数 / 秒
+
+    uv run python -m benchmark.domain_objects --chats 100 --steps 1000
+"""
+
+import argparse
+import time
+import tracemalloc
+import uuid
+from datetime import datetime
+from typing import Callable
+
+from app.domain.chat.entity.chat import create_chat, create_step
+from app.domain.chat.value_object.answer import create_answer
+from app.domain.chat.value_object.question import create_question
+from app.domain.chat.value_object.title import create_title
+from app.domain.shared.value_object.id import generate_id
+from app.domain.shared.value_object.time import create_time
+
+QUESTION = "DDD とクリーンアーキテクチャの違いを教えてください。"
+ANSWER = "DDD はドメインの知識をモデルとして表現する設計手法です。" * 4
+
+
+class LegacyValue:
+    def __init__(self, value):
+        self._value = value
+
+    def value(self):
+        return self._value
+
+
+class LegacyId(LegacyValue):
+    def __init__(self, value: str):
+        if not uuid.UUID(value):
+            raise ValueError("Id must be a valid UUID")
+        super().__init__(value)
+
+
+class LegacyStep:
+    def __init__(self, id, chat_id, question, answer, created_at):
+        self._id = id
+        self._chat_id = chat_id
+        self._question = question
+        self._answer = answer
+        self._created_at = created_at
+
+
+class LegacyChat:
+    def __init__(self, id, title, steps, created_at, updated_at):
+        self._id = id
+        self._title = title
+        self._steps = steps
+        self._created_at = created_at
+        self._updated_at = updated_at
+
+    def get_id(self):
+        return self._id
+
+    def get_steps(self):
+        return self._steps
+
+    def add_step(self, step):
+        self._steps.append(step)
+
+
+def legacy_chat():
+    now = LegacyValue(datetime.now())
+    return LegacyChat(LegacyId(str(uuid.uuid4())), LegacyValue("ベンチマーク"), [], now, now)
+
+
+def legacy_turn(chat: LegacyChat):
+    question = LegacyValue(QUESTION)
+    step = LegacyStep(LegacyId(str(uuid.uuid4())), chat.get_id(), question, LegacyValue(ANSWER), LegacyValue(datetime.now()))
+    chat.add_step(step)
+    # 履歴の組み立てで新しいステップを読む
+    chat.get_steps()[-1:]
+
+
+def current_chat():
+    now = create_time(datetime.now())
+    return create_chat(generate_id(), create_title("ベンチマーク"), [], now, now)
+
+
+def current_turn(chat):
+    question = create_question(QUESTION)
+    step = create_step(generate_id(), chat.get_id(), question, create_answer(ANSWER), create_time(datetime.now()))
+    chat.add_step(step)
+    chat.get_steps_since(chat.step_count() - 1)
+
+
+def measure_memory(new_chat: Callable, turn: Callable, chats: int, steps: int) -> float:
+    """1,000 ステップあたりの割り当てバイト数を返す。"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [new_chat() for _ in range(chats)]
+    for chat in held:
+        for _ in range(steps):
+            turn(chat)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / (chats * steps) * 1000
+
+
+def measure_turns_per_second(new_chat: Callable, turn: Callable, turns: int) -> float:
+    chat = new_chat()
+    started = time.perf_counter()
+    for _ in range(turns):
+        turn(chat)
+    return turns / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chats", type=int, default=100)
+    parser.add_argument("--steps", type=int, default=1000, help="チャットあたりのステップ数")
+    parser.add_argument("--turns", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(f"chats={args.chats} steps/chat={args.steps}")
+    print(f"{'':>8} {'bytes / 1k steps':>17} {'turns / s':>12}")
+    for name, new_chat, turn in (("legacy", legacy_chat, legacy_turn), ("current", current_chat, current_turn)):
+        memory = measure_memory(new_chat, turn, args.chats, args.steps)
+        speed = measure_turns_per_second(new_chat, turn, args.turns)
+        print(f"{name:>8} {memory:>17,.0f} {speed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""ファイル（ジャーナル）リポジトリの書き込みコストと起動時の復元時間を計測する。
+
+- 1 ターン（ステップ 1 件の追加）あたりの保存コストを、会話の長さごとに計測する。update（書き込みキューに入れる）の
+  所要時間と、書き込みスレッドがジャーナルに書き終えるまでを含めた 1 ターンあたりの時間を出力する
+- ジャーナルの件数ごとに、起動（スナップショットの索引作成 + ジャーナルの再生）にかかる時間を計測する
+
+    uv run python -m benchmark.file_repository
+"""
+
+import argparse
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+from app.domain.chat.entity.chat import Chat, create_chat, create_step
+from app.domain.chat.value_object.answer import create_answer
+from app.domain.chat.value_object.question import create_question
+from app.domain.chat.value_object.title import create_title
+from app.domain.shared.value_object.id import create_id
+from app.domain.shared.value_object.time import create_time
+from app.infrastructure.file.repository.chat import ChatRepositoryFileImpl
+
+QUESTION = create_question("ファイルリポジトリの書き込みコストを教えてください。")
+ANSWER = create_answer("ステップ 1 件につきジャーナルへの追記 1 回で保存します。" * 8)
+
+
+def new_chat() -> Chat:
+    now = create_time(datetime.now())
+    return create_chat(create_id(str(uuid.uuid4())), create_title("ベンチマーク"), [], now, now)
+
+
+def add_step(chat: Chat):
+    chat.add_step(create_step(create_id(str(uuid.uuid4())), chat.get_id(), QUESTION, ANSWER, create_time(datetime.now())))
+
+
+def bench_turn_write(path: str, lengths: list[int], turns: int, fsync: bool):
+    print(f"-- turn write cost (fsync={fsync})")
+    for length in lengths:
+        repository = ChatRepositoryFileImpl(path, snapshot_interval=0, fsync=fsync)
+        chat = new_chat()
+        for _ in range(length):
+            add_step(chat)
+        repository.create(chat)
+
+        repository.flush()
+        elapsed = 0.0
+        total_started = time.perf_counter()
+        for _ in range(turns):
+            add_step(chat)
+            started = time.perf_counter()
+            repository.update(chat)
+            elapsed += time.perf_counter() - started
+        repository.flush()
+        total_elapsed = time.perf_counter() - total_started
+        print(f"steps={length:>6}  update {elapsed / turns * 1e6:8.1f} µs/turn  written {total_elapsed / turns * 1e6:8.1f} µs/turn")
+        repository.close()
+        shutil.rmtree(path)
+
+
+def bench_recovery(path: str, sizes: list[int], steps_per_chat: int):
+    print(f"-- startup recovery ({steps_per_chat} steps/chat)")
+    for size in sizes:
+        chats = size // (steps_per_chat + 1)
+
+        # ジャーナルのみ（スナップショット無し）の状態を作る
+        repository = ChatRepositoryFileImpl(path, snapshot_interval=0)
+        for _ in range(chats):
+            chat = new_chat()
+            for _ in range(steps_per_chat):
+                add_step(chat)
+            repository.create(chat)
+        repository.close(compact=False)
+
+        started = time.perf_counter()
+        repository = ChatRepositoryFileImpl(path, snapshot_interval=0)
+        journal_elapsed = time.perf_counter() - started
+
+        # コンパクションしてスナップショットのみの状態から起動する
+        repository.close()
+        started = time.perf_counter()
+        repository = ChatRepositoryFileImpl(path, snapshot_interval=0)
+        snapshot_elapsed = time.perf_counter() - started
+
+        print(f"records={size:>8}  journal replay {journal_elapsed * 1e3:8.1f} ms  snapshot index {snapshot_elapsed * 1e3:8.1f} ms")
+        repository.close()
+        shutil.rmtree(path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lengths", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--fsync", action="store_true")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--steps-per-chat", type=int, default=9)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        path = f"{root}/chats"
+        bench_turn_write(path, args.lengths, args.turns, args.fsync)
+        bench_recovery(path, args.sizes, args.steps_per_chat)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""OpenAI API との HTTP 接続（タイムアウト・リトライ・リトライの予算・ヘッジ）の効果を、障害を混ぜた擬似 LLM サーバーで計測する。
+
+擬似 LLM サーバー（app.infrastructure.fake.server）を、応答ヘッダーを返さずに止まるリクエスト・429・503 を
+一定の割合で返すように起動し、AsyncOpenAIClient でストリームのリクエストを流して、以下の構成ごとに
+成功率・所要時間の p50 / p95 / p99 / 最大・上流へのリクエスト数（リトライ・ヘッジを含む）を出力する。
+- sdk-default: 以前の構成（SDK の既定のタイムアウトとリトライ。止まった上流を待ち続ける）
+- transport: 共有の接続プール・タイムアウト・ジッター付きのリトライ・リトライの予算
+- transport+hedge: さらに応答ヘッダーまでの時間が p95 を超えたらヘッジする
+最後に、上流の大半が失敗する場合に、リトライの予算で上流へのリクエスト数が抑えられることを確かめる。
+
+    uv run python -m benchmark.llm_transport --requests 400 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.infrastructure.metrics.prometheus import PrometheusMetrics, create_prometheus_metrics
+from app.infrastructure.openai.client import AsyncOpenAIClient, create_async_openai_client
+from app.infrastructure.openai.routing import LLMTaskPolicy, create_llm_router
+from app.infrastructure.openai.transport import LLMHTTPSettings, create_llm_http_client
+from app.usecase.ports.output.llm.client import LLM_TASK_STEP
+from benchmark.loadgen import free_port, wait_for_port
+
+def start_fake_server(args: argparse.Namespace, stall_rate: float, error_rate: float, server_error_rate: float) -> tuple[subprocess.Popen[bytes], int]:
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "app.infrastructure.fake.server", "--port", str(port),
+        "--latency", str(args.latency), "--tps", str(args.tps), "--answer-tokens", str(args.answer_tokens),
+        "--error-rate", str(error_rate), "--server-error-rate", str(server_error_rate),
+        "--stall-rate", str(stall_rate), "--stall-seconds", str(args.stall_seconds),
+    ])
+    return process, port
+
+def build_client(port: int, settings: Optional[LLMHTTPSettings], metrics: PrometheusMetrics) -> AsyncOpenAIClient:
+    base_url = f"http://127.0.0.1:{port}/v1"
+    router = create_llm_router({LLM_TASK_STEP: LLMTaskPolicy("fake", None, None)})
+    if settings is not None:
+        return create_async_openai_client(router, create_llm_http_client(settings, metrics), "fake", base_url, metrics)
+    # 以前の構成: SDK の既定のタイムアウト（読み込み 600 秒）とリトライ（2 回）
+    client = create_async_openai_client(router, httpx.AsyncClient(), "fake", base_url, metrics)
+    client.client = AsyncOpenAI(api_key="fake", base_url=base_url)
+    return client
+
+async def run(client: AsyncOpenAIClient, requests: int, concurrency: int, deadline: float) -> tuple[list[float], int]:
+    """ストリームのリクエストを流し、成功したリクエストの所要時間と失敗数を返す。deadline を超えたものは失敗とする。"""
+    semaphore = asyncio.Semaphore(concurrency)
+    seconds: list[float] = []
+    failed = 0
+
+    async def one(i: int):
+        nonlocal failed
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                async with asyncio.timeout(deadline):
+                    async for _ in client.stream_response(f"質問 {i}", "", None, LLM_TASK_STEP):
+                        pass
+                seconds.append(time.perf_counter() - started)
+            except Exception:
+                failed += 1
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    if client.client is not None:
+        await client.client.close()
+    await client.aclose()
+    return seconds, failed
+
+def counter(metrics: PrometheusMetrics, prefix: str) -> float:
+    total = 0.0
+    for line in metrics.render().splitlines():
+        if line.startswith(prefix):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+def report(name: str, seconds: list[float], failed: int, metrics: PrometheusMetrics, requests: int):
+    ordered = sorted(seconds)
+    quantiles = statistics.quantiles(ordered, n=100, method="inclusive") if len(ordered) > 1 else ordered * 99
+    attempts = counter(metrics, "llm_http_header_seconds_count")
+    print(f"{name:>16}: ok {len(seconds):4d}/{requests}  p50 {quantiles[49]:6.2f}s  p95 {quantiles[94]:6.2f}s  p99 {quantiles[98]:6.2f}s"
+          f"  max {ordered[-1]:6.2f}s  upstream {attempts / requests if attempts else float('nan'):.2f}x"
+          f"  retries {counter(metrics, 'llm_http_retries_total'):.0f}  hedges {counter(metrics, 'llm_http_hedges_total'):.0f}"
+          f"  budget-exhausted {counter(metrics, 'llm_http_retry_budget_exhausted_total'):.0f}")
+
+async def scenario(name: str, port: int, settings: Optional[LLMHTTPSettings], args: argparse.Namespace, requests: int):
+    metrics = create_prometheus_metrics()
+    seconds, failed = await run(build_client(port, settings, metrics), requests, args.concurrency, args.deadline)
+    report(name, seconds, failed, metrics, requests)
+
+async def main_async(args: argparse.Namespace):
+    transport = LLMHTTPSettings(read_timeout_seconds=args.read_timeout, max_retries=2, retry_backoff_seconds=0.2)
+    hedged = LLMHTTPSettings(read_timeout_seconds=args.read_timeout, max_retries=2, retry_backoff_seconds=0.2, hedge=True, hedge_min_delay_seconds=args.hedge_min_delay)
+    print(f"upstream: stall {args.stall_rate:.0%} ({args.stall_seconds:.0f}s), 429 {args.error_rate:.0%}, 503 {args.server_error_rate:.0%};"
+          f" {args.requests} streams x {args.answer_tokens} tokens, concurrency {args.concurrency}, deadline {args.deadline:.0f}s")
+    process, port = start_fake_server(args, args.stall_rate, args.error_rate, args.server_error_rate)
+    try:
+        await wait_for_port(port, process)
+        configurations: list[tuple[str, Optional[LLMHTTPSettings]]] = [("sdk-default", None), ("transport", transport), ("transport+hedge", hedged)]
+        for name, settings in configurations:
+            await scenario(name, port, settings, args, args.requests)
+    finally:
+        process.terminate()
+        process.wait()
+
+    # 上流の大半が失敗する場合: 予算が無ければ上流へのリクエストは (1 + max_retries) 倍になる
+    print(f"upstream outage: 503 {args.outage_error_rate:.0%}")
+    process, port = start_fake_server(args, 0, 0, args.outage_error_rate)
+    try:
+        await wait_for_port(port, process)
+        unlimited = LLMHTTPSettings(max_retries=2, retry_backoff_seconds=0.01, retry_budget_ratio=100)
+        budgeted = LLMHTTPSettings(max_retries=2, retry_backoff_seconds=0.01)
+        for name, settings in (("no budget", unlimited), ("budget 20%", budgeted)):
+            await scenario(name, port, settings, args, args.requests)
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="擬似 LLM の最初のトークンまでの時間")
+    parser.add_argument("--tps", type=float, default=200, help="擬似 LLM の 1 秒あたりのトークン数")
+    parser.add_argument("--answer-tokens", type=int, default=40)
+    parser.add_argument("--stall-rate", type=float, default=0.03)
+    parser.add_argument("--stall-seconds", type=float, default=30)
+    parser.add_argument("--error-rate", type=float, default=0.05, help="429 を返す割合")
+    parser.add_argument("--server-error-rate", type=float, default=0.05, help="503 を返す割合")
+    parser.add_argument("--outage-error-rate", type=float, default=0.8, help="障害時に 503 を返す割合")
+    parser.add_argument("--read-timeout", type=float, default=2.0, help="transport の構成の読み込みのタイムアウト")
+    parser.add_argument("--hedge-min-delay", type=float, default=0.3, help="ヘッジするまでの最小の待ち時間")
+    parser.add_argument("--deadline", type=float, default=60, help="1 リクエストの制限時間（超えたものは失敗とする）")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""/chat/stream に多数の WebSocket を張り、複数ターンの会話を流して性能を計測する負荷生成ツール。
+
+アプリ（main:app）を擬似 LLM で起動し、以下を出力する。
+- スループット（完了ターン数 / 秒）
+- ターンの所要時間と最初のトークンまでの時間（TTFT）の p50 / p95 / p99
+- ワーカープロセスごとのメモリ使用量（RSS のピーク）
+
+--backend fake は UseCase から擬似 LLM を直接呼び、fake-server は擬似 LLM サーバーを別プロセスで起動して
+OpenAI クライアント経由で呼ぶ。--url を指定した場合は起動済みのサーバーに接続する（メモリは計測しない）。
+サーバーの設定（LLM_MAX_CONCURRENCY、CHAT_REPOSITORY など）は環境変数で上書きできる。
+--router を指定すると serve.py で起動し、chat_id ごとに担当のワーカーへ振り分ける。
+--json で結果を JSON で出力できるため、変更前後の比較に使える。
+
+    uv run python -m benchmark.loadgen --sockets 200 --turns 5 --workers 1 --latency 0.3 --tps 100
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Optional
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+QUESTIONS = [
+    "DDD とは何ですか？",
+    "クリーンアーキテクチャとの違いを教えてください。",
+    "リポジトリはどの層に置くべきですか？",
+    "値オブジェクトとエンティティの違いは？",
+    "ユースケースのテストはどう書けばよいですか？",
+    "今までの話をまとめてください。",
+]
+
+
+@dataclass
+class Stats:
+    latencies: list[float] = field(default_factory=list)
+    ttfts: list[float] = field(default_factory=list)
+    errors: int = 0
+    disconnects: int = 0
+
+
+async def run_script(url: str, turns: int, think_time: float, stats: Stats):
+    """1 本の WebSocket で、同じチャットに turns 回質問する。"""
+    chat_id = str(uuid.uuid4())
+    try:
+        # serve.py のルーターがチャットの担当ワーカーに振り分けられるよう、URL にも chat_id を付ける
+        async with connect(f"{url}?chat_id={chat_id}", max_size=None) as ws:
+            for turn in range(turns):
+                started = time.perf_counter()
+                await ws.send(json.dumps({"chat_id": chat_id, "current_question": QUESTIONS[turn % len(QUESTIONS)]}))
+                first_token: Optional[float] = None
+                while True:
+                    frame = json.loads(await ws.recv())
+                    if frame["type"] == "delta" and first_token is None:
+                        first_token = time.perf_counter() - started
+                    elif frame["type"] == "error":
+                        stats.errors += 1
+                        break
+                    elif frame["type"] == "end":
+                        stats.latencies.append(time.perf_counter() - started)
+                        if first_token is not None:
+                            stats.ttfts.append(first_token)
+                        break
+                if think_time > 0:
+                    await asyncio.sleep(random.uniform(0, 2 * think_time))
+    except (ConnectionClosed, OSError):
+        stats.disconnects += 1
+
+
+async def run_load(url: str, sockets: int, turns: int, think_time: float, ramp_up: float) -> tuple[Stats, float]:
+    stats = Stats()
+
+    async def delayed(index: int):
+        # 接続の開始を ramp_up 秒に分散させる
+        await asyncio.sleep(ramp_up * index / sockets)
+        await run_script(url, turns, think_time, stats)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(delayed(index) for index in range(sockets)))
+    return stats, time.perf_counter() - started
+
+
+class MemorySampler:
+    """サーバーのプロセス（とワーカーの子プロセス）の RSS を定期的に読み取り、ピークを記録する。"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss: dict[int, int] = {}
+        self._task: Optional[asyncio.Task[None]] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.sample()
+
+    async def _run(self):
+        while True:
+            self.sample()
+            await asyncio.sleep(self.interval)
+
+    def sample(self):
+        for pid in [self.pid, *_descendants(self.pid)]:
+            rss = _rss_bytes(pid)
+            if rss is not None:
+                self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), rss)
+
+
+def _descendants(pid: int) -> list[int]:
+    # /proc を使うため Linux のみ対応（それ以外の環境では空になる）
+    try:
+        entries = [int(entry) for entry in os.listdir("/proc") if entry.isdigit()]
+    except OSError:
+        return []
+    parents: dict[int, int] = {}
+    for entry in entries:
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                parents[entry] = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    found, frontier = [], [pid]
+    while frontier:
+        parent = frontier.pop()
+        children = [child for child, ppid in parents.items() if ppid == parent]
+        found.extend(children)
+        frontier.extend(children)
+    return found
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_for_port(port: int, process: subprocess.Popen[bytes], timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with code {process.returncode}")
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            await writer.wait_closed()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"server did not start on port {port}")
+
+
+def start_servers(args: argparse.Namespace) -> tuple[list[subprocess.Popen[bytes]], subprocess.Popen[bytes], int, Optional[int]]:
+    """アプリ（と必要なら擬似 LLM サーバー）を起動し、(全プロセス, アプリ, アプリのポート, 擬似 LLM のポート) を返す。"""
+    env = dict(os.environ)
+    env.update({
+        "FAKE_LLM_LATENCY_SECONDS": str(args.latency),
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tps),
+        "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+        "FAKE_LLM_ERROR_RATE": str(args.error_rate),
+        # 同じ質問が繰り返されるため、キャッシュを無効にしないと LLM を呼ばずに済んでしまう
+        "LLM_CACHE_ENABLED": "false",
+    })
+    processes: list[subprocess.Popen[bytes]] = []
+    fake_port = None
+    if args.backend == "fake-server":
+        fake_port = free_port()
+        processes.append(subprocess.Popen([
+            sys.executable, "-m", "app.infrastructure.fake.server", "--port", str(fake_port),
+            "--latency", str(args.latency), "--tps", str(args.tps),
+            "--answer-tokens", str(args.answer_tokens), "--error-rate", str(args.error_rate),
+        ], env=env))
+        env.update({"LLM_BACKEND": "openai", "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1", "OPENAI_API_KEY": env.get("OPENAI_API_KEY") or "fake"})
+    else:
+        env["LLM_BACKEND"] = "fake"
+
+    port = free_port()
+    if args.router:
+        # chat_id ごとに担当のワーカーへ振り分ける serve.py で起動する
+        command = [sys.executable, "serve.py", "--workers", str(args.workers), "--port", str(port), "--log-level", "warning"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"]
+    app = subprocess.Popen(command, env=env)
+    processes.append(app)
+    return processes, app, port, fake_port
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    if len(values) == 1:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]}
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98]}
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, object]:
+    processes: list[subprocess.Popen[bytes]] = []
+    sampler: Optional[MemorySampler] = None
+    url = args.url
+    try:
+        if url is None:
+            processes, app, port, fake_port = start_servers(args)
+            if fake_port is not None:
+                await wait_for_port(fake_port, processes[0])
+            await wait_for_port(port, app)
+            url = f"ws://127.0.0.1:{port}/chat/stream"
+            sampler = MemorySampler(app.pid)
+            sampler.start()
+
+        stats, elapsed = await run_load(url, args.sockets, args.turns, args.think_time, args.ramp_up)
+        if sampler is not None:
+            await sampler.stop()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    return {
+        "sockets": args.sockets,
+        "turns_per_socket": args.turns,
+        "completed_turns": len(stats.latencies),
+        "errors": stats.errors,
+        "disconnects": stats.disconnects,
+        "elapsed_seconds": elapsed,
+        "throughput_turns_per_second": len(stats.latencies) / elapsed if elapsed > 0 else 0.0,
+        "turn_latency_seconds": percentiles(stats.latencies),
+        "ttft_seconds": percentiles(stats.ttfts),
+        "peak_rss_bytes_per_process": dict(sorted(sampler.peak_rss.items())) if sampler is not None else {},
+    }
+
+
+def print_report(result: dict[str, object]):
+    latency: dict[str, float] = result["turn_latency_seconds"]  # type: ignore
+    ttft: dict[str, float] = result["ttft_seconds"]  # type: ignore
+    rss: dict[int, int] = result["peak_rss_bytes_per_process"]  # type: ignore
+    print(f"sockets={result['sockets']} turns/socket={result['turns_per_socket']} elapsed={result['elapsed_seconds']:.2f}s")
+    print(f"completed={result['completed_turns']} errors={result['errors']} disconnects={result['disconnects']} throughput={result['throughput_turns_per_second']:.1f} turns/s")
+    print(f"turn latency: p50={latency['p50'] * 1e3:.0f}ms p95={latency['p95'] * 1e3:.0f}ms p99={latency['p99'] * 1e3:.0f}ms")
+    print(f"ttft:         p50={ttft['p50'] * 1e3:.0f}ms p95={ttft['p95'] * 1e3:.0f}ms p99={ttft['p99'] * 1e3:.0f}ms")
+    for pid, peak in rss.items():
+        print(f"pid {pid}: peak rss={peak / 1024 / 1024:.1f}MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="起動済みサーバーの WebSocket URL（省略時は main:app を起動する）")
+    parser.add_argument("--backend", choices=["fake", "fake-server"], default="fake")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--router", action="store_true", help="uvicorn --workers ではなく serve.py で複数ワーカーを起動する")
+    parser.add_argument("--sockets", type=int, default=100)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=0.0, help="ターン間の平均待ち時間（秒）")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="全接続を開始し終えるまでの時間（秒）")
+    parser.add_argument("--latency", type=float, default=0.3, help="擬似 LLM の最初のトークンまでの時間（秒）")
+    parser.add_argument("--tps", type=float, default=100, help="擬似 LLM の 1 秒あたりの生成トークン数")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--json", action="store_true", help="結果を JSON で出力する")
+    args = parser.parse_args()
+
+    result = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
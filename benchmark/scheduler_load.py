@@ -0,0 +1,189 @@
+"""レート制限のある LLM を相手に、N 本の WebSocket から同時に質問したときの挙動を計測する。
+
+LLM は同時実行数と 1 分あたりのトークン数を超えると 429 相当のエラーを返すスタブに差し替え、
+流量制御なし（上流のエラーがそのまま失敗になる）と LLMScheduler ありを比較する。
+
+    uv run python -m benchmark.scheduler_load --sockets 64 --turns 3 --upstream-concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Optional
+
+import uvicorn
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+from app.infrastructure.fastapi.application import create_fastapi_application
+from app.infrastructure.fastapi.handler.stream.chat_stream import create_chat_stream_handler
+from app.infrastructure.fastapi.handler.ui.ui import create_ui_handler
+from app.infrastructure.memory.repository.chat import create_chat_repository
+from app.infrastructure.openai.tokenizer import create_tokenizer
+from app.infrastructure.scheduler.llm import LLMScheduler, create_llm_scheduler, create_scheduled_llm_client
+from app.usecase.ports.output.llm.client import AsyncLLMClient, ChatMessage
+from app.usecase.ports.output.llm.tokenizer import Tokenizer
+from app.usecase.stream.chat_session import create_async_chat_session_usecase
+from app.usecase.stream.context import create_chat_context_builder
+from app.usecase.stream.session_cache import create_chat_session_cache
+
+COMPLETION_TOKENS = 64
+
+
+class RateLimitError(Exception):
+    pass
+
+
+class RateLimitedLLMClient(AsyncLLMClient):
+    """同時実行数と 1 分あたりのトークン数の上限を持つ LLM のスタブ。上限を超えると即座に失敗する。"""
+
+    def __init__(self, tokenizer: Tokenizer, latency: float, max_concurrency: int, tokens_per_minute: int):
+        self.tokenizer = tokenizer
+        self.latency = latency
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.active = 0
+        self.peak = 0
+        self.accepted = 0
+        self.rejected = 0
+        self._window: deque[tuple[float, int]] = deque()
+        self._window_tokens = 0
+
+    async def generate_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> str:
+        return "".join([chunk async for chunk in self.stream_response(question, prompt, chat_history, task)])
+
+    async def stream_response(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]], task: str) -> AsyncIterator[str]:
+        self._admit(question, prompt, chat_history)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            for _ in range(4):
+                await asyncio.sleep(self.latency / 4)
+                yield "answer "
+        finally:
+            self.active -= 1
+
+    def _admit(self, question: str, prompt: str, chat_history: Optional[list[ChatMessage]]):
+        tokens = self.tokenizer.count(prompt + question) + COMPLETION_TOKENS
+        for message in chat_history or []:
+            tokens += self.tokenizer.count(message.content)
+
+        now = time.monotonic()
+        while self._window and self._window[0][0] <= now - 60:
+            self._window_tokens -= self._window.popleft()[1]
+        if self.active >= self.max_concurrency or self._window_tokens + tokens > self.tokens_per_minute:
+            self.rejected += 1
+            raise RateLimitError("429 Too Many Requests")
+        self._window.append((now, tokens))
+        self._window_tokens += tokens
+        self.accepted += 1
+
+
+class Result:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.failed = 0
+        self.busy = 0
+        self.queued_frames = 0
+        self.max_position = 0
+
+
+async def one_socket(url: str, turns: int, result: Result):
+    chat_id = str(uuid.uuid4())
+    try:
+        async with connect(url) as ws:
+            for _ in range(turns):
+                started = time.perf_counter()
+                await ws.send(json.dumps({"chat_id": chat_id, "current_question": "こんにちは"}))
+                while True:
+                    frame = json.loads(await ws.recv())
+                    if frame["type"] == "queued":
+                        result.queued_frames += 1
+                        result.max_position = max(result.max_position, frame["position"])
+                    elif frame["type"] == "error":
+                        result.busy += 1
+                        break
+                    elif frame["type"] == "end":
+                        result.latencies.append(time.perf_counter() - started)
+                        break
+    except ConnectionClosed:
+        # 流量制御なしの場合、上流のエラーはハンドラの例外となり接続ごと切断される
+        result.failed += 1
+
+
+async def run(scheduled: bool, args: argparse.Namespace) -> tuple[Result, RateLimitedLLMClient, Optional[LLMScheduler]]:
+    tokenizer = create_tokenizer()
+    upstream = RateLimitedLLMClient(tokenizer, args.latency, args.upstream_concurrency, args.upstream_tpm)
+    llm_client: AsyncLLMClient = upstream
+    scheduler = None
+    if scheduled:
+        scheduler = create_llm_scheduler(
+            max_concurrency=args.upstream_concurrency,
+            tokens_per_minute=args.upstream_tpm,
+            max_queue=args.max_queue,
+            max_wait_seconds=args.max_wait,
+        )
+        llm_client = create_scheduled_llm_client(upstream, scheduler, tokenizer, COMPLETION_TOKENS)
+
+    usecase = create_async_chat_session_usecase(llm_client, create_chat_repository(), create_chat_session_cache(), create_chat_context_builder(tokenizer))
+    app = create_fastapi_application(create_chat_stream_handler(usecase), create_ui_handler()).application()
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="critical"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    result = Result()
+    try:
+        await asyncio.gather(*(one_socket(f"ws://127.0.0.1:{port}/chat/stream", args.turns, result) for _ in range(args.sockets)))
+        return result, upstream, scheduler
+    finally:
+        server.should_exit = True
+        await serve_task
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sockets", type=int, default=64)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.2, help="LLM 1 回あたりの擬似レイテンシ（秒）")
+    parser.add_argument("--upstream-concurrency", type=int, default=8)
+    parser.add_argument("--upstream-tpm", type=int, default=1_000_000)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--max-wait", type=float, default=30)
+    args = parser.parse_args()
+
+    print(f"sockets={args.sockets} turns={args.turns} latency={args.latency:.2f}s upstream: concurrency={args.upstream_concurrency} tpm={args.upstream_tpm}")
+    for scheduled in (False, True):
+        result, upstream, scheduler = asyncio.run(run(scheduled, args))
+        print(f"{'scheduler' if scheduled else 'direct':>9}: completed={len(result.latencies)} busy={result.busy} disconnected={result.failed} "
+              f"upstream 429={upstream.rejected} peak concurrency={upstream.peak} "
+              f"p50={percentile(result.latencies, 50):.2f}s p95={percentile(result.latencies, 95):.2f}s p99={percentile(result.latencies, 99):.2f}s")
+        if scheduler is not None:
+            stats = scheduler.stats()
+            mean_wait = stats.wait_seconds_total / stats.wait_count if stats.wait_count else 0.0
+            print(f"{'':>9}  queued frames={result.queued_frames} max position={result.max_position} "
+                  f"mean wait={mean_wait:.2f}s max wait={stats.max_wait_seconds:.2f}s rejected={stats.rejected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""アプリの読み込み時間と、起動してから最初のリクエストに応答するまでの時間を計測する。
+
+1. python -X importtime で main を読み込み、全体の時間と時間のかかったモジュールを出力する。
+   以前の構成（openai の SDK を読み込み時に読み込む）として、openai を先に読み込んだ場合とも比べる
+2. 擬似 LLM サーバー（app.infrastructure.fake.server）を OPENAI_BASE_URL に指定してアプリ（main:app）を起動し、
+   ポートで待ち受けるまで・/readyz が 200 を返すまで・最初の質問の最初の delta までの時間を、
+   起動時の接続の事前確立（LLM_PREWARM_CONNECTIONS）の有無ごとに runs 回計測して中央値を出力する
+
+    uv run python -m benchmark.startup --runs 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmark.loadgen import free_port, wait_for_port
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+def import_times(code: str) -> list[tuple[int, str, float]]:
+    """code を実行する新しいプロセスの -X importtime の出力を、(深さ, モジュール, 読み込み時間（秒）) の一覧にする。
+
+    深さ 0 が code から直接読み込んだモジュールで、時間はそのモジュールが読み込んだモジュールを含む。
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, check=True)
+    modules: list[tuple[int, str, float]] = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            modules.append(((len(match.group(3)) - 1) // 2, match.group(4), int(match.group(2)) / 1e6))
+    return modules
+
+def report_imports(runs: int):
+    print("import main")
+    modules: list[tuple[int, str, float]] = []
+    for name, code in (("lazy (current)", "import main"), ("eager openai", "import openai; import main")):
+        totals = []
+        for _ in range(runs):
+            modules = import_times(code)
+            totals.append(sum(seconds for depth, _, seconds in modules if depth == 0))
+        print(f"{name:>16}: {statistics.median(totals):6.3f}s")
+    # main が直接読み込んだモジュールのうち、時間のかかったもの（最後の計測）
+    modules = import_times("import main")
+    children = sorted(((seconds, module) for depth, module, seconds in modules if depth == 1), reverse=True)
+    for seconds, module in children[:5]:
+        print(f"{'':>18}{seconds:6.3f}s  {module}")
+
+async def first_delta(port: int) -> float:
+    """最初の質問を送り、最初の delta を受け取るまでの時間を返す。"""
+    async with connect(f"ws://127.0.0.1:{port}/chat/stream") as ws:
+        started = time.perf_counter()
+        await ws.send(json.dumps({"current_question": "最初の質問です"}))
+        while True:
+            frame = json.loads(await ws.recv())
+            if frame["type"] == "delta":
+                return time.perf_counter() - started
+            if frame["type"] in ("end", "error"):
+                raise RuntimeError(f"unexpected frame: {frame}")
+
+async def start_once(env: dict[str, str]) -> tuple[float, float, float]:
+    """アプリを起動し、待ち受けまで・ready まで・最初の delta までの時間を返す。"""
+    port = free_port()
+    started = time.perf_counter()
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"], env=env)
+    try:
+        await wait_for_port(port, app)
+        listening = time.perf_counter() - started
+        async with httpx.AsyncClient() as client:
+            while (await client.get(f"http://127.0.0.1:{port}/readyz")).status_code != 200:
+                await asyncio.sleep(0.01)
+        ready = time.perf_counter() - started
+        return listening, ready, await first_delta(port)
+    finally:
+        app.terminate()
+        app.wait()
+
+async def main_async(args: argparse.Namespace):
+    report_imports(args.runs)
+
+    fake_port = free_port()
+    fake = subprocess.Popen([
+        sys.executable, "-m", "app.infrastructure.fake.server", "--port", str(fake_port),
+        "--latency", str(args.latency), "--tps", "1000", "--answer-tokens", "8",
+    ])
+    try:
+        await wait_for_port(fake_port, fake)
+        print(f"startup (openai backend -> fake server, first token latency {args.latency * 1000:.0f}ms)")
+        for name, connections in (("prewarm", args.prewarm_connections), ("no prewarm", 0)):
+            env = dict(os.environ)
+            env.update({
+                "LLM_BACKEND": "openai",
+                "OPENAI_API_KEY": "fake",
+                "OPENAI_BASE_URL": f"http://127.0.0.1:{fake_port}/v1",
+                "LLM_PREWARM_CONNECTIONS": str(connections),
+                "LLM_CACHE_ENABLED": "false",
+                "CHAT_REPOSITORY": "memory",
+            })
+            results = [await start_once(env) for _ in range(args.runs)]
+            listening, ready, delta = (statistics.median(values) for values in zip(*results))
+            print(f"{name:>16}: listening {listening:6.3f}s  ready {ready:6.3f}s  first delta {delta * 1000:7.1f}ms")
+    finally:
+        fake.terminate()
+        fake.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="擬似 LLM の最初のトークンまでの時間")
+    parser.add_argument("--prewarm-connections", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
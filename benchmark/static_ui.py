@@ -0,0 +1,99 @@
+"""簡易 UI（GET / と /static/...）の転送量と、再訪問時の再検証（304）を計測する。
+
+以前の構成（CSS・JS を埋め込んだ HTML をリクエストごとに非圧縮で返す）と、起動時に圧縮したアセットを
+Accept-Encoding に応じて返す現在の構成とで、以下を出力する。
+- 初回の訪問で転送するバイト数（index.html と、そこから参照する CSS・JS の合計）
+- 再訪問で転送するバイト数（index.html は ETag で再検証して 304、CSS・JS は immutable のためリクエストしない）
+- 1 秒あたりに返せる GET / の数
+
+    uv run python -m benchmark.static_ui --requests 2000
+"""
+
+import argparse
+import asyncio
+import re
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse
+
+from app.infrastructure.fastapi.handler.ui.ui import UIHandler, create_ui_handler
+
+def inline_page(handler: UIHandler) -> str:
+    """以前の構成の HTML（CSS・JS を埋め込んだもの）を組み立てる。"""
+    html = handler.index.bodies["identity"].decode("utf-8")
+    for name, asset in handler.assets.items():
+        content = asset.bodies["identity"].decode("utf-8")
+        if name.endswith(".css"):
+            html = re.sub(rf'<link rel="stylesheet" href="/static/{re.escape(name)}" />', lambda _: f"<style>\n{content}</style>", html)
+        else:
+            html = re.sub(rf'<script src="/static/{re.escape(name)}"></script>', lambda _: f"<script>\n{content}</script>", html)
+    return html
+
+def build_app(handler: UIHandler, legacy: str) -> FastAPI:
+    app = FastAPI()
+
+    async def legacy_handle(request: Request):
+        return HTMLResponse(content=legacy, status_code=200)
+
+    app.add_api_route("/legacy", legacy_handle, methods=["GET"])
+    app.add_api_route("/", handler.handle, methods=["GET"])
+    app.add_api_route("/static/{name}", handler.asset, methods=["GET"])
+    return app
+
+async def visit(client: httpx.AsyncClient, accept_encoding: str) -> tuple[int, int]:
+    """初回の訪問と再訪問で転送したバイト数（本文）を返す。"""
+    headers = {"accept-encoding": accept_encoding}
+    index = await client.get("/", headers=headers)
+    # httpx は圧縮された本文を展開するため、受け取ったバイト数で数える
+    first = index.num_bytes_downloaded
+    for url in re.findall(r'(?:href|src)="(/static/[^"]+)"', index.text):
+        first += (await client.get(url, headers=headers)).num_bytes_downloaded
+    again = await client.get("/", headers={**headers, "if-none-match": index.headers["etag"]})
+    assert again.status_code == 304
+    return first, again.num_bytes_downloaded
+
+async def throughput(app: FastAPI, path: str, headers: dict[str, str], requests: int) -> float:
+    """クライアントでの展開を含めないよう、ASGI アプリを直接呼んで数える。"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(key.encode(), value.encode()) for key, value in headers.items()],
+        "client": ("127.0.0.1", 1), "server": ("ui", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return requests / (time.perf_counter() - started)
+
+async def main_async(args: argparse.Namespace):
+    handler = create_ui_handler()
+    legacy = inline_page(handler)
+    app = build_app(handler, legacy)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://ui") as client:
+        legacy_bytes = (await client.get("/legacy")).num_bytes_downloaded
+        print(f"{'legacy':>10}: first visit {legacy_bytes:7,d}B  repeat visit {legacy_bytes:7,d}B")
+        encodings = ["identity", "gzip"] + (["br"] if "br" in handler.index.bodies else [])
+        for encoding in encodings:
+            first, repeat = await visit(client, encoding)
+            print(f"{encoding:>10}: first visit {first:7,d}B  repeat visit {repeat:7,d}B  ({first / legacy_bytes:.0%} of legacy)")
+        legacy_rate = await throughput(app, "/legacy", {}, args.requests)
+        current_rate = await throughput(app, "/", {"accept-encoding": "gzip"}, args.requests)
+        print(f"GET / : legacy {legacy_rate:,.0f} req/s  current (gzip) {current_rate:,.0f} req/s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
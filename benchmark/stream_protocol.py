@@ -0,0 +1,173 @@
+"""/chat/stream のプロトコル（v1 / chat.v2.json / chat.v2.msgpack）ごとに、回答の転送量を計測する。
+
+アプリ（main:app）を擬似 LLM で起動し、アプリとクライアントの間にバイト数を数える TCP のプロキシを挟んで、
+プロトコルと permessage-deflate の有無の組み合わせごとに同じ会話を流し、サーバーからクライアントへのバイト数を出力する。
+あわせて、v2 で回答の途中に切断して再接続し、受け取れなかったフレームだけが送り直されること
+（LLM を呼び直さないこと）を確かめる。
+
+    uv run python -m benchmark.stream_protocol --turns 20 --answer-tokens 400
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import uuid
+from typing import Any, Callable, Optional
+
+import httpx
+from websockets.asyncio.client import connect
+from websockets.typing import Subprotocol
+
+from benchmark.loadgen import free_port, wait_for_port
+
+try:
+    import msgpack  # type: ignore
+except ImportError:
+    msgpack = None
+
+V2_JSON = Subprotocol("chat.v2.json")
+
+class CountingProxy:
+    """受け付けた接続をアプリのポートへ中継し、アプリからクライアントへのバイト数を数える。"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.downstream = 0
+
+    async def start(self) -> int:
+        server = await asyncio.start_server(self._relay, "127.0.0.1", 0)
+        return server.sockets[0].getsockname()[1]
+
+    async def _relay(self, client_reader: asyncio.StreamReader, client_writer: asyncio.StreamWriter):
+        app_reader, app_writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+        async def pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, count: bool):
+            try:
+                while data := await reader.read(65536):
+                    if count:
+                        self.downstream += len(data)
+                    writer.write(data)
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        await asyncio.gather(pipe(client_reader, app_writer, False), pipe(app_reader, client_writer, True))
+
+def _codec(subprotocol: Optional[str]) -> tuple[Callable[[dict[str, Any]], Any], Callable[[Any], dict[str, Any]]]:
+    if subprotocol == "chat.v2.msgpack":
+        assert msgpack is not None
+        return msgpack.packb, msgpack.unpackb
+    return json.dumps, json.loads
+
+async def run_turns(url: str, subprotocol: Optional[str], compression: Optional[str], turns: int) -> int:
+    """1 つの接続で turns 回の質問をし、受け取った delta の数を返す。"""
+    encode, decode = _codec(subprotocol)
+    deltas = 0
+    async with connect(f"{url}?chat_id={uuid.uuid4()}", subprotocols=[Subprotocol(subprotocol)] if subprotocol else None, compression=compression, max_size=None) as ws:
+        assert ws.subprotocol == subprotocol
+        for i in range(turns):
+            await ws.send(encode({"current_question": f"{i} 回目の質問です。設計について教えてください。"}))
+            while True:
+                frame = decode(await ws.recv())
+                if frame["type"] == "delta":
+                    deltas += 1
+                elif frame["type"] in ("end", "error"):
+                    break
+    return deltas
+
+def _requests(metrics_url: str) -> float:
+    for line in httpx.get(metrics_url).text.splitlines():
+        if line.startswith('llm_requests_total{method="stream",result="ok"}'):
+            return float(line.split()[1])
+    return 0.0
+
+async def check_resume(url: str, metrics_url: str, cut_after: int) -> dict[str, Any]:
+    """回答の途中で切断して再開し、受け取ったフレームの seq と LLM の呼び出し回数を確かめる。"""
+    chat_id = str(uuid.uuid4())
+    before = _requests(metrics_url)
+    received: list[dict[str, Any]] = []
+    async with connect(f"{url}?chat_id={chat_id}", subprotocols=[V2_JSON]) as ws:
+        json.loads(await ws.recv())
+        await ws.send(json.dumps({"current_question": "途中で切断します"}))
+        while len(received) < cut_after:
+            received.append(json.loads(await ws.recv()))
+    last_seq = received[-1]["seq"]
+    # 切断中もサーバーは回答の生成を続ける
+    await asyncio.sleep(0.5)
+    async with connect(f"{url}?chat_id={chat_id}&last_seq={last_seq}", subprotocols=[V2_JSON]) as ws:
+        hello = json.loads(await ws.recv())
+        replayed = 0
+        while True:
+            frame = json.loads(await ws.recv())
+            received.append(frame)
+            if frame["seq"] <= hello["seq"]:
+                replayed += 1
+            if frame["type"] == "end":
+                break
+    seqs = [frame["seq"] for frame in received]
+    return {
+        "resumed": hello["resumed"],
+        "contiguous": seqs == list(range(1, len(seqs) + 1)),
+        "replayed": replayed,
+        "frames": len(seqs),
+        "llm_calls": _requests(metrics_url) - before,
+    }
+
+async def main_async(args: argparse.Namespace):
+    env = dict(os.environ)
+    env.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY_SECONDS": "0",
+        "FAKE_LLM_TOKENS_PER_SECOND": str(args.tps),
+        "FAKE_LLM_ANSWER_TOKENS": str(args.answer_tokens),
+        # 同じ質問でも毎回 LLM を呼ぶ
+        "LLM_CACHE_ENABLED": "false",
+    })
+    port = free_port()
+    app = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"], env=env)
+    try:
+        await wait_for_port(port, app)
+        proxy = CountingProxy(port)
+        url = f"ws://127.0.0.1:{await proxy.start()}/chat/stream"
+
+        subprotocols: list[Optional[str]] = [None, "chat.v2.json"]
+        if msgpack is not None:
+            subprotocols.append("chat.v2.msgpack")
+        else:
+            print("msgpack is not installed; skipping chat.v2.msgpack")
+        baseline = None
+        print(f"{args.turns} turns x {args.answer_tokens} tokens per connection")
+        for subprotocol in subprotocols:
+            for compression in (None, "deflate"):
+                proxy.downstream = 0
+                deltas = await run_turns(url, subprotocol, compression, args.turns)
+                # 切断までの転送が終わるのを待ってから数える
+                await asyncio.sleep(0.2)
+                downstream = proxy.downstream
+                baseline = baseline or downstream
+                print(f"{subprotocol or 'v1':>16} {'deflate' if compression else 'plain':>8}: {downstream / 1024:9,.1f}KiB"
+                      f"  {downstream / deltas:6.1f}B/delta  ({downstream / baseline:.0%} of v1 plain)")
+
+        result = await check_resume(url, f"http://127.0.0.1:{port}/metrics", args.cut_after)
+        print(f"resume: resumed={result['resumed']} contiguous={result['contiguous']} frames={result['frames']}"
+              f" replayed={result['replayed']} llm_calls={result['llm_calls']:.0f}")
+    finally:
+        app.terminate()
+        app.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=20, help="1 つの接続でのターン数")
+    parser.add_argument("--answer-tokens", type=int, default=400, help="擬似 LLM の回答のトークン数")
+    parser.add_argument("--tps", type=float, default=5000, help="擬似 LLM の 1 秒あたりのトークン数")
+    parser.add_argument("--cut-after", type=int, default=10, help="再開の確認で、切断するまでに受け取るフレーム数")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
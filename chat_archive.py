@@ -0,0 +1,123 @@
+"""チャットを NDJSON（1 行 1 チャット、gzip 可）で一括して書き出す・取り込む。
+
+ファイルのリポジトリ（CHAT_REPOSITORY=file）の保存先を直接読み書きするか、--url で起動中のサーバーの
+/chats/export・/chats/import を使う。保存先を直接扱う場合は、同じ保存先を使うサーバーを停止しておくこと。
+どちらの場合も全件をメモリに載せず、少しずつ処理する。出力先が .gz で終わる場合は gzip で圧縮する。
+
+    uv run python chat_archive.py export data/chats -o chats.ndjson.gz
+    uv run python chat_archive.py import data/chats chats.ndjson.gz
+    uv run python chat_archive.py export --url http://localhost:8000 -o chats.ndjson.gz
+    uv run python chat_archive.py import --url http://localhost:8000 chats.ndjson.gz
+"""
+
+import argparse
+import os
+import sys
+import time
+from typing import IO, Iterator, Optional
+
+import httpx
+
+from app.infrastructure.file.repository.chat import ChatRepositoryFileImpl
+from app.infrastructure.serialization.archive import ChatArchiveError, create_chat_archive_decoder, encode_chat_archive
+
+# 入力を読み込む単位
+READ_CHUNK_BYTES = 1024 * 1024
+
+def export_chats(path: Optional[str], url: Optional[str], output: IO[bytes], compress: bool) -> int:
+    """書き出したバイト数を返す。"""
+    written = 0
+    if url is not None:
+        format = "gzip" if compress else "ndjson"
+        with httpx.stream("GET", f"{url.rstrip('/')}/chats/export", params={"format": format}, timeout=None) as response:
+            response.raise_for_status()
+            for chunk in response.iter_raw():
+                output.write(chunk)
+                written += len(chunk)
+        return written
+
+    assert path is not None
+    repository = ChatRepositoryFileImpl(path, snapshot_interval=0)
+    try:
+        for chunk in encode_chat_archive(repository.iter_all(), compress):
+            output.write(chunk)
+            written += len(chunk)
+    finally:
+        repository.close()
+    return written
+
+def import_chats(path: Optional[str], url: Optional[str], input: IO[bytes]) -> int:
+    """取り込んだチャットの件数を返す。"""
+    if url is not None:
+        response = httpx.post(f"{url.rstrip('/')}/chats/import", content=_chunks(input), timeout=None)
+        if response.status_code == 400:
+            raise SystemExit(f"import failed: {response.json()['detail']}")
+        response.raise_for_status()
+        return response.json()["imported"]
+
+    assert path is not None
+    # 取り込み中はコンパクションせず、終了時（close）に 1 回だけ行う
+    repository = ChatRepositoryFileImpl(path, snapshot_interval=0)
+    decoder = create_chat_archive_decoder()
+    imported = 0
+    try:
+        for chunk in _chunks(input):
+            for batch in decoder.feed(chunk):
+                repository.create_many(batch)
+                imported += len(batch)
+        for batch in decoder.close():
+            repository.create_many(batch)
+            imported += len(batch)
+    except ChatArchiveError as e:
+        raise SystemExit(f"import failed after {imported} chats: {e}")
+    finally:
+        repository.close()
+    return imported
+
+def _chunks(input: IO[bytes]) -> Iterator[bytes]:
+    while chunk := input.read(READ_CHUNK_BYTES):
+        yield chunk
+
+def main():
+    parser = argparse.ArgumentParser(description="チャットを NDJSON で一括して書き出す・取り込む")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export")
+    export_parser.add_argument("path", nargs="?", help="ファイルのリポジトリの保存先")
+    export_parser.add_argument("--url", help="起動中のサーバー（path の代わりに指定する）")
+    export_parser.add_argument("-o", "--output", default="-", help="出力先（- の場合は標準出力）")
+    export_parser.add_argument("--gzip", action="store_true", help="gzip で圧縮する（出力先が .gz の場合は指定しなくてよい）")
+    import_parser = commands.add_parser("import")
+    import_parser.add_argument("path", nargs="?", help="ファイルのリポジトリの保存先")
+    import_parser.add_argument("input", nargs="?", default="-", help="入力（- の場合は標準入力。gzip は自動で判定する）")
+    import_parser.add_argument("--url", help="起動中のサーバー（path の代わりに指定する）")
+    args = parser.parse_args()
+
+    if args.command == "import" and args.url is not None and args.path is not None and args.input == "-":
+        # --url の場合は位置引数が入力だけになる
+        args.path, args.input = None, args.path
+    if (args.path is None) == (args.url is None):
+        parser.error("specify either path or --url")
+    if args.path is not None and args.command == "export" and not os.path.isdir(args.path):
+        parser.error(f"{args.path} is not a directory")
+
+    started = time.perf_counter()
+    if args.command == "export":
+        compress = args.gzip or args.output.endswith(".gz")
+        if args.output == "-":
+            written = export_chats(args.path, args.url, sys.stdout.buffer, compress)
+        else:
+            with open(args.output, "wb") as output:
+                written = export_chats(args.path, args.url, output, compress)
+        elapsed = time.perf_counter() - started
+        print(f"exported {written / 1024 / 1024:,.1f}MiB in {elapsed:.1f}s ({written / 1024 / 1024 / elapsed:,.1f}MiB/s)", file=sys.stderr)
+    else:
+        if args.input == "-":
+            imported = import_chats(args.path, args.url, sys.stdin.buffer)
+        else:
+            with open(args.input, "rb") as input:
+                imported = import_chats(args.path, args.url, input)
+        elapsed = time.perf_counter() - started
+        print(f"imported {imported:,} chats in {elapsed:.1f}s ({imported / elapsed:,.0f} chats/s)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
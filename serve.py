@@ -0,0 +1,298 @@
+"""複数のワーカープロセスでアプリを起動する。
+
+各ワーカーは main:app を Unix ソケットで待ち受け、ルーターが TCP で受けた接続を chat_id の
+コンシステントハッシュで担当のワーカーへ中継する。チャットの状態は担当のワーカーだけが持つため、
+どのワーカーに接続しても同じ会話を続けられる。
+
+- SIGTTIN でワーカーを 1 つ追加する。担当の移ったチャットを他のワーカーから新しいワーカーへ移す
+- SIGTTOU でワーカーを 1 つ減らす。減らすワーカーのチャットを新しい担当へ移してから停止する
+- チャットは移動先が保存してから移動元で削除する。削除の前に移動元でそのチャットの接続を閉じ（クライアントは
+  新しい担当へ再接続する）、渡した後に移動元で更新されていたチャットは移動先へ送り直す。移し終えるまでの間（ソケットディレクトリに
+  rebalancing を置いている間）は、手元に無いチャットを参照したワーカーが他のワーカーから移してくる。
+  移動に失敗した場合は rebalancing を残し、以降も参照されたときに移してくるようにする
+- 異常終了したワーカーは同じ名前（ファイルのリポジトリの場合は同じ保存先）で起動し直す
+
+LLM の流量制御（LLM_MAX_CONCURRENCY など）と /metrics はワーカーごとの値になる。
+チャットの一覧・検索（/chats・/chats/search）と一括書き出し・取り込み（/chats/export・/chats/import）は、
+ワーカーをまたいで扱えないため使えない（404 になる）。ファイルのリポジトリの場合は、停止中にワーカーごとの保存先（CHAT_REPOSITORY_PATH/worker-N）を
+chat_archive.py で直接書き出せる。
+
+    uv run python serve.py --workers 4 --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import secrets
+import shutil
+import signal
+import sys
+import tempfile
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Awaitable
+
+import httpx
+
+from app.infrastructure.config import provide_config
+from app.infrastructure.cluster.peer import CLUSTER_SECRET_HEADER, REBALANCE_MARKER_FILE, release_record
+from app.infrastructure.cluster.ring import create_hash_ring
+from app.infrastructure.cluster.router import create_chat_router
+
+# ワーカーの起動を待つ時間
+WORKER_START_TIMEOUT_SECONDS = 30.0
+# ワーカーの追加・削除でチャットを移す、1 リクエストあたりの件数
+HANDOFF_BATCH_SIZE = 500
+
+logger = logging.getLogger("serve")
+
+@dataclass
+class Worker:
+    name: str
+    socket: str
+    process: asyncio.subprocess.Process
+
+class Cluster:
+    def __init__(self, socket_dir: str, uvicorn_args: list[str]):
+        self.socket_dir = socket_dir
+        self.uvicorn_args = uvicorn_args
+        self.config = provide_config()
+        self.ring = create_hash_ring()
+        self.router = create_chat_router(self.ring)
+        self.workers: dict[str, Worker] = {}
+        # ワーカー間の API の呼び出しに付ける秘密。ルーター経由の外部からの /internal を拒否するため、起動ごとに生成する
+        self.secret = secrets.token_urlsafe(32)
+        self._next_index = 0
+        self._stopping = False
+        # ワーカーの追加・削除は 1 つずつ行う
+        self._lock = asyncio.Lock()
+        # 結果を待たないタスク（ワーカーの監視・シグナルによる追加と削除）
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    async def add_worker(self):
+        async with self._lock:
+            name = f"worker-{self._next_index}"
+            self._next_index += 1
+            worker = await self._spawn(name)
+            self._begin_rebalance()
+            self.ring.add(worker.socket)
+            # 担当が新しいワーカーに移ったチャットを、他のワーカーから移す
+            moved = 0
+            try:
+                for source in list(self.workers.values()):
+                    if source is not worker:
+                        moved += await self._move_chats(source)
+            except httpx.HTTPError:
+                logger.exception("Failed to move chats to %s; the rest are moved when they are used", name)
+                return
+            self._end_rebalance()
+            logger.info("Added %s after moving %d chats (%d workers)", name, moved, len(self.workers))
+
+    async def remove_worker(self):
+        async with self._lock:
+            if len(self.workers) <= 1:
+                logger.warning("Cannot remove the last worker")
+                return
+            worker = self.workers[max(self.workers, key=lambda name: int(name.rsplit("-", 1)[1]))]
+            # 新しい接続が届かないようにしてから、チャットを新しい担当へ移す
+            self._begin_rebalance()
+            self.ring.remove(worker.socket)
+            try:
+                moved = await self._move_chats(worker)
+            except httpx.HTTPError:
+                logger.exception("Failed to hand off chats from %s; keeping it", worker.name)
+                self.ring.add(worker.socket)
+                return
+            del self.workers[worker.name]
+            worker.process.terminate()
+            await worker.process.wait()
+            # 他のワーカーが問い合わせ先にしないよう、ソケットを消しておく
+            _unlink(worker.socket)
+            self._remove_data(worker.name)
+            self._end_rebalance()
+            logger.info("Removed %s after moving %d chats (%d workers)", worker.name, moved, len(self.workers))
+
+    async def stop(self):
+        self._stopping = True
+        for worker in self.workers.values():
+            worker.process.terminate()
+        await asyncio.gather(*(worker.process.wait() for worker in self.workers.values()))
+        for worker in self.workers.values():
+            _unlink(worker.socket)
+
+    def start(self, coroutine: Awaitable[None], message: str):
+        """結果を待たないタスクとして実行する。例外はログに残す（取り出さないと、ワーカーが止まったままでも気付けない）。"""
+        async def run():
+            try:
+                await coroutine
+            except Exception:
+                logger.exception(message)
+
+        task = asyncio.create_task(run())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _spawn(self, name: str) -> Worker:
+        socket = os.path.join(self.socket_dir, f"{name}.sock")
+        _unlink(socket)
+        env = dict(os.environ, CLUSTER_SOCKET_DIR=self.socket_dir, CLUSTER_WORKER_SOCKET=socket, CLUSTER_SECRET=self.secret)
+        if self.config.chat_repository == "file":
+            env["CHAT_REPOSITORY_PATH"] = self._data_path(name)
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "main:app", "--uds", socket, *self.uvicorn_args, env=env,
+        )
+        worker = Worker(name, socket, process)
+        await self._wait_until_ready(worker)
+        self.workers[name] = worker
+        self.start(self._watch(worker), f"Failed to watch {name}")
+        return worker
+
+    async def _wait_until_ready(self, worker: Worker):
+        """ワーカーの /readyz が 200 を返す（ウォームアップが終わる）まで待つ。"""
+        deadline = asyncio.get_running_loop().time() + WORKER_START_TIMEOUT_SECONDS
+        async with httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=worker.socket), timeout=1.0) as client:
+            while asyncio.get_running_loop().time() < deadline:
+                if worker.process.returncode is not None:
+                    raise RuntimeError(f"{worker.name} exited with {worker.process.returncode}")
+                try:
+                    response = await client.get("http://worker/readyz")
+                    if response.status_code == 200:
+                        return
+                except httpx.HTTPError:
+                    pass
+                await asyncio.sleep(0.1)
+        worker.process.kill()
+        raise RuntimeError(f"{worker.name} did not start within {WORKER_START_TIMEOUT_SECONDS} seconds")
+
+    async def _watch(self, worker: Worker):
+        await worker.process.wait()
+        if self._stopping or self.workers.get(worker.name) is not worker:
+            return
+        # 担当は変えずに起動し直す（起動するまでの接続は 502 になる）
+        logger.warning("%s exited with %s; restarting", worker.name, worker.process.returncode)
+        async with self._lock:
+            if self._stopping:
+                return
+            try:
+                await self._spawn(worker.name)
+            except Exception:
+                # 担当のチャットは移せないため、ルーターはこのワーカーへの接続を 502 にし続ける
+                logger.exception("Failed to restart %s; its chats are unavailable until it is added again", worker.name)
+
+    async def _move_chats(self, source: Worker) -> int:
+        """source のチャットのうち、リング上の担当が source でないものを担当へ移す。"""
+        batches: dict[str, list[str]] = defaultdict(list)
+        moved = 0
+        async with httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=source.socket), timeout=None, headers=self._headers()) as client:
+            async with client.stream("GET", "http://worker/internal/chats") as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    owner = self.ring.owner(json.loads(line)["id"])
+                    assert owner is not None
+                    if owner == source.socket:
+                        continue
+                    batches[owner].append(line)
+                    if len(batches[owner]) >= HANDOFF_BATCH_SIZE:
+                        moved += await self._push(source, owner, batches.pop(owner))
+            for owner, lines in batches.items():
+                moved += await self._push(source, owner, lines)
+        return moved
+
+    async def _push(self, source: Worker, owner: str, lines: list[str]) -> int:
+        """lines のチャットを owner に保存させてから、source で削除する。
+
+        source で渡した後に更新されていたチャットは、source が接続を閉じた後の内容で owner を置き換えてから削除する
+        （owner でも更新されていた場合は、どちらの更新も失わないよう source に残す）。
+        """
+        await _post_lines(owner, "http://worker/internal/chats", lines, self._headers())
+        records = [release_record(json.loads(line)) for line in lines]
+        result = await _post_lines(source.socket, "http://worker/internal/chats/release", [json.dumps(record) for record in records], self._headers())
+        released = result["released"]
+        if result["kept"]:
+            versions = {record["id"]: record["version"] for record in records}
+            replaces = [json.dumps({"chat": chat, "version": versions[chat["id"]]}) for chat in result["kept"]]
+            replaced = (await _post_lines(owner, "http://worker/internal/chats/replace", replaces, self._headers()))["replaced"]
+            if replaced:
+                result = await _post_lines(source.socket, "http://worker/internal/chats/release", [json.dumps(record) for record in replaced], self._headers())
+                released += result["released"]
+            kept = len(result["kept"]) + len(replaces) - len(replaced)
+            if kept:
+                logger.warning("Kept %d chats on %s that were updated on both workers while they were moved", kept, source.name)
+        return released
+
+    def _headers(self) -> dict[str, str]:
+        return {CLUSTER_SECRET_HEADER: self.secret}
+
+    def _begin_rebalance(self):
+        # 移し終えるまでの間、手元に無いチャットを参照したワーカーが他のワーカーに問い合わせるようにする
+        with open(os.path.join(self.socket_dir, REBALANCE_MARKER_FILE), "w"):
+            pass
+
+    def _end_rebalance(self):
+        _unlink(os.path.join(self.socket_dir, REBALANCE_MARKER_FILE))
+
+    def _data_path(self, name: str) -> str:
+        return os.path.join(self.config.chat_repository_path, name)
+
+    def _remove_data(self, name: str):
+        # 移し終えたチャットが、同じ名前のワーカーを追加したときに読み込まれないようにする
+        if self.config.chat_repository == "file":
+            shutil.rmtree(self._data_path(name), ignore_errors=True)
+
+def _unlink(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+async def _post_lines(socket: str, url: str, lines: list[str], headers: dict[str, str]) -> dict[str, Any]:
+    async with httpx.AsyncClient(transport=httpx.AsyncHTTPTransport(uds=socket), timeout=None, headers=headers) as client:
+        response = await client.post(
+            url,
+            content="\n".join(lines).encode("utf-8"),
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+        return response.json()
+
+async def run(args: argparse.Namespace, uvicorn_args: list[str]):
+    socket_dir = args.socket_dir or tempfile.mkdtemp(prefix="chat-workers-")
+    os.makedirs(socket_dir, exist_ok=True)
+    cluster = Cluster(socket_dir, uvicorn_args)
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    try:
+        for _ in range(args.workers):
+            await cluster.add_worker()
+        server = await cluster.router.serve(args.host, args.port)
+        logger.info("Routing http://%s:%d to %d workers in %s", args.host, args.port, len(cluster.workers), socket_dir)
+
+        loop.add_signal_handler(signal.SIGTTIN, lambda: cluster.start(cluster.add_worker(), "Failed to add a worker"))
+        loop.add_signal_handler(signal.SIGTTOU, lambda: cluster.start(cluster.remove_worker(), "Failed to remove a worker"))
+        loop.add_signal_handler(signal.SIGINT, stopped.set)
+        loop.add_signal_handler(signal.SIGTERM, stopped.set)
+        await stopped.wait()
+
+        server.close()
+    finally:
+        await cluster.stop()
+        if not args.socket_dir:
+            shutil.rmtree(socket_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--socket-dir", default="", help="ワーカーの Unix ソケットを置くディレクトリ（省略時は一時ディレクトリ）")
+    # 残りの引数はそのまま uvicorn に渡す（--log-level など）
+    args, uvicorn_args = parser.parse_known_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(run(args, uvicorn_args))
+
+if __name__ == "__main__":
+    main()
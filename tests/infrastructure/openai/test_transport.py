@@ -0,0 +1,126 @@
+"""ResilientTransport（リトライ・リトライの予算・タイムアウト・ヘッジ）を、障害を順に指定した擬似 LLM サーバーに対して確かめる。"""
+
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Any, Iterator
+
+import httpx
+import pytest
+import uvicorn
+
+from app.infrastructure.fake.client import create_fake_llm
+from app.infrastructure.fake.server import FAULT_NONE, FAULT_RATE_LIMIT, FAULT_SERVER_ERROR, FAULT_STALL, FakeChatCompletionsServer, create_fake_chat_completions_server
+from app.infrastructure.metrics.prometheus import PrometheusMetrics, create_prometheus_metrics
+from app.infrastructure.openai.transport import LLMHTTPSettings, create_llm_http_client
+
+pytestmark = pytest.mark.anyio
+
+# 止まる上流が応答ヘッダーを返すまでの時間（テストのタイムアウト・ヘッジの待ち時間より十分長くする）
+STALL_SECONDS = 3.0
+
+BODY = {"model": "fake", "messages": [{"role": "user", "content": "こんにちは"}]}
+
+def fake_server(faults: list[str]) -> FakeChatCompletionsServer:
+    return create_fake_chat_completions_server(create_fake_llm(latency_seconds=0.01, tokens_per_second=0, answer_tokens=8), stall_seconds=STALL_SECONDS, faults=faults)
+
+@contextmanager
+def serve(server: FakeChatCompletionsServer) -> Iterator[str]:
+    """擬似 LLM サーバーを別スレッドで起動し、ベース URL を返す。"""
+    config = uvicorn.Config(server.application(), host="127.0.0.1", port=0, log_level="warning", ws="none", timeout_graceful_shutdown=1)
+    uvicorn_server = uvicorn.Server(config)
+    thread = threading.Thread(target=uvicorn_server.run, daemon=True)
+    thread.start()
+    while not uvicorn_server.started:
+        time.sleep(0.01)
+    port = uvicorn_server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        uvicorn_server.should_exit = True
+        thread.join()
+
+def settings(**overrides: Any) -> LLMHTTPSettings:
+    return replace(LLMHTTPSettings(http2=False, read_timeout_seconds=STALL_SECONDS * 2, retry_backoff_seconds=0.01), **overrides)
+
+def metric(metrics: PrometheusMetrics, sample: str) -> float:
+    """sample（名前とラベル）の値を返す（記録が無い場合は 0）。"""
+    for line in metrics.render().splitlines():
+        name, _, value = line.rpartition(" ")
+        if name == sample:
+            return float(value)
+    return 0.0
+
+async def post(client: httpx.AsyncClient, base_url: str) -> httpx.Response:
+    return await client.post(f"{base_url}/v1/chat/completions", json=BODY)
+
+@pytest.mark.parametrize("faults", [[FAULT_RATE_LIMIT], [FAULT_SERVER_ERROR], [FAULT_RATE_LIMIT, FAULT_SERVER_ERROR]])
+async def test_retries_until_success(faults: list[str]):
+    server = fake_server(faults)
+    metrics = create_prometheus_metrics()
+    with serve(server) as base_url:
+        async with create_llm_http_client(settings(max_retries=2), metrics) as client:
+            response = await post(client, base_url)
+    assert response.status_code == 200
+    assert response.json()["choices"][0]["message"]["content"]
+    assert server.requests == len(faults) + 1
+    assert metric(metrics, 'llm_http_retries_total{reason="status"}') == len(faults)
+
+async def test_surfaces_error_after_max_retries():
+    server = fake_server([FAULT_SERVER_ERROR] * 3)
+    with serve(server) as base_url:
+        async with create_llm_http_client(settings(max_retries=2)) as client:
+            response = await post(client, base_url)
+    assert response.status_code == 503
+    assert server.requests == 3
+
+async def test_surfaces_error_when_retry_budget_is_exhausted():
+    # 予算は 10 秒間に 1 回（比例分なし）のため、1 回だけリトライして 2 回目の 503 をそのまま返す
+    server = fake_server([FAULT_SERVER_ERROR] * 5)
+    metrics = create_prometheus_metrics()
+    with serve(server) as base_url:
+        async with create_llm_http_client(settings(max_retries=5, retry_budget_ratio=0, retry_budget_min_per_second=0.1), metrics) as client:
+            response = await post(client, base_url)
+    assert response.status_code == 503
+    assert server.requests == 2
+    assert metric(metrics, "llm_http_retry_budget_exhausted_total") == 1
+
+async def test_stalled_read_hits_read_timeout():
+    server = fake_server([FAULT_STALL])
+    with serve(server) as base_url:
+        async with create_llm_http_client(settings(max_retries=0, read_timeout_seconds=0.3)) as client:
+            started = time.perf_counter()
+            with pytest.raises(httpx.ReadTimeout):
+                await post(client, base_url)
+            assert time.perf_counter() - started < STALL_SECONDS
+    assert server.requests == 1
+
+async def test_retries_stalled_read():
+    server = fake_server([FAULT_STALL])
+    with serve(server) as base_url:
+        async with create_llm_http_client(settings(max_retries=1, read_timeout_seconds=0.3)) as client:
+            started = time.perf_counter()
+            response = await post(client, base_url)
+            assert time.perf_counter() - started < STALL_SECONDS
+    assert response.status_code == 200
+    assert server.requests == 2
+
+async def test_hedge_fires_after_delay_and_first_response_wins():
+    # ヘッジの待ち時間を決めるための計測（20 件）の後、止まる 1 件目とすぐ応答するヘッジを送る
+    samples = 20
+    server = fake_server([FAULT_NONE] * samples + [FAULT_STALL, FAULT_NONE])
+    metrics = create_prometheus_metrics()
+    hedge_delay = 0.3
+    with serve(server) as base_url:
+        async with create_llm_http_client(settings(hedge=True, hedge_min_delay_seconds=hedge_delay), metrics) as client:
+            for _ in range(samples):
+                assert (await post(client, base_url)).status_code == 200
+            started = time.perf_counter()
+            response = await post(client, base_url)
+            elapsed = time.perf_counter() - started
+    assert response.status_code == 200
+    assert hedge_delay <= elapsed < STALL_SECONDS
+    assert server.requests == samples + 2
+    assert metric(metrics, 'llm_http_hedges_total{winner="hedge"}') == 1
+    assert metric(metrics, 'llm_http_hedges_total{winner="primary"}') == 0